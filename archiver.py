@@ -0,0 +1,221 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+把原文件移动到归档目录（archive2可能位于另一个文件系统）
+
+同一文件系统内直接rename。跨文件系统时：
+1. 在内核中复制到目标目录的临时文件（copy_file_range，不支持时sendfile，
+   再不支持时用一个复用的缓冲区读写），每次复制一大块
+2. 复制的同时计算源文件的哈希（刚复制过的数据在页缓存中，读取很快）
+3. fsync目标文件，丢弃它的页缓存后重新读取计算哈希，与源文件比较
+4. 一致时把临时文件改名为目标文件并fsync目录，最后才删除源文件
+
+任何一步失败都删除临时文件并保留源文件。
+"""
+
+import os
+import time
+import errno
+import shutil
+import hashlib
+import logging
+from pathlib import Path
+from typing import Optional, Sequence
+
+logger = logging.getLogger(__name__)
+
+METHOD_RENAME = 'rename'
+METHOD_COPY_FILE_RANGE = 'copy_file_range'
+METHOD_SENDFILE = 'sendfile'
+METHOD_READWRITE = 'readwrite'
+COPY_METHODS = (METHOD_COPY_FILE_RANGE, METHOD_SENDFILE, METHOD_READWRITE)
+
+DEFAULT_CHUNK_SIZE = 16 * 1024 * 1024
+DEFAULT_ALGORITHM = 'sha256'
+
+# 内核不支持该复制方式（或不支持跨文件系统）时换下一种
+_UNSUPPORTED_ERRNOS = {errno.EXDEV, errno.ENOSYS, errno.EINVAL, errno.EOPNOTSUPP, errno.ENOTSUP}
+
+
+class ArchiveError(Exception):
+    """归档失败（源文件保持不动）"""
+
+
+class ArchiveResult:
+    """一个文件的归档结果"""
+
+    __slots__ = ('source', 'dest', 'size', 'method', 'digest', 'seconds')
+
+    def __init__(self, source: Path, dest: Path, size: int, method: str,
+                 digest: Optional[str], seconds: float):
+        self.source = source
+        self.dest = dest
+        self.size = size
+        self.method = method
+        self.digest = digest
+        self.seconds = seconds
+
+    def __repr__(self) -> str:
+        return f"ArchiveResult({self.source.name!r}, {self.method}, {self.size} bytes)"
+
+    @property
+    def throughput(self) -> Optional[float]:
+        """字节/秒（rename没有复制数据，为None）"""
+        if self.method == METHOD_RENAME or self.seconds <= 0:
+            return None
+        return self.size / self.seconds
+
+    def to_dict(self) -> dict:
+        return {
+            'method': self.method,
+            'size': self.size,
+            'digest': self.digest,
+            'seconds': round(self.seconds, 3),
+        }
+
+
+def _copy_file_range(src_fd: int, dst_fd: int, offset: int, count: int) -> int:
+    return os.copy_file_range(src_fd, dst_fd, count, offset, offset)
+
+
+def _sendfile(src_fd: int, dst_fd: int, offset: int, count: int) -> int:
+    # 目标文件位置随写入前进，与offset保持一致
+    return os.sendfile(dst_fd, src_fd, offset, count)
+
+
+def _copy_chunks(src_fd: int, dst_fd: int, size: int, method: str, hasher, chunk_size: int):
+    """用method复制整个文件，同时计算源文件的哈希"""
+    if method == METHOD_READWRITE:
+        buffer = bytearray(chunk_size)
+        view = memoryview(buffer)
+        with open(src_fd, 'rb', buffering=0, closefd=False) as src:
+            src.seek(0)
+            while True:
+                read = src.readinto(buffer)
+                if not read:
+                    break
+                hasher.update(view[:read])
+                written = 0
+                while written < read:
+                    written += os.write(dst_fd, view[written:read])
+        return
+
+    copy = _copy_file_range if method == METHOD_COPY_FILE_RANGE else _sendfile
+    offset = 0
+    while offset < size:
+        copied = copy(src_fd, dst_fd, offset, min(chunk_size, size - offset))
+        if copied == 0:
+            raise ArchiveError("复制时源文件变短")
+        hasher.update(os.pread(src_fd, copied, offset))
+        offset += copied
+
+
+def _file_digest(fd: int, algorithm: str, chunk_size: int) -> str:
+    """从头读取文件计算哈希（先丢弃页缓存，读到的是磁盘上的数据）"""
+    if hasattr(os, 'posix_fadvise'):
+        os.posix_fadvise(fd, 0, 0, os.POSIX_FADV_DONTNEED)
+    hasher = hashlib.new(algorithm)
+    buffer = bytearray(chunk_size)
+    view = memoryview(buffer)
+    with open(fd, 'rb', buffering=0, closefd=False) as fp:
+        fp.seek(0)
+        while True:
+            read = fp.readinto(buffer)
+            if not read:
+                break
+            hasher.update(view[:read])
+    return hasher.hexdigest()
+
+
+def _same_filesystem(source: Path, dest_dir: Path) -> bool:
+    return os.stat(source).st_dev == os.stat(dest_dir).st_dev
+
+
+def _fsync_dir(directory: Path):
+    fd = os.open(str(directory), os.O_RDONLY)
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+
+def copy_file(source, dest, methods: Sequence[str] = COPY_METHODS,
+              chunk_size: int = DEFAULT_CHUNK_SIZE, algorithm: str = DEFAULT_ALGORITHM) -> ArchiveResult:
+    """
+    校验后复制文件（不删除源文件）
+
+    Args:
+        source: 源文件
+        dest: 目标路径（已存在时覆盖）
+        methods: 依次尝试的复制方式
+        chunk_size: 每次复制的字节数
+        algorithm: hashlib哈希算法
+
+    Returns:
+        ArchiveResult（method为实际使用的复制方式）
+
+    Raises:
+        ArchiveError: 校验失败或所有复制方式都不可用
+        OSError: 读写失败
+    """
+    source, dest = Path(source), Path(dest)
+    temp_path = dest.with_name(f'.{dest.name}.partial')
+    started = time.monotonic()
+    src_fd = os.open(str(source), os.O_RDONLY)
+    try:
+        size = os.fstat(src_fd).st_size
+        for method in methods:
+            dst_fd = os.open(str(temp_path), os.O_RDWR | os.O_CREAT | os.O_TRUNC, 0o644)
+            try:
+                hasher = hashlib.new(algorithm)
+                try:
+                    _copy_chunks(src_fd, dst_fd, size, method, hasher, chunk_size)
+                except (AttributeError, OSError) as e:
+                    # AttributeError：当前平台没有该系统调用
+                    if isinstance(e, OSError) and e.errno not in _UNSUPPORTED_ERRNOS:
+                        raise
+                    logger.debug(f"{method}不可用，换下一种复制方式: {e}")
+                    continue
+                os.fsync(dst_fd)
+                digest = hasher.hexdigest()
+                copied_digest = _file_digest(dst_fd, algorithm, chunk_size)
+                if copied_digest != digest:
+                    raise ArchiveError(f"复制校验失败: {source.name}（{digest} != {copied_digest}）")
+                break
+            finally:
+                os.close(dst_fd)
+        else:
+            raise ArchiveError(f"没有可用的复制方式: {source.name}")
+        shutil.copystat(str(source), str(temp_path))
+        os.replace(str(temp_path), str(dest))
+        _fsync_dir(dest.parent)
+    except BaseException:
+        temp_path.unlink(missing_ok=True)
+        raise
+    finally:
+        os.close(src_fd)
+    return ArchiveResult(source, dest, size, method, digest, time.monotonic() - started)
+
+
+def archive_file(source, dest, methods: Sequence[str] = COPY_METHODS,
+                 chunk_size: int = DEFAULT_CHUNK_SIZE, algorithm: str = DEFAULT_ALGORITHM) -> ArchiveResult:
+    """
+    把源文件移动到dest：同一文件系统内rename，否则校验后复制、fsync，再删除源文件
+
+    参数与copy_file相同
+
+    Raises:
+        ArchiveError, OSError: 归档失败，源文件保持不动
+    """
+    source, dest = Path(source), Path(dest)
+    started = time.monotonic()
+    if _same_filesystem(source, dest.parent):
+        size = os.stat(source).st_size
+        os.replace(str(source), str(dest))
+        return ArchiveResult(source, dest, size, METHOD_RENAME, None, time.monotonic() - started)
+
+    result = copy_file(source, dest, methods, chunk_size, algorithm)
+    source.unlink()
+    _fsync_dir(source.parent)
+    result.seconds = time.monotonic() - started
+    return result
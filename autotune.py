@@ -0,0 +1,275 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+按实测吞吐量自动调整并行数（--jobs auto）
+
+不同主机、不同素材组合下合适的转码/图片并行数不同。AutoTuner在运行中
+每隔一段时间统计吞吐量（每秒转码的媒体秒数、每秒处理的照片数），
+用爬山法调整同时运行的任务数：
+- 上一次调整后吞吐量提高：沿同一方向继续调整
+- 吞吐量下降，或增加任务数后没有明显提高：反向调整
+- 减少任务数后吞吐量不变：保持（用更少的资源达到同样的吞吐量）
+- 反向退回原来的并行数后先保持一个周期，再继续试探
+
+照片和视频通常分批处理，两个统计周期的素材组合可能完全不同，
+因此只比较两个周期都有的吞吐量类别，没有共同类别时重新建立基准。
+
+运行结束时把最终的并行数按主机名保存，下次运行从这个值开始。
+"""
+
+import os
+import json
+import time
+import socket
+import asyncio
+import logging
+import threading
+from contextlib import asynccontextmanager, contextmanager
+from datetime import datetime
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+JOBS_AUTO = 'auto'
+
+UNIT_MEDIA_SECONDS = 'media_seconds'
+UNIT_PHOTOS = 'photos'
+
+DEFAULT_INTERVAL_SECONDS = 30.0
+# 吞吐量变化小于该比例视为没有变化（测量噪声）
+DEFAULT_TOLERANCE = 0.05
+DEFAULT_STATE_PATH = Path(
+    os.environ.get('XDG_CACHE_HOME') or Path.home() / '.cache'
+) / 'fixphotodate' / 'autotune.json'
+
+
+class ConcurrencyLimit:
+    """上限可以在运行中修改的信号量"""
+
+    def __init__(self, limit: int):
+        self._limit = limit
+        self._active = 0
+        self._cond = threading.Condition()
+
+    @property
+    def limit(self) -> int:
+        return self._limit
+
+    def set_limit(self, limit: int):
+        """修改上限（调小时已运行的任务不受影响，结束后才不再放行）"""
+        with self._cond:
+            self._limit = limit
+            self._cond.notify_all()
+
+    def try_acquire(self) -> bool:
+        with self._cond:
+            if self._active >= self._limit:
+                return False
+            self._active += 1
+            return True
+
+    def acquire(self):
+        with self._cond:
+            while self._active >= self._limit:
+                self._cond.wait()
+            self._active += 1
+
+    def release(self):
+        with self._cond:
+            self._active -= 1
+            self._cond.notify_all()
+
+    @contextmanager
+    def slot(self):
+        self.acquire()
+        try:
+            yield
+        finally:
+            self.release()
+
+    @asynccontextmanager
+    async def aslot(self, poll_seconds: float = 0.2):
+        """异步版slot，等待时不阻塞事件循环"""
+        while not self.try_acquire():
+            await asyncio.sleep(poll_seconds)
+        try:
+            yield
+        finally:
+            self.release()
+
+
+def load_tuned_jobs(state_path: Path = DEFAULT_STATE_PATH, host: Optional[str] = None) -> Optional[int]:
+    """读取上次为本主机选定的并行数"""
+    try:
+        with open(state_path, encoding='utf-8') as fp:
+            entry = json.load(fp).get(host or socket.gethostname())
+    except (OSError, ValueError):
+        return None
+    if isinstance(entry, dict) and isinstance(entry.get('jobs'), int):
+        return entry['jobs']
+    return None
+
+
+def save_tuned_jobs(jobs: int, rates: Dict[str, float], state_path: Path = DEFAULT_STATE_PATH,
+                    host: Optional[str] = None):
+    """按主机名保存选定的并行数（共享的家目录中各主机互不覆盖）"""
+    state_path = Path(state_path)
+    try:
+        with open(state_path, encoding='utf-8') as fp:
+            state = json.load(fp)
+    except (OSError, ValueError):
+        state = {}
+    state[host or socket.gethostname()] = {
+        'jobs': jobs,
+        'rates': {unit: round(rate, 3) for unit, rate in rates.items()},
+        'updated': datetime.now().replace(microsecond=0).isoformat(),
+    }
+    state_path.parent.mkdir(parents=True, exist_ok=True)
+    temp_path = state_path.with_name(f'{state_path.name}.{os.getpid()}.tmp')
+    with open(temp_path, 'w', encoding='utf-8') as fp:
+        json.dump(state, fp, ensure_ascii=False, indent=2)
+    os.replace(temp_path, state_path)
+
+
+class AutoTuner:
+    """爬山法并行数控制器"""
+
+    def __init__(self, min_jobs: int = 1, max_jobs: Optional[int] = None, initial: Optional[int] = None,
+                 interval: float = DEFAULT_INTERVAL_SECONDS, tolerance: float = DEFAULT_TOLERANCE,
+                 state_path: Optional[Path] = DEFAULT_STATE_PATH, host: Optional[str] = None):
+        """
+        Args:
+            min_jobs: 并行数下限
+            max_jobs: 并行数上限，默认为CPU核数
+            initial: 初始并行数，默认为上次保存的值，没有时为上下限的中间值
+            interval: 统计周期（秒）
+            tolerance: 视为没有变化的吞吐量相对变化
+            state_path: 保存选定并行数的文件，None表示不读取也不保存
+            host: 主机名（默认socket.gethostname()）
+        """
+        self.max_jobs = max_jobs or os.cpu_count() or 1
+        self.min_jobs = max(1, min(min_jobs, self.max_jobs))
+        self.interval = interval
+        self.tolerance = tolerance
+        self.state_path = state_path
+        self.host = host or socket.gethostname()
+
+        if initial is None and state_path is not None:
+            initial = load_tuned_jobs(state_path, self.host)
+            if initial is not None:
+                logger.info(f"使用上次选定的并行数: {initial}")
+        if initial is None:
+            initial = (self.min_jobs + self.max_jobs + 1) // 2
+        self.limit = ConcurrencyLimit(max(self.min_jobs, min(initial, self.max_jobs)))
+
+        self.history: List[Tuple[int, Dict[str, float]]] = []
+        self._direction = 1
+        self._moved = False
+        self._returned = False
+        self._last_rates: Optional[Dict[str, float]] = None
+        self._units: Dict[str, float] = {}
+        self._since = time.monotonic()
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def jobs(self) -> int:
+        """当前并行数"""
+        return self.limit.limit
+
+    def record(self, unit: str, amount: float = 1.0):
+        """记录完成的工作量（UNIT_MEDIA_SECONDS或UNIT_PHOTOS）"""
+        with self._lock:
+            self._units[unit] = self._units.get(unit, 0.0) + amount
+
+    def tick(self, now: Optional[float] = None) -> int:
+        """
+        结束一个统计周期并调整并行数
+
+        周期内没有完成任何任务时（例如都在转码长视频）继续累计，不做调整
+
+        Returns:
+            调整后的并行数
+        """
+        now = time.monotonic() if now is None else now
+        with self._lock:
+            elapsed = now - self._since
+            if elapsed <= 0 or not self._units:
+                return self.jobs
+            rates = {unit: amount / elapsed for unit, amount in self._units.items()}
+            self._units = {}
+            self._since = now
+
+        jobs = self.jobs
+        self.history.append((jobs, rates))
+        previous, self._last_rates = self._last_rates, rates
+        common = [unit for unit in rates if previous and previous.get(unit)]
+
+        if self._returned:
+            # 刚退回到较好的并行数：这次的提高只是相对上一个较差的点，先保持
+            self._returned = False
+            self._moved = False
+            return self.jobs
+        if not self._moved or not common:
+            # 刚建立基准（或素材类别变了），先向当前方向试探一步
+            self._step(self._direction, rates)
+            return self.jobs
+
+        gain = sum(rates[unit] / previous[unit] for unit in common) / len(common) - 1
+        if gain > self.tolerance:
+            self._step(self._direction, rates)
+        elif gain < -self.tolerance or self._direction > 0:
+            self._direction = -self._direction
+            self._step(self._direction, rates)
+            self._returned = self._moved
+        else:
+            self._moved = False
+        return self.jobs
+
+    def _step(self, direction: int, rates: Dict[str, float]):
+        """向direction方向调整一步，碰到上下限时反向"""
+        old = self.jobs
+        new = old + direction
+        if not self.min_jobs <= new <= self.max_jobs:
+            self._direction = -direction
+            new = old - direction
+        if not self.min_jobs <= new <= self.max_jobs:
+            self._moved = False
+            return
+        self.limit.set_limit(new)
+        self._moved = True
+        summary = '，'.join(f"{unit} {rate:.2f}/s" for unit, rate in rates.items())
+        logger.info(f"自动并行数: {old} → {new}（吞吐量 {summary}）")
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            self.tick()
+
+    def start(self) -> 'AutoTuner':
+        """在后台线程中按周期调整"""
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name='autotune', daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        """停止调整，记录并保存最终选定的并行数"""
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+        rates = self.history[-1][1] if self.history else {}
+        logger.info(f"选定并行数: {self.jobs}（{len(self.history)} 个统计周期）")
+        if self.state_path is not None and self.history:
+            try:
+                save_tuned_jobs(self.jobs, rates, self.state_path, self.host)
+            except OSError as e:
+                logger.warning(f"无法保存选定的并行数: {e}")
+
+    def __enter__(self) -> 'AutoTuner':
+        return self.start()
+
+    def __exit__(self, *exc_info):
+        self.stop()
@@ -0,0 +1,146 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+AVCHD（MTS/M2TS）录制时间读取工具
+
+AVCHD摄像机会在H.264 SEI的user_data_unregistered中写入"MDPM"数据块，
+其中包含录制日期、时间和时区。本模块只读取文件开头的几百个TS包
+（几百KB），无需ffprobe，也无需扫描目录推断时间。
+
+MDPM数据格式（均为BCD编码）：
+- 标签0x18：时区字节 + 年(2字节) + 月
+- 标签0x19：日 + 时 + 分 + 秒
+"""
+
+import logging
+from datetime import datetime, timedelta, timezone
+from typing import Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+# MDPM所在SEI的UUID（17ee8c60-f84d-11d9-8cd6-0800200c9a66）+ 标识
+MDPM_MARKER = bytes.fromhex('17ee8c60f84d11d98cd60800200c9a66') + b'MDPM'
+
+TS_PACKET_SIZE = 188
+TS_SYNC_BYTE = 0x47
+
+# 默认读取的TS包数量
+DEFAULT_MAX_PACKETS = 600
+
+
+def _detect_packet_size(head: bytes) -> Optional[int]:
+    """
+    检测TS包大小：MTS/M2TS为192字节（4字节时间码 + 188字节TS包），普通TS为188字节
+
+    Returns:
+        包大小，无法识别时返回None
+    """
+    for packet_size, sync_offset in ((192, 4), (188, 0)):
+        if len(head) >= packet_size * 3 + sync_offset and all(
+            head[sync_offset + i * packet_size] == TS_SYNC_BYTE for i in range(3)
+        ):
+            return packet_size
+    return None
+
+
+def _bcd(value: int) -> Optional[int]:
+    """解码一个BCD字节，非法值返回None"""
+    high, low = value >> 4, value & 0x0F
+    if high > 9 or low > 9:
+        return None
+    return high * 10 + low
+
+
+def _remove_emulation_prevention(data: bytes) -> bytes:
+    """去掉H.264防竞争字节（00 00 03 → 00 00）"""
+    return data.replace(b'\x00\x00\x03', b'\x00\x00')
+
+
+def parse_mdpm(data: bytes) -> Optional[datetime]:
+    """
+    解析MDPM数据块中的录制时间
+
+    Args:
+        data: 紧跟在MDPM标识之后的数据（已去掉防竞争字节）
+
+    Returns:
+        带时区的datetime对象，数据不完整或非法时返回None
+    """
+    if not data:
+        return None
+    count = data[0]
+    entries: Dict[int, bytes] = {}
+    for i in range(count):
+        entry = data[1 + i * 5:6 + i * 5]
+        if len(entry) < 5:
+            break
+        entries.setdefault(entry[0], entry[1:])
+
+    date_part = entries.get(0x18)
+    time_part = entries.get(0x19)
+    if date_part is None or time_part is None:
+        return None
+
+    fields = [_bcd(b) for b in date_part[1:] + time_part]
+    if any(field is None for field in fields):
+        return None
+    year_high, year_low, month, day, hour, minute, second = fields
+
+    tz_byte = date_part[0]
+    offset = timedelta(hours=(tz_byte >> 1) & 0x0F, minutes=30 if tz_byte & 0x01 else 0)
+    if tz_byte & 0x20:
+        offset = -offset
+
+    try:
+        return datetime(year_high * 100 + year_low, month, day, hour, minute, second,
+                        tzinfo=timezone(offset))
+    except ValueError:
+        return None
+
+
+def read_mdpm_datetime(mts_path, max_packets: int = DEFAULT_MAX_PACKETS) -> Optional[datetime]:
+    """
+    从MTS/M2TS文件开头读取MDPM录制时间
+
+    按PID重组前max_packets个TS包的负载，在其中查找MDPM数据块。
+
+    Args:
+        mts_path: MTS文件路径
+        max_packets: 最多读取的TS包数量
+
+    Returns:
+        带时区的datetime对象或None
+    """
+    with open(mts_path, 'rb') as f:
+        head = f.read(192 * 4)
+        packet_size = _detect_packet_size(head)
+        if packet_size is None:
+            logger.debug(f"不是TS格式: {mts_path}")
+            return None
+        f.seek(0)
+        raw = f.read(packet_size * max_packets)
+
+    sync_offset = packet_size - TS_PACKET_SIZE
+    payloads: Dict[int, bytearray] = {}
+    for start in range(0, len(raw) - packet_size + 1, packet_size):
+        packet = raw[start + sync_offset:start + packet_size]
+        if packet[0] != TS_SYNC_BYTE:
+            continue
+        pid = ((packet[1] & 0x1F) << 8) | packet[2]
+        adaptation = (packet[3] >> 4) & 0x03
+        if adaptation == 0x02 or pid == 0x1FFF:
+            continue  # 只有自适应字段或空包
+        offset = 4
+        if adaptation == 0x03:
+            offset += 1 + packet[4]
+        payloads.setdefault(pid, bytearray()).extend(packet[offset:])
+
+    for payload in payloads.values():
+        position = payload.find(MDPM_MARKER)
+        if position < 0:
+            continue
+        data = _remove_emulation_prevention(bytes(payload[position + len(MDPM_MARKER):position + 512]))
+        result = parse_mdpm(data)
+        if result:
+            return result
+    return None
@@ -0,0 +1,115 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+同时处理多个目录（一次传入几百个日期目录时）
+
+- 目录交给一个共享的线程池，最多同时处理workers个目录；每个目录使用自己的
+  处理器，时间线、已决定的照片时间等状态互不影响
+- 转码和图片任务的总数由调用方传给各处理器的同一个并发上限控制，
+  同时处理的目录数不会使ffmpeg进程数成倍增加
+- 一个目录失败只记录在结果中，其他目录继续处理，最后统一汇总
+- 停止后（Ctrl+C/SIGTERM）不再开始新目录，进行中的目录记为中断
+"""
+
+import time
+import logging
+import threading
+import traceback
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, List, Optional, Sequence
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_DIR_JOBS = 4
+
+RESULT_DONE = 'done'
+RESULT_FAILED = 'failed'
+RESULT_INTERRUPTED = 'interrupted'
+RESULT_SKIPPED = 'skipped'
+
+
+class DirectoryResult:
+    """一个目录的处理结果"""
+
+    __slots__ = ('path', 'status', 'error', 'failed_files', 'seconds')
+
+    def __init__(self, path: str, status: str, error: Optional[str] = None, failed_files: int = 0,
+                 seconds: float = 0.0):
+        self.path = path
+        self.status = status
+        self.error = error
+        self.failed_files = failed_files
+        self.seconds = seconds
+
+    def __repr__(self) -> str:
+        return f"DirectoryResult({self.path!r}, {self.status})"
+
+    @property
+    def ok(self) -> bool:
+        """目录处理完成且没有文件失败"""
+        return self.status == RESULT_DONE and not self.failed_files
+
+
+def run_directories(directories: Sequence[str], handler: Callable[[str], int], workers: int = DEFAULT_DIR_JOBS,
+                    should_stop: Optional[Callable[[], bool]] = None) -> List[DirectoryResult]:
+    """
+    用共享线程池处理多个目录
+
+    Args:
+        directories: 目录列表
+        handler: 处理一个目录的函数，返回失败的文件数，抛出异常表示整个目录失败
+        workers: 最多同时处理的目录数
+        should_stop: 返回True时不再开始新目录；此时处理函数抛出的异常记为中断而不是失败
+
+    Returns:
+        各目录的结果（与directories顺序相同）
+    """
+    total = len(directories)
+    finished = 0
+    lock = threading.Lock()
+
+    def run(path: str) -> DirectoryResult:
+        nonlocal finished
+        if should_stop and should_stop():
+            return DirectoryResult(path, RESULT_SKIPPED)
+        started = time.monotonic()
+        try:
+            result = DirectoryResult(path, RESULT_DONE, failed_files=handler(path))
+        except Exception as e:
+            if should_stop and should_stop():
+                result = DirectoryResult(path, RESULT_INTERRUPTED)
+            else:
+                result = DirectoryResult(path, RESULT_FAILED, error=str(e) or type(e).__name__)
+                logger.error(f"处理目录失败 {path}: {result.error}")
+                logger.debug(traceback.format_exc())
+        result.seconds = time.monotonic() - started
+        with lock:
+            finished += 1
+            logger.info(f"[{finished}/{total}] {path}: {result.status} ({result.seconds:.1f}秒)")
+        return result
+
+    with ThreadPoolExecutor(max_workers=max(1, min(workers, total or 1)), thread_name_prefix='dir') as executor:
+        return list(executor.map(run, directories))
+
+
+def summarize(results: List[DirectoryResult]) -> Dict[str, int]:
+    """
+    输出汇总：各状态的目录数，并列出失败的目录
+
+    Returns:
+        {状态: 目录数}，另有"failed_files"为失败的文件总数
+    """
+    counts = {status: 0 for status in (RESULT_DONE, RESULT_FAILED, RESULT_INTERRUPTED, RESULT_SKIPPED)}
+    for result in results:
+        counts[result.status] += 1
+    counts['failed_files'] = sum(result.failed_files for result in results)
+    logger.info(
+        f"目录汇总: 共{len(results)}个，完成{counts[RESULT_DONE]}，失败{counts[RESULT_FAILED]}，"
+        f"中断{counts[RESULT_INTERRUPTED]}，未开始{counts[RESULT_SKIPPED]}；失败文件{counts['failed_files']}个"
+    )
+    for result in results:
+        if result.status == RESULT_FAILED:
+            logger.error(f"  失败 {result.path}: {result.error}")
+        elif result.failed_files:
+            logger.error(f"  {result.path}: {result.failed_files} 个文件处理失败")
+    return counts
@@ -0,0 +1,114 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+文件名时间提取微基准测试
+
+对比原先的逐个格式匹配（未编译正则 + 逐组int()）与预编译组合匹配器，
+在一百万个文件名上的耗时，并校验两者结果一致；
+另外比较注册表中有5个和60个格式时的单文件匹配开销。
+
+用法: python bench_filename_dates.py [文件名数量]
+"""
+
+import re
+import sys
+import time
+import random
+from datetime import datetime
+
+from filename_dates import (
+    SOURCE_MA,
+    SOURCE_TEMP,
+    FilenamePattern,
+    PatternRegistry,
+    match_filename_datetime,
+)
+
+
+def legacy_match(stem: str):
+    """原先process_image中的匹配顺序：临时文件名格式 → MA格式"""
+    try:
+        match = re.search(r'(\d{4})-(\d{2})-(\d{2})\s+(\d{2})\.(\d{2})\.(\d{2})', stem)
+        if match:
+            year = int(match.group(1))
+            month = int(match.group(2))
+            day = int(match.group(3))
+            hour = int(match.group(4))
+            minute = int(match.group(5))
+            second = int(match.group(6))
+            return datetime(year, month, day, hour, minute, second), SOURCE_TEMP
+    except ValueError:
+        pass
+    try:
+        match = re.match(r'^MA(\d{14})', stem)
+        if match:
+            return datetime.strptime(match.group(1), '%Y%m%d%H%M%S'), SOURCE_MA
+    except ValueError:
+        pass
+    return None, None
+
+
+def generate_names(count: int):
+    """生成混合格式的文件名（大部分为普通相机文件名）"""
+    rng = random.Random(42)
+    names = []
+    for i in range(count):
+        kind = rng.random()
+        if kind < 0.70:
+            names.append(f"DSC_{i % 10000:04d}")
+        elif kind < 0.80:
+            names.append(f"临时文件名2012-03-{rng.randint(1, 28):02d} 02.59.{rng.randint(0, 59):02d}")
+        elif kind < 0.90:
+            names.append(f"MA2012031414{rng.randint(0, 59):02d}{rng.randint(0, 59):02d}0096-12-000000")
+        else:
+            names.append(f"video-2012-03-17-23-48-{rng.randint(0, 59):02d}")
+    return names
+
+
+def build_registry(size: int) -> PatternRegistry:
+    """构造包含size个不同前缀格式的注册表"""
+    registry = PatternRegistry()
+    registry.add(FilenamePattern('IMG', r'^IMG_(?P<date>\d{8}_\d{6})', '%Y%m%d_%H%M%S'))
+    for i in range(size - 1):
+        registry.add(FilenamePattern(f'APP{i}', rf'^APP{i:02d}_(?P<date>\d{{8}})', '%Y%m%d'))
+    return registry
+
+
+def bench(label: str, func, names, repeat: int = 3):
+    """运行repeat次，取最短耗时以减少系统抖动的影响"""
+    elapsed = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        results = [func(name) for name in names]
+        elapsed = min(elapsed, time.perf_counter() - start)
+    print(f"  {label:<12} {elapsed:8.3f} 秒  ({elapsed / len(names) * 1e6:.2f} 微秒/个)")
+    return results, elapsed
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 1_000_000
+    names = generate_names(count)
+
+    print("=" * 70)
+    print(f"文件名时间提取微基准测试（{count} 个文件名）")
+    print("=" * 70)
+
+    legacy_results, legacy_time = bench("逐个匹配", legacy_match, names)
+    combined_results, combined_time = bench(
+        "组合匹配", lambda stem: match_filename_datetime(stem, (SOURCE_TEMP, SOURCE_MA)), names
+    )
+
+    mismatches = sum(1 for a, b in zip(legacy_results, combined_results) if a != b)
+    print(f"\n  加速比: {legacy_time / combined_time:.2f}x")
+    print(f"  结果不一致: {mismatches}")
+
+    print("\n注册表规模对单文件开销的影响:")
+    for size in (5, 60):
+        registry = build_registry(size)
+        bench(f"{size}个格式", registry.match, names)
+    print("=" * 70)
+    return 0 if mismatches == 0 else 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,141 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+SIGINT/SIGTERM的平滑取消
+
+收到第一个信号后不再开始新任务，正在运行的任务继续完成；
+超过宽限时间后终止仍在运行的ffmpeg子进程，对应任务回滚（删除不完整的输出）。
+再次收到信号时立即终止子进程。
+
+子进程必须通过CancelToken.run启动才能被终止，它与
+subprocess.run(cmd, check=True, capture_output=True, timeout=...)的行为一致。
+
+一个任务可以使用以全局CancelToken为parent的子令牌：全局取消时子令牌也视为取消、
+其子进程也被终止；子令牌单独取消（如工作队列的租约失效）时只影响这个任务。
+"""
+
+import signal
+import logging
+import threading
+import subprocess
+from typing import Iterator, List, Optional, Set
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_GRACE_SECONDS = 60.0
+
+
+class Cancelled(Exception):
+    """已取消，任务未开始或已回滚"""
+
+
+class CancelToken:
+    """取消状态与受控的子进程"""
+
+    def __init__(self, parent: Optional['CancelToken'] = None):
+        """
+        Args:
+            parent: 上级令牌，它取消或终止子进程时本令牌也一样
+        """
+        self.parent = parent
+        self._event = threading.Event()
+        self._lock = threading.Lock()
+        self._processes: Set[subprocess.Popen] = set()
+        self._killed = False
+        self._timer: Optional[threading.Timer] = None
+        self.signum: Optional[int] = None
+
+    @property
+    def cancelled(self) -> bool:
+        return self._event.is_set() or (self.parent is not None and self.parent.cancelled)
+
+    def _lineage(self) -> Iterator['CancelToken']:
+        """本令牌及所有上级令牌"""
+        token = self
+        while token is not None:
+            yield token
+            token = token.parent
+
+    def cancel(self, grace: Optional[float] = None):
+        """
+        请求取消
+
+        Args:
+            grace: 宽限秒数，超过后终止仍在运行的子进程；None表示不限时
+        """
+        if self._event.is_set():
+            return
+        self._event.set()
+        if grace is not None:
+            self._timer = threading.Timer(grace, self.kill_processes)
+            self._timer.daemon = True
+            self._timer.start()
+
+    def check(self):
+        """已取消时抛出Cancelled"""
+        if self.cancelled:
+            raise Cancelled()
+
+    def kill_processes(self):
+        """终止所有受控的子进程，之后启动的子进程也会立即终止"""
+        with self._lock:
+            self._killed = True
+            processes = list(self._processes)
+        if processes:
+            logger.warning(f"终止 {len(processes)} 个仍在运行的子进程")
+        for process in processes:
+            process.kill()
+
+    def run(self, cmd: List[str], timeout: Optional[float] = None) -> subprocess.CompletedProcess:
+        """
+        运行子进程并等待结束（可被kill_processes终止）
+
+        Raises:
+            subprocess.CalledProcessError: 退出码非0（包括被终止）
+            subprocess.TimeoutExpired: 超时
+        """
+        process = subprocess.Popen(cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+        # 登记到所有上级令牌，上级终止子进程时也会终止它
+        killed = False
+        for token in self._lineage():
+            with token._lock:
+                token._processes.add(process)
+                killed = killed or token._killed
+        if killed:
+            process.kill()
+        try:
+            stdout, stderr = process.communicate(timeout=timeout)
+        except subprocess.TimeoutExpired:
+            process.kill()
+            process.communicate()
+            raise
+        finally:
+            for token in self._lineage():
+                with token._lock:
+                    token._processes.discard(process)
+        if process.returncode != 0:
+            raise subprocess.CalledProcessError(process.returncode, cmd, stdout, stderr)
+        return subprocess.CompletedProcess(cmd, 0, stdout, stderr)
+
+    def install(self, grace: float = DEFAULT_GRACE_SECONDS):
+        """在主线程中注册SIGINT/SIGTERM处理"""
+        def handle(signum, frame):
+            if self.cancelled:
+                logger.warning("再次收到停止信号，立即终止")
+                self.kill_processes()
+                return
+            self.signum = signum
+            logger.warning(
+                f"收到{signal.Signals(signum).name}：不再开始新任务，"
+                f"等待进行中的任务完成（最多{grace:.0f}秒，再次按Ctrl+C立即停止）"
+            )
+            self.cancel(grace)
+
+        for signum in (signal.SIGINT, signal.SIGTERM):
+            signal.signal(signum, handle)
+
+    @property
+    def exit_code(self) -> int:
+        """按shell惯例的退出码：128+信号编号"""
+        signum = next((token.signum for token in self._lineage() if token.signum), signal.SIGINT)
+        return 128 + signum
@@ -0,0 +1,186 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+JPEG/TIFF EXIF日期字段原地改写
+
+EXIF中的DateTime(306)、DateTimeOriginal(36867)、DateTimeDigitized(36868)
+都是20字节的ASCII值（"YYYY:MM:DD HH:MM:SS\\0"），改写时长度不变，
+因此只需找到值所在的偏移直接覆盖19个字节，不需要重新编码图片。
+"""
+
+import os
+import struct
+import logging
+from datetime import datetime, timedelta
+from typing import Callable, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+EXIF_DATE_FORMAT = '%Y:%m:%d %H:%M:%S'
+EXIF_DATE_LENGTH = 19
+
+TAG_DATETIME = 306
+TAG_DATETIME_ORIGINAL = 36867
+TAG_DATETIME_DIGITIZED = 36868
+TAG_EXIF_IFD = 0x8769
+
+DATE_TAGS = {TAG_DATETIME, TAG_DATETIME_ORIGINAL, TAG_DATETIME_DIGITIZED}
+
+ASCII_TYPE = 2
+# JPEG中EXIF数据最多位于前几个APPn段内，APP1最大64KB
+MAX_SCAN_BYTES = 256 * 1024
+
+
+def _find_tiff_start(f) -> Optional[int]:
+    """
+    找到TIFF头（EXIF数据起点）在文件中的偏移
+
+    TIFF文件本身从偏移0开始；JPEG则在APP1 "Exif\\0\\0" 段内
+    """
+    f.seek(0)
+    head = f.read(4)
+    if head in (b'II*\x00', b'MM\x00*'):
+        return 0
+    if head[:2] != b'\xff\xd8':
+        return None
+
+    offset = 2
+    while offset < MAX_SCAN_BYTES:
+        f.seek(offset)
+        marker = f.read(4)
+        if len(marker) < 4 or marker[0] != 0xFF:
+            return None
+        code = marker[1]
+        if code in (0xD9, 0xDA):  # EOI / SOS：之后是图像数据
+            return None
+        length = struct.unpack('>H', marker[2:])[0]
+        if code == 0xE1:
+            if f.read(6) == b'Exif\x00\x00':
+                return offset + 10
+        offset += 2 + length
+    return None
+
+
+def _read_ifd(f, tiff_start: int, ifd_offset: int, endian: str) -> List[Tuple[int, int, int, int]]:
+    """读取一个IFD的所有条目：(标签, 类型, 数量, 值或值偏移)"""
+    f.seek(tiff_start + ifd_offset)
+    raw = f.read(2)
+    if len(raw) < 2:
+        return []
+    count = struct.unpack(endian + 'H', raw)[0]
+    data = f.read(count * 12)
+    entries = []
+    for i in range(len(data) // 12):
+        entries.append(struct.unpack(endian + 'HHII', data[i * 12:(i + 1) * 12]))
+    return entries
+
+
+def find_exif_dates(f) -> List[Tuple[int, int, str]]:
+    """
+    查找EXIF日期字段
+
+    Args:
+        f: 以二进制模式打开的文件对象
+
+    Returns:
+        [(标签, 值在文件中的偏移, 当前值)]，没有EXIF或没有日期字段时为空列表
+    """
+    tiff_start = _find_tiff_start(f)
+    if tiff_start is None:
+        return []
+    f.seek(tiff_start)
+    header = f.read(8)
+    if len(header) < 8 or header[:2] not in (b'II', b'MM'):
+        return []
+    endian = '<' if header[:2] == b'II' else '>'
+    ifd0 = struct.unpack(endian + 'I', header[4:])[0]
+
+    results = []
+    pending = [ifd0]
+    visited = set()
+    while pending:
+        ifd_offset = pending.pop()
+        if ifd_offset in visited or ifd_offset == 0:
+            continue
+        visited.add(ifd_offset)
+        for tag, value_type, count, value in _read_ifd(f, tiff_start, ifd_offset, endian):
+            if tag == TAG_EXIF_IFD:
+                pending.append(value)
+            elif tag in DATE_TAGS and value_type == ASCII_TYPE and count >= EXIF_DATE_LENGTH:
+                position = tiff_start + value
+                f.seek(position)
+                text = f.read(EXIF_DATE_LENGTH).decode('ascii', 'replace')
+                results.append((tag, position, text))
+    return results
+
+
+def _write_at(f, offset: int, data: bytes):
+    """在指定偏移写入数据（优先使用pwrite）"""
+    if hasattr(os, 'pwrite'):
+        os.pwrite(f.fileno(), data, offset)
+    else:
+        f.seek(offset)
+        f.write(data)
+
+
+def shift_exif_dates(image_path, delta: timedelta,
+                     before_write: Optional[Callable[[List[Tuple[int, str]]], None]] = None) -> List[Tuple[int, str]]:
+    """
+    把EXIF中的所有日期字段原地平移delta
+
+    无法解析的值（如全空格的占位值）保持不变
+
+    Args:
+        image_path: JPEG或TIFF文件路径
+        delta: 时间偏移
+        before_write: 改写文件之前用[(偏移, 原值)]调用（先写好撤销记录）
+
+    Returns:
+        [(偏移, 原值)]，供撤销使用；没有可改写的字段时为空列表
+    """
+    with open(image_path, 'r+b') as f:
+        patches = []
+        for tag, position, text in find_exif_dates(f):
+            try:
+                old = datetime.strptime(text, EXIF_DATE_FORMAT)
+            except ValueError:
+                logger.debug(f"无法解析EXIF日期 {tag}: {text!r}")
+                continue
+            new = (old + delta).strftime(EXIF_DATE_FORMAT)
+            patches.append((position, text, new.encode('ascii')))
+
+        if patches and before_write is not None:
+            before_write([(position, text) for position, text, _ in patches])
+        for position, _, data in patches:
+            _write_at(f, position, data)
+        if patches:
+            f.flush()
+            os.fsync(f.fileno())
+    return [(position, text) for position, text, _ in patches]
+
+
+def restore_exif_dates(image_path, values: List[Tuple[int, str]]) -> int:
+    """
+    把shift_exif_dates记录的原值写回
+
+    只改写当前仍是合法日期字符串的位置，防止文件已被替换时写坏数据
+
+    Returns:
+        恢复的字段数
+    """
+    restored = 0
+    with open(image_path, 'r+b') as f:
+        for position, text in values:
+            f.seek(position)
+            current = f.read(EXIF_DATE_LENGTH).decode('ascii', 'replace')
+            try:
+                datetime.strptime(current, EXIF_DATE_FORMAT)
+            except ValueError:
+                logger.warning(f"{os.path.basename(image_path)} 偏移{position}处不是EXIF日期，跳过")
+                continue
+            _write_at(f, position, text.encode('ascii'))
+            restored += 1
+        if restored:
+            f.flush()
+            os.fsync(f.fileno())
+    return restored
@@ -0,0 +1,194 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+常驻exiftool进程会话
+
+功能：
+1. ExifToolSession：保持一个 `exiftool -stay_open True -@ -` 进程常驻，
+   通过stdin逐行发送参数，用 `-execute<N>` 分隔每批命令，
+   逐行读取输出直到 `{ready<N>}` 标记，避免每个文件都启动一次Perl（约150ms）
+2. ExifToolPool：少量会话组成的池，供多个工作线程借用
+"""
+
+import json
+import queue
+import shutil
+import subprocess
+import threading
+import logging
+from contextlib import contextmanager
+from itertools import count
+from typing import Iterator, List, Optional
+
+logger = logging.getLogger(__name__)
+
+
+class ExifToolError(RuntimeError):
+    """exiftool会话出错（进程不存在、意外退出等）"""
+
+
+class ExifToolSession:
+    """单个常驻exiftool进程"""
+
+    def __init__(self, executable: str = 'exiftool'):
+        """
+        初始化会话（不会立即启动进程）
+
+        Args:
+            executable: exiftool可执行文件
+        """
+        self.executable = executable
+        self._process: Optional[subprocess.Popen] = None
+        self._lock = threading.Lock()
+        self._counter = count(1)
+
+    @property
+    def running(self) -> bool:
+        return self._process is not None and self._process.poll() is None
+
+    def start(self):
+        """启动exiftool进程"""
+        if self.running:
+            return
+        if shutil.which(self.executable) is None:
+            raise ExifToolError(f"未找到 {self.executable}")
+        self._process = subprocess.Popen(
+            [self.executable, '-stay_open', 'True', '-@', '-'],
+            stdin=subprocess.PIPE,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.DEVNULL,
+            text=True,
+            encoding='utf-8',
+            errors='replace',
+            bufsize=1,
+        )
+        logger.debug(f"exiftool会话已启动 (pid={self._process.pid})")
+
+    def close(self):
+        """通知exiftool退出并等待进程结束"""
+        process = self._process
+        self._process = None
+        if process is None:
+            return
+        try:
+            if process.poll() is None:
+                process.stdin.write('-stay_open\nFalse\n')
+                process.stdin.flush()
+                process.wait(timeout=5)
+        except (OSError, subprocess.TimeoutExpired):
+            process.kill()
+            process.wait()
+
+    def __enter__(self) -> 'ExifToolSession':
+        self.start()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+    def execute(self, *args: str) -> str:
+        """
+        执行一批exiftool参数并返回标准输出
+
+        Args:
+            args: exiftool参数（每个参数一行，不能包含换行符）
+
+        Returns:
+            该批命令的输出文本
+        """
+        with self._lock:
+            self.start()
+            number = next(self._counter)
+            sentinel = f'{{ready{number}}}'
+            try:
+                self._process.stdin.write('\n'.join(args) + f'\n-execute{number}\n')
+                self._process.stdin.flush()
+                lines = []
+                for line in self._process.stdout:
+                    if line.rstrip('\r\n') == sentinel:
+                        return ''.join(lines)
+                    lines.append(line)
+            except OSError as e:
+                self.close()
+                raise ExifToolError(f"exiftool会话写入失败: {e}") from e
+            self.close()
+            raise ExifToolError("exiftool会话意外退出")
+
+    def execute_json(self, *args: str) -> List[dict]:
+        """
+        以JSON格式执行一批参数（自动添加 -j）
+
+        Returns:
+            每个文件一条记录的列表；无输出时为空列表
+        """
+        output = self.execute('-j', *args)
+        if not output.strip():
+            return []
+        try:
+            return json.loads(output)
+        except json.JSONDecodeError as e:
+            raise ExifToolError(f"exiftool输出不是有效JSON: {e}") from e
+
+
+class ExifToolPool:
+    """exiftool会话池，按需启动最多size个会话"""
+
+    def __init__(self, size: int = 2, executable: str = 'exiftool'):
+        """
+        Args:
+            size: 最大会话数
+            executable: exiftool可执行文件
+        """
+        if shutil.which(executable) is None:
+            raise ExifToolError(f"未找到 {executable}")
+        self.size = max(1, size)
+        self.executable = executable
+        self._idle: 'queue.LifoQueue[ExifToolSession]' = queue.LifoQueue()
+        self._sessions: List[ExifToolSession] = []
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def session(self) -> Iterator[ExifToolSession]:
+        """借用一个会话，用完自动归还；会话出错时丢弃并在下次借用时重建"""
+        session = self._acquire()
+        try:
+            yield session
+        except ExifToolError:
+            session.close()
+            raise
+        finally:
+            self._idle.put(session)
+
+    def _acquire(self) -> ExifToolSession:
+        try:
+            return self._idle.get_nowait()
+        except queue.Empty:
+            pass
+        with self._lock:
+            if len(self._sessions) < self.size:
+                session = ExifToolSession(self.executable)
+                self._sessions.append(session)
+                return session
+        return self._idle.get()
+
+    def execute_json(self, *args: str) -> List[dict]:
+        """借用一个会话执行JSON命令"""
+        with self.session() as session:
+            return session.execute_json(*args)
+
+    def execute(self, *args: str) -> str:
+        """借用一个会话执行命令"""
+        with self.session() as session:
+            return session.execute(*args)
+
+    def close(self):
+        """关闭池中所有会话"""
+        with self._lock:
+            for session in self._sessions:
+                session.close()
+
+    def __enter__(self) -> 'ExifToolPool':
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
@@ -0,0 +1,399 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+文件名时间提取引擎
+
+把分散在各个方法里的文件名时间格式合并成一个预编译的正则，
+按优先级排列命名分组，一次match调用同时得到时间和来源：
+
+1. temp  ：临时文件名<YYYY-MM-DD HH.mm.ss>***（文件名任意位置）
+2. ma    ：MA<YYYYMMDDHHMMSS>***
+3. video ：video-<YYYY-MM-DD-HH-mm-ss>***
+
+MA和video-格式先用startswith做廉价的前缀判断，
+不可能匹配的格式不会被尝试。
+
+此外还支持从配置文件（默认 filename_patterns.ini）注册更多格式，
+如 IMG_YYYYMMDD_HHMMSS、WhatsApp、Screenshot 等，无需修改代码。
+注册的格式按前缀建立前缀树，每个文件只尝试前缀相符的候选格式，
+格式数量增加到几十个时单个文件的匹配开销基本不变。
+"""
+
+import re
+import configparser
+import logging
+from datetime import datetime
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+# 来源名称
+SOURCE_TEMP = 'temp'
+SOURCE_MA = 'ma'
+SOURCE_VIDEO = 'video'
+
+# 来源优先级
+SOURCE_ORDER = (SOURCE_TEMP, SOURCE_MA, SOURCE_VIDEO)
+
+# 适用的媒体类型
+MEDIA_IMAGE = 'image'
+MEDIA_VIDEO = 'video'
+MEDIA_ALL = 'all'
+
+# 内置格式的优先级（数值越小越优先）与适用媒体类型
+BUILTIN_PRIORITIES = {SOURCE_TEMP: 10, SOURCE_MA: 20, SOURCE_VIDEO: 30}
+BUILTIN_MEDIA = {SOURCE_TEMP: MEDIA_IMAGE, SOURCE_MA: MEDIA_IMAGE, SOURCE_VIDEO: MEDIA_VIDEO}
+
+# 配置文件中格式的默认优先级
+DEFAULT_PATTERN_PRIORITY = 50
+
+# 默认的格式配置文件
+DEFAULT_PATTERNS_FILE = Path(__file__).resolve().with_name('filename_patterns.ini')
+
+# 各格式的正则（按优先级排列），保持与原先各方法中的写法一致
+_TEMP_REGEX = r'(?P<temp>(\d{4})-(\d{2})-(\d{2})\s+(\d{2})\.(\d{2})\.(\d{2}))'
+_MA_REGEX = r'MA(?P<ma>(\d{4})(\d{2})(\d{2})(\d{2})(\d{2})(\d{2}))'
+_VIDEO_REGEX = r'video-(?P<video>(\d{4})-(\d{2})-(\d{2})-(\d{2})-(\d{2})-(\d{2}))'
+
+# 全部格式的组合匹配器：所有分支都锚定在开头，
+# temp格式用前瞻在整个文件名中查找，因此分支顺序就是优先级
+COMBINED_PATTERN = re.compile(
+    rf'(?=.*?{_TEMP_REGEX})|{_MA_REGEX}|{_VIDEO_REGEX}',
+    re.DOTALL,
+)
+
+# 单个格式的匹配器（调用方只接受部分来源时使用）
+SOURCE_PATTERNS = {
+    SOURCE_TEMP: re.compile(_TEMP_REGEX),
+    SOURCE_MA: re.compile(rf'^{_MA_REGEX}'),
+    SOURCE_VIDEO: re.compile(rf'^{_VIDEO_REGEX}'),
+}
+
+# 前缀过滤：只有以这些前缀开头的文件名才可能匹配对应格式
+SOURCE_PREFIXES = {
+    SOURCE_MA: 'MA',
+    SOURCE_VIDEO: 'video-',
+}
+
+_PREFIXED_STARTS = tuple(SOURCE_PREFIXES.values())
+
+# 每个来源的命名分组后面紧跟6个数字分组（年月日时分秒）
+_GROUP_INDEX = dict(COMBINED_PATTERN.groupindex)
+
+# guess_datetime_from_filename 使用的辅助模式
+DIR_DATE_PATTERN = re.compile(r'(\d{8})')
+HOUR_MINUTE_SUFFIX_PATTERN = re.compile(r'_(\d{2})(\d{2})(?:_\d+)?$')
+HOUR_SUFFIX_PATTERN = re.compile(r'_(\d{2})(?:_\d+)?$')
+FILE_NUMBER_PATTERN = re.compile(r'(\d+)')
+
+
+def _build_datetime(match: re.Match, first_group: int) -> Optional[datetime]:
+    """用命名分组后面的6个数字分组构造datetime，日期非法时返回None"""
+    groups = match.groups()
+    try:
+        return datetime(
+            int(groups[first_group]), int(groups[first_group + 1]), int(groups[first_group + 2]),
+            int(groups[first_group + 3]), int(groups[first_group + 4]), int(groups[first_group + 5]),
+        )
+    except ValueError:
+        return None
+
+
+def _media_matches(pattern_media: str, media: Optional[str]) -> bool:
+    return media is None or pattern_media in (MEDIA_ALL, media)
+
+
+def _match_builtin(stem: str, allowed: Tuple[str, ...]) -> Tuple[Optional[datetime], Optional[str]]:
+    """
+    用组合匹配器匹配内置格式
+
+    Args:
+        stem: 文件名（不含扩展名）
+        allowed: 接受的内置来源
+
+    Returns:
+        (datetime对象, 来源名称)；没有匹配时为(None, None)
+    """
+    if not allowed:
+        return None, None
+
+    # 前缀过滤：不以MA或video-开头的文件名只可能匹配temp格式
+    if not stem.startswith(_PREFIXED_STARTS):
+        if SOURCE_TEMP not in allowed:
+            return None, None
+        match = SOURCE_PATTERNS[SOURCE_TEMP].search(stem)
+        if match:
+            dt = _build_datetime(match, 1)
+            if dt:
+                return dt, SOURCE_TEMP
+        return None, None
+
+    match = COMBINED_PATTERN.match(stem)
+    if not match or not match.lastgroup:
+        # 组合匹配器覆盖全部内置格式，这里没有匹配说明任何内置格式都不可能匹配
+        return None, None
+
+    name = match.lastgroup
+    if name in allowed:
+        dt = _build_datetime(match, _GROUP_INDEX[name])
+        if dt:
+            return dt, name
+
+    # 匹配到的格式不被接受或日期非法时，按优先级尝试其后的格式
+    # （排在它前面的分支已经在组合匹配中失败，无需再试）
+    for source in SOURCE_ORDER[SOURCE_ORDER.index(name) + 1:]:
+        if source not in allowed:
+            continue
+        prefix = SOURCE_PREFIXES.get(source)
+        if prefix is not None and not stem.startswith(prefix):
+            continue
+        single = SOURCE_PATTERNS[source].search(stem)
+        if single:
+            dt = _build_datetime(single, 1)
+            if dt:
+                return dt, source
+    return None, None
+
+
+def _literal_prefix(regex: str) -> str:
+    """从以^开头的正则中提取字面前缀，如 ^IMG_(\\d{8}) → IMG_"""
+    if not regex.startswith('^'):
+        return ''
+    prefix = []
+    for char in regex[1:]:
+        if char in '\\.^$*+?{}[]|()':
+            if char in '*?{' and prefix:
+                prefix.pop()  # 量词作用于前一个字符，该字符不是必需的
+            break
+        prefix.append(char)
+    return ''.join(prefix)
+
+
+class FilenamePattern:
+    """一个可注册的文件名时间格式"""
+
+    def __init__(
+        self,
+        name: str,
+        regex: str,
+        fmt: str,
+        prefix: Optional[str] = None,
+        priority: int = DEFAULT_PATTERN_PRIORITY,
+        media: str = MEDIA_ALL,
+    ):
+        """
+        Args:
+            name: 格式名称（即返回的来源名称）
+            regex: 正则表达式；有名为date的分组时解析该分组，否则解析整个匹配
+            fmt: strptime格式
+            prefix: 文件名必须具有的前缀，None表示从正则自动推导
+            priority: 优先级，数值越小越优先
+            media: 适用的媒体类型（image、video或all）
+        """
+        if media not in (MEDIA_IMAGE, MEDIA_VIDEO, MEDIA_ALL):
+            raise ValueError(f"格式{name}的media无效: {media}")
+        self.name = name
+        self.regex = re.compile(regex)
+        self.fmt = fmt
+        self.prefix = _literal_prefix(regex) if prefix is None else prefix
+        self.priority = priority
+        self.media = media
+        self._has_date_group = 'date' in self.regex.groupindex
+
+    def parse(self, stem: str) -> Optional[datetime]:
+        """匹配文件名并解析时间，不匹配或时间非法时返回None"""
+        match = self.regex.search(stem)
+        if not match:
+            return None
+        text = match.group('date') if self._has_date_group else match.group(0)
+        try:
+            return datetime.strptime(text, self.fmt)
+        except ValueError:
+            return None
+
+    def __repr__(self) -> str:
+        return f"FilenamePattern({self.name!r}, prefix={self.prefix!r}, priority={self.priority})"
+
+
+def _priority_key(pattern: FilenamePattern) -> int:
+    return pattern.priority
+
+
+class _TrieNode:
+    __slots__ = ('children', 'patterns')
+
+    def __init__(self):
+        self.children: Dict[str, '_TrieNode'] = {}
+        self.patterns: List[FilenamePattern] = []
+
+
+class PatternRegistry:
+    """按前缀树分派的文件名时间格式注册表"""
+
+    def __init__(self):
+        self.patterns: List[FilenamePattern] = []
+        self._root = _TrieNode()
+
+    def add(self, pattern: FilenamePattern):
+        """注册一个格式；同名格式会被替换"""
+        if any(existing.name == pattern.name for existing in self.patterns):
+            self.remove(pattern.name)
+        self.patterns.append(pattern)
+        node = self._root
+        for char in pattern.prefix:
+            node = node.children.setdefault(char, _TrieNode())
+        node.patterns.append(pattern)
+        node.patterns.sort(key=_priority_key)
+
+    def remove(self, name: str):
+        """按名称移除格式"""
+        patterns = [p for p in self.patterns if p.name != name]
+        self.patterns = []
+        self._root = _TrieNode()
+        for pattern in patterns:
+            self.add(pattern)
+
+    def candidates(self, stem: str) -> List[FilenamePattern]:
+        """
+        返回前缀与文件名相符的候选格式（按优先级排序）
+
+        沿前缀树走过文件名的前几个字符，开销只与最长前缀有关，与格式总数无关
+        """
+        found = self._root.patterns
+        node = self._root
+        for char in stem:
+            node = node.children.get(char)
+            if node is None:
+                break
+            if node.patterns:
+                found = found + node.patterns
+        if len(found) > 1:
+            found = sorted(found, key=_priority_key)
+        return found
+
+    def match(
+        self,
+        stem: str,
+        sources: Optional[Tuple[str, ...]] = None,
+        media: Optional[str] = None,
+        before_priority: Optional[int] = None,
+    ) -> Tuple[Optional[datetime], Optional[str]]:
+        """
+        用注册的格式匹配文件名
+
+        Args:
+            stem: 文件名（不含扩展名）
+            sources: 只接受的格式名称，None表示全部
+            media: 媒体类型，None表示不限
+            before_priority: 只尝试优先级数值小于该值的格式
+
+        Returns:
+            (datetime对象, 格式名称)；没有匹配时为(None, None)
+        """
+        if not self._root.patterns and (not stem or stem[0] not in self._root.children):
+            return None, None  # 首字符索引中没有候选格式
+        for pattern in self.candidates(stem):
+            if before_priority is not None and pattern.priority >= before_priority:
+                break
+            if sources is not None and pattern.name not in sources:
+                continue
+            if not _media_matches(pattern.media, media):
+                continue
+            dt = pattern.parse(stem)
+            if dt:
+                return dt, pattern.name
+        return None, None
+
+    def load_config(self, path) -> int:
+        """
+        从INI配置文件加载格式，每个小节一个格式：
+
+            [IMG_YYYYMMDD_HHMMSS]
+            regex = ^IMG_(?P<date>\\d{8}_\\d{6})
+            format = %Y%m%d_%H%M%S
+            priority = 40
+            media = image
+
+        Args:
+            path: 配置文件路径
+
+        Returns:
+            加载的格式数量
+        """
+        parser = configparser.ConfigParser(interpolation=None)
+        with open(path, encoding='utf-8') as f:
+            parser.read_file(f)
+
+        count = 0
+        for name in parser.sections():
+            section = parser[name]
+            try:
+                pattern = FilenamePattern(
+                    name,
+                    section['regex'],
+                    section['format'],
+                    prefix=section.get('prefix'),
+                    priority=section.getint('priority', DEFAULT_PATTERN_PRIORITY),
+                    media=section.get('media', MEDIA_ALL),
+                )
+            except (KeyError, re.error, ValueError) as e:
+                raise ValueError(f"文件名格式配置错误 [{name}]: {e}") from e
+            if name in BUILTIN_PRIORITIES:
+                raise ValueError(f"文件名格式配置错误 [{name}]: 与内置格式重名")
+            self.add(pattern)
+            count += 1
+        logger.debug(f"从{path}加载了{count}个文件名格式")
+        return count
+
+
+_default_registry: Optional[PatternRegistry] = None
+
+# (sources, media) → 接受的内置来源
+_ALLOWED_CACHE: Dict[Tuple[Optional[Tuple[str, ...]], Optional[str]], Tuple[str, ...]] = {}
+
+
+def default_registry() -> PatternRegistry:
+    """获取默认注册表（首次使用时加载 filename_patterns.ini）"""
+    global _default_registry
+    if _default_registry is None:
+        _default_registry = PatternRegistry()
+        if DEFAULT_PATTERNS_FILE.exists():
+            _default_registry.load_config(DEFAULT_PATTERNS_FILE)
+    return _default_registry
+
+
+def match_filename_datetime(
+    stem: str,
+    sources: Optional[Iterable[str]] = None,
+    media: Optional[str] = None,
+) -> Tuple[Optional[datetime], Optional[str]]:
+    """
+    从文件名（不含扩展名）提取时间
+
+    先用组合匹配器匹配内置格式，再在注册表中查找优先级更高的格式
+
+    Args:
+        stem: 文件名（不含扩展名）
+        sources: 只接受的来源（格式名称）集合，None表示全部来源
+        media: 媒体类型（image或video），None表示不限
+
+    Returns:
+        (datetime对象, 来源名称)；没有匹配时为(None, None)
+    """
+    if sources is not None and not isinstance(sources, tuple):
+        sources = tuple(sources)
+    key = (sources, media)
+    allowed = _ALLOWED_CACHE.get(key)
+    if allowed is None:
+        allowed = _ALLOWED_CACHE[key] = tuple(
+            source for source in SOURCE_ORDER
+            if (sources is None or source in sources) and _media_matches(BUILTIN_MEDIA[source], media)
+        )
+    builtin_dt, builtin_source = _match_builtin(stem, allowed)
+
+    limit = BUILTIN_PRIORITIES[builtin_source] if builtin_dt else None
+    dt, name = (_default_registry or default_registry()).match(stem, sources, media, limit)
+    if dt:
+        return dt, name
+    return builtin_dt, builtin_source
@@ -0,0 +1,223 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+ID3v2.4 日期标签写入工具
+
+功能：
+1. 将录音时间写入MP3文件的ID3v2.4标签（TDRC录制时间、TDOR原始发行时间）
+2. 保留已有标签中的其他帧（支持ID3v2.3/v2.4，v2.3专有的帧转换为v2.4的对应帧或丢弃；
+   带压缩、加密、分组标志等无法安全转换的v2.3帧不改写，交给ffmpeg处理）
+3. 已有标签的填充（padding）足够时，只原地改写文件开头的标签区域
+4. 标签需要变大时才重写整个文件，并预留充足填充，方便以后原地修改
+"""
+
+import os
+import shutil
+import struct
+import logging
+from datetime import datetime
+from pathlib import Path
+from typing import List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+# 标签需要扩大时预留的填充字节数
+DEFAULT_PADDING = 4096
+
+# 写入的日期帧
+DATE_FRAMES = (b'TDRC', b'TDOR')
+# 重写标签时需要丢弃的旧日期帧（包括ID3v2.3中被TDRC/TDOR取代的帧）
+OBSOLETE_DATE_FRAMES = {b'TDRC', b'TDOR', b'TYER', b'TDAT', b'TIME', b'TORY', b'TRDA'}
+# ID3v2.4中改名的v2.3帧（内容格式相同）
+RENAMED_V23_FRAMES = {b'IPLS': b'TIPL'}
+# ID3v2.4中已删除的v2.3帧（内容可由音频数据重新得到，直接丢弃）
+DROPPED_V23_FRAMES = {b'TSIZ'}
+# ID3v2.4中内容格式不同的v2.3帧（RVA2/EQU2），无法转换
+UNCONVERTIBLE_V23_FRAMES = {b'RVAD', b'EQUA'}
+# ID3v2.3帧格式标志：压缩、加密、分组（帧头后有额外字段，与v2.4的布局不同）
+V23_FORMAT_FLAGS = 0xE0
+
+# ID3v2标签头标志位
+FLAG_UNSYNCHRONISATION = 0x80
+FLAG_EXTENDED_HEADER = 0x40
+FLAG_FOOTER = 0x10
+
+
+def decode_syncsafe(data: bytes) -> int:
+    """解码4字节syncsafe整数（每字节只用低7位）"""
+    value = 0
+    for byte in data:
+        value = (value << 7) | (byte & 0x7F)
+    return value
+
+
+def encode_syncsafe(value: int) -> bytes:
+    """编码为4字节syncsafe整数"""
+    if value >= 1 << 28:
+        raise ValueError(f"ID3标签过大: {value}")
+    return bytes([(value >> 21) & 0x7F, (value >> 14) & 0x7F, (value >> 7) & 0x7F, value & 0x7F])
+
+
+def build_text_frame(frame_id: bytes, text: str) -> bytes:
+    """构造ID3v2.4文本帧（UTF-8编码）"""
+    payload = b'\x03' + text.encode('utf-8')
+    return frame_id + encode_syncsafe(len(payload)) + b'\x00\x00' + payload
+
+
+def read_tag(f) -> Optional[Tuple[int, int, int, bytes]]:
+    """
+    读取文件开头的ID3v2标签
+
+    Args:
+        f: 以二进制模式打开的文件对象
+
+    Returns:
+        (主版本号, 标志位, 标签总大小(含10字节头), 帧区域数据)；
+        文件开头没有ID3v2标签时返回None
+    """
+    f.seek(0)
+    header = f.read(10)
+    if len(header) < 10 or header[:3] != b'ID3':
+        return None
+    major, flags = header[3], header[5]
+    body_size = decode_syncsafe(header[6:10])
+    body = f.read(body_size)
+    if len(body) < body_size:
+        raise ValueError("ID3标签被截断")
+
+    # 跳过扩展头
+    if flags & FLAG_EXTENDED_HEADER:
+        if major == 4:
+            ext_size = decode_syncsafe(body[:4])
+        else:
+            ext_size = struct.unpack('>I', body[:4])[0] + 4
+        body = body[ext_size:]
+
+    total = 10 + body_size + (10 if flags & FLAG_FOOTER else 0)
+    return major, flags, total, body
+
+
+def parse_frames(major: int, body: bytes) -> Optional[List[bytes]]:
+    """
+    将ID3v2.3/v2.4帧区域解析为ID3v2.4格式的原始帧列表（不含旧的日期帧）
+
+    ID3v2.3的帧大小会转换为syncsafe格式，改名的帧换成v2.4的帧ID，已删除的帧丢弃。
+
+    Args:
+        major: 标签主版本号（3或4）
+        body: 帧区域数据
+
+    Returns:
+        ID3v2.4帧字节串列表；有带压缩、加密、分组标志或格式不同而无法安全转换的
+        v2.3帧时返回None（改写标签会丢失这些帧）
+    """
+    frames = []
+    offset = 0
+    while offset + 10 <= len(body):
+        frame_id = body[offset:offset + 4]
+        if frame_id[0] == 0:
+            break  # 进入填充区域
+        if major == 4:
+            size = decode_syncsafe(body[offset + 4:offset + 8])
+        else:
+            size = struct.unpack('>I', body[offset + 4:offset + 8])[0]
+        frame_flags = body[offset + 8:offset + 10]
+        payload = body[offset + 10:offset + 10 + size]
+        offset += 10 + size
+        if len(payload) < size:
+            break
+
+        if frame_id in OBSOLETE_DATE_FRAMES:
+            continue
+        if major == 4:
+            frames.append(frame_id + encode_syncsafe(size) + frame_flags + payload)
+            continue
+        if frame_flags[1] & V23_FORMAT_FLAGS or frame_id in UNCONVERTIBLE_V23_FRAMES:
+            logger.debug(f"无法转换的ID3v2.3帧: {frame_id!r}（标志{frame_flags[1]:#x}）")
+            return None
+        if frame_id in DROPPED_V23_FRAMES:
+            continue
+        frame_id = RENAMED_V23_FRAMES.get(frame_id, frame_id)
+        frames.append(frame_id + encode_syncsafe(size) + b'\x00\x00' + payload)
+    return frames
+
+
+def build_tag(frames: List[bytes], size: int) -> bytes:
+    """
+    构造ID3v2.4标签，用零字节填充到指定总大小
+
+    Args:
+        frames: 帧字节串列表
+        size: 标签总大小（含10字节头）
+
+    Returns:
+        标签字节串
+    """
+    body = b''.join(frames)
+    body += b'\x00' * (size - 10 - len(body))
+    return b'ID3\x04\x00\x00' + encode_syncsafe(len(body)) + body
+
+
+def id3_temp_path(mp3_path) -> Path:
+    """重写整个文件时使用的临时文件（与ffmpeg重新封装的_temp.mp3不同名）"""
+    mp3_path = Path(mp3_path)
+    return mp3_path.parent / (mp3_path.stem + '.id3.tmp')
+
+
+def write_id3_date(mp3_path, dt: datetime, padding: int = DEFAULT_PADDING, temp_path=None) -> bool:
+    """
+    将日期写入MP3文件的ID3v2.4 TDRC/TDOR帧
+
+    Args:
+        mp3_path: MP3文件路径
+        dt: datetime对象
+        padding: 标签需要扩大时预留的填充字节数
+        temp_path: 标签需要扩大、重写整个文件时使用的临时文件，默认见id3_temp_path
+
+    Returns:
+        是否写入成功；遇到不支持的标签（ID3v2.2、整体非同步化、含无法转换的v2.3帧等）
+        返回False，此时文件不会被修改
+    """
+    mp3_path = Path(mp3_path)
+    date_text = dt.strftime('%Y-%m-%dT%H:%M:%S')
+    new_frames = [build_text_frame(frame_id, date_text) for frame_id in DATE_FRAMES]
+
+    with open(mp3_path, 'r+b') as f:
+        tag = read_tag(f)
+        if tag is None:
+            frames, old_size = [], 0
+        else:
+            major, flags, old_size, body = tag
+            if major not in (3, 4) or flags & FLAG_UNSYNCHRONISATION:
+                logger.debug(f"不支持的ID3标签（v2.{major}，标志{flags:#x}）: {mp3_path.name}")
+                return False
+            frames = parse_frames(major, body)
+            if frames is None:
+                logger.warning(f"ID3v2.3标签含无法转换的帧（压缩、加密等），不改写标签以免丢失这些帧: {mp3_path.name}")
+                return False
+
+        frames.extend(new_frames)
+        needed = 10 + sum(len(frame) for frame in frames)
+
+        if tag is not None and needed <= old_size:
+            # 填充足够：只原地改写标签区域（去掉旧的footer，用填充补齐）
+            f.seek(0)
+            f.write(build_tag(frames, old_size))
+            f.flush()
+            os.fsync(f.fileno())
+            logger.debug(f"ID3标签已原地更新: {mp3_path.name}")
+            return True
+
+    # 标签需要变大：重写整个文件，并预留填充
+    temp_mp3 = Path(temp_path) if temp_path is not None else id3_temp_path(mp3_path)
+    try:
+        with open(mp3_path, 'rb') as src, open(temp_mp3, 'wb') as dst:
+            dst.write(build_tag(frames, needed + padding))
+            src.seek(old_size)
+            shutil.copyfileobj(src, dst, 1024 * 1024)
+        temp_mp3.replace(mp3_path)
+    finally:
+        if temp_mp3.exists():
+            temp_mp3.unlink()
+    logger.debug(f"ID3标签已重写（新增{padding}字节填充）: {mp3_path.name}")
+    return True
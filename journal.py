@@ -0,0 +1,325 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+处理日志：记录每个文件的状态变化，崩溃或取消后从中断处继续
+
+需要用--journal启用（监视模式总是使用）：启用后已完成且未变化的文件在重新处理时被跳过，
+启动时输出数据库路径和已有记录数。
+
+源文件依次经过以下状态，每次变化是一个事务：
+- discovered：扫描时发现
+- dated：时间已决定（保存计划项，继续时不再重新分析）
+- converted：转码输出已生成
+- tagged：时间已写入
+- archived：原文件已移入归档目录
+- done：处理完成
+
+再次处理同一目录时一次读出该目录的全部记录，之后每个文件按路径查找：
+- done且文件大小、修改时间与记录一致：跳过
+- dated/converted/tagged且文件未变化：使用保存的计划项，从下一步继续
+- 文件已变化或没有记录：重新分析
+
+每次状态变化后记录源文件当时的大小、修改时间和inode（写入EXIF会改变图片的修改时间），
+原文件已归档时记录为空。
+
+目录处理完成（没有失败、没有取消，且重新列出目录时每个文件都已记为完成）后
+记录目录的修改时间（在重新列出之前取得，处理期间加入的文件不会被当作已处理）。目录中增加、删除、
+改名文件都会改变它，下次修改时间不变时整个目录直接跳过，不再列出和检查其中的文件。
+原地修改文件内容不改变目录的修改时间，这种情况需要完整扫描（--full-scan）。
+修改时间离记录时间太近时不可信（文件系统的时间精度可能只有2秒，
+记录之后同一时间刻度内加入的文件不会改变它），下次仍完整扫描一次。
+
+写入临时文件（ffmpeg重新封装的_temp文件、写EXIF的.tmp文件、重写ID3标签的.id3.tmp文件）之前
+记录路径和进程号，完成后删除记录。进程被强制终止时记录留下，下次处理该目录时只删除这些临时文件
+（写入它们的进程已不存在时），不按文件名猜测，不会删除用户自己的文件或其他进程正在写的文件。
+不使用处理日志时，临时文件记录在只用于这一目的的另一个数据库中（DEFAULT_TEMP_JOURNAL_PATH）。
+
+数据库使用WAL模式（提交只追加日志，读写互不阻塞）。WAL需要共享内存，
+不能放在网络文件系统上，因此默认放在本机缓存目录，而不是archive2中。
+"""
+
+import os
+import json
+import time
+import sqlite3
+import logging
+import threading
+from pathlib import Path
+from typing import Dict, List, Optional
+
+from plan import PlanItem
+
+logger = logging.getLogger(__name__)
+
+STATE_DISCOVERED = 'discovered'
+STATE_DATED = 'dated'
+STATE_CONVERTED = 'converted'
+STATE_TAGGED = 'tagged'
+STATE_ARCHIVED = 'archived'
+STATE_DONE = 'done'
+
+# 目录修改时间与记录时间相差不到该值时不可信（FAT的时间精度为2秒）
+RACY_NS = 2 * 10 ** 9
+
+DEFAULT_JOURNAL_PATH = Path(
+    os.environ.get('XDG_CACHE_HOME') or Path.home() / '.cache'
+) / 'fixphotodate' / 'journal.db'
+# 不使用处理日志时只记录正在写入的临时文件
+DEFAULT_TEMP_JOURNAL_PATH = DEFAULT_JOURNAL_PATH.with_name('temp_files.db')
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS files (
+    path     TEXT PRIMARY KEY,
+    dir      TEXT NOT NULL,
+    state    TEXT NOT NULL,
+    size     INTEGER,
+    mtime_ns INTEGER,
+    item     TEXT,
+    updated  REAL,
+    inode    INTEGER
+);
+CREATE INDEX IF NOT EXISTS files_dir ON files (dir);
+CREATE TABLE IF NOT EXISTS transitions (
+    id     INTEGER PRIMARY KEY,
+    path   TEXT NOT NULL,
+    state  TEXT NOT NULL,
+    at     REAL NOT NULL,
+    detail TEXT
+);
+CREATE TABLE IF NOT EXISTS directories (
+    path        TEXT PRIMARY KEY,
+    mtime_ns    INTEGER NOT NULL,
+    recorded_ns INTEGER NOT NULL
+);
+CREATE TABLE IF NOT EXISTS temp_files (
+    path    TEXT PRIMARY KEY,
+    dir     TEXT NOT NULL,
+    pid     INTEGER NOT NULL,
+    started REAL NOT NULL
+);
+"""
+
+# 旧版本数据库中缺少的列
+ADDED_COLUMNS = (('transitions', 'detail', 'TEXT'), ('files', 'inode', 'INTEGER'))
+
+
+def _process_alive(pid: int) -> bool:
+    """进程是否仍在运行（本进程的临时文件总是视为正在写入）"""
+    if pid == os.getpid():
+        return True
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+class JournalEntry:
+    """一个文件的最新记录"""
+
+    __slots__ = ('path', 'state', 'size', 'mtime_ns', 'inode', 'item')
+
+    def __init__(self, path: str, state: str, size: Optional[int], mtime_ns: Optional[int],
+                 item: Optional[PlanItem], inode: Optional[int] = None):
+        self.path = path
+        self.state = state
+        self.size = size
+        self.mtime_ns = mtime_ns
+        self.inode = inode
+        self.item = item
+
+    def __repr__(self) -> str:
+        return f"JournalEntry({os.path.basename(self.path)!r}, {self.state})"
+
+    def matches(self, stat: os.stat_result) -> bool:
+        """文件自记录以来是否未变化（被大小和修改时间相同的另一个文件替换时inode不同）"""
+        if self.inode is not None and self.inode != stat.st_ino:
+            return False
+        return self.size == stat.st_size and self.mtime_ns == stat.st_mtime_ns
+
+
+class Journal:
+    """基于SQLite（WAL模式）的处理日志，可被多个线程共用"""
+
+    def __init__(self, db_path=DEFAULT_JOURNAL_PATH):
+        """
+        Args:
+            db_path: 数据库路径（应位于本机磁盘）
+        """
+        self.db_path = Path(db_path)
+        self.db_path.parent.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(str(self.db_path), isolation_level=None, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        # WAL下NORMAL在进程崩溃时不丢失已提交的事务，只有断电可能丢失最后几个
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript(SCHEMA)
+        for table, column, column_type in ADDED_COLUMNS:
+            columns = {row[1] for row in self._conn.execute(f"PRAGMA table_info({table})")}
+            if column not in columns:
+                self._conn.execute(f"ALTER TABLE {table} ADD COLUMN {column} {column_type}")
+
+    def __len__(self) -> int:
+        """有记录的文件数"""
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM files").fetchone()[0]
+
+    def load(self, directory) -> Dict[str, JournalEntry]:
+        """
+        读取目录中所有文件的最新记录
+
+        Returns:
+            {文件绝对路径: JournalEntry}
+        """
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT path, state, size, mtime_ns, item, inode FROM files WHERE dir = ?",
+                (str(Path(directory).resolve()),),
+            ).fetchall()
+        return {row[0]: self._entry(*row) for row in rows}
+
+    @staticmethod
+    def _entry(path: str, state: str, size: Optional[int], mtime_ns: Optional[int], item: Optional[str],
+               inode: Optional[int]) -> JournalEntry:
+        try:
+            plan_item = PlanItem.from_dict(json.loads(item)) if item else None
+        except (ValueError, KeyError, TypeError) as e:
+            logger.warning(f"处理日志中的计划项无法读取，重新分析 {os.path.basename(path)}: {e}")
+            state, plan_item = STATE_DISCOVERED, None
+        return JournalEntry(path, state, size, mtime_ns, plan_item, inode)
+
+    def get(self, path) -> Optional[JournalEntry]:
+        """读取一个文件的最新记录"""
+        path = Path(path).resolve()
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT path, state, size, mtime_ns, item, inode FROM files WHERE path = ?", (str(path),),
+            ).fetchone()
+        if row is None:
+            return None
+        return self._entry(*row)
+
+    def record(self, path, state: str, item: Optional[PlanItem] = None, detail: Optional[dict] = None):
+        """
+        记录文件进入新状态（一个事务）
+
+        Args:
+            path: 文件路径
+            state: 新状态（STATE_*）
+            item: 计划项（dated及之后的状态需要，继续时使用）
+            detail: 这一步的附加信息（如归档的复制方式、哈希和耗时）
+        """
+        path = Path(path).resolve()
+        try:
+            stat = path.stat()
+            size, mtime_ns, inode = stat.st_size, stat.st_mtime_ns, stat.st_ino
+        except OSError:
+            size = mtime_ns = inode = None
+        data = json.dumps(item.to_dict(), ensure_ascii=False) if item is not None else None
+        now = time.time()
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                self._conn.execute(
+                    "INSERT INTO files (path, dir, state, size, mtime_ns, inode, item, updated) "
+                    "VALUES (?, ?, ?, ?, ?, ?, ?, ?) "
+                    "ON CONFLICT (path) DO UPDATE SET state = excluded.state, size = excluded.size, "
+                    "mtime_ns = excluded.mtime_ns, inode = excluded.inode, item = excluded.item, "
+                    "updated = excluded.updated",
+                    (str(path), str(path.parent), state, size, mtime_ns, inode, data, now),
+                )
+                self._conn.execute(
+                    "INSERT INTO transitions (path, state, at, detail) VALUES (?, ?, ?, ?)",
+                    (str(path), state, now, json.dumps(detail) if detail is not None else None),
+                )
+            except BaseException:
+                self._conn.execute("ROLLBACK")
+                raise
+            self._conn.execute("COMMIT")
+
+    def directory_unchanged(self, directory) -> bool:
+        """目录自上次处理完成以来是否没有增加、删除或改名文件"""
+        directory = Path(directory).resolve()
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT mtime_ns, recorded_ns FROM directories WHERE path = ?", (str(directory),),
+            ).fetchone()
+        if row is None:
+            return False
+        mtime_ns, recorded_ns = row
+        try:
+            current = directory.stat().st_mtime_ns
+        except OSError:
+            return False
+        return current == mtime_ns and recorded_ns - mtime_ns >= RACY_NS
+
+    def record_directory(self, directory, mtime_ns: Optional[int] = None):
+        """
+        记录目录已处理完成时的修改时间
+
+        Args:
+            directory: 目录
+            mtime_ns: 确认目录中的文件都已完成之前取得的修改时间（之后加入的文件
+                会改变修改时间，下次不会跳过）；默认为当前的修改时间
+        """
+        directory = Path(directory).resolve()
+        if mtime_ns is None:
+            mtime_ns = directory.stat().st_mtime_ns
+        with self._lock:
+            self._conn.execute(
+                "INSERT INTO directories (path, mtime_ns, recorded_ns) VALUES (?, ?, ?) "
+                "ON CONFLICT (path) DO UPDATE SET mtime_ns = excluded.mtime_ns, recorded_ns = excluded.recorded_ns",
+                (str(directory), mtime_ns, time.time_ns()),
+            )
+
+    def begin_temp(self, path):
+        """开始写入临时文件"""
+        path = Path(path).resolve()
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO temp_files (path, dir, pid, started) VALUES (?, ?, ?, ?)",
+                (str(path), str(path.parent), os.getpid(), time.time()),
+            )
+
+    def end_temp(self, path):
+        """临时文件已改名或删除"""
+        with self._lock:
+            self._conn.execute("DELETE FROM temp_files WHERE path = ?", (str(Path(path).resolve()),))
+
+    def stale_temps(self, directory) -> List[Path]:
+        """目录中写入进程已不存在的临时文件（被强制终止时留下）"""
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT path, pid FROM temp_files WHERE dir = ?", (str(Path(directory).resolve()),),
+            ).fetchall()
+        return [Path(path) for path, pid in rows if not _process_alive(pid)]
+
+    def history(self, path) -> List[str]:
+        """文件经过的所有状态（按时间顺序）"""
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT state FROM transitions WHERE path = ? ORDER BY id",
+                (str(Path(path).resolve()),),
+            ).fetchall()
+        return [state for state, in rows]
+
+    def details(self, path, state: str) -> List[dict]:
+        """文件进入state时记录的附加信息（按时间顺序）"""
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT detail FROM transitions WHERE path = ? AND state = ? AND detail IS NOT NULL ORDER BY id",
+                (str(Path(path).resolve()), state),
+            ).fetchall()
+        return [json.loads(detail) for detail, in rows]
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+    def __enter__(self) -> 'Journal':
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
@@ -24,14 +24,85 @@ v3.7.2 EXIF修复更新：
 """
 
 import sys
-import re
+import asyncio
+import argparse
 import subprocess
 import shutil
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import ExitStack, contextmanager
+from functools import partial
 from pathlib import Path
 from datetime import datetime, timedelta
-from typing import Optional
+from typing import Dict, List, Optional, Set, Tuple
 import logging
 
+from archiver import METHOD_RENAME, ArchiveResult, archive_file
+from autotune import JOBS_AUTO, UNIT_MEDIA_SECONDS, UNIT_PHOTOS, AutoTuner, ConcurrencyLimit
+from avchd_mdpm import read_mdpm_datetime
+from batch import DEFAULT_DIR_JOBS, run_directories, summarize
+from cancellation import DEFAULT_GRACE_SECONDS, CancelToken, Cancelled
+from exiftool_session import ExifToolError, ExifToolPool
+from filename_dates import (
+    DIR_DATE_PATTERN,
+    FILE_NUMBER_PATTERN,
+    HOUR_MINUTE_SUFFIX_PATTERN,
+    HOUR_SUFFIX_PATTERN,
+    MEDIA_IMAGE,
+    MEDIA_VIDEO,
+    SOURCE_MA,
+    SOURCE_TEMP,
+    SOURCE_VIDEO,
+    default_registry,
+    match_filename_datetime,
+)
+from id3_tags import id3_temp_path, write_id3_date
+from journal import (
+    DEFAULT_JOURNAL_PATH,
+    DEFAULT_TEMP_JOURNAL_PATH,
+    STATE_ARCHIVED,
+    STATE_CONVERTED,
+    STATE_DATED,
+    STATE_DISCOVERED,
+    STATE_DONE,
+    STATE_TAGGED,
+    Journal,
+    JournalEntry,
+)
+from mp4_atoms import patch_mp4_times, read_mp4_duration
+from pipeline import Pipeline, Stage
+from plan import (
+    ACTION_CONVERT_AUDIO,
+    ACTION_CONVERT_VIDEO,
+    ACTION_SKIP,
+    ACTION_TAG_IMAGE,
+    ACTION_TAG_MP4,
+    DATE_SOURCE_DIRECTORY,
+    DATE_SOURCE_EXIF,
+    DATE_SOURCE_LAST_FILE,
+    DATE_SOURCE_MDPM,
+    DATE_SOURCE_NEIGHBORS,
+    DATE_SOURCE_RIFF,
+    KIND_AUDIO,
+    KIND_IMAGE,
+    KIND_MP4,
+    KIND_VIDEO,
+    PROFILE_MP3,
+    PROFILE_MP4,
+    PlanItem,
+    ProcessingPlan,
+    dump_plans,
+    load_plans,
+)
+from resource_governor import DEFAULT_RESERVE_MB, IONICE_CLASSES, MB, ResourceGovernor, lower_priority
+from riff_dates import read_avi_datetime
+from sharding import parse_shard, select_shard
+from task_graph import TaskGraph
+from time_shift import default_undo_path, parse_offset, shift_directory, undo_shift
+from timeline import DirectoryTimelines
+from watcher import DEFAULT_POLL_SECONDS, DEFAULT_SETTLE_SECONDS, open_watcher, watch_loop
+from work_queue import DEFAULT_LEASE_SECONDS, WorkQueue, run_worker
+
 # 配置日志
 logging.basicConfig(
     level=logging.INFO,
@@ -65,14 +136,84 @@ class MediaProcessor:
     # 支持的音频格式
     AUDIO_EXTENSIONS = {'.amr', '.mp3', '.wav', '.aac', '.flac'}
     
-    def __init__(self, source_dir: str):
+    # 需要转码的视频格式 → 转换方法（原文件归档，生成MP4）
+    VIDEO_CONVERTERS = {
+        '.avi': 'convert_avi_to_mp4',
+        '.3gp': 'convert_3gp_to_mp4',
+        '.vob': 'convert_vob_to_mp4',
+        '.mov': 'convert_mov_to_mp4',
+        '.mts': 'convert_mts_to_mp4',
+        '.flv': 'convert_flv_to_mp4',
+    }
+    # 需要转码的音频格式 → 转换方法（原文件归档，生成MP3）
+    AUDIO_CONVERTERS = {'.amr': 'convert_amr_to_mp3'}
+    # 图片之后的计划顺序
+    PLAN_ORDER = ('.avi', '.3gp', '.vob', '.mov', '.mts', '.flv', '.mp4', '.amr')
+    # 可以从前一个文件推断时间的格式（最后一个文件规则）
+    LAST_FILE_EXTENSIONS = {'.avi', '.3gp', '.vob', '.mov', '.mts', '.flv', '.amr'}
+    # 可以用相邻照片插值的格式
+    INTERPOLATION_EXTENSIONS = {'.avi', '.3gp', '.vob', '.mov', '.mts', '.flv'}
+    # 转换方式 → (ffmpeg编码参数, 超时秒数)
+    FFMPEG_PROFILES = {
+        PROFILE_MP4: (
+            ['-c:v', 'libx264', '-preset', 'medium',
+             '-crf', '18',  # 质量参数，18很高，0是无损
+             '-c:a', 'aac', '-q:a', '9'],
+            3600,  # 1小时超时
+        ),
+        PROFILE_MP3: (
+            ['-c:a', 'libmp3lame',
+             '-q:a', '4'],  # MP3质量参数，4是高质量
+            1800,  # 30分钟超时
+        ),
+    }
+    # 流水线各阶段默认工作线程数（transform由jobs参数决定）
+    PIPELINE_WORKERS = {'metadata': 4, 'infer': 2, 'transform': 1, 'tag': 2, 'archive': 1}
+    # 各类任务的内存估计（MB），资源调控器据此决定能否再启动一个任务
+    JOB_MEMORY_MB = {PROFILE_MP4: 512, PROFILE_MP3: 64, KIND_IMAGE: 128}
+    # 高清源（AVCHD 1080i）解码和反交错需要的内存（代替按转换方式的估计）
+    SOURCE_MEMORY_MB = {'.mts': 1536}
+    
+    def __init__(self, source_dir: str, exiftool_pool: Optional[ExifToolPool] = None,
+                 governor: Optional[ResourceGovernor] = None, tuner: Optional[AutoTuner] = None,
+                 cancel_token: Optional[CancelToken] = None, journal: Optional[Journal] = None,
+                 job_limit: Optional[ConcurrencyLimit] = None, temp_journal: Optional[Journal] = None):
         """
         初始化处理器
         
         Args:
             source_dir: 源目录路径
+            exiftool_pool: 常驻exiftool会话池，设置后EXIF读写改用exiftool
+            governor: 资源调控器，设置后转码和图片任务按负载与可用内存准入
+            tuner: 自动并行数控制器，设置后同时运行的转码和图片任务数由它决定
+            cancel_token: 取消状态，取消后不再开始新任务
+            journal: 处理日志，设置后记录每个文件的状态变化，
+                再次处理时跳过已完成的文件、从中断处继续未完成的文件
+            job_limit: 同时运行的转码和图片任务数上限，可由多个处理器共用
+                （同时处理多个目录时作为全局上限）；默认使用tuner的上限
+            temp_journal: 没有处理日志时用来记录正在写入的临时文件，
+                被强制终止后下次运行仍能删除不完整的临时文件
         """
         self.source_dir = Path(source_dir).resolve()
+        self.exiftool_pool = exiftool_pool
+        self.governor = governor
+        self.tuner = tuner
+        self.job_limit = job_limit if job_limit is not None or tuner is None else tuner.limit
+        self.cancel_token = cancel_token or CancelToken()
+        self.journal = journal
+        # 记录正在写入的临时文件（处理日志优先）
+        self._temps = journal if journal is not None else temp_journal
+        # 从处理日志继续的文件 → 上次到达的状态
+        self._resumed: Dict[str, str] = {}
+        self.interrupted = False
+        # 目录 → 相机时间线索引（处理开始时建立快照，不受后续移动文件影响）
+        self._timelines: Dict[Path, DirectoryTimelines] = {}
+        # 计划中已决定的图片时间（插值时代替尚未写入磁盘的EXIF）
+        self._planned_dates: Dict[Path, Optional[datetime]] = {}
+        # 转码输出路径 → 原文件
+        self._conversion_outputs: Dict[Path, Path] = {}
+        # 图片 → 时间已确定事件（需要插值的视频只等待自己的锚点照片）
+        self._image_events: Dict[Path, threading.Event] = {}
         self.archive_dir = self.source_dir.parent / 'archive2' / self.source_dir.name
         
         if not self.source_dir.exists():
@@ -81,289 +222,936 @@ class MediaProcessor:
         logger.info(f"处理目录: {self.source_dir}")
         logger.info(f"归档目录: {self.archive_dir}")
     
-    def process_all(self):
-        """处理目录中的所有文件"""
+    def process_all(self, jobs: int = 1, workers: Optional[Dict[str, int]] = None,
+                    full_scan: bool = False) -> Dict[str, Dict]:
+        """
+        处理目录中的所有文件
+        
+        按流水线处理：扫描 → 读取元数据 → 推断时间 → 转码 → 写入时间 → 归档，
+        各阶段用有界队列连接并同时运行，读EXIF与ffmpeg转码可以重叠
+        
+        有处理日志时，目录自上次处理完成以来没有增加、删除或改名文件则整个跳过
+        
+        Args:
+            jobs: 同时运行的转码任务数
+            workers: 覆盖各阶段的工作线程数（键为阶段名，见PIPELINE_WORKERS）
+            full_scan: 即使目录没有变化也逐个检查文件（发现原地修改的文件）
+            
+        Returns:
+            各阶段的统计
+        """
         logger.info("开始处理媒体文件...")
         
-        files = list(self.source_dir.iterdir())
-        
-        # 处理图片
-        image_files = [f for f in files if f.suffix.lower() in self.IMAGE_EXTENSIONS]
-        logger.info(f"找到 {len(image_files)} 个图片文件")
-        for image_file in image_files:
-            self.process_image(image_file)
-        
-        # 处理AVI文件
-        avi_files = [f for f in files if f.suffix.lower() == '.avi']
-        logger.info(f"找到 {len(avi_files)} 个AVI文件")
-        for avi_file in avi_files:
-            self.process_avi(avi_file)
-        
-        # 处理3GP文件
-        threeGp_files = [f for f in files if f.suffix.lower() == '.3gp']
-        logger.info(f"找到 {len(threeGp_files)} 个3GP文件")
-        for threeGp_file in threeGp_files:
-            self.process_3gp(threeGp_file)
-        
-        # 处理VOB文件
-        vob_files = [f for f in files if f.suffix.lower() == '.vob']
-        logger.info(f"找到 {len(vob_files)} 个VOB文件")
-        for vob_file in vob_files:
-            self.process_vob(vob_file)
-        
-        # 处理MOV文件
-        mov_files = [f for f in files if f.suffix.lower() == '.mov']
-        logger.info(f"找到 {len(mov_files)} 个MOV文件")
-        for mov_file in mov_files:
-            self.process_mov(mov_file)
-        
-        # 处理MTS文件
-        mts_files = [f for f in files if f.suffix.lower() == '.mts']
-        logger.info(f"找到 {len(mts_files)} 个MTS文件")
-        for mts_file in mts_files:
-            self.process_mts(mts_file)
-        
-        # 处理FLV文件
-        flv_files = [f for f in files if f.suffix.lower() == '.flv']
-        logger.info(f"找到 {len(flv_files)} 个FLV文件")
-        for flv_file in flv_files:
-            self.process_flv(flv_file)
-        
-        # 处理MP4文件（原始MP4文件或转换后的）
-        mp4_files = [f for f in files if f.suffix.lower() == '.mp4']
-        logger.info(f"找到 {len(mp4_files)} 个MP4文件")
-        for mp4_file in mp4_files:
-            self.process_mp4(mp4_file)
-        
-        # 处理AMR文件
-        amr_files = [f for f in files if f.suffix.lower() == '.amr']
-        logger.info(f"找到 {len(amr_files)} 个AMR文件")
-        for amr_file in amr_files:
-            self.process_amr(amr_file)
-        
-        logger.info("处理完成！")
+        pipeline = self._pipeline(jobs, workers)
+        self.interrupted = False
+        if self.journal is not None and not full_scan and self.journal.directory_unchanged(self.source_dir):
+            logger.info("目录自上次处理完成以来没有变化，跳过")
+            return pipeline.summary()
+        self._remove_partial_outputs()
+        pipeline.run(self._scan())
+        
+        summary = pipeline.summary()
+        logger.info(f"流水线统计: {summary}")
+        failed = sum(stage['failed'] for stage in summary.values())
+        if not failed:
+            self._record_directory_done()
+        if self.cancel_token.cancelled:
+            self.interrupted = True
+            if self.journal is not None:
+                logger.warning("已取消：处理进度已记录在处理日志中，再次运行时从中断处继续")
+            else:
+                logger.warning("已取消：部分文件未处理")
+        else:
+            logger.info("处理完成！")
+        return summary
     
-    def process_image(self, image_path: Path):
+    def _record_directory_done(self):
+        """所有文件都已完成时记录目录修改时间，下次运行时没有变化的目录整个跳过（取消后不记录）"""
+        if self.journal is None or self.cancel_token.cancelled:
+            return
+        # 先取修改时间再检查：检查之后加入的文件会改变修改时间，下次不会跳过
+        mtime_ns = self.source_dir.stat().st_mtime_ns
+        unfinished = self._unfinished_files()
+        if unfinished:
+            logger.info(f"处理期间加入了 {len(unfinished)} 个文件，下次运行时处理: "
+                        f"{', '.join(path.name for path in unfinished[:5])}")
+        else:
+            self.journal.record_directory(self.source_dir, mtime_ns)
+    
+    def _unfinished_files(self) -> List[Path]:
+        """重新列出目录：没有记为已完成或记录后又有变化的待处理文件（扫描之后才加入的文件）"""
+        entries = self.journal.load(self.source_dir)
+        unfinished = []
+        for path in sorted(f for f in self.source_dir.iterdir() if f.is_file()):
+            suffix = path.suffix.lower()
+            if suffix not in self.IMAGE_EXTENSIONS and suffix not in self.PLAN_ORDER:
+                continue
+            entry = entries.get(str(path))
+            try:
+                if entry is None or entry.state != STATE_DONE or not entry.matches(path.stat()):
+                    unfinished.append(path)
+            except FileNotFoundError:
+                continue
+        return unfinished
+    
+    def _pipeline(self, jobs: int, workers: Optional[Dict[str, int]]) -> Pipeline:
+        """按jobs和workers建立流水线"""
+        counts = dict(self.PIPELINE_WORKERS, transform=jobs)
+        if self.tuner is not None:
+            # 图片写入也受自动并行数限制，线程数按上限准备
+            counts['tag'] = max(counts['tag'], jobs)
+        counts.update(workers or {})
+        return Pipeline([
+            Stage('metadata', self._stage_metadata, counts['metadata']),
+            Stage('infer', self._stage_infer, counts['infer']),
+            Stage('transform', self._stage_transform, counts['transform']),
+            Stage('tag', self._stage_tag, counts['tag']),
+            Stage('archive', self._stage_archive, counts['archive']),
+        ])
+    
+    def ingest(self, paths: List[Path], jobs: int = 1, workers: Optional[Dict[str, int]] = None) -> Dict[str, Dict]:
         """
-        处理图片文件
+        处理目录中新写完的文件（监视模式）
+        
+        保留之前建立的时间线、已决定的照片时间等状态，只把新文件加入时间线，
+        推断时间不需要重新扫描目录或读取已处理照片的EXIF
         
         Args:
-            image_path: 图片路径
+            paths: 新文件（必须在源目录中）
+            jobs, workers: 同process_all
+            
+        Returns:
+            各阶段的统计
+        """
+        pipeline = self._pipeline(jobs, workers)
+        pipeline.run(self._scan([Path(path) for path in paths]))
+        summary = pipeline.summary()
+        self.interrupted = self.cancel_token.cancelled
+        return summary
+    
+    def watch(self, jobs: int = 1, settle: float = DEFAULT_SETTLE_SECONDS, use_inotify: bool = True,
+              poll_seconds: float = DEFAULT_POLL_SECONDS):
         """
-        logger.info(f"处理图片: {image_path.name}")
+        先处理目录中已有的文件，然后监视目录，把新写完的文件逐批交给ingest，直到取消
         
-        # 优先级1: 尝试从临时文件名格式提取时间（最优先）
-        exif_date = self._extract_datetime_from_temp_filename(image_path)
+        需要处理日志：处理产生的文件（转码输出、写入EXIF后的图片）也会触发事件，
+        靠处理日志识别为已完成
         
-        if exif_date:
-            logger.info(f"  从临时文件名格式提取时间: {exif_date}")
-            self.set_exif_datetime(image_path, exif_date)
-            logger.info("  已更新图片EXIF日期")
+        Args:
+            jobs: 同时运行的转码任务数
+            settle: 文件大小和修改时间不变多少秒后算写完
+            use_inotify: 是否使用inotify（False时轮询，用于网络文件系统）
+            poll_seconds: 轮询间隔
+        """
+        if self.journal is None:
+            raise ValueError("监视模式需要处理日志")
+        # 先开始监视再处理已有文件，处理期间新加入的文件不会遗漏
+        watcher = open_watcher(self.source_dir, use_inotify, poll_seconds)
+        try:
+            self.process_all(jobs, full_scan=True)
+            logger.info(f"监视中: {self.source_dir}（Ctrl+C停止）")
+            watch_loop(
+                watcher, lambda paths: self.ingest(paths, jobs), settle,
+                should_stop=lambda: self.cancel_token.cancelled,
+            )
+        finally:
+            watcher.close()
+    
+    def _remove_partial_outputs(self):
+        """
+        删除上次被强制终止时留下的临时文件（ffmpeg重新封装的_temp文件、写EXIF的.tmp文件）
+        
+        只删除处理日志（或temp_journal）中记录为正在写入、且写入它的进程已不存在的文件，不按文件名判断
+        """
+        if self._temps is None:
+            return
+        for path in self._temps.stale_temps(self.source_dir):
+            if path.exists():
+                logger.warning(f"删除不完整的临时文件: {path.name}")
+                path.unlink()
+            self._temps.end_temp(path)
+    
+    @contextmanager
+    def _tracked_temp(self, temp_path: Path):
+        """写入临时文件期间在处理日志中记录它，被强制终止时下次运行可以安全删除"""
+        if self._temps is not None:
+            self._temps.begin_temp(temp_path)
+        try:
+            yield temp_path
+        finally:
+            if self._temps is not None:
+                self._temps.end_temp(temp_path)
+    
+    def _scan(self, new_files: Optional[List[Path]] = None):
+        """
+        流水线扫描阶段：建立快照后依次产出待处理文件
+        
+        图片必须排在前面：推断阶段的视频会等待自己的锚点照片，
+        图片先进入元数据阶段才能保证被等待的照片不会堵在后面
+        
+        有处理日志时：已完成且未变化的文件跳过，时间已决定且未变化的文件直接产出计划项，
+        其余文件重新分析；最后产出归档目录中缺少转码输出的原文件。
+        取消后不再产出新文件
+        
+        Args:
+            new_files: 只处理这些新文件，保留已建立的状态（监视模式）；None表示整个目录
+        """
+        if new_files is None:
+            images, others = self._snapshot()
+            entries = self.journal.load(self.source_dir) if self.journal is not None else {}
         else:
-            # 优先级2: 尝试从MA格式文件名提取时间
-            exif_date = self._extract_datetime_from_ma_format(image_path)
-            
-            if exif_date:
-                logger.info(f"  从MA格式文件名提取时间: {exif_date}")
-                self.set_exif_datetime(image_path, exif_date)
-                logger.info("  已更新图片EXIF日期")
+            images, others = self._add_files(new_files)
+            entries = {}
+            if self.journal is not None:
+                for path in images + others:
+                    entry = self.journal.get(path)
+                    if entry is not None:
+                        entries[str(path)] = entry
+        self._resumed = {}
+        skipped = 0
+        
+        remaining = images + others
+        for index, path in enumerate(remaining):
+            if self.cancel_token.cancelled:
+                # 未产出的照片不会再被读取，放行等待它们的视频
+                for rest in remaining[index:]:
+                    if rest in self._image_events:
+                        self._image_events[rest].set()
+                return
+            entry = entries.get(str(path))
+            try:
+                stat = path.stat()
+            except FileNotFoundError:
+                # 监视模式中文件写完后又被移走
+                if path in self._image_events:
+                    self._image_events[path].set()
+                continue
+            if entry is not None and entry.matches(stat):
+                if entry.state == STATE_DONE:
+                    skipped += 1
+                    if path in self._image_events:
+                        self._image_events[path].set()
+                    continue
+                if entry.item is not None:
+                    self._resumed[entry.item.path] = entry.state
+                    yield entry.item
+                    continue
+            elif self.journal is not None:
+                self.journal.record(path, STATE_DISCOVERED)
+            yield path
+        if skipped:
+            logger.info(f"跳过 {skipped} 个已完成的文件（见处理日志）")
+        if self._resumed:
+            logger.info(f"从处理日志继续 {len(self._resumed)} 个未完成的文件")
+        
+        if self.journal is not None and new_files is None:
+            for item in self._orphaned_sources(entries):
+                if self.cancel_token.cancelled:
+                    return
+                yield item
+    
+    def _orphaned_sources(self, entries: Dict[str, JournalEntry]) -> List[PlanItem]:
+        """
+        归档目录中缺少转码输出的原文件（旧版本先归档再转码，转码前中断时留下）
+        
+        有记录的使用记录中的计划项，没有记录的重新分析；转码输出直接写回源目录，不再归档
+        """
+        if not self.archive_dir.is_dir():
+            return []
+        items = []
+        for path in sorted(self.archive_dir.iterdir()):
+            suffix = path.suffix.lower()
+            if not path.is_file() or suffix not in self.VIDEO_CONVERTERS and suffix not in self.AUDIO_CONVERTERS:
+                continue
+            output_suffix = '.mp3' if suffix in self.AUDIO_CONVERTERS else '.mp4'
+            output_path = self.source_dir / (path.stem + output_suffix)
+            if output_path.exists() or (self.source_dir / path.name).exists():
+                continue
+            entry = entries.get(str(self.source_dir / path.name))
+            if entry is not None and entry.item is not None:
+                item = entry.item
             else:
-                # 优先级3: 尝试读取EXIF日期
-                exif_date = self.get_exif_datetime(image_path)
-                
-                if exif_date:
-                    logger.info(f"  EXIF日期: {exif_date}")
-                else:
-                    # 优先级4: 猜测时间
-                    exif_date = self.guess_datetime_from_filename(image_path)
-                    logger.info(f"  猜测日期: {exif_date}")
-                    
-                    # 如果成功猜测或读取，更新图片EXIF
-                    if exif_date:
-                        self.set_exif_datetime(image_path, exif_date)
-                        logger.info("  已更新图片日期")
+                item = self._read_metadata(path)
+                if item.date is None:
+                    item.date, item.date_source = self._guess_datetime(self.source_dir / path.name)
+                    item.write_date = item.date is not None
+            item.path = str(path)
+            item.archive = None
+            item.snapshot()
+            logger.warning(f"继续处理已归档但未转码的文件: {path.name}")
+            self._resumed[item.path] = STATE_DATED
+            items.append(item)
+        return items
     
-    def process_avi(self, avi_path: Path):
+    def _stage_metadata(self, source) -> PlanItem:
+        """流水线元数据阶段：读取文件名、EXIF、RIFF、MDPM中的时间（处理日志中的计划项直接使用）"""
+        if isinstance(source, PlanItem):
+            if source.kind == KIND_IMAGE:
+                path = Path(source.path)
+                self._planned_dates[path] = source.date
+                self._image_events[path].set()
+            return source
+        return self._read_metadata(source)
+    
+    def _stage_infer(self, item: PlanItem) -> PlanItem:
+        """流水线推断阶段：需要插值的视频/音频只等待自己的锚点照片"""
+        if self._needs_inference(item):
+            for anchor in self._inference_anchors(Path(item.path)):
+                event = self._image_events.get(anchor)
+                if event is not None:
+                    event.wait()
+        if item.path in self._resumed:
+            return item
+        item = self._infer_date(item)
+        self._journal(item, STATE_DATED)
+        return item
+    
+    def _needs_inference(self, item: PlanItem) -> bool:
+        """视频/音频没有自身时间时需要从相邻文件推断"""
+        return item.action != ACTION_SKIP and item.date is None and item.kind in (KIND_VIDEO, KIND_AUDIO)
+    
+    def _inference_anchors(self, file_path: Path) -> Set[Path]:
         """
-        处理AVI文件
+        推断该文件时间时会读取哪些照片的时间（任务图中的依赖）
+        
+        与_guess_datetime的规则对应：
+        - 最后一个文件：前一个媒体文件；前一个是视频时为该视频插值用的照片
+        - 视频插值：同一相机时间线中前后最近的照片
         
         Args:
-            avi_path: AVI文件路径
+            file_path: 视频或音频路径
+            
+        Returns:
+            照片路径集合
         """
-        logger.info(f"处理AVI: {avi_path.name}")
-        
-        # 创建归档目录
-        self.archive_dir.mkdir(parents=True, exist_ok=True)
+        suffix = file_path.suffix.lower()
+        if suffix not in self.LAST_FILE_EXTENSIONS:
+            return set()
+        located = self._get_timelines(file_path.parent).locate(file_path)
+        if located is None:
+            return set()
+        timeline, seq = located
+        
+        anchors = set()
+        if seq == timeline.last_seq:
+            before = timeline.before(seq)
+            if before is not None:
+                if before.path.suffix.lower() in self.IMAGE_EXTENSIONS:
+                    anchors.add(before.path)
+                elif before.path.suffix.lower() in self.VIDEO_EXTENSIONS:
+                    anchors |= self._neighbor_images(timeline, before.seq)
+        if suffix in self.INTERPOLATION_EXTENSIONS:
+            anchors |= self._neighbor_images(timeline, seq)
+        return anchors
+    
+    def _neighbor_images(self, timeline, seq: int) -> Set[Path]:
+        """时间线中seq前后最近的照片"""
+        neighbors = (timeline.before(seq, self.IMAGE_EXTENSIONS), timeline.after(seq, self.IMAGE_EXTENSIONS))
+        return {entry.path for entry in neighbors if entry is not None}
+    
+    def _stage_transform(self, item: PlanItem) -> Optional[PlanItem]:
+        """
+        流水线转码阶段（第一个修改文件的阶段）
         
-        # 移动AVI文件到归档目录
-        archive_avi_path = self.archive_dir / avi_path.name
-        shutil.move(str(avi_path), str(archive_avi_path))
-        logger.info(f"  已移动到: {archive_avi_path}")
+        取消后不再开始新文件，进入本阶段的文件会完成转码、写入时间和归档；
+        宽限时间内没有完成的转码被终止并回滚，下次运行从dated状态继续
+        """
+        if item.action == ACTION_SKIP:
+            self._journal(item, STATE_DONE)
+            return None
+        if self.cancel_token.cancelled:
+            return None
+        if self._resumed.get(item.path) in (STATE_CONVERTED, STATE_TAGGED) and Path(item.output).exists():
+            logger.info(f"已转码，继续: {Path(item.path).name}")
+            return item
+        try:
+            self._transform(item)
+        except Exception:
+            if not self.cancel_token.cancelled:
+                raise
+            logger.warning(f"已取消，转码已回滚: {Path(item.path).name}")
+            return None
+        if item.output:
+            self._journal(item, STATE_CONVERTED)
+        return item
+    
+    def _stage_tag(self, item: PlanItem) -> PlanItem:
+        """流水线写入时间阶段"""
+        if self._resumed.get(item.path) == STATE_TAGGED:
+            return item
+        self._tag(item)
+        if item.write_date and item.date:
+            self._journal(item, STATE_TAGGED)
+        return item
+    
+    def _stage_archive(self, item: PlanItem) -> PlanItem:
+        """流水线归档阶段"""
+        result = self._archive(item)
+        if result is not None:
+            self._journal(item, STATE_ARCHIVED, result.to_dict())
+        self._journal(item, STATE_DONE)
+        if item.output:
+            # 转码输出也记为已完成，再次处理时不会被当作已有的MP4重新写入时间
+            self._journal(PlanItem(item.output, item.kind, ACTION_SKIP), STATE_DONE)
+        return item
+    
+    def _journal(self, item: PlanItem, state: str, detail: Optional[dict] = None):
+        """记录文件进入新状态（没有处理日志时不记录）"""
+        if self.journal is not None:
+            self.journal.record(item.path, state, item, detail)
+    
+    def _snapshot(self) -> Tuple[List[Path], List[Path]]:
+        """
+        列出待处理文件并建立时间线快照（必须在修改任何文件之前调用）
         
-        # 生成MP4文件
-        mp4_name = avi_path.stem + '.mp4'
-        mp4_path = self.source_dir / mp4_name
+        Returns:
+            (图片列表, 其余文件列表)，其余文件按PLAN_ORDER排列
+        """
+        files = sorted(f for f in self.source_dir.iterdir() if f.is_file())
+        
+        self._timelines = {}
+        self._planned_dates = {}
+        self._image_events = {}
+        self._conversion_outputs = {}
+        self._get_timelines(self.source_dir)
+        return self._register_files(files, verbose=True)
+    
+    def _add_files(self, paths: List[Path]) -> Tuple[List[Path], List[Path]]:
+        """
+        把新文件加入已建立的时间线（监视模式，不重新扫描目录）
         
-        if self.convert_avi_to_mp4(archive_avi_path, mp4_path):
-            logger.info(f"  已生成MP4: {mp4_path.name}")
-            
-            # 从文件名猜测创建时间并写入MP4元数据
-            media_date = self.guess_datetime_from_filename(avi_path)
-            if media_date:
-                self.set_mp4_metadata(mp4_path, media_date)
-                logger.info(f"  已设置MP4时间戳: {media_date}")
+        Returns:
+            (图片列表, 其余文件列表)
+        """
+        files = sorted(path for path in paths if path.parent == self.source_dir and path.is_file())
+        timelines = self._get_timelines(self.source_dir)
+        for path in files:
+            timelines.add(path)
+        return self._register_files(files)
     
-    def process_3gp(self, threeGp_path: Path):
+    def _register_files(self, files: List[Path], verbose: bool = False) -> Tuple[List[Path], List[Path]]:
+        """为文件建立照片事件和转码输出索引，按图片在前、其余按PLAN_ORDER排列"""
+        for f in files:
+            suffix = f.suffix.lower()
+            if suffix in self.IMAGE_EXTENSIONS:
+                self._image_events[f] = threading.Event()
+            elif suffix in self.VIDEO_CONVERTERS:
+                # 转码输出 → 原文件（同名的已有MP4会被覆盖，不再单独处理）
+                self._conversion_outputs[self.source_dir / (f.stem + '.mp4')] = f
+        
+        images = [f for f in files if f.suffix.lower() in self.IMAGE_EXTENSIONS]
+        if verbose:
+            logger.info(f"找到 {len(images)} 个图片文件")
+        others = []
+        for suffix in self.PLAN_ORDER:
+            group = [f for f in files if f.suffix.lower() == suffix]
+            if verbose:
+                logger.info(f"找到 {len(group)} 个{suffix[1:].upper()}文件")
+            others.extend(group)
+        return images, others
+    
+    def plan(self, jobs: int = 1) -> ProcessingPlan:
         """
-        处理3GP文件（与AVI相同的操作）
+        生成处理计划（只读，不移动、不修改任何文件）
+        
+        在做任何决定之前对目录建立时间线快照；先决定所有图片的时间，
+        视频和音频插值时使用计划中的图片时间（而不是尚未写入磁盘的EXIF），
+        因此计划与执行顺序无关。各文件的读取与推断按任务图调度，
+        只有需要插值的文件等待自己的锚点照片
         
         Args:
-            threeGp_path: 3GP文件路径
+            jobs: 并行读取文件头的线程数
+            
+        Returns:
+            ProcessingPlan对象
         """
-        logger.info(f"处理3GP: {threeGp_path.name}")
-        
-        # 创建归档目录
-        self.archive_dir.mkdir(parents=True, exist_ok=True)
+        logger.info("生成处理计划...")
+        
+        images, others = self._snapshot()
+        plan = ProcessingPlan(str(self.source_dir), str(self.archive_dir))
+        
+        files = images + others
+        graph = self._build_plan_graph(files)
+        graph.run(jobs)
+        for file_path in files:
+            item = graph.results.get(f'infer:{file_path.name}')
+            if item is None:
+                logger.error(f"无法生成计划: {file_path.name}")
+            else:
+                plan.items.append(item)
         
-        # 移动3GP文件到归档目录
-        archive_3gp_path = self.archive_dir / threeGp_path.name
-        shutil.move(str(threeGp_path), str(archive_3gp_path))
-        logger.info(f"  已移动到: {archive_3gp_path}")
+        logger.info(f"计划完成: {plan.counts()}")
+        return plan
+    
+    def _build_plan_graph(self, files: List[Path]) -> TaskGraph:
+        """
+        生成计划的任务图
         
-        # 生成MP4文件
-        mp4_name = threeGp_path.stem + '.mp4'
-        mp4_path = self.source_dir / mp4_name
+        每个文件有两个任务：read（读取自身时间）→ infer（推断时间）；
+        需要插值的视频/音频的infer任务还依赖其锚点照片的read任务，
+        其余文件（包括文件名或容器中带时间的视频）不等待任何照片
         
-        if self.convert_3gp_to_mp4(archive_3gp_path, mp4_path):
-            logger.info(f"  已生成MP4: {mp4_path.name}")
+        Args:
+            files: 快照中的待处理文件
             
-            # 从文件名猜测创建时间并写入MP4元数据
-            media_date = self.guess_datetime_from_filename(threeGp_path)
-            if media_date:
-                self.set_mp4_metadata(mp4_path, media_date)
-                logger.info(f"  已设置MP4时间戳: {media_date}")
+        Returns:
+            TaskGraph对象，结果为 "infer:<文件名>" → PlanItem
+        """
+        graph = TaskGraph()
+        snapshot = set(files)
+        for file_path in files:
+            graph.add(f'read:{file_path.name}', partial(self._read_metadata, file_path))
+        
+        def infer(file_path: Path) -> PlanItem:
+            return self._infer_date(graph.results[f'read:{file_path.name}'])
+        
+        for file_path in files:
+            deps = [f'read:{file_path.name}']
+            if file_path.suffix.lower() in self.LAST_FILE_EXTENSIONS:
+                deps += [
+                    f'read:{anchor.name}' for anchor in sorted(self._inference_anchors(file_path))
+                    if anchor in snapshot
+                ]
+            graph.add(f'infer:{file_path.name}', partial(infer, file_path), deps)
+        return graph
     
-    def process_vob(self, vob_path: Path):
+    def plan_file(self, file_path: Path) -> PlanItem:
         """
-        处理VOB文件（与AVI相同的操作）
+        决定单个文件的处理方式（只读）
         
         Args:
-            vob_path: VOB文件路径
+            file_path: 文件路径
+            
+        Returns:
+            PlanItem对象
+        """
+        return self._infer_date(self._read_metadata(file_path))
+    
+    def _read_metadata(self, file_path: Path) -> PlanItem:
+        """
+        读取文件自身携带的时间，生成计划项
+        
+        图片的时间在这里完全确定（猜测只依赖目录名），并记录到_planned_dates；
+        视频和音频没有自身时间时留给_infer_date推断
+        """
+        suffix = file_path.suffix.lower()
+        if suffix in self.IMAGE_EXTENSIONS:
+            try:
+                item = self._plan_image(file_path)
+                self._planned_dates[file_path] = item.date
+            finally:
+                # 成功或失败都放行等待这张照片的视频
+                event = self._image_events.get(file_path)
+                if event is not None:
+                    event.set()
+        elif suffix in self.VIDEO_CONVERTERS:
+            item = self._plan_video(file_path)
+        elif suffix == '.mp4':
+            item = self._plan_mp4(file_path)
+        elif suffix in self.AUDIO_CONVERTERS:
+            item = self._plan_audio(file_path)
+        else:
+            item = PlanItem(str(file_path), None, ACTION_SKIP, note="不支持的格式")
+        item.snapshot()
+        return item
+    
+    def _infer_date(self, item: PlanItem) -> PlanItem:
+        """没有自身时间的视频、MP4和音频：从相邻文件或目录名推断"""
+        if item.action == ACTION_SKIP or item.kind == KIND_IMAGE or item.date is not None:
+            return item
+        file_path = Path(item.path)
+        item.date, item.date_source = self._guess_datetime(file_path)
+        item.write_date = item.date is not None
+        if item.date:
+            logger.info(f"  {file_path.name} 推断时间: {item.date}")
+        return item
+    
+    def _plan_image(self, image_path: Path) -> PlanItem:
+        """
+        决定图片的时间
+        
+        优先级1/2: 临时文件名格式、MA格式（需要写入EXIF）
+        优先级3: EXIF拍摄日期（不需要写入）
+        优先级4: 配置的文件名格式（如IMG_YYYYMMDD_HHMMSS，需要写入EXIF）
+        优先级5: 猜测时间（需要写入EXIF）
+        
+        配置的格式排在EXIF之后：安卓/Pixel照片通常已有正确的拍摄时间，
+        文件名中的时间只精确到秒，不应覆盖EXIF、重新编码图片
         """
-        logger.info(f"处理VOB: {vob_path.name}")
+        logger.info(f"分析图片: {image_path.name}")
+        
+        # 从临时文件名格式或MA格式提取时间（一次匹配）
+        exif_date, source = match_filename_datetime(image_path.stem, (SOURCE_TEMP, SOURCE_MA), MEDIA_IMAGE)
+        write_date = True
+        
+        if exif_date:
+            if source == SOURCE_TEMP:
+                logger.info(f"  从临时文件名格式提取时间: {exif_date}")
+            else:
+                logger.info(f"  从MA格式文件名提取时间: {exif_date}")
+        else:
+            exif_date = self.get_exif_datetime(image_path)
+            if exif_date:
+                source = DATE_SOURCE_EXIF
+                write_date = False
+                logger.info(f"  EXIF日期: {exif_date}")
+            else:
+                exif_date, source = match_filename_datetime(image_path.stem, media=MEDIA_IMAGE)
+                if exif_date:
+                    logger.info(f"  从{source}格式文件名提取时间: {exif_date}")
+                else:
+                    exif_date, source = self._guess_datetime(image_path)
+                    logger.info(f"  猜测日期: {exif_date}")
         
-        # 创建归档目录
-        self.archive_dir.mkdir(parents=True, exist_ok=True)
+        return PlanItem(
+            str(image_path), KIND_IMAGE, ACTION_TAG_IMAGE,
+            date=exif_date, date_source=source, write_date=write_date and exif_date is not None,
+        )
+    
+    def _plan_video(self, video_path: Path) -> PlanItem:
+        """读取需要转码的视频自身的时间（AVI的RIFF头、MTS的MDPM），决定输出和归档位置"""
+        logger.info(f"分析{video_path.suffix[1:].upper()}: {video_path.name}")
         
-        # 移动VOB文件到归档目录
-        archive_vob_path = self.archive_dir / vob_path.name
-        shutil.move(str(vob_path), str(archive_vob_path))
-        logger.info(f"  已移动到: {archive_vob_path}")
+        media_date, source = None, None
+        suffix = video_path.suffix.lower()
+        try:
+            if suffix == '.avi':
+                # RIFF hdrl中的IDIT/strd拍摄时间（只读取文件头）
+                media_date, source = read_avi_datetime(video_path), DATE_SOURCE_RIFF
+                if media_date:
+                    logger.info(f"  从AVI头部(IDIT/strd)读取拍摄时间: {media_date}")
+            elif suffix == '.mts':
+                # AVCHD MDPM中的录制时间（只读取文件开头几百KB）
+                media_date, source = read_mdpm_datetime(video_path), DATE_SOURCE_MDPM
+                if media_date:
+                    logger.info(f"  从AVCHD MDPM读取录制时间: {media_date}")
+        except OSError as e:
+            logger.debug(f"读取{video_path.name}头部时间失败: {e}")
+            media_date = None
+        
+        return PlanItem(
+            str(video_path), KIND_VIDEO, ACTION_CONVERT_VIDEO,
+            date=media_date, date_source=source if media_date else None,
+            write_date=media_date is not None,
+            profile=PROFILE_MP4,
+            output=str(self.source_dir / (video_path.stem + '.mp4')),
+            archive=str(self.archive_dir / video_path.name),
+        )
+    
+    def _plan_mp4(self, mp4_path: Path) -> PlanItem:
+        """读取已有MP4文件名中的时间（video-<YYYY-MM-DD-HH-mm-ss>***等格式）"""
+        logger.info(f"分析MP4: {mp4_path.name}")
+        
+        converted_from = self._conversion_outputs.get(mp4_path)
+        if converted_from is not None:
+            return PlanItem(
+                str(mp4_path), KIND_MP4, ACTION_SKIP,
+                note=f"将被{converted_from.name}的转换结果覆盖",
+            )
         
-        # 生成MP4文件
-        mp4_name = vob_path.stem + '.mp4'
-        mp4_path = self.source_dir / mp4_name
+        media_date, source = match_filename_datetime(mp4_path.stem, media=MEDIA_VIDEO)
+        if media_date:
+            logger.info(f"  从{source}格式文件名提取时间: {media_date}")
         
-        if self.convert_vob_to_mp4(archive_vob_path, mp4_path):
-            logger.info(f"  已生成MP4: {mp4_path.name}")
+        return PlanItem(
+            str(mp4_path), KIND_MP4, ACTION_TAG_MP4,
+            date=media_date, date_source=source, write_date=media_date is not None,
+        )
+    
+    def _plan_audio(self, audio_path: Path) -> PlanItem:
+        """决定需要转码的音频的输出和归档位置（时间由_infer_date推断）"""
+        logger.info(f"分析{audio_path.suffix[1:].upper()}: {audio_path.name}")
+        
+        return PlanItem(
+            str(audio_path), KIND_AUDIO, ACTION_CONVERT_AUDIO,
+            profile=PROFILE_MP3,
+            output=str(self.source_dir / (audio_path.stem + '.mp3')),
+            archive=str(self.archive_dir / audio_path.name),
+        )
+    
+    def execute(self, plan: ProcessingPlan, jobs: int = 1) -> int:
+        """
+        按计划执行转码、写入元数据和归档
+        
+        所有决定都已在计划中做出，各文件之间互不依赖，可以并行执行
+        
+        Args:
+            plan: 处理计划
+            jobs: 并行任务数
             
-            # 从文件名猜测创建时间并写入MP4元数据
-            media_date = self.guess_datetime_from_filename(vob_path)
-            if media_date:
-                self.set_mp4_metadata(mp4_path, media_date)
-                logger.info(f"  已设置MP4时间戳: {media_date}")
+        Returns:
+            失败的文件数
+        """
+        items = [item for item in plan.items if item.action != ACTION_SKIP]
+        logger.info(f"执行计划: {len(items)} 个文件（{jobs} 个并行任务）")
+        self._remove_partial_outputs()
+        
+        results = self._map(self.execute_item, items, jobs)
+        failed = results.count(False)
+        if failed:
+            logger.warning(f"{failed} 个文件处理失败")
+        return failed
     
-    def process_mov(self, mov_path: Path):
+    def execute_item(self, item: PlanItem) -> bool:
         """
-        处理MOV文件（与AVI相同的操作）
+        执行计划中的一个文件：转码 → 写入时间 → 归档
         
         Args:
-            mov_path: MOV文件路径
+            item: 计划项
+            
+        Returns:
+            是否成功
         """
-        logger.info(f"处理MOV: {mov_path.name}")
+        if item.action == ACTION_SKIP:
+            return True
         
-        # 创建归档目录
-        self.archive_dir.mkdir(parents=True, exist_ok=True)
+        file_path = Path(item.path)
+        if self.cancel_token.cancelled:
+            logger.debug(f"已取消，未执行: {file_path.name}")
+            return False
+        if item.changed():
+            logger.warning(f"文件自生成计划以来已变化或不存在，跳过: {file_path.name}")
+            return False
         
-        # 移动MOV文件到归档目录
-        archive_mov_path = self.archive_dir / mov_path.name
-        shutil.move(str(mov_path), str(archive_mov_path))
-        logger.info(f"  已移动到: {archive_mov_path}")
+        try:
+            self._transform(item)
+            self._tag(item)
+            self._archive(item)
+            return True
+        except Exception as e:
+            logger.error(f"处理失败 {file_path.name}: {e}")
+            return False
+    
+    def _transform(self, item: PlanItem):
+        """
+        按计划转码（原文件保持不动，转码成功后才归档）
         
-        # 生成MP4文件
-        mp4_name = mov_path.stem + '.mp4'
-        mp4_path = self.source_dir / mp4_name
+        Raises:
+            RuntimeError: 转码失败
+        """
+        if item.action not in (ACTION_CONVERT_VIDEO, ACTION_CONVERT_AUDIO):
+            return
+        source_path = Path(item.path)
+        output_path = Path(item.output)
+        suffix = source_path.suffix.lower()
+        logger.info(f"处理{suffix[1:].upper()}: {source_path.name}")
         
-        if self.convert_mov_to_mp4(archive_mov_path, mp4_path):
-            logger.info(f"  已生成MP4: {mp4_path.name}")
-            
-            # 从文件名猜测创建时间并写入MP4元数据
-            media_date = self.guess_datetime_from_filename(mov_path)
-            if media_date:
-                self.set_mp4_metadata(mp4_path, media_date)
-                logger.info(f"  已设置MP4时间戳: {media_date}")
+        if item.action == ACTION_CONVERT_AUDIO:
+            converter = getattr(self, self.AUDIO_CONVERTERS[suffix])
+        else:
+            converter = getattr(self, self.VIDEO_CONVERTERS[suffix])
+        with self._admit(item):
+            converted = converter(source_path, output_path)
+        if not converted:
+            # ffmpeg失败或被终止时输出不完整，删除以免下次被当作已转换的MP4
+            output_path.unlink(missing_ok=True)
+            raise RuntimeError(f"转换失败: {source_path.name}")
+        self._record_throughput(item)
+        logger.info(f"  已生成{output_path.suffix[1:].upper()}: {output_path.name}")
     
-    def process_mts(self, mts_path: Path):
+    def _tag(self, item: PlanItem):
+        """按计划把时间写入图片EXIF、MP4或MP3"""
+        if not (item.write_date and item.date):
+            return
+        if item.action == ACTION_TAG_IMAGE:
+            with self._admit(item):
+                self._tag_image(item)
+        elif item.action == ACTION_TAG_MP4:
+            self.set_mp4_metadata(Path(item.path), item.date)
+            logger.info(f"  {Path(item.path).name} 已设置MP4时间戳: {item.date}")
+        elif item.action == ACTION_CONVERT_VIDEO:
+            self.set_mp4_metadata(Path(item.output), item.date)
+            logger.info(f"  {Path(item.output).name} 已设置MP4时间戳: {item.date}")
+        elif item.action == ACTION_CONVERT_AUDIO:
+            self.set_mp3_metadata(Path(item.output), item.date)
+            logger.info(f"  {Path(item.output).name} 已设置MP3时间戳: {item.date}")
+    
+    def _tag_image(self, item: PlanItem):
+        """把时间写入图片EXIF"""
+        self.set_exif_datetime(Path(item.path), item.date)
+        self._record_throughput(item)
+        logger.info(f"  {Path(item.path).name} 已更新图片EXIF日期: {item.date}")
+    
+    def _record_throughput(self, item: PlanItem):
+        """向自动并行数控制器报告完成的工作量（照片数，或转码输出的媒体秒数）"""
+        if self.tuner is None:
+            return
+        if item.kind == KIND_IMAGE:
+            self.tuner.record(UNIT_PHOTOS)
+            return
+        try:
+            duration = read_mp4_duration(item.output) if item.profile == PROFILE_MP4 else None
+        except OSError:
+            duration = None
+        if duration:
+            self.tuner.record(UNIT_MEDIA_SECONDS, duration)
+    
+    def _memory_estimate(self, item: PlanItem) -> int:
+        """任务的内存估计（MB）"""
+        suffix = Path(item.path).suffix.lower()
+        if suffix in self.SOURCE_MEMORY_MB:
+            return self.SOURCE_MEMORY_MB[suffix]
+        return self.JOB_MEMORY_MB.get(item.profile or item.kind, self.JOB_MEMORY_MB[KIND_IMAGE])
+    
+    @contextmanager
+    def _admit(self, item: PlanItem):
+        """转码/图片任务准入：先占用并发上限（自动并行数或全局上限）的名额，再由资源调控器按负载和内存放行"""
+        with ExitStack() as stack:
+            if self.job_limit is not None:
+                stack.enter_context(self.job_limit.slot())
+            if self.governor is not None:
+                stack.enter_context(self.governor.admit(self._memory_estimate(item)))
+            yield
+    
+    def _archive(self, item: PlanItem) -> Optional[ArchiveResult]:
         """
-        处理MTS文件（与AVI相同的操作）
+        按计划把已转码的原文件移动到归档目录
         
-        Args:
-            mts_path: MTS文件路径
+        归档目录在另一个文件系统时在内核中复制并校验哈希，fsync后才删除原文件
+        
+        Returns:
+            归档结果（复制方式、大小、哈希、耗时），不需要归档时为None
         """
-        logger.info(f"处理MTS: {mts_path.name}")
+        if not item.archive:
+            return None
+        archive_path = Path(item.archive)
+        archive_path.parent.mkdir(parents=True, exist_ok=True)
+        result = archive_file(item.path, archive_path)
+        if result.method == METHOD_RENAME:
+            logger.info(f"  已移动到: {archive_path}")
+        else:
+            logger.info(
+                f"  已复制并校验后移动到: {archive_path}（{result.size / MB:.1f}MB，"
+                f"{result.throughput / MB:.1f}MB/s，{result.method}，{result.digest[:12]}）"
+            )
+        return result
+    
+    async def aprocess_all(self, jobs: int = 1, workers: Optional[Dict[str, int]] = None,
+                           full_scan: bool = False) -> Dict[str, Dict]:
+        """
+        异步版process_all（供asyncio服务嵌入，不阻塞事件循环）
         
-        # 创建归档目录
-        self.archive_dir.mkdir(parents=True, exist_ok=True)
+        在线程池中运行与process_all相同的流水线：有界队列、处理日志、跳过没有变化的目录、
+        取消与回滚都相同。asyncio任务被取消时取消本处理器的取消令牌并立即终止ffmpeg，
+        等流水线回滚不完整的输出并退出后再抛出CancelledError
         
-        # 移动MTS文件到归档目录
-        archive_mts_path = self.archive_dir / mts_path.name
-        shutil.move(str(mts_path), str(archive_mts_path))
-        logger.info(f"  已移动到: {archive_mts_path}")
+        Args:
+            jobs, workers, full_scan: 同process_all
+            
+        Returns:
+            各阶段的统计
+        """
+        loop = asyncio.get_running_loop()
+        future = loop.run_in_executor(None, partial(self.process_all, jobs, workers, full_scan))
+        try:
+            return await asyncio.shield(future)
+        except asyncio.CancelledError:
+            self.cancel_token.cancel()
+            self.cancel_token.kill_processes()
+            await asyncio.wait([future])
+            raise
+    
+    async def aprocess_file(self, file_path: Path, executor=None) -> Optional[PlanItem]:
+        """
+        异步版process_file（在线程池中运行）
         
-        # 生成MP4文件
-        mp4_name = mts_path.stem + '.mp4'
-        mp4_path = self.source_dir / mp4_name
+        Args:
+            file_path: 文件路径
+            executor: 使用的线程池，默认使用事件循环的默认线程池
+            
+        Returns:
+            完成的计划项，失败时返回None
+        """
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(executor, self.process_file, Path(file_path))
+    
+    @staticmethod
+    def _map(func, items: list, jobs: int) -> list:
+        """按顺序返回func(item)的结果，jobs大于1时使用线程池并行"""
+        if jobs <= 1 or len(items) <= 1:
+            return [func(item) for item in items]
+        with ThreadPoolExecutor(max_workers=jobs) as executor:
+            return list(executor.map(func, items))
+    
+    def process_file(self, file_path: Path) -> Optional[PlanItem]:
+        """
+        处理单个文件（读取时间 → 转码 → 写入时间 → 归档）
         
-        if self.convert_mts_to_mp4(archive_mts_path, mp4_path):
-            logger.info(f"  已生成MP4: {mp4_path.name}")
+        Args:
+            file_path: 文件路径
             
-            # 从文件名猜测创建时间并写入MP4元数据
-            media_date = self.guess_datetime_from_filename(mts_path)
-            if media_date:
-                self.set_mp4_metadata(mp4_path, media_date)
-                logger.info(f"  已设置MP4时间戳: {media_date}")
+        Returns:
+            完成的计划项，失败时返回None
+        """
+        try:
+            item = self.plan_file(Path(file_path))
+        except Exception as e:
+            logger.error(f"处理失败 {Path(file_path).name}: {e}")
+            return None
+        return item if self.execute_item(item) else None
     
-    def process_flv(self, flv_path: Path):
+    def process_image(self, image_path: Path):
         """
-        处理FLV文件（与AVI相同的操作）
+        处理图片文件
         
         Args:
-            flv_path: FLV文件路径
+            image_path: 图片路径
         """
-        logger.info(f"处理FLV: {flv_path.name}")
+        return self.process_file(image_path)
+    
+    def process_avi(self, avi_path: Path):
+        """
+        处理AVI文件：优先读取RIFF头部时间，转换为MP4并归档原文件
         
-        # 从文件名猜测创建时间（必须在移动文件之前）
-        media_date = self.guess_datetime_from_filename(flv_path)
+        Args:
+            avi_path: AVI文件路径
+        """
+        return self.process_file(avi_path)
+    
+    def process_3gp(self, threeGp_path: Path):
+        """
+        处理3GP文件（与AVI相同的操作）
+        
+        Args:
+            threeGp_path: 3GP文件路径
+        """
+        return self.process_file(threeGp_path)
+    
+    def process_vob(self, vob_path: Path):
+        """
+        处理VOB文件（与AVI相同的操作）
         
-        # 创建归档目录
-        self.archive_dir.mkdir(parents=True, exist_ok=True)
+        Args:
+            vob_path: VOB文件路径
+        """
+        return self.process_file(vob_path)
+    
+    def process_mov(self, mov_path: Path):
+        """
+        处理MOV文件（与AVI相同的操作）
         
-        # 移动FLV文件到归档目录
-        archive_flv_path = self.archive_dir / flv_path.name
-        shutil.move(str(flv_path), str(archive_flv_path))
-        logger.info(f"  已移动到: {archive_flv_path}")
+        Args:
+            mov_path: MOV文件路径
+        """
+        return self.process_file(mov_path)
+    
+    def process_mts(self, mts_path: Path):
+        """
+        处理MTS文件：优先读取AVCHD MDPM录制时间，其余与AVI相同
         
-        # 生成MP4文件
-        mp4_name = flv_path.stem + '.mp4'
-        mp4_path = self.source_dir / mp4_name
+        Args:
+            mts_path: MTS文件路径
+        """
+        return self.process_file(mts_path)
+    
+    def process_flv(self, flv_path: Path):
+        """
+        处理FLV文件（与AVI相同的操作）
         
-        if self.convert_flv_to_mp4(archive_flv_path, mp4_path):
-            logger.info(f"  已生成MP4: {mp4_path.name}")
-            
-            # 写入MP4元数据
-            if media_date:
-                self.set_mp4_metadata(mp4_path, media_date)
-                logger.info(f"  已设置MP4时间戳: {media_date}")
+        Args:
+            flv_path: FLV文件路径
+        """
+        return self.process_file(flv_path)
     
     def process_mp4(self, mp4_path: Path):
         """
@@ -372,23 +1160,7 @@ class MediaProcessor:
         Args:
             mp4_path: MP4文件路径
         """
-        logger.info(f"处理MP4: {mp4_path.name}")
-        
-        # 从文件名提取时间（video-YYYY-MM-DD-HH-mm-ss格式）
-        media_date = self._extract_datetime_from_video_format(mp4_path)
-        
-        if media_date:
-            logger.info(f"  从video格式文件名提取时间: {media_date}")
-            # 更新MP4元数据
-            self.set_mp4_metadata(mp4_path, media_date)
-            logger.info(f"  已设置MP4时间戳: {media_date}")
-        else:
-            # 尝试猜测时间
-            media_date = self.guess_datetime_from_filename(mp4_path)
-            if media_date:
-                logger.info(f"  猜测时间: {media_date}")
-                self.set_mp4_metadata(mp4_path, media_date)
-                logger.info(f"  已设置MP4时间戳: {media_date}")
+        return self.process_file(mp4_path)
     
     def process_amr(self, amr_path: Path):
         """
@@ -397,28 +1169,7 @@ class MediaProcessor:
         Args:
             amr_path: AMR文件路径
         """
-        logger.info(f"处理AMR: {amr_path.name}")
-        
-        # 创建归档目录
-        self.archive_dir.mkdir(parents=True, exist_ok=True)
-        
-        # 移动AMR文件到归档目录备份
-        archive_amr_path = self.archive_dir / amr_path.name
-        shutil.move(str(amr_path), str(archive_amr_path))
-        logger.info(f"  已移动到: {archive_amr_path}")
-        
-        # 生成MP3文件
-        mp3_name = amr_path.stem + '.mp3'
-        mp3_path = self.source_dir / mp3_name
-        
-        if self.convert_amr_to_mp3(archive_amr_path, mp3_path):
-            logger.info(f"  已生成MP3: {mp3_path.name}")
-            
-            # 从文件名猜测创建时间并写入MP3元数据
-            media_date = self.guess_datetime_from_filename(amr_path)
-            if media_date:
-                self.set_mp3_metadata(mp3_path, media_date)
-                logger.info(f"  已设置MP3时间戳: {media_date}")
+        return self.process_file(amr_path)
     
     def get_exif_datetime(self, image_path: Path) -> Optional[datetime]:
         """
@@ -430,6 +1181,9 @@ class MediaProcessor:
         Returns:
             datetime对象或None
         """
+        if self.exiftool_pool is not None:
+            return self._get_exif_datetime_exiftool(image_path)
+        
         try:
             # 优先使用piexif
             if HAS_PIEXIF:
@@ -459,6 +1213,34 @@ class MediaProcessor:
         
         return None
     
+    def _get_exif_datetime_exiftool(self, image_path: Path) -> Optional[datetime]:
+        """
+        通过常驻exiftool会话读取拍摄日期（DateTimeOriginal，其次DateTime）
+        
+        Args:
+            image_path: 图片路径
+            
+        Returns:
+            datetime对象或None
+        """
+        try:
+            records = self.exiftool_pool.execute_json(
+                '-EXIF:DateTimeOriginal', '-EXIF:ModifyDate', str(image_path)
+            )
+        except ExifToolError as e:
+            logger.debug(f"exiftool读取失败: {e}")
+            return None
+        
+        record = records[0] if records else {}
+        for key in ('DateTimeOriginal', 'ModifyDate'):
+            value = record.get(key)
+            if isinstance(value, str):
+                try:
+                    return datetime.strptime(value, '%Y:%m:%d %H:%M:%S')
+                except ValueError:
+                    pass
+        return None
+    
     def _extract_datetime_from_temp_filename(self, image_path: Path) -> Optional[datetime]:
         """
         从临时文件名格式提取时间戳：临时文件名<YYYY-MM-DD HH.mm.ss>***
@@ -470,28 +1252,10 @@ class MediaProcessor:
         Returns:
             datetime对象或None
         """
-        try:
-            file_name = image_path.stem  # 不包含扩展名
-            
-            # 检查是否包含 YYYY-MM-DD HH.mm.ss 格式的时间戳
-            # 支持格式: 临时文件名2012-03-19 02.59.06 或其他前缀
-            match = re.search(r'(\d{4})-(\d{2})-(\d{2})\s+(\d{2})\.(\d{2})\.(\d{2})', file_name)
-            if match:
-                year = int(match.group(1))
-                month = int(match.group(2))
-                day = int(match.group(3))
-                hour = int(match.group(4))
-                minute = int(match.group(5))
-                second = int(match.group(6))
-                
-                dt = datetime(year, month, day, hour, minute, second)
-                logger.debug(f"从临时文件名格式提取时间: {file_name} → {dt}")
-                return dt
-            
-            return None
-        except Exception as e:
-            logger.debug(f"临时文件名格式时间提取失败: {e}")
-            return None
+        dt, _ = match_filename_datetime(image_path.stem, (SOURCE_TEMP,))
+        if dt:
+            logger.debug(f"从临时文件名格式提取时间: {image_path.stem} → {dt}")
+        return dt
     
     def _extract_datetime_from_ma_format(self, image_path: Path) -> Optional[datetime]:
         """
@@ -504,22 +1268,10 @@ class MediaProcessor:
         Returns:
             datetime对象或None
         """
-        try:
-            file_name = image_path.stem  # 不包含扩展名
-            
-            # 检查是否以MA开头，并且后面跟14位数字（YYYYMMDDHHMMSS）
-            match = re.match(r'^MA(\d{14})', file_name)
-            if match:
-                datetime_str = match.group(1)  # 提取14位数字
-                # 格式：YYYYMMDDHHMMSS
-                dt = datetime.strptime(datetime_str, '%Y%m%d%H%M%S')
-                logger.debug(f"从MA格式文件名提取时间: {file_name} → {dt}")
-                return dt
-            
-            return None
-        except Exception as e:
-            logger.debug(f"MA格式时间提取失败: {e}")
-            return None
+        dt, _ = match_filename_datetime(image_path.stem, (SOURCE_MA,))
+        if dt:
+            logger.debug(f"从MA格式文件名提取时间: {image_path.stem} → {dt}")
+        return dt
     
     def _extract_datetime_from_video_format(self, video_path: Path) -> Optional[datetime]:
         """
@@ -533,27 +1285,10 @@ class MediaProcessor:
         Returns:
             datetime对象或None
         """
-        try:
-            file_name = video_path.stem  # 不包含扩展名
-            
-            # 检查是否以video-开头，并且后面跟YYYY-MM-DD-HH-mm-ss格式
-            match = re.match(r'^video-(\d{4})-(\d{2})-(\d{2})-(\d{2})-(\d{2})-(\d{2})', file_name)
-            if match:
-                year = int(match.group(1))
-                month = int(match.group(2))
-                day = int(match.group(3))
-                hour = int(match.group(4))
-                minute = int(match.group(5))
-                second = int(match.group(6))
-                
-                dt = datetime(year, month, day, hour, minute, second)
-                logger.debug(f"从video格式文件名提取时间: {file_name} → {dt}")
-                return dt
-            
-            return None
-        except Exception as e:
-            logger.debug(f"video格式时间提取失败: {e}")
-            return None
+        dt, _ = match_filename_datetime(video_path.stem, (SOURCE_VIDEO,))
+        if dt:
+            logger.debug(f"从video格式文件名提取时间: {video_path.stem} → {dt}")
+        return dt
     
     def set_exif_datetime(self, image_path: Path, dt: datetime):
         """
@@ -563,6 +1298,10 @@ class MediaProcessor:
             image_path: 图片路径
             dt: datetime对象
         """
+        if self.exiftool_pool is not None:
+            self._set_exif_datetime_exiftool(image_path, dt)
+            return
+        
         if not HAS_PIEXIF:
             logger.warning(f"无法更新{image_path.name}的EXIF（需要piexif）")
             return
@@ -599,15 +1338,54 @@ class MediaProcessor:
             img = Image.open(image_path)
             # 保存到临时文件
             temp_path = image_path.with_suffix('.tmp')
-            img.save(str(temp_path), 'jpeg', exif=exif_bytes, quality=95)
-            # 替换原文件
-            temp_path.replace(image_path)
+            with self._tracked_temp(temp_path):
+                img.save(str(temp_path), 'jpeg', exif=exif_bytes, quality=95)
+                # 替换原文件
+                temp_path.replace(image_path)
             
             logger.debug(f"EXIF已更新: {image_path.name}")
         except Exception as e:
             logger.error(f"更新EXIF失败: {e}")
+            image_path.with_suffix('.tmp').unlink(missing_ok=True)
+    
+    def _set_exif_datetime_exiftool(self, image_path: Path, dt: datetime):
+        """
+        通过常驻exiftool会话写入拍摄日期（原地修改，不重新编码图片）
+        
+        Args:
+            image_path: 图片路径
+            dt: datetime对象
+        """
+        datetime_str = dt.strftime('%Y:%m:%d %H:%M:%S')
+        try:
+            output = self.exiftool_pool.execute(
+                '-overwrite_original',
+                f'-EXIF:DateTimeOriginal={datetime_str}',
+                f'-EXIF:ModifyDate={datetime_str}',
+                str(image_path),
+            )
+        except ExifToolError as e:
+            logger.error(f"更新EXIF失败: {e}")
+            return
+        
+        if '1 image files updated' in output:
+            logger.debug(f"EXIF已更新: {image_path.name}")
+        else:
+            logger.error(f"更新EXIF失败: {output.strip()}")
     
     def guess_datetime_from_filename(self, file_path: Path) -> Optional[datetime]:
+        """
+        从文件名猜测创建日期（见_guess_datetime）
+        
+        Args:
+            file_path: 文件路径
+            
+        Returns:
+            datetime对象或None
+        """
+        return self._guess_datetime(file_path)[0]
+    
+    def _guess_datetime(self, file_path: Path) -> Tuple[Optional[datetime], Optional[str]]:
         """
         从文件名猜测创建日期
         
@@ -623,25 +1401,25 @@ class MediaProcessor:
             file_path: 文件路径
             
         Returns:
-            datetime对象或None
+            (datetime对象, 时间来源)，无法猜测时为(None, None)
         """
         # 模式0: 对于视频或音频文件，如果是最后一个文件，尝试从前一个文件时间+1分钟
-        if file_path.suffix.lower() in {'.avi', '.3gp', '.vob', '.mov', '.mts', '.flv', '.amr'}:
+        if file_path.suffix.lower() in self.LAST_FILE_EXTENSIONS:
             last_file_date = self._get_datetime_from_last_file(file_path)
             if last_file_date:
                 logger.info(f"  （最后一个文件）从前一个文件推断时间: {last_file_date}")
-                return last_file_date
+                return last_file_date, DATE_SOURCE_LAST_FILE
             
             # 模式1: 对于视频文件，尝试通过相邻照片的EXIF时间插值
-            if file_path.suffix.lower() in {'.avi', '.3gp', '.vob', '.mov', '.mts', '.flv'}:
+            if file_path.suffix.lower() in self.INTERPOLATION_EXTENSIONS:
                 interpolated_date = self._interpolate_datetime_from_neighbors(file_path)
                 if interpolated_date:
                     logger.info(f"  通过相邻照片插值得到时间: {interpolated_date}")
-                    return interpolated_date
+                    return interpolated_date, DATE_SOURCE_NEIGHBORS
         
         # 模式2: 从目录名解析 YYYYMMDD
         dir_name = file_path.parent.name
-        match = re.search(r'(\d{8})', dir_name)
+        match = DIR_DATE_PATTERN.search(dir_name)
         if match:
             date_str = match.group(1)
             try:
@@ -650,40 +1428,73 @@ class MediaProcessor:
                 file_name = file_path.stem
                 
                 # 尝试YYYYMMDD_HHMM或_HH模式
-                time_match = re.search(r'_(\d{2})(\d{2})(?:_\d+)?$', file_name)
+                time_match = HOUR_MINUTE_SUFFIX_PATTERN.search(file_name)
                 if time_match:
                     hour = int(time_match.group(1))
                     minute = int(time_match.group(2))
-                    return base_date.replace(hour=hour, minute=minute)
+                    return base_date.replace(hour=hour, minute=minute), DATE_SOURCE_DIRECTORY
                 
-                time_match = re.search(r'_(\d{2})(?:_\d+)?$', file_name)
+                time_match = HOUR_SUFFIX_PATTERN.search(file_name)
                 if time_match:
                     hour = int(time_match.group(1))
-                    return base_date.replace(hour=hour)
+                    return base_date.replace(hour=hour), DATE_SOURCE_DIRECTORY
                 
                 # 如果没有时间信息，使用基础日期加时间序列
                 # 根据文件编号猜测时间
-                file_num_match = re.search(r'(\d+)', file_name)
+                file_num_match = FILE_NUMBER_PATTERN.search(file_name)
                 if file_num_match:
                     file_num = int(file_num_match.group(1))
                     # 假设每个文件相隔几秒到几分钟
                     file_seq = file_num % 1000
                     minutes_offset = (file_seq % 60)
                     hours_offset = (file_seq // 60) % 24
-                    return base_date.replace(hour=hours_offset, minute=minutes_offset)
+                    return base_date.replace(hour=hours_offset, minute=minutes_offset), DATE_SOURCE_DIRECTORY
                 
-                return base_date
+                return base_date, DATE_SOURCE_DIRECTORY
             except Exception as e:
                 logger.debug(f"从目录名解析日期失败: {e}")
         
-        return None
+        return None, None
+    
+    def _get_timelines(self, directory: Path) -> DirectoryTimelines:
+        """
+        获取目录的相机时间线索引（每个目录只扫描一次）
+        
+        Args:
+            directory: 目录路径
+            
+        Returns:
+            DirectoryTimelines对象
+        """
+        timelines = self._timelines.get(directory)
+        if timelines is None:
+            timelines = DirectoryTimelines(
+                directory,
+                self.IMAGE_EXTENSIONS | self.VIDEO_EXTENSIONS | self.AUDIO_EXTENSIONS,
+            )
+            self._timelines[directory] = timelines
+        return timelines
+    
+    def _get_image_datetime(self, image_path: Path) -> Optional[datetime]:
+        """
+        获取照片时间：优先使用计划中已决定的时间，否则读取EXIF
+        
+        Args:
+            image_path: 图片路径
+            
+        Returns:
+            datetime对象或None
+        """
+        if image_path in self._planned_dates:
+            return self._planned_dates[image_path]
+        return self.get_exif_datetime(image_path)
     
     def _interpolate_datetime_from_neighbors(self, video_path: Path) -> Optional[datetime]:
         """
         通过相邻照片的EXIF时间插值来获取视频的创建时间
         
-        假设文件编号连续，找到视频前后的照片，
-        读取它们的EXIF时间，使用线性插值估算视频时间
+        假设同一相机（文件名前缀）的文件编号连续，在该相机的时间线中
+        找到视频前后的照片，读取它们的EXIF时间，使用线性插值估算视频时间
         
         Args:
             video_path: 视频文件路径
@@ -692,44 +1503,27 @@ class MediaProcessor:
             插值得到的datetime对象或None
         """
         try:
-            # 提取视频文件编号
             video_name = video_path.stem
-            video_num_match = re.search(r'(\d+)', video_name)
-            if not video_num_match:
-                return None
-            
-            video_num = int(video_num_match.group(1))
-            
-            # 获取同目录所有文件
-            all_files = list(video_path.parent.iterdir())
-            
-            # 筛选图片文件并提取编号
-            image_files = {}
-            for f in all_files:
-                if f.suffix.lower() in self.IMAGE_EXTENSIONS:
-                    num_match = re.search(r'(\d+)', f.stem)
-                    if num_match:
-                        num = int(num_match.group(1))
-                        image_files[num] = f
-            
-            if not image_files:
+            located = self._get_timelines(video_path.parent).locate(video_path)
+            if located is None:
                 return None
+            timeline, video_seq = located
             
-            # 找到视频前后最接近的两张照片
-            before_num = max([n for n in image_files.keys() if n < video_num], default=None)
-            after_num = min([n for n in image_files.keys() if n > video_num], default=None)
+            # 在同一相机的时间线中找到视频前后最接近的两张照片
+            before = timeline.before(video_seq, self.IMAGE_EXTENSIONS)
+            after = timeline.after(video_seq, self.IMAGE_EXTENSIONS)
             
             # 需要前后都有照片才能插值
-            if before_num is None or after_num is None:
+            if before is None or after is None:
                 logger.debug(f"无法找到{video_name}前后的照片用于插值")
                 return None
             
-            before_file = image_files[before_num]
-            after_file = image_files[after_num]
+            before_file = before.path
+            after_file = after.path
             
             # 读取两张照片的EXIF时间
-            before_date = self.get_exif_datetime(before_file)
-            after_date = self.get_exif_datetime(after_file)
+            before_date = self._get_image_datetime(before_file)
+            after_date = self._get_image_datetime(after_file)
             
             if not before_date or not after_date:
                 logger.debug(f"无法读取照片EXIF时间: {before_file.name} 或 {after_file.name}")
@@ -738,13 +1532,13 @@ class MediaProcessor:
             # 线性插值计算视频时间
             # 假设前后两张照片的编号与时间成线性关系
             time_diff_seconds = (after_date - before_date).total_seconds()
-            num_diff = after_num - before_num
+            num_diff = after.seq - before.seq
             
             # 每个编号之间相隔的秒数
             seconds_per_num = time_diff_seconds / num_diff
             
             # 计算视频对应的时间
-            video_seconds_offset = (video_num - before_num) * seconds_per_num
+            video_seconds_offset = (video_seq - before.seq) * seconds_per_num
             interpolated_date = before_date + timedelta(seconds=video_seconds_offset)
             
             logger.debug(
@@ -762,6 +1556,8 @@ class MediaProcessor:
         """
         对于最后一个文件，获取前一个媒体文件（照片、视频或音频）的时间，并加1分钟
         
+        "最后"和"前一个"都在同一相机（文件名前缀）的时间线内判断
+        
         Args:
             video_path: 视频或音频文件路径
             
@@ -769,47 +1565,29 @@ class MediaProcessor:
             推断得到的datetime对象或None
         """
         try:
-            # 提取文件编号
             file_name = video_path.stem
-            file_num_match = re.search(r'(\d+)', file_name)
-            if not file_num_match:
+            located = self._get_timelines(video_path.parent).locate(video_path)
+            if located is None:
                 return None
+            timeline, file_seq = located
             
-            file_num = int(file_num_match.group(1))
-            
-            # 获取同目录所有媒体文件（照片、视频和音频）
-            all_files = list(video_path.parent.iterdir())
-            media_files = {}
-            
-            for f in all_files:
-                suffix = f.suffix.lower()
-                if suffix in self.IMAGE_EXTENSIONS or suffix in self.VIDEO_EXTENSIONS or suffix in self.AUDIO_EXTENSIONS:
-                    num_match = re.search(r'(\d+)', f.stem)
-                    if num_match:
-                        num = int(num_match.group(1))
-                        media_files[num] = f
-            
-            if not media_files:
-                return None
-            
-            # 检查当前文件是否是最后一个媒体文件
-            max_num = max(media_files.keys())
-            if file_num != max_num:
-                logger.debug(f"{file_name}不是最后一个文件（最后文件编号{max_num}），无法使用此方法")
+            # 检查当前文件是否是该相机的最后一个媒体文件
+            if file_seq != timeline.last_seq:
+                logger.debug(f"{file_name}不是最后一个文件（最后文件序号{timeline.last_seq}），无法使用此方法")
                 return None
             
-            # 找前一个媒体文件（编号小于当前文件）
-            before_num = max([n for n in media_files.keys() if n < file_num], default=None)
-            if before_num is None:
+            # 找前一个媒体文件（序号小于当前文件）
+            before = timeline.before(file_seq)
+            if before is None:
                 logger.debug(f"无法找到{file_name}前的媒体文件")
                 return None
             
-            before_file = media_files[before_num]
+            before_file = before.path
             before_date = None
             
             # 首先尝试获取照片的EXIF时间
             if before_file.suffix.lower() in self.IMAGE_EXTENSIONS:
-                before_date = self.get_exif_datetime(before_file)
+                before_date = self._get_image_datetime(before_file)
                 if before_date:
                     logger.debug(f"从照片{before_file.name}读取EXIF时间: {before_date}")
             
@@ -834,6 +1612,22 @@ class MediaProcessor:
             logger.debug(f"从前一个文件推断时间失败: {e}")
             return None
     
+    def _ffmpeg_command(self, profile: str, source_path: Path, output_path: Path) -> List[str]:
+        """按转换方式生成ffmpeg转码命令（同步与异步转码共用）"""
+        codec_args, _ = self.FFMPEG_PROFILES[profile]
+        return ['ffmpeg', '-i', str(source_path), *codec_args, '-y', str(output_path)]
+    
+    def _ffmpeg_metadata_command(self, media_path: Path, temp_path: Path, timestamp: str) -> List[str]:
+        """生成只改写creation_time、不重新编码的ffmpeg命令"""
+        return [
+            'ffmpeg',
+            '-i', str(media_path),
+            '-c', 'copy',
+            '-metadata', f'creation_time={timestamp}',
+            '-y',
+            str(temp_path),
+        ]
+    
     def convert_avi_to_mp4(self, avi_path: Path, mp4_path: Path) -> bool:
         """
         使用ffmpeg将AVI转换为MP4
@@ -855,24 +1649,11 @@ class MediaProcessor:
             return False
         
         try:
-            # 使用ffmpeg转换视频，保持质量
-            # 使用 -q:v 1 保持高质量，或者使用特定的码率
-            cmd = [
-                'ffmpeg',
-                '-i', str(avi_path),
-                '-c:v', 'libx264',
-                '-preset', 'medium',
-                '-crf', '18',  # 质量参数，18很高，0是无损
-                '-c:a', 'aac',
-                '-q:a', '9',
-                '-y',  # 覆盖输出文件
-                str(mp4_path)
-            ]
+            # 使用ffmpeg转换为MP4，保持质量（参数见FFMPEG_PROFILES）
+            cmd = self._ffmpeg_command(PROFILE_MP4, avi_path, mp4_path)
             
             logger.info(f"  转换中: {avi_path.name} -> {mp4_path.name}")
-            subprocess.run(cmd, check=True, 
-                         capture_output=True,
-                         timeout=3600)  # 1小时超时
+            self.cancel_token.run(cmd, timeout=3600)  # 1小时超时
             
             return mp4_path.exists()
         except subprocess.TimeoutExpired:
@@ -903,23 +1684,11 @@ class MediaProcessor:
             return False
         
         try:
-            # 使用ffmpeg转换3GP为MP4，保持质量
-            cmd = [
-                'ffmpeg',
-                '-i', str(threeGp_path),
-                '-c:v', 'libx264',
-                '-preset', 'medium',
-                '-crf', '18',  # 质量参数，18很高，0是无损
-                '-c:a', 'aac',
-                '-q:a', '9',
-                '-y',  # 覆盖输出文件
-                str(mp4_path)
-            ]
+            # 使用ffmpeg转换为MP4，保持质量（参数见FFMPEG_PROFILES）
+            cmd = self._ffmpeg_command(PROFILE_MP4, threeGp_path, mp4_path)
             
             logger.info(f"  转换中: {threeGp_path.name} -> {mp4_path.name}")
-            subprocess.run(cmd, check=True, 
-                         capture_output=True,
-                         timeout=3600)  # 1小时超时
+            self.cancel_token.run(cmd, timeout=3600)  # 1小时超时
             
             return mp4_path.exists()
         except subprocess.TimeoutExpired:
@@ -950,23 +1719,11 @@ class MediaProcessor:
             return False
         
         try:
-            # 使用ffmpeg转换VOB为MP4，保持质量
-            cmd = [
-                'ffmpeg',
-                '-i', str(vob_path),
-                '-c:v', 'libx264',
-                '-preset', 'medium',
-                '-crf', '18',  # 质量参数，18很高，0是无损
-                '-c:a', 'aac',
-                '-q:a', '9',
-                '-y',  # 覆盖输出文件
-                str(mp4_path)
-            ]
+            # 使用ffmpeg转换为MP4，保持质量（参数见FFMPEG_PROFILES）
+            cmd = self._ffmpeg_command(PROFILE_MP4, vob_path, mp4_path)
             
             logger.info(f"  转换中: {vob_path.name} -> {mp4_path.name}")
-            subprocess.run(cmd, check=True, 
-                         capture_output=True,
-                         timeout=3600)  # 1小时超时
+            self.cancel_token.run(cmd, timeout=3600)  # 1小时超时
             
             return mp4_path.exists()
         except subprocess.TimeoutExpired:
@@ -997,23 +1754,11 @@ class MediaProcessor:
             return False
         
         try:
-            # 使用ffmpeg转换MOV为MP4，保持质量
-            cmd = [
-                'ffmpeg',
-                '-i', str(mov_path),
-                '-c:v', 'libx264',
-                '-preset', 'medium',
-                '-crf', '18',  # 质量参数，18很高，0是无损
-                '-c:a', 'aac',
-                '-q:a', '9',
-                '-y',  # 覆盖输出文件
-                str(mp4_path)
-            ]
+            # 使用ffmpeg转换为MP4，保持质量（参数见FFMPEG_PROFILES）
+            cmd = self._ffmpeg_command(PROFILE_MP4, mov_path, mp4_path)
             
             logger.info(f"  转换中: {mov_path.name} -> {mp4_path.name}")
-            subprocess.run(cmd, check=True, 
-                         capture_output=True,
-                         timeout=3600)  # 1小时超时
+            self.cancel_token.run(cmd, timeout=3600)  # 1小时超时
             
             return mp4_path.exists()
         except subprocess.TimeoutExpired:
@@ -1044,23 +1789,11 @@ class MediaProcessor:
             return False
         
         try:
-            # 使用ffmpeg转换MTS为MP4，保持质量
-            cmd = [
-                'ffmpeg',
-                '-i', str(mts_path),
-                '-c:v', 'libx264',
-                '-preset', 'medium',
-                '-crf', '18',  # 质量参数，18很高，0是无损
-                '-c:a', 'aac',
-                '-q:a', '9',
-                '-y',  # 覆盖输出文件
-                str(mp4_path)
-            ]
+            # 使用ffmpeg转换为MP4，保持质量（参数见FFMPEG_PROFILES）
+            cmd = self._ffmpeg_command(PROFILE_MP4, mts_path, mp4_path)
             
             logger.info(f"  转换中: {mts_path.name} -> {mp4_path.name}")
-            subprocess.run(cmd, check=True, 
-                         capture_output=True,
-                         timeout=3600)  # 1小时超时
+            self.cancel_token.run(cmd, timeout=3600)  # 1小时超时
             
             return mp4_path.exists()
         except subprocess.TimeoutExpired:
@@ -1091,23 +1824,11 @@ class MediaProcessor:
             return False
         
         try:
-            # 使用ffmpeg转换FLV为MP4，保持质量
-            cmd = [
-                'ffmpeg',
-                '-i', str(flv_path),
-                '-c:v', 'libx264',
-                '-preset', 'medium',
-                '-crf', '18',  # 质量参数，18很高，0是无损
-                '-c:a', 'aac',
-                '-q:a', '9',
-                '-y',  # 覆盖输出文件
-                str(mp4_path)
-            ]
+            # 使用ffmpeg转换为MP4，保持质量（参数见FFMPEG_PROFILES）
+            cmd = self._ffmpeg_command(PROFILE_MP4, flv_path, mp4_path)
             
             logger.info(f"  转换中: {flv_path.name} -> {mp4_path.name}")
-            subprocess.run(cmd, check=True, 
-                         capture_output=True,
-                         timeout=3600)  # 1小时超时
+            self.cancel_token.run(cmd, timeout=3600)  # 1小时超时
             
             return mp4_path.exists()
         except subprocess.TimeoutExpired:
@@ -1138,20 +1859,11 @@ class MediaProcessor:
             return False
         
         try:
-            # 使用ffmpeg转换AMR为MP3
-            cmd = [
-                'ffmpeg',
-                '-i', str(amr_path),
-                '-c:a', 'libmp3lame',
-                '-q:a', '4',  # MP3质量参数，4是高质量
-                '-y',  # 覆盖输出文件
-                str(mp3_path)
-            ]
+            # 使用ffmpeg转换AMR为MP3（参数见FFMPEG_PROFILES）
+            cmd = self._ffmpeg_command(PROFILE_MP3, amr_path, mp3_path)
             
             logger.info(f"  转换中: {amr_path.name} -> {mp3_path.name}")
-            subprocess.run(cmd, check=True, 
-                         capture_output=True,
-                         timeout=1800)  # 30分钟超时
+            self.cancel_token.run(cmd, timeout=1800)  # 30分钟超时
             
             return mp3_path.exists()
         except subprocess.TimeoutExpired:
@@ -1163,7 +1875,28 @@ class MediaProcessor:
     
     def set_mp4_metadata(self, mp4_path: Path, dt: datetime):
         """
-        使用ffmpeg设置MP4文件的创建时间元数据
+        设置MP4文件的创建时间元数据
+        
+        优先原地改写mvhd/tkhd/mdhd中的时间字段（只需几KB读写），
+        文件结构不支持原地改写时回退到ffmpeg重新封装
+        
+        Args:
+            mp4_path: MP4文件路径
+            dt: datetime对象
+        """
+        try:
+            patched = patch_mp4_times(mp4_path, dt)
+            if patched:
+                logger.debug(f"MP4元数据已原地更新: {mp4_path.name}（{patched}个时间原子）")
+                return
+        except Exception as e:
+            logger.debug(f"原地更新MP4元数据失败，改用ffmpeg: {e}")
+        
+        self._set_mp4_metadata_ffmpeg(mp4_path, dt)
+    
+    def _set_mp4_metadata_ffmpeg(self, mp4_path: Path, dt: datetime):
+        """
+        使用ffmpeg重新封装MP4文件来设置创建时间元数据
         
         Args:
             mp4_path: MP4文件路径
@@ -1177,27 +1910,42 @@ class MediaProcessor:
             # 格式化时间戳为ISO 8601格式
             timestamp = dt.isoformat()
             
-            cmd = [
-                'ffmpeg',
-                '-i', str(mp4_path),
-                '-c', 'copy',
-                '-metadata', f'creation_time={timestamp}',
-                '-y',
-                str(temp_mp4)
-            ]
-            
-            subprocess.run(cmd, check=True,
-                         capture_output=True,
-                         timeout=600)
+            cmd = self._ffmpeg_metadata_command(mp4_path, temp_mp4, timestamp)
             
-            # 用临时文件替换原文件
-            shutil.move(str(temp_mp4), str(mp4_path))
+            with self._tracked_temp(temp_mp4):
+                self.cancel_token.run(cmd, timeout=600)
+                # 用临时文件替换原文件
+                shutil.move(str(temp_mp4), str(mp4_path))
             logger.debug(f"MP4元数据已更新: {mp4_path.name}")
         except Exception as e:
             logger.warning(f"设置MP4元数据失败: {e}")
+            temp_mp4.unlink(missing_ok=True)
             # 不中断处理流程
     
     def set_mp3_metadata(self, mp3_path: Path, dt: datetime):
+        """
+        设置MP3文件的录音时间元数据
+        
+        优先写入ID3v2.4的TDRC/TDOR帧（填充足够时只改写标签区域），
+        遇到不支持的标签时回退到ffmpeg重新封装
+        
+        Args:
+            mp3_path: MP3文件路径
+            dt: datetime对象
+        """
+        try:
+            temp_path = id3_temp_path(mp3_path)
+            with self._tracked_temp(temp_path):
+                written = write_id3_date(mp3_path, dt, temp_path=temp_path)
+            if written:
+                logger.debug(f"MP3 ID3日期已更新: {mp3_path.name}")
+                return
+        except Exception as e:
+            logger.debug(f"写入ID3日期失败，改用ffmpeg: {e}")
+        
+        self._set_mp3_metadata_ffmpeg(mp3_path, dt)
+    
+    def _set_mp3_metadata_ffmpeg(self, mp3_path: Path, dt: datetime):
         """
         使用ffmpeg设置MP3文件的创建时间元数据
         
@@ -1212,24 +1960,16 @@ class MediaProcessor:
             # 格式化时间戳为ISO 8601格式
             timestamp = dt.isoformat()
             
-            cmd = [
-                'ffmpeg',
-                '-i', str(mp3_path),
-                '-c', 'copy',
-                '-metadata', f'creation_time={timestamp}',
-                '-y',
-                str(temp_mp3)
-            ]
-            
-            subprocess.run(cmd, check=True,
-                         capture_output=True,
-                         timeout=600)
+            cmd = self._ffmpeg_metadata_command(mp3_path, temp_mp3, timestamp)
             
-            # 用临时文件替换原文件
-            shutil.move(str(temp_mp3), str(mp3_path))
+            with self._tracked_temp(temp_mp3):
+                self.cancel_token.run(cmd, timeout=600)
+                # 用临时文件替换原文件
+                shutil.move(str(temp_mp3), str(mp3_path))
             logger.debug(f"MP3元数据已更新: {mp3_path.name}")
         except Exception as e:
             logger.warning(f"设置MP3元数据失败: {e}")
+            temp_mp3.unlink(missing_ok=True)
             # 不中断处理流程
     
     def get_directory_date(self) -> Optional[datetime]:
@@ -1239,7 +1979,7 @@ class MediaProcessor:
         Returns:
             datetime对象或None
         """
-        match = re.search(r'(\d{8})', self.source_dir.name)
+        match = DIR_DATE_PATTERN.search(self.source_dir.name)
         if match:
             try:
                 return datetime.strptime(match.group(1), '%Y%m%d')
@@ -1248,24 +1988,398 @@ class MediaProcessor:
         return None
 
 
+def shard_key(dir_path) -> str:
+    """目录的分片键：目录名（不含上级路径，不同机器挂载点不同时结果一致）"""
+    return Path(dir_path).resolve().name
+
+
+def parse_jobs(text: str):
+    """--jobs参数：正整数或auto"""
+    if text == JOBS_AUTO:
+        return JOBS_AUTO
+    return int(text)
+
+
+def parse_args() -> argparse.Namespace:
+    """解析命令行参数"""
+    parser = argparse.ArgumentParser(
+        description="处理照片和视频：推断拍摄时间、写入元数据、转码为MP4/MP3",
+        epilog=(
+            "示例:\n"
+            "  python main.py ./20070922_mcm\n"
+            "  python main.py ./20070922_mcm ./20070923_mcm\n"
+            "  python main.py ./20070922_mcm --plan plan.json\n"
+            "  python main.py --execute-plan plan.json --jobs 4\n"
+            "  python main.py ./2007* --dir-jobs 8 --jobs 4   （同时处理8个目录，总共最多4个转码任务）\n"
+            "  python main.py /nas/photos/* --queue /nas/photos/queue.db   （多台机器共同处理）\n"
+            "  python main.py /nas/photos/* --shard 2/4   （4台机器各处理一部分目录，无需协调）\n"
+            "  python main.py --watch ~/inbox   （持续处理收件目录中新写完的文件）\n"
+            "  python main.py shift ./20070922_mcm --offset +1h   （整目录时间平移，见 main.py shift -h）"
+        ),
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+    )
+    parser.add_argument("directories", nargs="*", metavar="目录路径", help="待处理目录")
+    parser.add_argument(
+        "--exiftool-session",
+        action="store_true",
+        help="使用常驻exiftool进程读写EXIF（原地修改，不重新编码图片）",
+    )
+    parser.add_argument(
+        "--patterns",
+        metavar="文件",
+        action="append",
+        default=[],
+        help="额外的文件名时间格式配置文件（INI格式，可多次指定；默认已加载filename_patterns.ini）",
+    )
+    parser.add_argument(
+        "--jobs",
+        type=parse_jobs,
+        default=1,
+        metavar="N|auto",
+        help="并行任务数（默认1）；auto表示按实测吞吐量自动调整，并为本机保存选定的值",
+    )
+    parser.add_argument(
+        "--dir-jobs",
+        type=int,
+        default=DEFAULT_DIR_JOBS,
+        metavar="N",
+        help=f"同时处理的目录数（默认{DEFAULT_DIR_JOBS}）；转码和图片任务的总数仍受--jobs限制",
+    )
+    parser.add_argument(
+        "--min-jobs",
+        type=int,
+        default=1,
+        metavar="N",
+        help="--jobs auto的并行数下限（默认1）",
+    )
+    parser.add_argument(
+        "--max-jobs",
+        type=int,
+        metavar="N",
+        help="--jobs auto的并行数上限（默认为CPU核数）",
+    )
+    mode = parser.add_mutually_exclusive_group()
+    mode.add_argument(
+        "--plan",
+        metavar="文件",
+        help="只生成处理计划并写入JSON文件（\"-\"表示标准输出），不修改任何文件",
+    )
+    mode.add_argument(
+        "--execute-plan",
+        metavar="文件",
+        help="执行之前用--plan生成的计划",
+    )
+    parser.add_argument(
+        "--queue",
+        metavar="数据库",
+        help="共享工作队列（放在所有机器都能访问的目录）：把目录加入队列，"
+             "然后领取队列中的目录逐个处理，工作进程退出后其他机器会接手未完成的目录",
+    )
+    parser.add_argument(
+        "--lease",
+        type=float,
+        default=DEFAULT_LEASE_SECONDS,
+        metavar="秒",
+        help=f"工作队列租约时长，超过这个时间未续约的目录会被其他工作进程接手（默认{DEFAULT_LEASE_SECONDS}）",
+    )
+    parser.add_argument(
+        "--shard",
+        type=parse_shard,
+        metavar="I/N",
+        help="只处理按目录名哈希落在第I个分片（共N个）的目录，同一目录的文件总在同一分片",
+    )
+    parser.add_argument(
+        "--watch",
+        metavar="目录",
+        help="先处理目录中已有的文件，然后持续监视，新文件写完后立即处理（Ctrl+C停止）",
+    )
+    parser.add_argument(
+        "--settle",
+        type=float,
+        default=DEFAULT_SETTLE_SECONDS,
+        metavar="秒",
+        help=f"--watch中文件大小和修改时间不变多少秒后算写完（默认{DEFAULT_SETTLE_SECONDS:g}）",
+    )
+    parser.add_argument(
+        "--poll",
+        action="store_true",
+        help="--watch定期列出目录而不使用inotify（目录位于网络文件系统时使用）",
+    )
+    parser.add_argument(
+        "--journal",
+        action="store_true",
+        help="使用处理日志（记录每个文件的处理进度，再次运行时跳过已完成的文件、从中断处继续，"
+             "跳过没有变化的目录）；--watch总是使用",
+    )
+    parser.add_argument(
+        "--journal-db",
+        default=str(DEFAULT_JOURNAL_PATH),
+        metavar="数据库",
+        help=f"处理日志的位置（应放在本机磁盘，默认{DEFAULT_JOURNAL_PATH}）",
+    )
+    parser.add_argument(
+        "--full-scan",
+        action="store_true",
+        help="使用处理日志时逐个检查所有文件（默认跳过上次处理完成后没有增加、删除或改名文件的目录，"
+             "原地修改过文件内容时使用）",
+    )
+    parser.add_argument(
+        "--grace",
+        type=float,
+        default=DEFAULT_GRACE_SECONDS,
+        metavar="秒",
+        help=f"收到Ctrl+C/SIGTERM后等待进行中的任务完成的时间，超过后终止并回滚（默认{DEFAULT_GRACE_SECONDS:.0f}）",
+    )
+    parser.add_argument(
+        "--max-load",
+        type=float,
+        metavar="负载",
+        help="1分钟平均负载达到该值时暂缓启动新的转码/图片任务（默认为CPU核数）",
+    )
+    parser.add_argument(
+        "--reserve-mem",
+        type=int,
+        default=DEFAULT_RESERVE_MB,
+        metavar="MB",
+        help=f"启动新任务后至少保留的可用内存（默认{DEFAULT_RESERVE_MB}MB）",
+    )
+    parser.add_argument(
+        "--nice",
+        type=int,
+        default=0,
+        metavar="N",
+        help="降低CPU优先级（nice值增加N），与其他服务共用主机时使用",
+    )
+    parser.add_argument(
+        "--ionice",
+        choices=sorted(IONICE_CLASSES),
+        help="I/O调度类别（idle：磁盘空闲时才读写）",
+    )
+    args = parser.parse_args()
+    if not args.directories and not args.execute_plan and not args.queue and not args.watch:
+        parser.error("需要指定待处理目录")
+    if args.watch and (args.directories or args.plan or args.execute_plan or args.queue):
+        parser.error("--watch不能与其他目录、--plan/--execute-plan或--queue同时使用")
+    if args.settle < 0:
+        parser.error("--settle不能为负数")
+    if args.queue and (args.plan or args.execute_plan):
+        parser.error("--queue不能与--plan/--execute-plan同时使用")
+    if args.jobs != JOBS_AUTO and args.jobs < 1:
+        parser.error("--jobs必须大于0")
+    if args.dir_jobs < 1:
+        parser.error("--dir-jobs必须大于0")
+    if args.min_jobs < 1 or (args.max_jobs is not None and args.max_jobs < args.min_jobs):
+        parser.error("--min-jobs必须大于0且不大于--max-jobs")
+    if args.lease <= 0:
+        parser.error("--lease必须大于0")
+    if args.max_load is not None and args.max_load <= 0:
+        parser.error("--max-load必须大于0")
+    if args.nice < 0:
+        parser.error("--nice不能为负数")
+    return args
+
+
+def parse_shift_args(argv) -> argparse.Namespace:
+    """解析shift子命令参数"""
+    parser = argparse.ArgumentParser(
+        prog="main.py shift",
+        description="把目录中所有照片和视频的时间平移一个固定偏移（原地改写EXIF与MP4时间字段）",
+        epilog=(
+            "示例:\n"
+            "  python main.py shift ./20070922_mcm --offset +1h\n"
+            "  python main.py shift ./20070922_mcm --offset=-1d2h30m --jobs 4\n"
+            "  python main.py shift --undo archive2/20070922_mcm/shift_undo_20240101_120000.jsonl"
+        ),
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+    )
+    parser.add_argument("directories", nargs="*", metavar="目录路径", help="待平移目录")
+    parser.add_argument(
+        "--offset",
+        type=parse_offset,
+        metavar="偏移",
+        help="时间偏移，如 +1h、+1d2h、+01:30:15；负偏移写成 --offset=-30m",
+    )
+    parser.add_argument(
+        "--undo-file",
+        metavar="文件",
+        help="撤销记录路径（仅一个目录时可用；默认 archive2/<目录名>/shift_undo_<时间>.jsonl）",
+    )
+    parser.add_argument("--undo", metavar="文件", help="按撤销记录恢复平移前的时间")
+    parser.add_argument("--jobs", type=int, default=4, metavar="N", help="并行线程数（默认4）")
+    args = parser.parse_args(argv)
+    if args.undo:
+        if args.directories or args.offset:
+            parser.error("--undo不能与目录或--offset同时使用")
+    elif not args.directories or args.offset is None:
+        parser.error("需要指定目录和--offset")
+    if args.undo_file and len(args.directories) > 1:
+        parser.error("--undo-file只能用于单个目录")
+    return args
+
+
+def shift_main(argv) -> int:
+    """shift子命令：整目录时间平移或撤销"""
+    args = parse_shift_args(argv)
+    
+    if args.undo:
+        stats = undo_shift(args.undo, args.jobs)
+        logger.info(f"恢复完成: {stats}")
+        return 1 if stats['failed'] else 0
+    
+    failed = 0
+    for dir_path in args.directories:
+        undo_path = args.undo_file or default_undo_path(dir_path)
+        stats = shift_directory(dir_path, args.offset, undo_path, args.jobs)
+        logger.info(f"平移完成 {dir_path}: {stats}")
+        failed += stats['failed']
+    return 1 if failed else 0
+
+
 def main():
     """主函数"""
-    if len(sys.argv) < 2:
-        print("用法: python main.py <目录路径> [目录路径2] ...")
-        print("\n示例:")
-        print("  python main.py ./20070922_mcm")
-        print("  python main.py ./20070922_mcm ./20070923_mcm")
-        sys.exit(1)
-    
-    for dir_path in sys.argv[1:]:
+    if len(sys.argv) > 1 and sys.argv[1] == 'shift':
+        sys.exit(shift_main(sys.argv[2:]))
+    
+    args = parse_args()
+    
+    for patterns_file in args.patterns:
+        count = default_registry().load_config(patterns_file)
+        logger.info(f"已加载 {count} 个文件名时间格式: {patterns_file}")
+    
+    if args.shard:
+        total = len(args.directories)
+        args.directories = select_shard(args.directories, args.shard, shard_key)
+        logger.info(f"分片 {args.shard[0]}/{args.shard[1]}: {len(args.directories)}/{total} 个目录")
+    
+    lower_priority(args.nice, args.ionice)
+    governor = ResourceGovernor(max_load=args.max_load, reserve_mb=args.reserve_mem)
+    cancel_token = CancelToken()
+    cancel_token.install(args.grace)
+    tuner = None
+    jobs = args.jobs
+    if jobs == JOBS_AUTO:
+        # 线程按上限准备，同时运行的任务数由tuner控制
+        tuner = AutoTuner(args.min_jobs, args.max_jobs)
+        jobs = tuner.max_jobs
+        if not args.plan:
+            tuner.start()
+    
+    journal = None
+    if (args.journal or args.watch) and not args.plan and not args.execute_plan:
+        # 监视模式靠处理日志识别自己产生的文件，总是使用
+        journal = Journal(args.journal_db)
+        logger.info(f"处理日志: {journal.db_path}（已有 {len(journal)} 个文件的记录，"
+                    f"其中已完成且未变化的文件将跳过）")
+    temp_journal = None
+    if journal is None and not args.plan:
+        # 没有处理日志时仍记录正在写入的临时文件，被强制终止后下次运行可以清理
+        temp_journal = Journal(DEFAULT_TEMP_JOURNAL_PATH)
+    
+    exiftool_pool = None
+    if args.exiftool_session:
         try:
-            processor = MediaProcessor(dir_path)
-            processor.process_all()
-        except Exception as e:
-            import traceback
-            logger.error(f"处理目录失败 {dir_path}: {e}")
-            logger.error(traceback.format_exc())
+            exiftool_pool = ExifToolPool()
+        except ExifToolError as e:
+            logger.warning(f"无法启用exiftool常驻会话: {e}")
+    
+    try:
+        if args.execute_plan:
+            with open(args.execute_plan, encoding='utf-8') as fp:
+                plans = load_plans(fp)
+            if args.shard:
+                plans = select_shard(plans, args.shard, lambda plan: shard_key(plan.source_dir))
+            failed = 0
+            for plan in plans:
+                processor = MediaProcessor(
+                    plan.source_dir, exiftool_pool=exiftool_pool, governor=governor, tuner=tuner,
+                    cancel_token=cancel_token, temp_journal=temp_journal,
+                )
+                failed += processor.execute(plan, jobs)
+            if cancel_token.cancelled:
+                sys.exit(cancel_token.exit_code)
+            if failed:
+                sys.exit(1)
+            return
+        
+        if args.plan:
+            plans = [
+                MediaProcessor(dir_path, exiftool_pool=exiftool_pool).plan(jobs)
+                for dir_path in args.directories
+            ]
+            if args.plan == '-':
+                dump_plans(plans, sys.stdout)
+            else:
+                with open(args.plan, 'w', encoding='utf-8') as fp:
+                    dump_plans(plans, fp)
+                logger.info(f"处理计划已写入: {args.plan}")
+            return
+        
+        if args.watch:
+            processor = MediaProcessor(
+                args.watch, exiftool_pool=exiftool_pool, governor=governor, tuner=tuner,
+                cancel_token=cancel_token, journal=journal,
+            )
+            # 收到停止信号是监视模式的正常结束方式，未完成的文件已记录在处理日志中
+            processor.watch(jobs, settle=args.settle, use_inotify=not args.poll)
+            return
+        
+        if args.queue:
+            queue = WorkQueue(args.queue, lease_seconds=args.lease)
+            added = queue.add(args.directories)
+            if added:
+                logger.info(f"已加入工作队列: {added} 个目录")
+            def process_task(dir_path, task_token):
+                # task_token在收到停止信号或租约失效（目录已被其他工作进程接手）时取消
+                processor = MediaProcessor(
+                    dir_path, exiftool_pool=exiftool_pool, governor=governor, tuner=tuner,
+                    cancel_token=task_token, journal=journal, temp_journal=temp_journal,
+                )
+                summary = processor.process_all(jobs, full_scan=args.full_scan)
+                if processor.interrupted:
+                    # 放弃租约，由下一个工作进程接手（同一台机器上的工作进程可以从处理日志继续）
+                    raise Cancelled()
+                failed = sum(stage['failed'] for stage in summary.values())
+                if failed:
+                    # 任务记为失败（不记为完成），再次加入队列时重新处理
+                    raise RuntimeError(f"{failed} 个文件处理失败")
+            
+            stats = run_worker(queue, process_task, should_stop=lambda: cancel_token.cancelled,
+                               cancel_token=cancel_token)
+            if cancel_token.cancelled:
+                sys.exit(cancel_token.exit_code)
+            if stats['failed']:
+                sys.exit(1)
+            return
+        
+        # 各目录共用一个并发上限，同时处理多个目录时转码和图片任务总数仍为jobs
+        job_limit = tuner.limit if tuner is not None else ConcurrencyLimit(jobs)
+        def process_directory(dir_path):
+            processor = MediaProcessor(
+                dir_path, exiftool_pool=exiftool_pool, governor=governor, tuner=tuner,
+                cancel_token=cancel_token, journal=journal, job_limit=job_limit,
+                temp_journal=temp_journal,
+            )
+            summary = processor.process_all(jobs, full_scan=args.full_scan)
+            if processor.interrupted:
+                raise Cancelled()
+            return sum(stage['failed'] for stage in summary.values())
+        
+        results = run_directories(args.directories, process_directory, workers=args.dir_jobs,
+                                  should_stop=lambda: cancel_token.cancelled)
+        summarize(results)
+        if cancel_token.cancelled:
+            sys.exit(cancel_token.exit_code)
+        if not all(result.ok for result in results):
             sys.exit(1)
+    finally:
+        if tuner is not None and not args.plan:
+            tuner.stop()
+        if exiftool_pool is not None:
+            exiftool_pool.close()
+        if journal is not None:
+            journal.close()
+        if temp_journal is not None:
+            temp_journal.close()
 
 
 if __name__ == '__main__':
@@ -0,0 +1,472 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+ISOBMFF（MP4/MOV/3GP/M4V）原子遍历工具
+
+功能：
+1. 按原子头逐级遍历文件结构，跳过mdat等大原子，不读取媒体数据
+2. 原地改写 moov/mvhd、trak/tkhd、trak/mdia/mdhd 的创建/修改时间
+   - 支持version 0（32位）与version 1（64位）时间字段
+   - 支持moov位于文件末尾的文件
+   - 仅改写几十个字节，不再需要ffmpeg重新封装整个文件
+   - 也可以把原有时间整体平移（记录原值以便撤销）
+3. 不启动ffprobe，直接读取创建时间：
+   - moov/mvhd 创建时间
+   - QuickTime keys/ilst 中的 com.apple.quicktime.creationdate
+   - udta/©day（QuickTime与iTunes两种写法）
+4. 读取mvhd中的时长（用于统计转码吞吐量）
+"""
+
+import os
+import struct
+import logging
+from datetime import datetime, timezone
+from typing import Callable, Iterator, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+# MP4时间以1904-01-01 00:00:00 UTC为起点
+MP4_EPOCH = datetime(1904, 1, 1, tzinfo=timezone.utc)
+MP4_EPOCH_OFFSET = int((datetime(1970, 1, 1, tzinfo=timezone.utc) - MP4_EPOCH).total_seconds())
+
+# 需要改写时间的原子（均为FullBox，时间字段紧跟version/flags）
+TIME_BOXES = {b'mvhd', b'tkhd', b'mdhd'}
+# 需要深入遍历的容器原子
+TIME_CONTAINERS = {b'moov', b'trak', b'mdia'}
+
+# 日期元数据原子与QuickTime键名
+DAY_ATOM = b'\xa9day'
+APPLE_CREATIONDATE_KEY = b'com.apple.quicktime.creationdate'
+
+
+class Atom:
+    """单个原子的位置信息"""
+
+    __slots__ = ('type', 'offset', 'header_size', 'size')
+
+    def __init__(self, atom_type: bytes, offset: int, header_size: int, size: int):
+        self.type = atom_type
+        self.offset = offset
+        self.header_size = header_size
+        self.size = size
+
+    @property
+    def payload_offset(self) -> int:
+        return self.offset + self.header_size
+
+    @property
+    def end(self) -> int:
+        return self.offset + self.size
+
+    def __repr__(self) -> str:
+        return f"Atom({self.type!r}, offset={self.offset}, size={self.size})"
+
+
+def iter_atoms(f, start: int, end: int) -> Iterator[Atom]:
+    """
+    遍历[start, end)范围内的同级原子，只读取原子头
+
+    Args:
+        f: 以二进制模式打开的文件对象
+        start: 起始偏移
+        end: 结束偏移
+
+    Yields:
+        Atom对象
+    """
+    offset = start
+    while offset + 8 <= end:
+        f.seek(offset)
+        header = f.read(8)
+        if len(header) < 8:
+            return
+        size, atom_type = struct.unpack('>I4s', header)
+        header_size = 8
+        if size == 1:
+            # 64位扩展大小
+            large = f.read(8)
+            if len(large) < 8:
+                return
+            size = struct.unpack('>Q', large)[0]
+            header_size = 16
+        elif size == 0:
+            # 原子延伸到父容器（或文件）末尾
+            size = end - offset
+        if size < header_size or offset + size > end:
+            logger.debug(f"原子大小异常: {atom_type!r} @ {offset}")
+            return
+        yield Atom(atom_type, offset, header_size, size)
+        offset += size
+
+
+def find_atom(f, start: int, end: int, atom_type: bytes) -> Optional[Atom]:
+    """在[start, end)范围内查找第一个指定类型的同级原子"""
+    for atom in iter_atoms(f, start, end):
+        if atom.type == atom_type:
+            return atom
+    return None
+
+
+def file_size(f) -> int:
+    """获取文件大小"""
+    return os.fstat(f.fileno()).st_size
+
+
+def find_time_boxes(f) -> List[Atom]:
+    """
+    查找moov下所有带创建时间的原子（mvhd、tkhd、mdhd）
+
+    Args:
+        f: 以二进制模式打开的文件对象
+
+    Returns:
+        原子列表，未找到moov时为空列表
+    """
+    moov = find_atom(f, 0, file_size(f), b'moov')
+    if moov is None:
+        return []
+
+    boxes = []
+    pending = [moov]
+    while pending:
+        container = pending.pop()
+        for atom in iter_atoms(f, container.payload_offset, container.end):
+            if atom.type in TIME_BOXES:
+                boxes.append(atom)
+            elif atom.type in TIME_CONTAINERS:
+                pending.append(atom)
+    return boxes
+
+
+def datetime_to_mp4_time(dt: datetime) -> int:
+    """
+    将datetime转换为MP4时间（自1904年起的秒数）
+
+    不带时区的datetime按本地时间处理，与ffmpeg解析creation_time的行为一致
+    """
+    return int(dt.timestamp()) + MP4_EPOCH_OFFSET
+
+
+def mp4_time_to_datetime(value: int) -> Optional[datetime]:
+    """将MP4时间转换为UTC datetime，0或越界值返回None"""
+    if value <= 0:
+        return None
+    try:
+        return datetime.fromtimestamp(value - MP4_EPOCH_OFFSET, tz=timezone.utc)
+    except (OverflowError, OSError, ValueError):
+        return None
+
+
+def read_box_times(f, atom: Atom) -> Optional[Tuple[int, int, int]]:
+    """
+    读取时间原子的version、创建时间和修改时间
+
+    Returns:
+        (version, creation_time, modification_time) 或 None
+    """
+    f.seek(atom.payload_offset)
+    version_flags = f.read(4)
+    if len(version_flags) < 4:
+        return None
+    version = version_flags[0]
+    if version == 1:
+        data = f.read(16)
+        if len(data) < 16:
+            return None
+        creation, modification = struct.unpack('>QQ', data)
+    elif version == 0:
+        data = f.read(8)
+        if len(data) < 8:
+            return None
+        creation, modification = struct.unpack('>II', data)
+    else:
+        return None
+    return version, creation, modification
+
+
+def patch_mp4_times(mp4_path, dt: datetime) -> int:
+    """
+    原地改写MP4/MOV文件中mvhd、tkhd、mdhd的创建时间与修改时间
+
+    只读取原子头和时间字段所在的几十个字节，使用pwrite原地写入，
+    不读取mdat，文件大小与其余内容保持不变。
+
+    Args:
+        mp4_path: MP4文件路径
+        dt: 要写入的datetime对象
+
+    Returns:
+        成功改写的原子数量；文件不是ISOBMFF、moov被压缩（cmov）
+        或时间超出32位字段范围时返回0，且不修改文件
+    """
+    mp4_time = datetime_to_mp4_time(dt)
+    if mp4_time < 0:
+        return 0
+
+    with open(mp4_path, 'r+b') as f:
+        boxes = find_time_boxes(f)
+        patches = []
+        for atom in boxes:
+            times = read_box_times(f, atom)
+            if times is None:
+                return 0
+            version = times[0]
+            if version == 1:
+                patches.append((atom.payload_offset + 4, struct.pack('>QQ', mp4_time, mp4_time)))
+            elif mp4_time <= 0xFFFFFFFF:
+                patches.append((atom.payload_offset + 4, struct.pack('>II', mp4_time, mp4_time)))
+            else:
+                logger.debug(f"时间超出32位范围，无法原地写入: {atom!r}")
+                return 0
+
+        # 所有原子都校验通过后再统一写入，避免部分改写
+        _write_patches(f, patches)
+
+    return len(patches)
+
+
+def _write_patches(f, patches: List[Tuple[int, bytes]]):
+    """按(偏移, 数据)原地写入并同步到磁盘"""
+    fd = f.fileno()
+    for offset, data in patches:
+        if hasattr(os, 'pwrite'):
+            os.pwrite(fd, data, offset)
+        else:
+            f.seek(offset)
+            f.write(data)
+    if patches:
+        f.flush()
+        os.fsync(fd)
+
+
+def _pack_times(version: int, creation: int, modification: int) -> Optional[bytes]:
+    """按原子version打包时间字段，超出字段范围时返回None"""
+    if version == 1:
+        limit, fmt = 0xFFFFFFFFFFFFFFFF, '>QQ'
+    else:
+        limit, fmt = 0xFFFFFFFF, '>II'
+    if not (0 <= creation <= limit and 0 <= modification <= limit):
+        return None
+    return struct.pack(fmt, creation, modification)
+
+
+def shift_mp4_times(mp4_path, seconds: int,
+                    before_write: Optional[Callable[[List[Tuple[int, int, int, int]]], None]] = None,
+                    ) -> Optional[List[Tuple[int, int, int, int]]]:
+    """
+    把mvhd、tkhd、mdhd的创建/修改时间原地平移seconds秒
+
+    为0的时间表示未设置，保持不变
+
+    Args:
+        mp4_path: MP4文件路径
+        seconds: 偏移秒数（可为负数）
+        before_write: 改写文件之前用原时间记录调用（先写好撤销记录）
+
+    Returns:
+        [(时间字段偏移, version, 原创建时间, 原修改时间)]，供撤销使用；
+        文件结构不支持原地改写时返回None，且不修改文件
+    """
+    with open(mp4_path, 'r+b') as f:
+        records = []
+        patches = []
+        for atom in find_time_boxes(f):
+            times = read_box_times(f, atom)
+            if times is None:
+                return None
+            version, creation, modification = times
+            data = _pack_times(
+                version,
+                creation + seconds if creation else 0,
+                modification + seconds if modification else 0,
+            )
+            if data is None:
+                logger.debug(f"平移后的时间超出字段范围: {atom!r}")
+                return None
+            records.append((atom.payload_offset + 4, version, creation, modification))
+            patches.append((atom.payload_offset + 4, data))
+
+        if patches and before_write is not None:
+            before_write(records)
+        _write_patches(f, patches)
+    return records
+
+
+def restore_mp4_times(mp4_path, records: List[Tuple[int, int, int, int]]) -> int:
+    """
+    把shift_mp4_times记录的原时间写回
+
+    只改写version与记录一致的位置，防止文件已被替换时写坏数据
+
+    Returns:
+        恢复的原子数量
+    """
+    with open(mp4_path, 'r+b') as f:
+        patches = []
+        for offset, version, creation, modification in records:
+            f.seek(offset - 4)
+            if f.read(1) != bytes([version]):
+                logger.warning(f"{os.path.basename(mp4_path)} 偏移{offset}处的原子已变化，跳过")
+                continue
+            data = _pack_times(version, creation, modification)
+            if data is not None:
+                patches.append((offset, data))
+        _write_patches(f, patches)
+    return len(patches)
+
+
+def _meta_children_offset(f, meta: Atom) -> int:
+    """
+    获取meta原子子原子的起始偏移
+
+    ISO格式的meta是FullBox（带4字节version/flags），QuickTime格式则不带
+    """
+    f.seek(meta.payload_offset + 4)
+    if f.read(4) == b'hdlr':
+        return meta.payload_offset
+    return meta.payload_offset + 4
+
+
+def _read_data_atom_text(f, container: Atom) -> Optional[str]:
+    """读取ilst条目中data原子的文本值"""
+    data = find_atom(f, container.payload_offset, container.end, b'data')
+    if data is None or data.size < data.header_size + 8:
+        return None
+    f.seek(data.payload_offset + 8)  # 跳过类型标识和locale
+    return f.read(data.end - data.payload_offset - 8).decode('utf-8', 'ignore').strip('\x00 ')
+
+
+def _read_meta_texts(f, meta: Atom) -> Tuple[Optional[str], Optional[str]]:
+    """
+    从meta原子读取日期文本
+
+    Returns:
+        (com.apple.quicktime.creationdate, ©day)
+    """
+    start = _meta_children_offset(f, meta)
+    keys = []
+    ilst = None
+    for atom in iter_atoms(f, start, meta.end):
+        if atom.type == b'keys':
+            f.seek(atom.payload_offset + 4)
+            count = struct.unpack('>I', f.read(4))[0]
+            offset = atom.payload_offset + 8
+            for _ in range(count):
+                if offset + 8 > atom.end:
+                    break
+                f.seek(offset)
+                key_size = struct.unpack('>I', f.read(4))[0]
+                if key_size < 8:
+                    break
+                f.read(4)  # 命名空间（mdta）
+                keys.append(f.read(key_size - 8))
+                offset += key_size
+        elif atom.type == b'ilst':
+            ilst = atom
+
+    if ilst is None:
+        return None, None
+
+    creationdate = None
+    day = None
+    for item in iter_atoms(f, ilst.payload_offset, ilst.end):
+        if item.type == DAY_ATOM:
+            day = day or _read_data_atom_text(f, item)
+            continue
+        index = struct.unpack('>I', item.type)[0]
+        if 1 <= index <= len(keys) and keys[index - 1] == APPLE_CREATIONDATE_KEY:
+            creationdate = creationdate or _read_data_atom_text(f, item)
+    return creationdate, day
+
+
+def _read_udta_day(f, udta: Atom) -> Optional[str]:
+    """读取udta下QuickTime格式的©day文本（2字节长度 + 2字节语言码 + 文本）"""
+    day = find_atom(f, udta.payload_offset, udta.end, DAY_ATOM)
+    if day is None or day.size < day.header_size + 4:
+        return None
+    f.seek(day.payload_offset)
+    text_size = struct.unpack('>H', f.read(2))[0]
+    f.read(2)
+    text_size = min(text_size, day.end - day.payload_offset - 4)
+    return f.read(text_size).decode('utf-8', 'ignore').strip('\x00 ')
+
+
+def read_creation_texts(mp4_path) -> List[str]:
+    """
+    读取MP4/MOV/3GP/M4V文件中的创建时间文本，不启动ffprobe
+
+    只按原子头跳转读取moov内的少量数据，不读取mdat。
+    返回顺序与ffprobe标签的优先级一致：
+    mvhd创建时间、com.apple.quicktime.creationdate、©day
+
+    Args:
+        mp4_path: 文件路径
+
+    Returns:
+        时间文本列表（可能为空），调用方负责规范化
+    """
+    texts = []
+    with open(mp4_path, 'rb') as f:
+        moov = find_atom(f, 0, file_size(f), b'moov')
+        if moov is None:
+            return texts
+
+        mvhd = None
+        metas = []
+        udta = None
+        for atom in iter_atoms(f, moov.payload_offset, moov.end):
+            if atom.type == b'mvhd':
+                mvhd = atom
+            elif atom.type == b'meta':
+                metas.append(atom)
+            elif atom.type == b'udta':
+                udta = atom
+
+        if mvhd is not None:
+            times = read_box_times(f, mvhd)
+            created = mp4_time_to_datetime(times[1]) if times else None
+            if created:
+                texts.append(created.strftime('%Y-%m-%dT%H:%M:%SZ'))
+
+        day = None
+        if udta is not None:
+            day = _read_udta_day(f, udta)
+            udta_meta = find_atom(f, udta.payload_offset, udta.end, b'meta')
+            if udta_meta is not None:
+                metas.append(udta_meta)
+
+        creationdate = None
+        for meta in metas:
+            meta_creationdate, meta_day = _read_meta_texts(f, meta)
+            creationdate = creationdate or meta_creationdate
+            day = day or meta_day
+
+        texts.extend(text for text in (creationdate, day) if text)
+    return texts
+
+
+def read_mp4_duration(mp4_path) -> Optional[float]:
+    """
+    读取mvhd中的时长（秒），不启动ffprobe
+
+    Returns:
+        时长秒数；没有moov/mvhd或时间刻度为0时返回None
+    """
+    with open(mp4_path, 'rb') as f:
+        moov = find_atom(f, 0, file_size(f), b'moov')
+        if moov is None:
+            return None
+        mvhd = find_atom(f, moov.payload_offset, moov.end, b'mvhd')
+        if mvhd is None:
+            return None
+        f.seek(mvhd.payload_offset)
+        version_flags = f.read(4)
+        if version_flags[:1] == b'\x01':
+            data = f.read(28)
+            fields = struct.unpack('>QQIQ', data) if len(data) == 28 else None
+        else:
+            data = f.read(16)
+            fields = struct.unpack('>IIII', data) if len(data) == 16 else None
+    if not fields or fields[2] == 0:
+        return None
+    return fields[3] / fields[2]
@@ -0,0 +1,157 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+有界队列连接的多阶段流水线
+
+每个阶段有自己的工作线程数，阶段之间用有界队列连接：
+下游处理不过来时上游的put会阻塞（背压），内存中的待处理项数量有上限；
+不同阶段同时运行，读EXIF的磁盘I/O与ffmpeg转码可以重叠。
+
+阶段函数接收一项、返回交给下一阶段的项；返回None表示该项到此结束，
+抛出异常表示该项处理失败（记录日志后丢弃，不影响其他项）。
+"""
+
+import time
+import queue
+import logging
+import threading
+from typing import Any, Callable, Dict, Iterable, List, Optional
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_QUEUE_SIZE = 64
+
+# 队列结束标记
+_STOP = object()
+
+
+class Stage:
+    """流水线中的一个阶段"""
+
+    def __init__(self, name: str, func: Callable[[Any], Optional[Any]], workers: int = 1,
+                 maxsize: int = DEFAULT_QUEUE_SIZE):
+        """
+        Args:
+            name: 阶段名称（用于日志与统计）
+            func: 处理函数
+            workers: 工作线程数
+            maxsize: 输入队列容量
+        """
+        if workers < 1:
+            raise ValueError(f"阶段{name}的工作线程数必须大于0")
+        self.name = name
+        self.func = func
+        self.workers = workers
+        self.maxsize = maxsize
+
+
+class StageStats:
+    """单个阶段的统计"""
+
+    __slots__ = ('done', 'dropped', 'failed', 'busy')
+
+    def __init__(self):
+        self.done = 0
+        self.dropped = 0
+        self.failed = 0
+        self.busy = 0.0
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            'done': self.done,
+            'dropped': self.dropped,
+            'failed': self.failed,
+            'busy': round(self.busy, 3),
+        }
+
+
+class Pipeline:
+    """由多个Stage组成的流水线"""
+
+    def __init__(self, stages: List[Stage]):
+        if not stages:
+            raise ValueError("流水线至少需要一个阶段")
+        self.stages = stages
+        self.stats: Dict[str, StageStats] = {stage.name: StageStats() for stage in stages}
+        self.results: List[Any] = []
+        self._lock = threading.Lock()
+
+    def run(self, source: Iterable[Any]) -> List[Any]:
+        """
+        把source中的项依次送入流水线，等待全部处理完毕
+
+        Args:
+            source: 输入项（可以是生成器，在单独的线程中迭代）
+
+        Returns:
+            通过最后一个阶段的项
+        """
+        queues = [queue.Queue(maxsize=stage.maxsize) for stage in self.stages]
+        remaining = [stage.workers for stage in self.stages]
+        source_error: List[BaseException] = []
+
+        def feed():
+            try:
+                for item in source:
+                    queues[0].put(item)
+            except BaseException as e:
+                source_error.append(e)
+            finally:
+                for _ in range(self.stages[0].workers):
+                    queues[0].put(_STOP)
+
+        def work(index: int):
+            stage = self.stages[index]
+            stats = self.stats[stage.name]
+            inbox = queues[index]
+            outbox = queues[index + 1] if index + 1 < len(queues) else None
+            while True:
+                item = inbox.get()
+                if item is _STOP:
+                    break
+                started = time.perf_counter()
+                try:
+                    result = stage.func(item)
+                except Exception as e:
+                    logger.error(f"[{stage.name}] 处理失败 {item!r}: {e}")
+                    with self._lock:
+                        stats.failed += 1
+                        stats.busy += time.perf_counter() - started
+                    continue
+                with self._lock:
+                    stats.busy += time.perf_counter() - started
+                    if result is None:
+                        stats.dropped += 1
+                    else:
+                        stats.done += 1
+                        if outbox is None:
+                            self.results.append(result)
+                if result is not None and outbox is not None:
+                    outbox.put(result)
+
+            # 本阶段最后一个退出的线程通知下一阶段结束
+            with self._lock:
+                remaining[index] -= 1
+                last = remaining[index] == 0
+            if last and outbox is not None:
+                for _ in range(self.stages[index + 1].workers):
+                    outbox.put(_STOP)
+
+        threads = [threading.Thread(target=feed, name='pipeline-source', daemon=True)]
+        for index, stage in enumerate(self.stages):
+            for n in range(stage.workers):
+                threads.append(threading.Thread(
+                    target=work, args=(index,), name=f'pipeline-{stage.name}-{n}', daemon=True,
+                ))
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        if source_error:
+            raise source_error[0]
+        return self.results
+
+    def summary(self) -> Dict[str, Dict[str, Any]]:
+        """各阶段的完成数、提前结束数、失败数与累计处理时间"""
+        return {name: stats.to_dict() for name, stats in self.stats.items()}
@@ -0,0 +1,170 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+可序列化的处理计划
+
+处理分为两个阶段：
+- plan（只读）：在移动任何文件之前对目录建立快照，决定每个文件的时间及其来源、
+  转换方式和归档位置
+- execute：按计划执行移动、转码和写入元数据，各文件之间互不依赖，可以并行
+
+计划可以保存为JSON，检查或修改后再执行。
+"""
+
+import os
+import json
+from datetime import datetime
+from typing import Any, Dict, List, Optional
+
+PLAN_VERSION = 1
+
+# 文件类别
+KIND_IMAGE = 'image'
+KIND_VIDEO = 'video'
+KIND_MP4 = 'mp4'
+KIND_AUDIO = 'audio'
+
+# 执行动作
+ACTION_TAG_IMAGE = 'tag_image'          # 写入图片EXIF（时间已在EXIF中时不写）
+ACTION_CONVERT_VIDEO = 'convert_video'  # 归档原文件 → 转为MP4 → 写入MP4时间
+ACTION_TAG_MP4 = 'tag_mp4'              # 写入已有MP4的时间
+ACTION_CONVERT_AUDIO = 'convert_audio'  # 归档原文件 → 转为MP3 → 写入ID3时间
+ACTION_SKIP = 'skip'
+
+# 时间来源（文件名格式的来源直接使用格式名，如temp、ma、video、IMG_YYYYMMDD_HHMMSS）
+DATE_SOURCE_EXIF = 'exif'
+DATE_SOURCE_RIFF = 'riff'
+DATE_SOURCE_MDPM = 'mdpm'
+DATE_SOURCE_LAST_FILE = 'last_file'
+DATE_SOURCE_NEIGHBORS = 'neighbors'
+DATE_SOURCE_DIRECTORY = 'directory'
+
+# 转换方式
+PROFILE_MP4 = 'mp4'   # libx264 crf18 + aac
+PROFILE_MP3 = 'mp3'   # libmp3lame q4
+
+
+class PlanItem:
+    """计划中的一个文件"""
+
+    FIELDS = ('path', 'kind', 'action', 'date', 'date_source', 'write_date',
+              'profile', 'output', 'archive', 'size', 'mtime_ns', 'note')
+
+    def __init__(self, path: str, kind: str, action: str,
+                 date: Optional[datetime] = None, date_source: Optional[str] = None,
+                 write_date: bool = False, profile: Optional[str] = None,
+                 output: Optional[str] = None, archive: Optional[str] = None,
+                 size: Optional[int] = None, mtime_ns: Optional[int] = None,
+                 note: Optional[str] = None):
+        """
+        Args:
+            path: 源文件路径
+            kind: 文件类别（KIND_*）
+            action: 执行动作（ACTION_*）
+            date: 推断出的时间
+            date_source: 时间来源
+            write_date: 是否需要把时间写入文件
+            profile: 转换方式（PROFILE_*）
+            output: 转换输出路径
+            archive: 原文件归档路径
+            size, mtime_ns: 计划时的文件大小与修改时间，执行前用于检查文件是否变化
+            note: 说明（如跳过的原因）
+        """
+        self.path = path
+        self.kind = kind
+        self.action = action
+        self.date = date
+        self.date_source = date_source
+        self.write_date = write_date
+        self.profile = profile
+        self.output = output
+        self.archive = archive
+        self.size = size
+        self.mtime_ns = mtime_ns
+        self.note = note
+
+    def __repr__(self) -> str:
+        return f"PlanItem({os.path.basename(self.path)!r}, {self.action}, {self.date})"
+
+    def snapshot(self):
+        """记录源文件当前的大小与修改时间"""
+        stat = os.stat(self.path)
+        self.size = stat.st_size
+        self.mtime_ns = stat.st_mtime_ns
+
+    def changed(self) -> bool:
+        """源文件自计划以来是否已被删除或修改"""
+        try:
+            stat = os.stat(self.path)
+        except OSError:
+            return True
+        if self.size is None:
+            return False
+        return stat.st_size != self.size or stat.st_mtime_ns != self.mtime_ns
+
+    def to_dict(self) -> Dict[str, Any]:
+        data = {name: getattr(self, name) for name in self.FIELDS}
+        if self.date is not None:
+            data['date'] = self.date.isoformat()
+        return data
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> 'PlanItem':
+        values = {name: data.get(name) for name in cls.FIELDS}
+        if values['date']:
+            values['date'] = datetime.fromisoformat(values['date'])
+        values['write_date'] = bool(values['write_date'])
+        return cls(**values)
+
+
+class ProcessingPlan:
+    """一个目录的处理计划"""
+
+    def __init__(self, source_dir: str, archive_dir: str, items: Optional[List[PlanItem]] = None,
+                 created: Optional[datetime] = None):
+        self.source_dir = source_dir
+        self.archive_dir = archive_dir
+        self.items = items if items is not None else []
+        self.created = created or datetime.now().replace(microsecond=0)
+
+    def counts(self) -> Dict[str, int]:
+        """各动作的文件数"""
+        result: Dict[str, int] = {}
+        for item in self.items:
+            result[item.action] = result.get(item.action, 0) + 1
+        return result
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            'source_dir': self.source_dir,
+            'archive_dir': self.archive_dir,
+            'created': self.created.isoformat(),
+            'items': [item.to_dict() for item in self.items],
+        }
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> 'ProcessingPlan':
+        return cls(
+            data['source_dir'],
+            data['archive_dir'],
+            [PlanItem.from_dict(item) for item in data.get('items', [])],
+            datetime.fromisoformat(data['created']) if data.get('created') else None,
+        )
+
+
+def dump_plans(plans: List[ProcessingPlan], fp, indent: Optional[int] = 1):
+    """把多个目录的计划写成一个JSON文档"""
+    json.dump(
+        {'version': PLAN_VERSION, 'plans': [plan.to_dict() for plan in plans]},
+        fp, ensure_ascii=False, indent=indent,
+    )
+    fp.write('\n')
+
+
+def load_plans(fp) -> List[ProcessingPlan]:
+    """读取dump_plans写出的JSON文档"""
+    data = json.load(fp)
+    version = data.get('version')
+    if version != PLAN_VERSION:
+        raise ValueError(f"不支持的计划版本: {version}")
+    return [ProcessingPlan.from_dict(plan) for plan in data.get('plans', [])]
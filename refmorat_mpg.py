@@ -3,11 +3,20 @@ from __future__ import annotations
 
 import argparse
 import json
+import os
 import shutil
+import struct
 import subprocess
 import sys
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from datetime import datetime, timezone
 from pathlib import Path
+from typing import Callable
+
+from exiftool_session import ExifToolError, ExifToolPool
+from mp4_atoms import read_creation_texts
+from resource_governor import DEFAULT_RESERVE_MB, IONICE_CLASSES, ResourceGovernor, lower_priority
+from sharding import parse_shard, select_shard
 
 
 VIDEO_EXTENSIONS = {
@@ -31,8 +40,26 @@ VIDEO_EXTENSIONS = {
 	".wmv",
 }
 
+DEFAULT_PROBE_WORKERS = min(8, (os.cpu_count() or 1) * 2)
+
+# 转换的内存估计（MB）：多数文件只是重新封装，失败时才转码 H.264；
+# 高清传输流（AVCHD 1080i）转码时解码和反交错占用最多
+CONVERT_MEMORY_MB = 384
+HD_CONVERT_MEMORY_MB = {
+	".m2ts": 1536,
+	".mts": 1536,
+	".ts": 1536,
+}
+
+ISOBMFF_EXTENSIONS = {
+	".3gp",
+	".m4v",
+	".mov",
+	".mp4",
+}
+
 
-def parse_args() -> argparse.Namespace:
+def parse_args(argv: list[str] | None = None) -> argparse.Namespace:
 	parser = argparse.ArgumentParser(
 		description="将目录中的视频文件转换为 MP4（保持原始质量，不改变分辨率与尺寸，输出名为原文件名+.mp4）"
 	)
@@ -48,7 +75,56 @@ def parse_args() -> argparse.Namespace:
 		action="store_true",
 		help="若目标 mp4 已存在则覆盖（默认跳过）",
 	)
-	return parser.parse_args()
+	parser.add_argument(
+		"--probe-workers",
+		type=int,
+		default=DEFAULT_PROBE_WORKERS,
+		help=f"并发探测元数据的线程数（默认 {DEFAULT_PROBE_WORKERS}）",
+	)
+	parser.add_argument(
+		"--exiftool-session",
+		action="store_true",
+		help="使用常驻 exiftool 进程读取元数据（避免每个文件启动一次 exiftool）",
+	)
+	parser.add_argument(
+		"--shard",
+		type=parse_shard,
+		metavar="I/N",
+		help="只处理按相对路径哈希落在第 I 个分片（共 N 个）的文件，用于多进程/多机器分担",
+	)
+	parser.add_argument(
+		"--jobs",
+		type=int,
+		default=1,
+		help="同时运行的 ffmpeg 转换数上限（默认 1），实际并发还受负载和可用内存限制",
+	)
+	parser.add_argument(
+		"--max-load",
+		type=float,
+		help="1 分钟平均负载达到该值时暂缓启动新的转换（默认为 CPU 核数）",
+	)
+	parser.add_argument(
+		"--reserve-mem",
+		type=int,
+		default=DEFAULT_RESERVE_MB,
+		metavar="MB",
+		help=f"启动新转换后至少保留的可用内存（默认 {DEFAULT_RESERVE_MB}MB）",
+	)
+	parser.add_argument(
+		"--nice",
+		type=int,
+		default=0,
+		help="降低 CPU 优先级（nice 值增加 N）",
+	)
+	parser.add_argument(
+		"--ionice",
+		choices=sorted(IONICE_CLASSES),
+		help="I/O 调度类别（idle：磁盘空闲时才读写）",
+	)
+	args = parser.parse_args(argv)
+	if args.probe_workers < 1:
+		parser.error("--probe-workers 必须大于 0")
+	return args
 
 
 def is_video_file(path: Path) -> bool:
@@ -97,6 +173,20 @@ def normalize_datetime_text(value: str) -> str | None:
 	return None
 
 
+def extract_creation_time_isobmff(input_file: Path) -> str | None:
+	try:
+		texts = read_creation_texts(input_file)
+	except (OSError, struct.error):
+		return None
+
+	for text in texts:
+		normalized = normalize_datetime_text(text)
+		if normalized:
+			return normalized
+
+	return None
+
+
 def extract_creation_time_ffprobe(input_file: Path) -> str | None:
 	if shutil.which("ffprobe") is None:
 		return None
@@ -158,24 +248,36 @@ def extract_creation_time_ffprobe(input_file: Path) -> str | None:
 	return None
 
 
-def extract_creation_time_exiftool(input_file: Path) -> str | None:
-	if shutil.which("exiftool") is None:
-		return None
-
-	cmd = ["exiftool", "-j", "-api", "QuickTimeUTC=1", str(input_file)]
-	try:
-		result = subprocess.run(
-			cmd,
-			check=True,
-			capture_output=True,
-			text=True,
-		)
-		records = json.loads(result.stdout)
+def extract_creation_time_exiftool(
+	input_file: Path,
+	exiftool_pool: ExifToolPool | None = None,
+) -> str | None:
+	if exiftool_pool is not None:
+		try:
+			records = exiftool_pool.execute_json("-api", "QuickTimeUTC=1", str(input_file))
+		except ExifToolError:
+			return None
 		if not records:
 			return None
 		record = records[0]
-	except (subprocess.CalledProcessError, json.JSONDecodeError, IndexError):
-		return None
+	else:
+		if shutil.which("exiftool") is None:
+			return None
+
+		cmd = ["exiftool", "-j", "-api", "QuickTimeUTC=1", str(input_file)]
+		try:
+			result = subprocess.run(
+				cmd,
+				check=True,
+				capture_output=True,
+				text=True,
+			)
+			records = json.loads(result.stdout)
+			if not records:
+				return None
+			record = records[0]
+		except (subprocess.CalledProcessError, json.JSONDecodeError, IndexError):
+			return None
 
 	for key in (
 		"MediaCreateDate",
@@ -201,12 +303,20 @@ def extract_creation_time_filesystem(input_file: Path) -> str | None:
 	return dt.strftime("%Y-%m-%dT%H:%M:%SZ")
 
 
-def get_media_creation_time(input_file: Path) -> tuple[str | None, str]:
-	ffprobe_time = extract_creation_time_ffprobe(input_file)
-	if ffprobe_time:
-		return ffprobe_time, "ffprobe"
+def get_media_creation_time(
+	input_file: Path,
+	exiftool_pool: ExifToolPool | None = None,
+) -> tuple[str | None, str]:
+	if input_file.suffix.lower() in ISOBMFF_EXTENSIONS:
+		isobmff_time = extract_creation_time_isobmff(input_file)
+		if isobmff_time:
+			return isobmff_time, "isobmff"
+	else:
+		ffprobe_time = extract_creation_time_ffprobe(input_file)
+		if ffprobe_time:
+			return ffprobe_time, "ffprobe"
 
-	exiftool_time = extract_creation_time_exiftool(input_file)
+	exiftool_time = extract_creation_time_exiftool(input_file, exiftool_pool)
 	if exiftool_time:
 		return exiftool_time, "exiftool"
 
@@ -259,18 +369,34 @@ def get_output_file(input_file: Path) -> Path:
 	return input_file.with_name(f"{input_file.name}.mp4")
 
 
-def convert_video(input_file: Path, overwrite: bool) -> str:
+def should_skip(input_file: Path, overwrite: bool) -> bool:
 	output_file = get_output_file(input_file)
 
 	if input_file.suffix.lower() == ".mp4":
 		print(f"[跳过] 已是 MP4: {input_file.name}")
-		return "skipped"
+		return True
 
 	if output_file.exists() and not overwrite:
 		print(f"[跳过] 目标已存在: {output_file.name}")
+		return True
+
+	return False
+
+
+def convert_video(
+	input_file: Path,
+	overwrite: bool,
+	exiftool_pool: ExifToolPool | None = None,
+	creation: tuple[str | None, str] | None = None,
+) -> str:
+	output_file = get_output_file(input_file)
+
+	if should_skip(input_file, overwrite):
 		return "skipped"
 
-	creation_time, source = get_media_creation_time(input_file)
+	if creation is None:
+		creation = get_media_creation_time(input_file, exiftool_pool)
+	creation_time, source = creation
 	if creation_time:
 		print(f"[时间] {input_file.name} -> {creation_time} (来源: {source})")
 
@@ -327,6 +453,45 @@ def convert_video(input_file: Path, overwrite: bool) -> str:
 		return "failed"
 
 
+def probe_and_convert(
+	video_files: list[Path],
+	probe: Callable[[Path], tuple[str | None, str]],
+	convert: Callable[[Path, tuple[str | None, str]], str],
+	probe_workers: int,
+	jobs: int,
+) -> dict[str, int]:
+	"""
+	元数据探测（I/O 密集）在线程池中提前进行，结果按完成顺序送入转换线程池（CPU 密集）
+
+	探测或转换抛出异常的文件记为失败，不影响其他文件
+
+	Returns:
+		{"success": 成功, "skipped": 跳过, "failed": 失败}
+	"""
+	counts = {"success": 0, "skipped": 0, "failed": 0}
+	with ThreadPoolExecutor(max_workers=probe_workers) as probe_executor, \
+			ThreadPoolExecutor(max_workers=max(1, jobs)) as convert_executor:
+		futures = {probe_executor.submit(probe, video_file): video_file for video_file in video_files}
+		conversions = {}
+		for future in as_completed(futures):
+			video_file = futures[future]
+			try:
+				creation = future.result()
+			except Exception as e:
+				print(f"[失败] 读取元数据失败: {video_file.name} ({e})")
+				counts["failed"] += 1
+				continue
+			conversions[convert_executor.submit(convert, video_file, creation)] = video_file
+		for conversion, video_file in conversions.items():
+			try:
+				result = conversion.result()
+			except Exception as e:
+				print(f"[失败] 转换失败: {video_file.name} ({e})")
+				result = "failed"
+			counts[result if result in counts else "failed"] += 1
+	return counts
+
+
 def main() -> int:
 	args = parse_args()
 	directory = Path(args.directory).expanduser().resolve()
@@ -341,6 +506,11 @@ def main() -> int:
 
 	iterator = directory.rglob("*") if args.recursive else directory.iterdir()
 	video_files = sorted(path for path in iterator if is_video_file(path))
+	if args.shard:
+		# 每个文件的转换相互独立，按相对路径分片即可
+		video_files = select_shard(
+			video_files, args.shard, lambda path: path.relative_to(directory).as_posix()
+		)
 	if not video_files:
 		print(f"未找到可转换的视频文件: {directory}")
 		return 0
@@ -348,24 +518,47 @@ def main() -> int:
 	print(f"开始处理目录: {directory}")
 	print(f"检测到 {len(video_files)} 个视频文件")
 
-	success_count = 0
-	skipped_count = 0
-	failed_count = 0
+	lower_priority(args.nice, args.ionice)
+	governor = ResourceGovernor(max_load=args.max_load, reserve_mb=args.reserve_mem)
+
+	exiftool_pool = None
+	if args.exiftool_session:
+		try:
+			exiftool_pool = ExifToolPool(size=min(args.probe_workers, 4))
+		except ExifToolError as e:
+			print(f"[提示] 无法启用 exiftool 常驻会话: {e}")
+
+	def convert_admitted(video_file: Path, creation: tuple[str | None, str]) -> str:
+		estimate = HD_CONVERT_MEMORY_MB.get(video_file.suffix.lower(), CONVERT_MEMORY_MB)
+		with governor.admit(estimate):
+			return convert_video(video_file, args.overwrite, exiftool_pool, creation=creation)
 
+	pending_files = []
+	skipped_count = 0
 	for video_file in video_files:
-		result = convert_video(video_file, args.overwrite)
-		if result == "success":
-			success_count += 1
-		elif result == "skipped":
+		if should_skip(video_file, args.overwrite):
 			skipped_count += 1
 		else:
-			failed_count += 1
+			pending_files.append(video_file)
+
+	# 每个转换启动前由资源调控器按负载和可用内存准入
+	try:
+		counts = probe_and_convert(
+			pending_files,
+			lambda video_file: get_media_creation_time(video_file, exiftool_pool),
+			convert_admitted,
+			args.probe_workers,
+			args.jobs,
+		)
+	finally:
+		if exiftool_pool is not None:
+			exiftool_pool.close()
 
 	print("\n处理完成")
-	print(f"成功: {success_count}")
-	print(f"跳过: {skipped_count}")
-	print(f"失败: {failed_count}")
-	return 0 if failed_count == 0 else 2
+	print(f"成功: {counts['success']}")
+	print(f"跳过: {skipped_count + counts['skipped']}")
+	print(f"失败: {counts['failed']}")
+	return 0 if counts["failed"] == 0 else 2
 
 
 if __name__ == "__main__":
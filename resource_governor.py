@@ -0,0 +1,197 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+按系统负载和可用内存决定是否启动新任务的资源调控器
+
+固定的并行数要么用不满机器，要么在几个1080i MTS同时解码时把机器推进swap。
+调控器在每个ffmpeg/图片任务开始前检查：
+- 1分钟平均负载（os.getloadavg）
+- 可用内存（/proc/meminfo的MemAvailable）减去预留内存
+- 任务的内存估计（按转换方式估计，由调用方给出）
+
+刚启动的任务还没有体现在负载和可用内存中，因此最近启动的任务
+按其估计值计入。没有任务在运行时总是放行，保证不会永远等待。
+无法读取负载或内存（非Linux）时对应的检查不生效。
+"""
+
+import os
+import time
+import asyncio
+import logging
+import threading
+import subprocess
+from contextlib import asynccontextmanager, contextmanager
+from typing import Callable, Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+MB = 1024 * 1024
+DEFAULT_RESERVE_MB = 512
+DEFAULT_POLL_SECONDS = 1.0
+# 任务启动后多久才会完整体现在负载和可用内存中
+RAMP_SECONDS = 15.0
+
+IONICE_CLASSES = {'idle': ['-c', '3'], 'best-effort': ['-c', '2', '-n', '7']}
+
+
+def read_meminfo(path: str = '/proc/meminfo') -> Dict[str, int]:
+    """读取/proc/meminfo（单位：字节）"""
+    info = {}
+    with open(path, encoding='ascii') as fp:
+        for line in fp:
+            key, _, value = line.partition(':')
+            fields = value.split()
+            if fields and fields[0].isdigit():
+                info[key] = int(fields[0]) * (1024 if fields[1:] == ['kB'] else 1)
+    return info
+
+
+def available_memory() -> Optional[int]:
+    """可用内存（字节），无法读取时返回None"""
+    try:
+        info = read_meminfo()
+    except OSError:
+        return None
+    if 'MemAvailable' in info:
+        return info['MemAvailable']
+    if 'MemFree' in info:
+        # 3.14之前的内核没有MemAvailable
+        return info['MemFree'] + info.get('Cached', 0)
+    return None
+
+
+def load_average() -> Optional[float]:
+    """1分钟平均负载，无法读取时返回None"""
+    try:
+        return os.getloadavg()[0]
+    except (OSError, AttributeError):
+        return None
+
+
+class ResourceGovernor:
+    """任务准入控制（线程安全，可被多个处理器共享）"""
+
+    def __init__(self, max_load: Optional[float] = None, reserve_mb: int = DEFAULT_RESERVE_MB,
+                 poll_seconds: float = DEFAULT_POLL_SECONDS,
+                 memory_reader: Callable[[], Optional[int]] = available_memory,
+                 load_reader: Callable[[], Optional[float]] = load_average):
+        """
+        Args:
+            max_load: 负载上限，默认为CPU核数
+            reserve_mb: 始终保留给系统和其他服务的内存（MB）
+            poll_seconds: 资源不足时重新检查的间隔
+            memory_reader: 读取可用内存（字节）的函数
+            load_reader: 读取平均负载的函数
+        """
+        self.max_load = max_load if max_load is not None else float(os.cpu_count() or 1)
+        self.reserve = reserve_mb * MB
+        self.poll_seconds = poll_seconds
+        self._memory_reader = memory_reader
+        self._load_reader = load_reader
+        self._cond = threading.Condition()
+        # 运行中的任务：[内存估计（字节）, 开始时间]
+        self._running: List[List[float]] = []
+        self.waits = 0
+
+    @property
+    def running(self) -> int:
+        """运行中的任务数"""
+        return len(self._running)
+
+    def _fits(self, estimate: int) -> bool:
+        """资源是否足够再启动一个任务（调用时持有锁）"""
+        if not self._running:
+            return True
+        now = time.monotonic()
+        ramping = [job for job in self._running if now - job[1] < RAMP_SECONDS]
+
+        load = self._load_reader()
+        if load is not None and load + len(ramping) >= self.max_load:
+            return False
+
+        available = self._memory_reader()
+        if available is not None:
+            pending = sum(job[0] for job in ramping)
+            if available - pending - estimate < self.reserve:
+                return False
+        return True
+
+    def try_acquire(self, estimate_mb: float) -> Optional[list]:
+        """
+        资源足够时登记一个任务
+
+        Returns:
+            任务凭据（传给release）；资源不足时返回None
+        """
+        with self._cond:
+            if not self._fits(int(estimate_mb * MB)):
+                return None
+            job = [int(estimate_mb * MB), time.monotonic()]
+            self._running.append(job)
+            return job
+
+    def acquire(self, estimate_mb: float) -> list:
+        """等待资源足够后登记一个任务"""
+        job = self.try_acquire(estimate_mb)
+        if job is not None:
+            return job
+        self.waits += 1
+        with self._cond:
+            while True:
+                # 任务结束时被唤醒；负载和内存的变化只能靠定时重新检查
+                self._cond.wait(self.poll_seconds)
+                if self._fits(int(estimate_mb * MB)):
+                    job = [int(estimate_mb * MB), time.monotonic()]
+                    self._running.append(job)
+                    return job
+
+    def release(self, job: list):
+        """任务结束"""
+        with self._cond:
+            self._running.remove(job)
+            self._cond.notify_all()
+
+    @contextmanager
+    def admit(self, estimate_mb: float):
+        """with governor.admit(估计MB): 运行任务"""
+        job = self.acquire(estimate_mb)
+        try:
+            yield
+        finally:
+            self.release(job)
+
+    @asynccontextmanager
+    async def aadmit(self, estimate_mb: float):
+        """async with governor.aadmit(估计MB): 等待时不阻塞事件循环"""
+        job = self.try_acquire(estimate_mb)
+        if job is None:
+            self.waits += 1
+            while job is None:
+                await asyncio.sleep(self.poll_seconds)
+                job = self.try_acquire(estimate_mb)
+        try:
+            yield
+        finally:
+            self.release(job)
+
+
+def lower_priority(nice: int = 0, ionice: Optional[str] = None):
+    """
+    降低本进程（及之后启动的ffmpeg子进程）的CPU和I/O优先级
+
+    应在启动线程池和子进程之前调用，新线程和子进程继承当前优先级
+
+    Args:
+        nice: 增加的nice值
+        ionice: I/O调度类别，'idle'或'best-effort'（最低级别7）
+    """
+    if nice:
+        os.nice(nice)
+        logger.info(f"已降低CPU优先级: nice +{nice}")
+    if ionice:
+        try:
+            subprocess.run(['ionice', *IONICE_CLASSES[ionice], '-p', str(os.getpid())],
+                           check=True, capture_output=True)
+            logger.info(f"已设置I/O调度类别: {ionice}")
+        except (FileNotFoundError, subprocess.CalledProcessError) as e:
+            logger.warning(f"无法设置I/O优先级（需要util-linux的ionice）: {e}")
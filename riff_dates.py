@@ -0,0 +1,147 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+AVI（RIFF）拍摄时间读取工具
+
+富士、佳能、尼康等卡片机拍摄的AVI会把拍摄时间写在文件开头的
+RIFF hdrl列表中：
+- IDIT块：文本时间，如 "THU OCT 26 16:46:04 2006" 或 "2006:10:26 16:46:04"
+- strd块：厂商数据（AVIF/EXIF结构或尼康NCTG），其中包含EXIF格式的时间文本
+
+本模块只读取hdrl列表，不读取movi中的音视频数据。
+"""
+
+import re
+import struct
+import logging
+from datetime import datetime
+from typing import Iterator, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+# hdrl列表的最大读取字节数（正常只有几KB）
+MAX_HDRL_SIZE = 1024 * 1024
+
+# IDIT常见的时间文本格式
+IDIT_FORMATS = (
+    '%a %b %d %H:%M:%S %Y',
+    '%Y:%m:%d %H:%M:%S',
+    '%Y/%m/%d %H:%M:%S',
+    '%Y-%m-%d %H:%M:%S',
+    '%Y/%m/%d/ %H:%M',
+    '%Y/%m/%d %H:%M',
+)
+
+# strd中EXIF格式的时间文本
+EXIF_DATETIME_PATTERN = re.compile(rb'(\d{4}):(\d{2}):(\d{2}) (\d{2}):(\d{2}):(\d{2})')
+
+
+def iter_chunks(data: bytes, start: int = 0) -> Iterator[Tuple[bytes, bytes]]:
+    """
+    遍历RIFF块
+
+    Args:
+        data: 块数据
+        start: 起始偏移
+
+    Yields:
+        (块ID, 块内容)；LIST块的内容包含4字节列表类型
+    """
+    offset = start
+    while offset + 8 <= len(data):
+        chunk_id, size = struct.unpack('<4sI', data[offset:offset + 8])
+        yield chunk_id, data[offset + 8:offset + 8 + size]
+        offset += 8 + size + (size & 1)
+
+
+def parse_idit(value: bytes) -> Optional[datetime]:
+    """
+    解析IDIT时间文本
+
+    Args:
+        value: IDIT块内容
+
+    Returns:
+        datetime对象或None
+    """
+    text = ' '.join(value.decode('latin-1').replace('\x00', ' ').split())
+    for fmt in IDIT_FORMATS:
+        try:
+            return datetime.strptime(text, fmt)
+        except ValueError:
+            continue
+    logger.debug(f"无法识别的IDIT时间: {text!r}")
+    return None
+
+
+def parse_strd(value: bytes) -> Optional[datetime]:
+    """
+    从strd厂商数据中查找EXIF格式的时间文本
+
+    Args:
+        value: strd块内容
+
+    Returns:
+        第一个有效的datetime对象或None
+    """
+    for match in EXIF_DATETIME_PATTERN.finditer(value):
+        try:
+            return datetime(*(int(group) for group in match.groups()))
+        except ValueError:
+            continue
+    return None
+
+
+def read_hdrl(f) -> Optional[bytes]:
+    """
+    读取AVI文件的hdrl列表内容
+
+    Args:
+        f: 以二进制模式打开的文件对象
+
+    Returns:
+        hdrl列表内容（不含列表类型），不是AVI文件时返回None
+    """
+    header = f.read(12)
+    if len(header) < 12 or header[:4] != b'RIFF' or header[8:12] not in (b'AVI ', b'AVIX'):
+        return None
+
+    while True:
+        chunk_header = f.read(12)
+        if len(chunk_header) < 8:
+            return None
+        chunk_id, size = struct.unpack('<4sI', chunk_header[:8])
+        if chunk_id == b'LIST' and chunk_header[8:12] == b'hdrl':
+            return f.read(min(size - 4, MAX_HDRL_SIZE))
+        if chunk_id == b'LIST' and chunk_header[8:12] == b'movi':
+            return None
+        f.seek(size + (size & 1) - 4, 1)
+
+
+def read_avi_datetime(avi_path) -> Optional[datetime]:
+    """
+    读取AVI文件hdrl列表中的拍摄时间（IDIT优先，其次strd）
+
+    Args:
+        avi_path: AVI文件路径
+
+    Returns:
+        datetime对象（相机本地时间）或None
+    """
+    with open(avi_path, 'rb') as f:
+        hdrl = read_hdrl(f)
+    if hdrl is None:
+        return None
+
+    strd_date = None
+    for chunk_id, value in iter_chunks(hdrl):
+        if chunk_id == b'IDIT':
+            idit_date = parse_idit(value)
+            if idit_date:
+                return idit_date
+        elif chunk_id == b'LIST' and value[:4] == b'strl' and strd_date is None:
+            for sub_id, sub_value in iter_chunks(value, 4):
+                if sub_id == b'strd':
+                    strd_date = parse_strd(sub_value)
+                    break
+    return strd_date
@@ -0,0 +1,52 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+确定性分片（--shard I/N）
+
+同一批目录或文件交给N个互不通信的进程（或不同机器上的定时任务）处理时，
+每个进程只取哈希值落在自己分片中的部分。哈希使用SHA-1而不是内置hash()
+（内置hash对字符串随机加盐，不同进程结果不同）。
+
+分片键由调用方选择：时间推断依赖同目录的其他文件，因此main.py按目录名分片，
+同一目录的文件总在同一个分片中；refmorat_mpg的每个文件相互独立，按文件分片。
+"""
+
+import hashlib
+from typing import Callable, Iterable, List, Tuple, TypeVar
+
+T = TypeVar('T')
+
+
+def parse_shard(text: str) -> Tuple[int, int]:
+    """
+    解析分片参数 "I/N"（I从1开始）
+
+    Raises:
+        ValueError: 格式不正确或I不在1..N之间
+    """
+    index, sep, count = text.partition('/')
+    if not sep:
+        raise ValueError(f"分片格式应为I/N: {text}")
+    index, count = int(index), int(count)
+    if count < 1 or not 1 <= index <= count:
+        raise ValueError(f"分片序号应在1到{count}之间: {text}")
+    return index, count
+
+
+def shard_of(key: str, count: int) -> int:
+    """分片键所属的分片（1..count）"""
+    digest = hashlib.sha1(key.encode('utf-8')).digest()
+    return int.from_bytes(digest[:8], 'big') % count + 1
+
+
+def select_shard(items: Iterable[T], shard: Tuple[int, int], key: Callable[[T], str]) -> List[T]:
+    """
+    只保留属于指定分片的项
+
+    Args:
+        items: 待分配的项
+        shard: parse_shard的结果 (I, N)
+        key: 从项得到分片键的函数
+    """
+    index, count = shard
+    return [item for item in items if shard_of(key(item), count) == index]
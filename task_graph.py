@@ -0,0 +1,157 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+依赖感知的任务图调度器
+
+每个任务声明它依赖的任务；调度器把依赖都已完成的任务交给对应的线程池，
+任务完成后再放行依赖它的任务。不同类型的任务可以使用不同的线程池
+（例如读取元数据用I/O线程池，转码用受限的转码线程池）。
+
+依赖任务失败时，后续任务仍然会运行（例如照片EXIF读取失败，
+视频仍然可以改用目录名推断时间），失败原因记录在errors中。
+任务抛出KeyboardInterrupt/SystemExit等非Exception异常时不再开始新任务，
+等进行中的任务结束后在调用run的线程中重新抛出。
+"""
+
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, Iterable, List, Union
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_POOL = 'default'
+
+
+class TaskGraph:
+    """有向无环任务图"""
+
+    def __init__(self):
+        self._funcs: Dict[str, Callable[[], Any]] = {}
+        self._deps: Dict[str, List[str]] = {}
+        self._pools: Dict[str, str] = {}
+        self.results: Dict[str, Any] = {}
+        self.errors: Dict[str, BaseException] = {}
+
+    def __len__(self) -> int:
+        return len(self._funcs)
+
+    def __contains__(self, name: str) -> bool:
+        return name in self._funcs
+
+    def add(self, name: str, func: Callable[[], Any], deps: Iterable[str] = (),
+            pool: str = DEFAULT_POOL):
+        """
+        添加任务
+
+        Args:
+            name: 任务名（唯一）
+            func: 无参数的可调用对象，返回值记录在results[name]
+            deps: 依赖的任务名
+            pool: 运行该任务的线程池名
+        """
+        if name in self._funcs:
+            raise ValueError(f"任务重复: {name}")
+        self._funcs[name] = func
+        self._deps[name] = list(dict.fromkeys(deps))
+        self._pools[name] = pool
+
+    def _check(self) -> Dict[str, List[str]]:
+        """检查依赖是否都存在且无环，返回 任务 → 依赖它的任务"""
+        dependents: Dict[str, List[str]] = {name: [] for name in self._funcs}
+        for name, deps in self._deps.items():
+            for dep in deps:
+                if dep not in self._funcs:
+                    raise ValueError(f"任务{name}依赖不存在的任务{dep}")
+                dependents[dep].append(name)
+
+        # Kahn算法：能按拓扑顺序走完所有任务才说明无环
+        remaining = {name: len(deps) for name, deps in self._deps.items()}
+        ready = [name for name, count in remaining.items() if count == 0]
+        visited = 0
+        while ready:
+            name = ready.pop()
+            visited += 1
+            for child in dependents[name]:
+                remaining[child] -= 1
+                if remaining[child] == 0:
+                    ready.append(child)
+        if visited != len(self._funcs):
+            cycle = sorted(name for name, count in remaining.items() if count > 0)
+            raise ValueError(f"任务图存在循环依赖: {', '.join(cycle[:5])}")
+        return dependents
+
+    def run(self, workers: Union[int, Dict[str, int]] = 1) -> Dict[str, Any]:
+        """
+        运行所有任务，等待全部完成
+
+        Args:
+            workers: 每个线程池的线程数（整数表示所有线程池相同；字典中未列出的线程池为1）
+
+        Returns:
+            任务名 → 返回值（失败的任务不在其中，见errors）
+
+        Raises:
+            BaseException: 任务抛出的非Exception异常（KeyboardInterrupt、SystemExit等）
+        """
+        dependents = self._check()
+        if not self._funcs:
+            return self.results
+
+        pool_names = set(self._pools.values())
+        if isinstance(workers, int):
+            sizes = {pool: workers for pool in pool_names}
+        else:
+            sizes = {pool: workers.get(pool, 1) for pool in pool_names}
+        executors = {
+            pool: ThreadPoolExecutor(max_workers=max(1, size), thread_name_prefix=f'graph-{pool}')
+            for pool, size in sizes.items()
+        }
+
+        lock = threading.Lock()
+        remaining = {name: len(deps) for name, deps in self._deps.items()}
+        finished = [0]
+        aborted: List[BaseException] = []
+        all_done = threading.Event()
+
+        def submit(name: str):
+            executors[self._pools[name]].submit(execute, name)
+
+        def execute(name: str):
+            try:
+                self.results[name] = self._funcs[name]()
+            except Exception as e:
+                logger.error(f"任务失败 {name}: {e}")
+                self.errors[name] = e
+            except BaseException as e:
+                # 线程池会吞掉异常：记录后唤醒run，由调用线程重新抛出
+                self.errors[name] = e
+                with lock:
+                    aborted.append(e)
+                all_done.set()
+                return
+            ready = []
+            with lock:
+                if aborted:
+                    return
+                for child in dependents[name]:
+                    remaining[child] -= 1
+                    if remaining[child] == 0:
+                        ready.append(child)
+                finished[0] += 1
+                if finished[0] == len(self._funcs):
+                    all_done.set()
+            for child in ready:
+                submit(child)
+
+        try:
+            for name, count in list(remaining.items()):
+                if count == 0:
+                    submit(name)
+            all_done.wait()
+        finally:
+            for executor in executors.values():
+                executor.shutdown(wait=True, cancel_futures=bool(aborted))
+        if aborted:
+            raise aborted[0]
+        return self.results
@@ -0,0 +1,122 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+测试归档（各复制方式、哈希校验、不支持时换下一种方式、校验失败时保留原文件、同一文件系统内rename）
+"""
+
+import os
+import errno
+import hashlib
+import logging
+import tempfile
+from pathlib import Path
+
+import archiver
+from archiver import (
+    METHOD_COPY_FILE_RANGE,
+    METHOD_READWRITE,
+    METHOD_RENAME,
+    METHOD_SENDFILE,
+    ArchiveError,
+    archive_file,
+    copy_file,
+)
+from journal import STATE_ARCHIVED, Journal
+from main import MediaProcessor
+from plan import ACTION_CONVERT_VIDEO, KIND_VIDEO, PlanItem
+
+logging.getLogger().setLevel(logging.CRITICAL)
+
+test_cases = []
+
+# 跨多个块、最后一块不满
+DATA = os.urandom(10 * 4096 + 123)
+DIGEST = hashlib.sha256(DATA).hexdigest()
+
+with tempfile.TemporaryDirectory() as tmp:
+    tmp = Path(tmp)
+    source = tmp / 'MVI_0001.avi'
+    source.write_bytes(DATA)
+    os.utime(source, ns=(1190426400000000000, 1190426400000000000))
+
+    # 各复制方式
+    for method in (METHOD_COPY_FILE_RANGE, METHOD_SENDFILE, METHOD_READWRITE):
+        dest = tmp / f'{method}.avi'
+        result = copy_file(source, dest, methods=(method,), chunk_size=4096)
+        test_cases.append((f"{method}复制内容", dest.read_bytes() == DATA, True))
+        test_cases.append((f"{method}哈希", (result.method, result.digest), (method, DIGEST)))
+    test_cases.append(("保留修改时间", dest.stat().st_mtime_ns, source.stat().st_mtime_ns))
+    (tmp / 'empty').write_bytes(b'')
+    result = copy_file(tmp / 'empty', tmp / 'empty.copy')
+    test_cases.append(("空文件", (result.size, result.digest), (0, hashlib.sha256(b'').hexdigest())))
+
+    # copy_file_range不支持时（如旧内核跨文件系统返回EXDEV）换下一种方式
+    def unsupported(*args):
+        raise OSError(errno.EXDEV, os.strerror(errno.EXDEV))
+
+    original_copy_file_range = archiver._copy_file_range
+    archiver._copy_file_range = unsupported
+    result = copy_file(source, tmp / 'fallback.avi', chunk_size=4096)
+    archiver._copy_file_range = original_copy_file_range
+    test_cases.append(("不支持时换下一种方式", result.method, METHOD_SENDFILE))
+
+    # 校验失败：不留下目标文件和临时文件
+    original_file_digest = archiver._file_digest
+    archiver._file_digest = lambda fd, algorithm, chunk_size: 'corrupted'
+    archive_dir = tmp / 'archive'
+    archive_dir.mkdir()
+    archiver._same_filesystem = lambda source, dest_dir: False
+    try:
+        archive_file(source, archive_dir / source.name)
+        test_cases.append(("校验失败时报错", "未报错", "ArchiveError"))
+    except ArchiveError:
+        test_cases.append(("校验失败时报错", "ArchiveError", "ArchiveError"))
+    archiver._file_digest = original_file_digest
+    test_cases.append(("校验失败时不留下文件", list(archive_dir.iterdir()), []))
+    test_cases.append(("校验失败时保留原文件", source.read_bytes() == DATA, True))
+
+    # 跨文件系统：复制、校验后删除原文件
+    result = archive_file(source, archive_dir / source.name)
+    test_cases.append(("跨文件系统归档", (result.method, result.digest, source.exists()),
+                       (METHOD_COPY_FILE_RANGE, DIGEST, False)))
+    test_cases.append(("归档内容", (archive_dir / source.name).read_bytes() == DATA, True))
+    test_cases.append(("记录吞吐量", result.throughput is not None and result.throughput > 0, True))
+
+    # 同一文件系统：直接rename，归档结果写入处理日志
+    archiver._same_filesystem = lambda source, dest_dir: True
+    directory = tmp / '20070922_trip'
+    directory.mkdir()
+    video = directory / 'MVI_0002.avi'
+    video.write_bytes(DATA)
+    processor = MediaProcessor(str(directory), journal=Journal(tmp / 'journal.db'))
+    item = PlanItem(str(video), KIND_VIDEO, ACTION_CONVERT_VIDEO,
+                    archive=str(processor.archive_dir / video.name))
+    processor._stage_archive(item)
+    details = processor.journal.details(video, STATE_ARCHIVED)
+    test_cases.append(("同一文件系统内rename", [detail['method'] for detail in details], [METHOD_RENAME]))
+    test_cases.append(("已移动", (video.exists(), (processor.archive_dir / video.name).exists()), (False, True)))
+    processor.journal.close()
+
+print("=" * 70)
+print("归档测试")
+print("=" * 70)
+
+passed = 0
+failed = 0
+
+for description, result, expected in test_cases:
+    if result == expected:
+        status = "✅ PASS"
+        passed += 1
+    else:
+        status = "❌ FAIL"
+        failed += 1
+
+    print(f"\n{status}")
+    print(f"  场景:     {description}")
+    print(f"  期望:     {expected}")
+    print(f"  实际:     {result}")
+
+print("\n" + "=" * 70)
+print(f"测试结果: {passed} 通过, {failed} 失败")
+print("=" * 70)
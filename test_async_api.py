@@ -0,0 +1,149 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+测试异步API（aprocess_all/aprocess_file不阻塞事件循环，与同步API使用同一条流水线和处理日志，
+取消asyncio任务时终止ffmpeg并回滚）
+
+使用假ffmpeg脚本（testing_support）代替真正的转码
+"""
+
+import os
+import time
+import asyncio
+import logging
+import tempfile
+from datetime import datetime
+from pathlib import Path
+
+from journal import STATE_ARCHIVED, STATE_CONVERTED, STATE_DATED, STATE_DISCOVERED, STATE_DONE, STATE_TAGGED, Journal
+from main import MediaProcessor
+from mp4_atoms import datetime_to_mp4_time, find_time_boxes, read_box_times
+from testing_support import install_fake_ffmpeg, make_jpeg
+
+logging.getLogger().setLevel(logging.CRITICAL)
+
+
+def mvhd_time(path: Path) -> int:
+    with open(path, 'rb') as f:
+        return read_box_times(f, find_time_boxes(f)[0])[1]
+
+
+async def run_with_ticker(processor: MediaProcessor):
+    """处理期间另一个协程持续计时，用来确认事件循环没有被阻塞"""
+    ticks = 0
+    done = asyncio.Event()
+
+    async def ticker():
+        nonlocal ticks
+        while not done.is_set():
+            ticks += 1
+            await asyncio.sleep(0.01)
+
+    task = asyncio.create_task(ticker())
+    results = await processor.aprocess_all(jobs=2)
+    done.set()
+    await task
+    return results, ticks
+
+
+with tempfile.TemporaryDirectory() as tmp:
+    install_fake_ffmpeg(Path(tmp))
+    os.environ['FAKE_FFMPEG_DELAY'] = '0.2'
+
+    directory = Path(tmp) / 'trip'
+    directory.mkdir()
+    make_jpeg(directory / 'DSC_0001.JPG', '2012:03:14 10:00:00')
+    (directory / 'DSC_0002.AVI').write_bytes(b'not really an avi')
+    make_jpeg(directory / 'DSC_0003.JPG', '2012:03:14 10:02:00')
+    (directory / 'DSC_0004.3GP').write_bytes(b'not really a 3gp')
+
+    processor = MediaProcessor(str(directory))
+    results, ticks = asyncio.run(run_with_ticker(processor))
+
+    # 单个文件
+    single = Path(tmp) / 'single'
+    single.mkdir()
+    (single / 'MOV_0001.mov').write_bytes(b'not really a mov')
+    (single / 'MOV_0002.mov').write_bytes(b'not really a mov')
+    single_item = MediaProcessor(str(single)).process_mov(single / 'MOV_0001.mov')
+    async_item = asyncio.run(MediaProcessor(str(single)).aprocess_file(single / 'MOV_0002.mov'))
+
+    # 处理日志：记录各状态，再次运行时跳过没有变化的目录
+    logged = Path(tmp) / 'logged'
+    logged.mkdir()
+    make_jpeg(logged / 'DSC_0001.JPG', '2012:03:14 10:00:00')
+    (logged / 'DSC_0002.AVI').write_bytes(b'not really an avi')
+    journal = Journal(Path(tmp) / 'journal.db')
+    logged_results = asyncio.run(MediaProcessor(str(logged), journal=journal).aprocess_all(jobs=2))
+    history = journal.history(logged / 'DSC_0002.AVI')
+    os.utime(logged, ns=(1331719200000000000, 1331719200000000000))
+    journal.record_directory(logged)
+    rerun = asyncio.run(MediaProcessor(str(logged), journal=journal).aprocess_all(jobs=2))
+    journal.close()
+
+    # 取消asyncio任务：终止正在运行的ffmpeg，删除不完整的输出
+    hung = Path(tmp) / 'hung'
+    hung.mkdir()
+    (hung / 'MVI_0001.avi').write_bytes(b'not really an avi')
+    os.environ['FAKE_FFMPEG_HANG'] = '1'
+    hung_processor = MediaProcessor(str(hung))
+
+    async def cancel_soon():
+        task = asyncio.create_task(hung_processor.aprocess_all())
+        await asyncio.sleep(1)
+        started = time.monotonic()
+        task.cancel()
+        try:
+            await task
+            return "未取消", 0.0
+        except asyncio.CancelledError:
+            return "已取消", time.monotonic() - started
+
+    cancelled, cancel_seconds = asyncio.run(cancel_soon())
+    del os.environ['FAKE_FFMPEG_HANG']
+
+    test_cases = [
+        ("所有文件完成", (results['metadata']['done'], sum(stage['failed'] for stage in results.values())), (4, 0)),
+        ("转码期间事件循环未被阻塞", ticks > 10, True),
+        ("插值时间写入MP4", mvhd_time(directory / 'DSC_0002.mp4'),
+         datetime_to_mp4_time(datetime(2012, 3, 14, 10, 1))),
+        ("最后一个文件推断时间", mvhd_time(directory / 'DSC_0004.mp4'),
+         datetime_to_mp4_time(datetime(2012, 3, 14, 10, 3))),
+        ("原文件已归档", sorted(p.name for p in processor.archive_dir.iterdir()),
+         ['DSC_0002.AVI', 'DSC_0004.3GP']),
+        ("同步处理单个文件", (single_item.action, (single / 'MOV_0001.mp4').exists()),
+         ('convert_video', True)),
+        ("异步处理单个文件", (async_item.action, (single / 'MOV_0002.mp4').exists()),
+         ('convert_video', True)),
+        ("异步处理记录状态变化", history,
+         [STATE_DISCOVERED, STATE_DATED, STATE_CONVERTED, STATE_TAGGED, STATE_ARCHIVED, STATE_DONE]),
+        ("异步处理的文件都完成", logged_results['metadata']['done'], 2),
+        ("目录没有变化时整个跳过", rerun['metadata']['done'], 0),
+        ("取消后立即结束", (cancelled, cancel_seconds < 10), ("已取消", True)),
+        ("取消后删除不完整的输出", ((hung / 'MVI_0001.mp4').exists(), (hung / 'MVI_0001.avi').exists()), (False, True)),
+        ("取消后标记为中断", hung_processor.interrupted, True),
+    ]
+
+print("=" * 70)
+print("异步API测试")
+print("=" * 70)
+
+passed = 0
+failed = 0
+
+for description, result, expected in test_cases:
+    if result == expected:
+        status = "✅ PASS"
+        passed += 1
+    else:
+        status = "❌ FAIL"
+        failed += 1
+
+    print(f"\n{status}")
+    print(f"  场景:     {description}")
+    print(f"  期望:     {expected}")
+    print(f"  实际:     {result}")
+
+print("\n" + "=" * 70)
+print(f"测试结果: {passed} 通过, {failed} 失败")
+print("=" * 70)
@@ -0,0 +1,137 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+测试自动并行数（爬山法收敛、上下限、按主机保存、可调信号量、MP4时长读取）
+"""
+
+import struct
+import logging
+import tempfile
+import threading
+import time
+from pathlib import Path
+
+from autotune import UNIT_MEDIA_SECONDS, UNIT_PHOTOS, AutoTuner, ConcurrencyLimit, load_tuned_jobs
+from mp4_atoms import read_mp4_duration
+
+logging.getLogger().setLevel(logging.CRITICAL)
+
+test_cases = []
+
+
+def simulate(tuner, throughput, periods=30, unit=UNIT_MEDIA_SECONDS):
+    """模拟运行：每个周期按当前并行数产生吞吐量，返回经过的并行数"""
+    visited = []
+    now = 0.0
+    tuner._since = now
+    for _ in range(periods):
+        tuner.record(unit, throughput(tuner.jobs) * 10)
+        now += 10
+        visited.append(tuner.tick(now))
+    return visited
+
+
+# 吞吐量在4个并行时达到峰值，之后因争用下降：最终在4附近徘徊
+def peaked(jobs):
+    return {1: 10, 2: 19, 3: 27, 4: 33, 5: 30, 6: 26, 7: 22, 8: 18}[jobs]
+
+
+tuner = AutoTuner(1, 8, initial=1, state_path=None)
+visited = simulate(tuner, peaked)
+test_cases.append(("爬升到峰值附近", set(visited[-10:]) <= {3, 4, 5}, True))
+test_cases.append(("经过峰值", 4 in visited, True))
+
+# 从上限开始也能回到峰值附近
+tuner = AutoTuner(1, 8, initial=8, state_path=None)
+visited = simulate(tuner, peaked)
+test_cases.append(("从上限下降到峰值附近", set(visited[-10:]) <= {3, 4, 5}, True))
+
+# 吞吐量不随并行数增加（I/O瓶颈）：回到较少的并行数
+tuner = AutoTuner(1, 8, initial=2, state_path=None)
+visited = simulate(tuner, lambda jobs: 20)
+test_cases.append(("无收益时不增加并行数", max(visited[-10:]) <= 3, True))
+
+# 上下限
+tuner = AutoTuner(2, 3, initial=2, state_path=None)
+visited = simulate(tuner, lambda jobs: jobs * 10)
+test_cases.append(("不超出上下限", set(visited) <= {2, 3}, True))
+
+# 没有完成任何任务的周期不做调整
+tuner = AutoTuner(1, 8, initial=4, state_path=None)
+test_cases.append(("空周期不调整", tuner.tick(time.monotonic() + 60), 4))
+
+# 两个周期素材类别不同时重新建立基准（只试探，不根据不可比的数值反向）
+tuner = AutoTuner(1, 8, initial=4, state_path=None)
+tuner._since = 0
+tuner.record(UNIT_PHOTOS, 1000)
+tuner.tick(10)
+tuner.record(UNIT_MEDIA_SECONDS, 1)
+test_cases.append(("类别变化时继续试探", tuner.tick(20), 6))
+
+# 可调信号量：调小上限后不再放行
+limit = ConcurrencyLimit(2)
+test_cases.append(("放行到上限", [limit.try_acquire(), limit.try_acquire(), limit.try_acquire()],
+                   [True, True, False]))
+limit.set_limit(1)
+limit.release()
+test_cases.append(("调小上限后等待", limit.try_acquire(), False))
+acquired = threading.Event()
+thread = threading.Thread(target=lambda: (limit.acquire(), acquired.set()))
+thread.start()
+limit.set_limit(2)
+thread.join(5)
+test_cases.append(("调大上限后放行", acquired.is_set(), True))
+
+with tempfile.TemporaryDirectory() as tmp:
+    tmp = Path(tmp)
+
+    # 按主机名保存并在下次运行时使用
+    state_path = tmp / 'autotune.json'
+    tuner = AutoTuner(1, 8, initial=3, state_path=state_path, host='nas1')
+    simulate(tuner, lambda jobs: jobs * 10, periods=2)
+    tuner.stop()
+    saved = tuner.jobs
+    AutoTuner(1, 8, initial=7, state_path=state_path, host='nas2').stop()
+    test_cases.append(("保存本机选定值", load_tuned_jobs(state_path, 'nas1'), saved))
+    test_cases.append(("下次运行从保存值开始", AutoTuner(1, 8, state_path=state_path, host='nas1').jobs, saved))
+    test_cases.append(("没有统计周期时不保存", load_tuned_jobs(state_path, 'nas2'), None))
+    test_cases.append(("保存值超出上限时截断", AutoTuner(1, 2, state_path=state_path, host='nas1').jobs,
+                       min(saved, 2)))
+
+    # mvhd时长
+    def box(atom_type, payload):
+        return struct.pack('>I4s', 8 + len(payload), atom_type) + payload
+
+    for version, fields in ((0, struct.pack('>IIII', 0, 0, 600, 90000)),
+                            (1, struct.pack('>QQIQ', 0, 0, 600, 90000))):
+        mvhd = box(b'mvhd', bytes([version, 0, 0, 0]) + fields + b'\x00' * 80)
+        path = tmp / f'v{version}.mp4'
+        path.write_bytes(box(b'ftyp', b'isom') + box(b'moov', mvhd))
+        test_cases.append((f"mvhd v{version}时长", read_mp4_duration(path), 150.0))
+    path = tmp / 'empty.mp4'
+    path.write_bytes(box(b'ftyp', b'isom'))
+    test_cases.append(("没有moov", read_mp4_duration(path), None))
+
+print("=" * 70)
+print("自动并行数测试")
+print("=" * 70)
+
+passed = 0
+failed = 0
+
+for description, result, expected in test_cases:
+    if result == expected:
+        status = "✅ PASS"
+        passed += 1
+    else:
+        status = "❌ FAIL"
+        failed += 1
+
+    print(f"\n{status}")
+    print(f"  场景:     {description}")
+    print(f"  期望:     {expected}")
+    print(f"  实际:     {result}")
+
+print("\n" + "=" * 70)
+print(f"测试结果: {passed} 通过, {failed} 失败")
+print("=" * 70)
@@ -0,0 +1,77 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+测试AVCHD MDPM录制时间读取功能
+"""
+
+import os
+import tempfile
+
+from avchd_mdpm import MDPM_MARKER, read_mdpm_datetime
+
+
+def escape(data: bytes) -> bytes:
+    """插入H.264防竞争字节（00 00 0x → 00 00 03 0x）"""
+    out = bytearray()
+    zeros = 0
+    for byte in data:
+        if zeros >= 2 and byte <= 3:
+            out.append(3)
+            zeros = 0
+        out.append(byte)
+        zeros = zeros + 1 if byte == 0 else 0
+    return bytes(out)
+
+
+def build_m2ts(tz: int, date: bytes, time: bytes) -> bytes:
+    """构造192字节包的M2TS，SEI负载跨越多个TS包"""
+    mdpm = MDPM_MARKER + bytes([3, 0x13, 0, 0, 0, 0, 0x18, tz]) + date + b'\x19' + time + b'\xE0\x01\x02\x03\x04'
+    sei = b'\x00\x00\x00\x01\x06\x05' + bytes([len(mdpm)]) + escape(mdpm)
+    stream = b'\xFF' * 150 + sei + b'\xFF' * 400
+    packets = b''
+    for i in range(0, len(stream), 184):
+        chunk = stream[i:i + 184].ljust(184, b'\xFF')
+        packets += b'\x00\x00\x00\x00' + bytes([0x47, 0x10, 0x11, 0x10 | (i // 184) % 16]) + chunk
+    return packets
+
+
+# 测试用例: (说明, 时区字节, 日期BCD, 时间BCD, 期望结果)
+test_cases = [
+    ("东八区", 0x10, b'\x20\x12\x03', b'\x17\x23\x48\x09', "2012-03-17 23:48:09+08:00"),
+    ("西五区半", 0x2B, b'\x20\x10\x12', b'\x31\x08\x00\x00', "2010-12-31 08:00:00-05:30"),
+    ("含防竞争字节", 0x00, b'\x20\x09\x10', b'\x01\x00\x00\x01', "2009-10-01 00:00:01+00:00"),
+    ("非法BCD", 0x10, b'\x20\x12\x1A', b'\x17\x23\x48\x09', None),
+]
+
+print("=" * 70)
+print("AVCHD MDPM录制时间读取测试")
+print("=" * 70)
+
+passed = 0
+failed = 0
+
+for description, tz, date, time, expected in test_cases:
+    with tempfile.NamedTemporaryFile(suffix='.MTS', delete=False) as tmp:
+        tmp.write(build_m2ts(tz, date, time))
+        path = tmp.name
+    try:
+        result = read_mdpm_datetime(path)
+    finally:
+        os.unlink(path)
+
+    actual = str(result) if result else None
+    if actual == expected:
+        status = "✅ PASS"
+        passed += 1
+    else:
+        status = "❌ FAIL"
+        failed += 1
+
+    print(f"\n{status}")
+    print(f"  场景:     {description}")
+    print(f"  期望:     {expected}")
+    print(f"  实际:     {actual}")
+
+print("\n" + "=" * 70)
+print(f"测试结果: {passed} 通过, {failed} 失败")
+print("=" * 70)
@@ -0,0 +1,141 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+测试同时处理多个目录（目录并发数、一个目录失败不影响其他目录、停止后不再开始新目录、
+多个目录共用转码并发上限）
+
+使用假ffmpeg脚本（testing_support）代替真正的转码，脚本把每次转码的开始和结束时刻记录到FAKE_FFMPEG_TIMES
+"""
+
+import os
+import time
+import logging
+import tempfile
+import threading
+from pathlib import Path
+
+from autotune import ConcurrencyLimit
+from batch import RESULT_DONE, RESULT_FAILED, RESULT_INTERRUPTED, RESULT_SKIPPED, run_directories, summarize
+from main import MediaProcessor
+from testing_support import install_fake_ffmpeg, make_jpeg
+
+logging.getLogger().setLevel(logging.CRITICAL)
+
+test_cases = []
+
+# 同时处理的目录数
+active = 0
+peak = 0
+lock = threading.Lock()
+
+
+def slow(path):
+    global active, peak
+    with lock:
+        active += 1
+        peak = max(peak, active)
+    time.sleep(0.05)
+    with lock:
+        active -= 1
+    if path == 'broken':
+        raise ValueError("源目录不存在")
+    return 2 if path == 'partial' else 0
+
+
+directories = [f'day{i:02d}' for i in range(8)] + ['broken', 'partial']
+results = run_directories(directories, slow, workers=3)
+test_cases.append(("最多同时处理workers个目录", peak, 3))
+test_cases.append(("结果顺序与目录顺序相同", [result.path for result in results], directories))
+test_cases.append(("一个目录失败不影响其他目录",
+                   [result.status for result in results], [RESULT_DONE] * 8 + [RESULT_FAILED, RESULT_DONE]))
+test_cases.append(("记录失败原因", results[8].error, "源目录不存在"))
+test_cases.append(("有文件失败的目录不算成功", [result.ok for result in results[-3:]], [True, False, False]))
+counts = summarize(results)
+test_cases.append(("汇总", (counts[RESULT_DONE], counts[RESULT_FAILED], counts['failed_files']), (9, 1, 2)))
+
+# 停止后不再开始新目录，进行中的目录记为中断
+stop = threading.Event()
+
+
+def cancelled(path):
+    stop.set()
+    raise RuntimeError("已取消")
+
+
+results = run_directories(['a', 'b', 'c'], cancelled, workers=1, should_stop=stop.is_set)
+test_cases.append(("停止后的状态", [result.status for result in results],
+                   [RESULT_INTERRUPTED, RESULT_SKIPPED, RESULT_SKIPPED]))
+test_cases.append(("没有目录", run_directories([], slow), []))
+
+# 多个目录共用转码并发上限，各目录的时间线互不影响
+with tempfile.TemporaryDirectory() as tmp:
+    tmp = Path(tmp)
+    install_fake_ffmpeg(tmp)
+    ffmpeg_log = tmp / 'ffmpeg.log'
+    os.environ['FAKE_FFMPEG_TIMES'] = str(ffmpeg_log)
+    os.environ['FAKE_FFMPEG_DELAY'] = '0.2'
+
+    directories = []
+    for day in ('20070922_trip', '20070923_trip', '20070924_trip'):
+        directory = tmp / day
+        directory.mkdir()
+        make_jpeg(directory / 'IMG_0001.jpg')
+        for name in ('MVI_0002.avi', 'MVI_0003.avi'):
+            (directory / name).write_bytes(b'not really an avi')
+        directories.append(str(directory))
+    directories.append(str(tmp / '20070925_missing'))
+
+    job_limit = ConcurrencyLimit(2)
+    processors = {}
+
+    def process_directory(dir_path):
+        processor = MediaProcessor(dir_path, job_limit=job_limit)
+        processors[dir_path] = processor
+        summary = processor.process_all(jobs=2)
+        return sum(stage['failed'] for stage in summary.values())
+
+    results = run_directories(directories, process_directory, workers=3)
+    test_cases.append(("不存在的目录失败，其他目录完成", [result.status for result in results],
+                       [RESULT_DONE, RESULT_DONE, RESULT_DONE, RESULT_FAILED]))
+    test_cases.append(("所有视频都已转码", sorted(p.name for d in directories[:3] for p in Path(d).glob('*.mp4')),
+                       ['MVI_0002.mp4', 'MVI_0002.mp4', 'MVI_0002.mp4', 'MVI_0003.mp4', 'MVI_0003.mp4', 'MVI_0003.mp4']))
+
+    # 任一时刻运行的转码数（按开始/结束时刻计算）
+    events = []
+    for line in ffmpeg_log.read_text().split('\n'):
+        if line:
+            started, ended = map(float, line.split())
+            events += [(started, 1), (ended, -1)]
+    running = most = 0
+    for _, delta in sorted(events):
+        running += delta
+        most = max(most, running)
+    test_cases.append(("转码总数", len(events) // 2, 6))
+    test_cases.append(("同时运行的转码数不超过共用上限", most <= 2, True))
+    test_cases.append(("各目录使用自己的时间线",
+                       [sorted(processor._timelines) for processor in processors.values() if processor._timelines],
+                       [[Path(d).resolve()] for d in sorted(processors) if Path(d).exists()]))
+
+print("=" * 70)
+print("多目录处理测试")
+print("=" * 70)
+
+passed = 0
+failed = 0
+
+for description, result, expected in test_cases:
+    if result == expected:
+        status = "✅ PASS"
+        passed += 1
+    else:
+        status = "❌ FAIL"
+        failed += 1
+
+    print(f"\n{status}")
+    print(f"  场景:     {description}")
+    print(f"  期望:     {expected}")
+    print(f"  实际:     {result}")
+
+print("\n" + "=" * 70)
+print(f"测试结果: {passed} 通过, {failed} 失败")
+print("=" * 70)
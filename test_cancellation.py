@@ -0,0 +1,169 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+测试平滑取消（终止子进程、回滚不完整的转码输出、从处理日志继续）
+
+使用假ffmpeg脚本（testing_support）代替真正的转码
+"""
+
+import os
+import sys
+import time
+import logging
+import tempfile
+import threading
+import subprocess
+from pathlib import Path
+
+from cancellation import CancelToken
+from journal import STATE_DATED, STATE_DONE, Journal
+from main import MediaProcessor
+from testing_support import install_fake_ffmpeg, make_jpeg
+
+logging.getLogger().setLevel(logging.CRITICAL)
+
+test_cases = []
+
+# 受控子进程
+token = CancelToken()
+test_cases.append(("正常运行", token.run([sys.executable, '-c', 'print(1)']).stdout.strip(), b'1'))
+try:
+    token.run([sys.executable, '-c', 'import sys; sys.exit(3)'])
+    test_cases.append(("非0退出码", "未报错", 3))
+except subprocess.CalledProcessError as e:
+    test_cases.append(("非0退出码", e.returncode, 3))
+
+token.cancel(grace=0.2)
+started = time.monotonic()
+try:
+    token.run([sys.executable, '-c', 'import time; time.sleep(30)'])
+except subprocess.CalledProcessError:
+    pass
+test_cases.append(("宽限时间后终止子进程", time.monotonic() - started < 10, True))
+test_cases.append(("已取消", token.cancelled, True))
+
+# 子令牌：上级取消时一起取消，上级终止子进程时子令牌的子进程也被终止；单独取消不影响上级
+parent = CancelToken()
+child = CancelToken(parent=parent)
+child.cancel()
+test_cases.append(("子令牌单独取消", (child.cancelled, parent.cancelled), (True, False)))
+child = CancelToken(parent=parent)
+threading.Timer(0.2, lambda: (parent.cancel(), parent.kill_processes())).start()
+started = time.monotonic()
+try:
+    child.run([sys.executable, '-c', 'import time; time.sleep(30)'])
+except subprocess.CalledProcessError:
+    pass
+test_cases.append(("上级终止子令牌的子进程", time.monotonic() - started < 10, True))
+test_cases.append(("上级取消时子令牌也取消", child.cancelled, True))
+
+with tempfile.TemporaryDirectory() as tmp:
+    tmp = Path(tmp)
+    install_fake_ffmpeg(tmp)
+
+    directory = tmp / '20070922_trip'
+    directory.mkdir()
+    make_jpeg(directory / 'IMG_0001.jpg', '2007:09:22 10:00:00')
+    make_jpeg(directory / 'IMG_0002.jpg')
+    for name in ('MVI_0003.avi', 'MVI_0004.avi', 'MVI_0005.avi'):
+        (directory / name).write_bytes(b'not really an avi')
+
+    # 第一个转码开始后取消：转码被终止并回滚，其余视频不再开始
+    os.environ['FAKE_FFMPEG_HANG'] = '1'
+    token = CancelToken()
+    journal = Journal(tmp / 'journal.db')
+    processor = MediaProcessor(str(directory), cancel_token=token, journal=journal)
+
+    def cancel_when_converting():
+        while not list(directory.glob('*.mp4')):
+            time.sleep(0.02)
+        token.cancel(grace=0.3)
+
+    threading.Thread(target=cancel_when_converting, daemon=True).start()
+    started = time.monotonic()
+    # 单线程读取，保证照片在视频之前进入转码阶段
+    processor.process_all(jobs=1, workers={'metadata': 1, 'infer': 1})
+    test_cases.append(("取消后及时返回", time.monotonic() - started < 20, True))
+    test_cases.append(("标记为中断", processor.interrupted, True))
+    test_cases.append(("不完整的MP4已删除", sorted(p.name for p in directory.glob('*.mp4')), []))
+    test_cases.append(("视频未被归档", len(list(directory.glob('*.avi'))), 3))
+
+    states = {Path(path).name: entry.state for path, entry in journal.load(directory).items()}
+    test_cases.append(("处理日志中的状态", states, {
+        'IMG_0001.jpg': STATE_DONE, 'IMG_0002.jpg': STATE_DONE,
+        'MVI_0003.avi': STATE_DATED, 'MVI_0004.avi': STATE_DATED, 'MVI_0005.avi': STATE_DATED,
+    }))
+
+    # 从处理日志继续：只处理未完成的视频，已完成的照片不再改写
+    del os.environ['FAKE_FFMPEG_HANG']
+    tagged_mtime = (directory / 'IMG_0002.jpg').stat().st_mtime_ns
+    processor = MediaProcessor(str(directory), journal=journal)
+    processor.process_all(jobs=2)
+    test_cases.append(("继续后全部转码",
+                       sorted(p.name for p in directory.glob('*.mp4')),
+                       ['MVI_0003.mp4', 'MVI_0004.mp4', 'MVI_0005.mp4']))
+    test_cases.append(("原视频已归档", len(list(processor.archive_dir.glob('*.avi'))), 3))
+    test_cases.append(("已完成的照片未再改写", (directory / 'IMG_0002.jpg').stat().st_mtime_ns, tagged_mtime))
+    journal.close()
+
+    # 强制终止后留下的临时文件：只删除处理日志中记录的、写入进程已不存在的文件
+    directory = tmp / 'killed'
+    directory.mkdir()
+    for name in ('IMG_0001.jpg', 'IMG_0001.tmp', 'IMG_0002.jpg', 'IMG_0002.tmp', 'clip.mp4', 'clip_temp.mp4',
+                 'song.mp3', 'song_temp.mp3'):
+        (directory / name).write_bytes(b'x')
+    journal = Journal(tmp / 'temps.db')
+    dead = subprocess.Popen([sys.executable, '-c', 'pass'])
+    dead.wait()
+    running = subprocess.Popen([sys.executable, '-c', 'import time; time.sleep(30)'])
+    journal.begin_temp(directory / 'IMG_0001.tmp')
+    journal.begin_temp(directory / 'clip_temp.mp4')
+    journal.begin_temp(directory / 'IMG_0002.tmp')
+    # 被终止的进程写入的临时文件 / 另一个仍在运行的处理进程正在写入的临时文件
+    journal._conn.execute("UPDATE temp_files SET pid = ? WHERE path NOT LIKE '%IMG_0002.tmp'", (dead.pid,))
+    journal._conn.execute("UPDATE temp_files SET pid = ? WHERE path LIKE '%IMG_0002.tmp'", (running.pid,))
+    MediaProcessor(str(directory), journal=journal)._remove_partial_outputs()
+    running.kill()
+    running.wait()
+    test_cases.append(("只清理记录为正在写入的临时文件", sorted(p.name for p in directory.iterdir()),
+                       ['IMG_0001.jpg', 'IMG_0002.jpg', 'IMG_0002.tmp', 'clip.mp4', 'song.mp3', 'song_temp.mp3']))
+    test_cases.append(("清理后删除记录", journal.stale_temps(directory), [directory / 'IMG_0002.tmp']))
+    MediaProcessor(str(directory))._remove_partial_outputs()
+    test_cases.append(("没有任何记录时不删除任何文件", len(list(directory.iterdir())), 6))
+    journal.close()
+
+    # 不使用处理日志时，临时文件记录在只用于这一目的的数据库中，执行计划前同样清理
+    temp_journal = Journal(tmp / 'temp_files.db')
+    temp_journal.begin_temp(directory / 'song.id3.tmp')
+    (directory / 'song.id3.tmp').write_bytes(b'x')
+    temp_journal._conn.execute("UPDATE temp_files SET pid = ?", (dead.pid,))
+    processor = MediaProcessor(str(directory), temp_journal=temp_journal)
+    processor.execute(processor.plan())
+    test_cases.append(("没有处理日志时执行计划前清理临时文件",
+                       ((directory / 'song.id3.tmp').exists(), temp_journal.stale_temps(directory)), (False, [])))
+    test_cases.append(("用户的同名文件不受影响", (directory / 'song_temp.mp3').exists(), True))
+    temp_journal.close()
+
+print("=" * 70)
+print("平滑取消测试")
+print("=" * 70)
+
+passed = 0
+failed = 0
+
+for description, result, expected in test_cases:
+    if result == expected:
+        status = "✅ PASS"
+        passed += 1
+    else:
+        status = "❌ FAIL"
+        failed += 1
+
+    print(f"\n{status}")
+    print(f"  场景:     {description}")
+    print(f"  期望:     {expected}")
+    print(f"  实际:     {result}")
+
+print("\n" + "=" * 70)
+print(f"测试结果: {passed} 通过, {failed} 失败")
+print("=" * 70)
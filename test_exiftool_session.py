@@ -0,0 +1,150 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+测试常驻exiftool会话（-execute<N>/{ready<N>}分隔、会话池跨线程复用、子进程退出后重建）
+
+使用临时目录中的假exiftool脚本：实现 -stay_open True -@ -，每个参数一行，
+读到 -execute<N> 时输出文件参数（-j时为JSON）和 {ready<N>}；参数中有 -die 时直接退出。
+每次启动把进程号记录到FAKE_EXIFTOOL_LOG
+"""
+
+import os
+import sys
+import logging
+import tempfile
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+from exiftool_session import ExifToolError, ExifToolPool, ExifToolSession
+from testing_support import install_script
+
+logging.getLogger().setLevel(logging.CRITICAL)
+
+FAKE_EXIFTOOL = f"""#!{sys.executable}
+import os, sys, json
+with open(os.environ['FAKE_EXIFTOOL_LOG'], 'a') as log:
+    log.write(f"{{os.getpid()}}\\n")
+args = []
+for line in sys.stdin:
+    line = line.rstrip('\\n')
+    if args[-1:] == ['-stay_open'] and line == 'False':
+        sys.exit(0)
+    if not line.startswith('-execute'):
+        args.append(line)
+        continue
+    if '-die' in args:
+        sys.exit(1)
+    files = [arg for arg in args if not arg.startswith('-')]
+    if '-j' in args:
+        print(json.dumps([{{'SourceFile': name, 'Pid': os.getpid()}} for name in files], indent=1))
+    else:
+        for name in files:
+            print(name)
+    print('{{ready' + line[len('-execute'):] + '}}', flush=True)
+    args = []
+"""
+
+test_cases = []
+
+with tempfile.TemporaryDirectory() as tmp:
+    tmp = Path(tmp)
+    install_script(tmp, 'exiftool', FAKE_EXIFTOOL)
+    exiftool_log = tmp / 'exiftool.log'
+    os.environ['FAKE_EXIFTOOL_LOG'] = str(exiftool_log)
+
+    def started():
+        """读取并清空假exiftool的启动记录（进程号）"""
+        if not exiftool_log.exists():
+            return []
+        pids = [int(pid) for pid in exiftool_log.read_text().split()]
+        exiftool_log.unlink()
+        return pids
+
+    # 分隔标记：每批命令只读到自己编号的{ready<N>}
+    session = ExifToolSession()
+    test_cases.append(("第一批命令", session.execute('a.jpg'), 'a.jpg\n'))
+    test_cases.append(("其他编号的标记是普通输出", session.execute('{ready1}', '{ready3}', 'b.jpg'),
+                       '{ready1}\n{ready3}\nb.jpg\n'))
+    test_cases.append(("没有输出的命令", session.execute('-ver'), ''))
+    records = session.execute_json('a.jpg', 'b.jpg')
+    test_cases.append(("JSON输出", [record['SourceFile'] for record in records], ['a.jpg', 'b.jpg']))
+    test_cases.append(("没有文件时JSON为空列表", session.execute_json(), []))
+    test_cases.append(("多批命令只启动一次", len(started()), 1))
+
+    # 子进程退出：正在执行的命令报错，下一批命令重新启动进程
+    first_pid = records[0]['Pid']
+    try:
+        session.execute('-die')
+        test_cases.append(("执行中进程退出", "未报错", ExifToolError))
+    except ExifToolError:
+        test_cases.append(("执行中进程退出", ExifToolError, ExifToolError))
+    test_cases.append(("退出后不再运行", session.running, False))
+    pid = session.execute_json('c.jpg')[0]['Pid']
+    test_cases.append(("下一批命令重新启动", (pid != first_pid, len(started())), (True, 1)))
+    session._process.kill()
+    session._process.wait()
+    test_cases.append(("空闲时被终止后重新启动", session.execute('d.jpg'), 'd.jpg\n'))
+    started()
+    session.close()
+    test_cases.append(("关闭后进程已退出", session.running, False))
+
+    # 会话池：多个线程共用最多size个进程
+    with ExifToolPool(size=2) as pool:
+        barrier = threading.Barrier(4)
+        seen = []
+
+        def worker(index):
+            barrier.wait()
+            pids = set()
+            for number in range(5):
+                pids.add(pool.execute_json(f'{index}_{number}.jpg')[0]['Pid'])
+            return pids
+
+        with ThreadPoolExecutor(max_workers=4) as executor:
+            for pids in executor.map(worker, range(4)):
+                seen.append(pids)
+        used = set().union(*seen)
+        test_cases.append(("池中进程数不超过size", len(used) <= 2, True))
+        test_cases.append(("进程被多个线程复用", len(started()), len(used)))
+
+        # 出错的会话被关闭，下次借用时重建
+        try:
+            with pool.session() as session:
+                session.execute('-die')
+        except ExifToolError:
+            pass
+        pids = {pool.execute_json('f.jpg')[0]['Pid'] for _ in range(4)}
+        test_cases.append(("出错后池仍可用", len(pids) <= 2 and len(started()) == 1, True))
+        sessions = pool._sessions
+    test_cases.append(("关闭池后所有进程退出", any(session.running for session in sessions), False))
+
+    try:
+        ExifToolPool(executable=str(tmp / 'missing'))
+        test_cases.append(("未安装exiftool", "未报错", ExifToolError))
+    except ExifToolError:
+        test_cases.append(("未安装exiftool", ExifToolError, ExifToolError))
+
+print("=" * 70)
+print("常驻exiftool会话测试")
+print("=" * 70)
+
+passed = 0
+failed = 0
+
+for description, result, expected in test_cases:
+    if result == expected:
+        status = "✅ PASS"
+        passed += 1
+    else:
+        status = "❌ FAIL"
+        failed += 1
+
+    print(f"\n{status}")
+    print(f"  场景:     {description}")
+    print(f"  期望:     {expected}")
+    print(f"  实际:     {result}")
+
+print("\n" + "=" * 70)
+print(f"测试结果: {passed} 通过, {failed} 失败")
+print("=" * 70)
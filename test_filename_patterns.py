@@ -0,0 +1,84 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+测试文件名时间格式注册表（配置加载、前缀分派、优先级）
+"""
+
+import os
+import tempfile
+
+from filename_dates import (
+    MEDIA_IMAGE,
+    MEDIA_VIDEO,
+    DEFAULT_PATTERNS_FILE,
+    FilenamePattern,
+    PatternRegistry,
+    match_filename_datetime,
+)
+
+registry = PatternRegistry()
+registry.load_config(DEFAULT_PATTERNS_FILE)
+
+# 优先级高于内置temp格式的自定义格式
+with tempfile.NamedTemporaryFile('w', suffix='.ini', delete=False, encoding='utf-8') as tmp:
+    tmp.write("[early]\nregex = ^X(?P<date>\\d{8})\nformat = %Y%m%d\npriority = 5\n")
+    extra_config = tmp.name
+try:
+    registry.load_config(extra_config)
+finally:
+    os.unlink(extra_config)
+
+# 测试用例: (说明, 文件名, 媒体类型, 期望时间, 期望来源)
+test_cases = [
+    ("安卓相机照片", "IMG_20120314_142357", MEDIA_IMAGE, "2012-03-14 14:23:57", "IMG_YYYYMMDD_HHMMSS"),
+    ("安卓相机视频", "VID_20120314_142357", MEDIA_VIDEO, "2012-03-14 14:23:57", "VID_YYYYMMDD_HHMMSS"),
+    ("视频格式不用于照片", "VID_20120314_142357", MEDIA_IMAGE, None, None),
+    ("WhatsApp图片", "IMG-20120314-WA0001", MEDIA_IMAGE, "2012-03-14 00:00:00", "WhatsApp_IMG"),
+    ("新版截图", "Screenshot_20120314-142357", MEDIA_IMAGE, "2012-03-14 14:23:57", "Screenshot_YYYYMMDD-HHMMSS"),
+    ("旧版截图", "Screenshot_2012-03-14-14-23-57", MEDIA_IMAGE, "2012-03-14 14:23:57", "Screenshot_YYYY-MM-DD-HH-MM-SS"),
+    ("非法日期", "IMG_20121314_142357", MEDIA_IMAGE, None, None),
+    ("普通相机文件名", "DSC_0001", MEDIA_IMAGE, None, None),
+    ("自定义优先级", "X20120314", None, "2012-03-14 00:00:00", "early"),
+]
+
+print("=" * 70)
+print("文件名时间格式注册表测试")
+print("=" * 70)
+
+passed = 0
+failed = 0
+
+
+def check(description, result, expected):
+    global passed, failed
+    if result == expected:
+        status = "✅ PASS"
+        passed += 1
+    else:
+        status = "❌ FAIL"
+        failed += 1
+    print(f"\n{status}")
+    print(f"  场景:     {description}")
+    print(f"  期望:     {expected}")
+    print(f"  实际:     {result}")
+
+
+for description, stem, media, expected_time, expected_source in test_cases:
+    dt, source = registry.match(stem, media=media)
+    check(description, (str(dt) if dt else None, source), (expected_time, expected_source))
+
+# 前缀分派：只返回前缀相符的候选格式
+check("前缀候选", [p.name for p in registry.candidates("Screenshot_x")],
+      ["Screenshot_YYYYMMDD-HHMMSS", "Screenshot_YYYY-MM-DD-HH-MM-SS"])
+check("没有候选", registry.candidates("DSC_0001"), [])
+
+# 前缀自动推导（量词作用的字符不计入前缀）
+check("前缀推导", FilenamePattern('p', r'^ABC_?(?P<date>\d{8})', '%Y%m%d').prefix, "ABC")
+
+# 内置格式与默认注册表的组合
+check("内置MA格式", match_filename_datetime("MA201203141423570096-12-000000", media=MEDIA_IMAGE)[1], "ma")
+check("默认注册表", match_filename_datetime("IMG_20120314_142357", media=MEDIA_IMAGE)[1], "IMG_YYYYMMDD_HHMMSS")
+
+print("\n" + "=" * 70)
+print(f"测试结果: {passed} 通过, {failed} 失败")
+print("=" * 70)
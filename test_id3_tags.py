@@ -0,0 +1,141 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+测试ID3v2.4日期标签写入功能
+"""
+
+import os
+import struct
+import logging
+import tempfile
+from datetime import datetime
+
+from id3_tags import build_tag, build_text_frame, decode_syncsafe, read_tag, write_id3_date
+
+logging.getLogger().setLevel(logging.CRITICAL)
+
+
+def read_text_frames(body: bytes) -> dict:
+    """解析ID3v2.4帧区域中的文本帧（不过滤日期帧）"""
+    frames = {}
+    offset = 0
+    while offset + 10 <= len(body) and body[offset] != 0:
+        size = decode_syncsafe(body[offset + 4:offset + 8])
+        frames[body[offset:offset + 4]] = body[offset + 11:offset + 10 + size].decode('utf-8')
+        offset += 10 + size
+    return frames
+
+
+AUDIO = b'\xFF\xFB\x90\x00' + b'\x55' * 2048
+
+
+def v23_tag(frames: list, padding: int) -> bytes:
+    """构造ID3v2.3标签，frames为(帧ID, 文本)或(帧ID, 文本, 格式标志)"""
+    body = b''
+    for frame_id, text, *flags in frames:
+        payload = b'\x00' + text.encode('latin-1')
+        body += frame_id + struct.pack('>I', len(payload)) + bytes([0, flags[0] if flags else 0]) + payload
+    body += b'\x00' * padding
+    size = len(body)
+    syncsafe = bytes([(size >> 21) & 0x7F, (size >> 14) & 0x7F, (size >> 7) & 0x7F, size & 0x7F])
+    return b'ID3\x03\x00\x00' + syncsafe + body
+
+
+# v2.4中不存在的v2.3帧
+V23_ONLY_FRAMES = {b'TYER', b'TDAT', b'TIME', b'TORY', b'TRDA', b'IPLS', b'TSIZ'}
+
+# 测试用例: (说明, 原始文件内容, 期望原地改写, 期望保留的其他帧)
+test_cases = [
+    ("没有ID3标签", AUDIO, False, {}),
+    ("v2.4标签且填充充足", build_tag([build_text_frame(b'TIT2', '标题')], 1024) + AUDIO, True, {b'TIT2': '标题'}),
+    ("v2.4标签但没有填充", build_tag([build_text_frame(b'TIT2', 'title')], 30) + AUDIO, False, {b'TIT2': 'title'}),
+    ("v2.3标签含旧日期帧",
+     v23_tag([(b'TIT2', 'title'), (b'TYER', '1999'), (b'TDAT', '1703'), (b'TIME', '2348'), (b'TRDA', '17 March')],
+             512) + AUDIO, True, {b'TIT2': 'title'}),
+    ("v2.3专有帧改名或丢弃", v23_tag([(b'IPLS', 'mix'), (b'TSIZ', '2052')], 512) + AUDIO, True, {b'TIPL': 'mix'}),
+]
+
+# 含无法转换的v2.3帧：不修改文件（由调用者改用ffmpeg）
+refused_cases = [
+    ("v2.3压缩帧", v23_tag([(b'TIT2', 'title'), (b'COMM', 'zlib', 0x80)], 512) + AUDIO),
+    ("v2.3加密帧", v23_tag([(b'TIT2', 'title', 0x40)], 512) + AUDIO),
+    ("v2.3分组帧", v23_tag([(b'TIT2', 'title', 0x20)], 512) + AUDIO),
+    ("v2.3音量调整帧（v2.4格式不同）", v23_tag([(b'RVAD', 'volume')], 512) + AUDIO),
+]
+
+dt = datetime(2012, 3, 17, 23, 48, 9)
+
+print("=" * 70)
+print("ID3v2.4日期标签写入测试")
+print("=" * 70)
+
+passed = 0
+failed = 0
+
+for description, original, expect_in_place, expect_frames in test_cases:
+    with tempfile.NamedTemporaryFile(suffix='.mp3', delete=False) as tmp:
+        tmp.write(original)
+        path = tmp.name
+
+    try:
+        ok = write_id3_date(path, dt)
+        with open(path, 'rb') as f:
+            major, flags, size, body = read_tag(f)
+            f.seek(size)
+            audio = f.read()
+            f.seek(0)
+            data = f.read()
+        frames = read_text_frames(body)
+        in_place = len(data) == len(original)
+        ok = (
+            ok
+            and major == 4
+            and audio == AUDIO
+            and frames.get(b'TDRC') == '2012-03-17T23:48:09'
+            and frames.get(b'TDOR') == '2012-03-17T23:48:09'
+            and not V23_ONLY_FRAMES & frames.keys()
+            and all(frames.get(frame_id) == text for frame_id, text in expect_frames.items())
+            and in_place == expect_in_place
+        )
+    finally:
+        os.unlink(path)
+
+    if ok:
+        status = "✅ PASS"
+        passed += 1
+    else:
+        status = "❌ FAIL"
+        failed += 1
+
+    print(f"\n{status}")
+    print(f"  场景:     {description}")
+    print(f"  原地改写: {in_place}")
+    print(f"  帧:       {sorted(k.decode() for k in frames)}")
+
+for description, original in refused_cases:
+    with tempfile.NamedTemporaryFile(suffix='.mp3', delete=False) as tmp:
+        tmp.write(original)
+        path = tmp.name
+
+    try:
+        written = write_id3_date(path, dt)
+        with open(path, 'rb') as f:
+            unchanged = f.read() == original
+    finally:
+        os.unlink(path)
+
+    if not written and unchanged:
+        status = "✅ PASS"
+        passed += 1
+    else:
+        status = "❌ FAIL"
+        failed += 1
+
+    print(f"\n{status}")
+    print(f"  场景:     {description}")
+    print(f"  已写入:   {written}")
+    print(f"  文件未变: {unchanged}")
+
+print("\n" + "=" * 70)
+print(f"测试结果: {passed} 通过, {failed} 失败")
+print("=" * 70)
@@ -0,0 +1,205 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+测试处理日志（状态记录、WAL模式、跳过已完成的文件、跳过没有变化的目录、从中断的状态继续、
+继续已归档但未转码的文件）
+
+使用假ffmpeg脚本（testing_support）代替真正的转码，脚本把每次调用记录到FAKE_FFMPEG_LOG
+"""
+
+import os
+import sqlite3
+import logging
+import tempfile
+from pathlib import Path
+
+from journal import (
+    STATE_ARCHIVED,
+    STATE_CONVERTED,
+    STATE_DATED,
+    STATE_DISCOVERED,
+    STATE_DONE,
+    STATE_TAGGED,
+    Journal,
+)
+from main import MediaProcessor
+from testing_support import install_fake_ffmpeg, make_jpeg
+
+logging.getLogger().setLevel(logging.CRITICAL)
+
+test_cases = []
+
+with tempfile.TemporaryDirectory() as tmp:
+    tmp = Path(tmp)
+    install_fake_ffmpeg(tmp)
+    ffmpeg_log = tmp / 'ffmpeg.log'
+    os.environ['FAKE_FFMPEG_LOG'] = str(ffmpeg_log)
+
+    def conversions():
+        """读取并清空假ffmpeg的调用记录（只统计转码，不含写入时间的重新封装）"""
+        if not ffmpeg_log.exists():
+            return []
+        names = ffmpeg_log.read_text().split()
+        ffmpeg_log.unlink()
+        return sorted(name for name in names if not name.endswith(('.mp4', '.mp3')))
+
+    # 记录与读取
+    journal = Journal(tmp / 'journal.db')
+    mode = sqlite3.connect(str(tmp / 'journal.db')).execute("PRAGMA journal_mode").fetchone()[0]
+    test_cases.append(("WAL模式", mode, 'wal'))
+
+    sample = tmp / 'sample' / 'a.jpg'
+    sample.parent.mkdir()
+    sample.write_bytes(b'x')
+    journal.record(sample, STATE_DISCOVERED)
+    journal.record(sample, STATE_DONE)
+    entry = journal.load(sample.parent)[str(sample)]
+    test_cases.append(("最新状态", entry.state, STATE_DONE))
+    test_cases.append(("状态历史", journal.history(sample), [STATE_DISCOVERED, STATE_DONE]))
+    test_cases.append(("文件未变化", entry.matches(sample.stat()), True))
+    sample.write_bytes(b'xy')
+    test_cases.append(("文件已变化", entry.matches(sample.stat()), False))
+    journal.record(sample, STATE_DONE)
+    replacement = sample.with_name('b.jpg')
+    replacement.write_bytes(b'yz')
+    os.utime(replacement, ns=(sample.stat().st_atime_ns, sample.stat().st_mtime_ns))
+    os.replace(replacement, sample)
+    entry = journal.load(sample.parent)[str(sample)]
+    test_cases.append(("被大小和修改时间相同的文件替换", entry.matches(sample.stat()), False))
+    journal.close()
+    journal = Journal(tmp / 'journal.db')
+    test_cases.append(("重新打开后仍在", journal.load(sample.parent)[str(sample)].state, STATE_DONE))
+    test_cases.append(("记录的文件数", len(journal), 1))
+
+    directory = tmp / '20070922_trip'
+    directory.mkdir()
+    taken = '2007:09:22 10:00:00'
+    make_jpeg(directory / 'IMG_0001.jpg', taken)
+    make_jpeg(directory / 'IMG_0002.jpg')
+    for name in ('MVI_0003.avi', 'MVI_0004.avi'):
+        (directory / name).write_bytes(b'not really an avi')
+
+    # 第一次运行：每个文件都记录完整的状态变化
+    processor = MediaProcessor(str(directory), journal=journal)
+    processor.process_all(jobs=2)
+    test_cases.append(("第一次运行转码", conversions(), ['MVI_0003.avi', 'MVI_0004.avi']))
+    test_cases.append(("视频的状态变化", journal.history(directory / 'MVI_0003.avi'),
+                       [STATE_DISCOVERED, STATE_DATED, STATE_CONVERTED, STATE_TAGGED, STATE_ARCHIVED, STATE_DONE]))
+    test_cases.append(("需要写入时间的照片", journal.history(directory / 'IMG_0002.jpg'),
+                       [STATE_DISCOVERED, STATE_DATED, STATE_TAGGED, STATE_DONE]))
+    test_cases.append(("已有EXIF时间的照片", journal.history(directory / 'IMG_0001.jpg'),
+                       [STATE_DISCOVERED, STATE_DATED, STATE_DONE]))
+    test_cases.append(("转码输出记为已完成", journal.history(directory / 'MVI_0003.mp4'), [STATE_DONE]))
+
+    # 再次运行：全部跳过，不读取、不改写任何文件
+    mtimes = {path.name: path.stat().st_mtime_ns for path in directory.iterdir()}
+    processor = MediaProcessor(str(directory), journal=journal)
+    summary = processor.process_all(jobs=2)
+    test_cases.append(("再次运行不转码", conversions(), []))
+    test_cases.append(("再次运行没有文件进入流水线", summary['metadata']['done'], 0))
+    test_cases.append(("文件未被改写", {path.name: path.stat().st_mtime_ns for path in directory.iterdir()}, mtimes))
+
+    # 文件被修改后重新处理
+    make_jpeg(directory / 'IMG_0002.jpg', size=(16, 16))
+    summary = MediaProcessor(str(directory), journal=journal).process_all(jobs=2)
+    test_cases.append(("只重新处理变化的文件", summary['metadata']['done'], 1))
+    test_cases.append(("变化的照片重新写入时间", journal.history(directory / 'IMG_0002.jpg')[-3:],
+                       [STATE_DATED, STATE_TAGGED, STATE_DONE]))
+
+    # 目录没有增加、删除或改名文件时整个跳过
+    old_mtime = (1190426400000000000, 1190426400000000000)
+    test_cases.append(("刚处理完时目录修改时间不可信", journal.directory_unchanged(directory), False))
+    os.utime(directory, ns=old_mtime)
+    journal.record_directory(directory)
+    test_cases.append(("目录没有变化", journal.directory_unchanged(directory), True))
+    # 原地修改文件内容不改变目录修改时间：默认不发现，完整扫描时发现
+    make_jpeg(directory / 'IMG_0001.jpg', taken, size=(16, 16))
+    os.utime(directory, ns=old_mtime)
+    summary = MediaProcessor(str(directory), journal=journal).process_all(jobs=2)
+    test_cases.append(("跳过没有变化的目录", summary['metadata']['done'], 0))
+    summary = MediaProcessor(str(directory), journal=journal).process_all(jobs=2, full_scan=True)
+    test_cases.append(("完整扫描发现原地修改的文件", summary['metadata']['done'], 1))
+    # 加入新文件后只处理新文件
+    os.utime(directory, ns=old_mtime)
+    journal.record_directory(directory)
+    make_jpeg(directory / 'IMG_0008.jpg')
+    summary = MediaProcessor(str(directory), journal=journal).process_all(jobs=2)
+    test_cases.append(("目录变化后只处理新文件", summary['metadata']['done'], 1))
+
+    # 扫描之后才加入的文件：不记录目录修改时间，下次运行时处理
+    directory = tmp / '20070922_inbox'
+    directory.mkdir()
+    make_jpeg(directory / 'IMG_0001.jpg', taken)
+    os.utime(directory, ns=old_mtime)
+    processor = MediaProcessor(str(directory), journal=journal)
+    snapshot = processor._snapshot
+
+    def snapshot_then_add():
+        files = snapshot()
+        make_jpeg(directory / 'IMG_0002.jpg', taken)
+        os.utime(directory, ns=old_mtime)
+        return files
+
+    processor._snapshot = snapshot_then_add
+    processor.process_all(jobs=2)
+    test_cases.append(("扫描后加入文件时不记为没有变化", journal.directory_unchanged(directory), False))
+    summary = MediaProcessor(str(directory), journal=journal).process_all(jobs=2)
+    test_cases.append(("下次运行处理扫描后加入的文件",
+                       (summary['metadata']['done'], journal.get(directory / 'IMG_0002.jpg').state), (1, STATE_DONE)))
+
+    # 转码后、归档前崩溃：从converted继续，不再转码
+    directory = tmp / '20070923_crash'
+    directory.mkdir()
+    (directory / 'MVI_0005.avi').write_bytes(b'not really an avi')
+    processor = MediaProcessor(str(directory), journal=journal)
+    item = processor.plan_file(directory / 'MVI_0005.avi')
+    item.snapshot()
+    journal.record(item.path, STATE_DATED, item)
+    processor._transform(item)
+    journal.record(item.path, STATE_CONVERTED, item)
+    conversions()
+    MediaProcessor(str(directory), journal=journal).process_all()
+    test_cases.append(("从converted继续时不再转码", conversions(), []))
+    test_cases.append(("继续后归档", (directory.parent / 'archive2' / directory.name / 'MVI_0005.avi').exists(), True))
+    test_cases.append(("继续后完成", journal.history(directory / 'MVI_0005.avi')[-3:],
+                       [STATE_TAGGED, STATE_ARCHIVED, STATE_DONE]))
+
+    # 旧版本先归档再转码，转码前中断：归档目录中的原文件没有转码输出
+    directory = tmp / '20070924_legacy'
+    directory.mkdir()
+    archive_dir = directory.parent / 'archive2' / directory.name
+    archive_dir.mkdir(parents=True)
+    (archive_dir / 'MVI_0006.avi').write_bytes(b'not really an avi')
+    (archive_dir / 'MVI_0007.avi').write_bytes(b'not really an avi')
+    (directory / 'MVI_0007.mp4').write_bytes(b'converted earlier')
+    MediaProcessor(str(directory), journal=journal).process_all()
+    test_cases.append(("只转码缺少输出的归档文件", conversions(), ['MVI_0006.avi']))
+    test_cases.append(("输出写回源目录", sorted(p.name for p in directory.glob('*.mp4')),
+                       ['MVI_0006.mp4', 'MVI_0007.mp4']))
+    test_cases.append(("归档文件保留在原处", sorted(p.name for p in archive_dir.iterdir()),
+                       ['MVI_0006.avi', 'MVI_0007.avi']))
+    journal.close()
+
+print("=" * 70)
+print("处理日志测试")
+print("=" * 70)
+
+passed = 0
+failed = 0
+
+for description, result, expected in test_cases:
+    if result == expected:
+        status = "✅ PASS"
+        passed += 1
+    else:
+        status = "❌ FAIL"
+        failed += 1
+
+    print(f"\n{status}")
+    print(f"  场景:     {description}")
+    print(f"  期望:     {expected}")
+    print(f"  实际:     {result}")
+
+print("\n" + "=" * 70)
+print(f"测试结果: {passed} 通过, {failed} 失败")
+print("=" * 70)
@@ -0,0 +1,168 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+测试MP4原子原地改写与读取创建时间功能
+"""
+
+import os
+import struct
+import tempfile
+from datetime import datetime, timezone
+
+from mp4_atoms import (
+    datetime_to_mp4_time,
+    find_time_boxes,
+    patch_mp4_times,
+    read_box_times,
+    read_creation_texts,
+)
+
+
+def box(atom_type: bytes, payload: bytes) -> bytes:
+    return struct.pack('>I4s', 8 + len(payload), atom_type) + payload
+
+
+def time_box(atom_type: bytes, version: int, value: int) -> bytes:
+    if version == 1:
+        payload = bytes([1, 0, 0, 0]) + struct.pack('>QQ', value, value) + b'\x00' * 20
+    else:
+        payload = bytes([0, 0, 0, 0]) + struct.pack('>II', value, value) + b'\x00' * 20
+    return box(atom_type, payload)
+
+
+def build_mp4(moov_at_end: bool, large_mdat: bool) -> bytes:
+    """构造一个最小的MP4结构：ftyp + mdat + moov(mvhd, trak(tkhd, mdia(mdhd)))"""
+    ftyp = box(b'ftyp', b'isom\x00\x00\x02\x00isomiso2')
+    media = b'\xAB' * 4096
+    if large_mdat:
+        mdat = struct.pack('>I4sQ', 1, b'mdat', 16 + len(media)) + media
+    else:
+        mdat = box(b'mdat', media)
+    trak = box(b'trak', time_box(b'tkhd', 1, 100) + box(b'mdia', time_box(b'mdhd', 0, 100)))
+    moov = box(b'moov', time_box(b'mvhd', 0, 100) + trak + box(b'udta', b''))
+    return ftyp + (mdat + moov if moov_at_end else moov + mdat)
+
+
+# 测试用例: (说明, moov在末尾, 64位mdat)
+test_cases = [
+    ("moov在文件开头", False, False),
+    ("moov在文件末尾", True, False),
+    ("64位mdat大小 + moov在末尾", True, True),
+]
+
+target = datetime(2012, 3, 17, 23, 48, 9, tzinfo=timezone.utc)
+expected_time = datetime_to_mp4_time(target)
+
+print("=" * 70)
+print("MP4原子原地改写与读取创建时间测试")
+print("=" * 70)
+
+passed = 0
+failed = 0
+
+for description, moov_at_end, large_mdat in test_cases:
+    original = build_mp4(moov_at_end, large_mdat)
+    with tempfile.NamedTemporaryFile(suffix='.mp4', delete=False) as tmp:
+        tmp.write(original)
+        path = tmp.name
+
+    try:
+        patched = patch_mp4_times(path, target)
+        with open(path, 'rb') as f:
+            times = [read_box_times(f, atom) for atom in find_time_boxes(f)]
+            f.seek(0)
+            data = f.read()
+        ok = (
+            patched == 3
+            and len(data) == len(original)
+            and all(t[1] == expected_time and t[2] == expected_time for t in times)
+            and b'\xAB' * 4096 in data
+        )
+    finally:
+        os.unlink(path)
+
+    if ok:
+        status = "✅ PASS"
+        passed += 1
+    else:
+        status = "❌ FAIL"
+        failed += 1
+
+    print(f"\n{status}")
+    print(f"  场景:     {description}")
+    print(f"  改写原子: {patched}")
+    print(f"  时间字段: {times}")
+
+# 非MP4文件不应被修改
+with tempfile.NamedTemporaryFile(suffix='.mp4', delete=False) as tmp:
+    tmp.write(b'not an mp4 file at all')
+    path = tmp.name
+try:
+    patched = patch_mp4_times(path, target)
+    with open(path, 'rb') as f:
+        unchanged = f.read() == b'not an mp4 file at all'
+finally:
+    os.unlink(path)
+
+if patched == 0 and unchanged:
+    status = "✅ PASS"
+    passed += 1
+else:
+    status = "❌ FAIL"
+    failed += 1
+print(f"\n{status}")
+print("  场景:     非MP4文件保持不变")
+
+
+def quicktime_meta(creationdate: str) -> bytes:
+    """构造QuickTime风格的moov/meta(hdlr, keys, ilst)"""
+    key = b'com.apple.quicktime.creationdate'
+    keys = box(b'keys', b'\x00\x00\x00\x00' + struct.pack('>I', 1)
+               + struct.pack('>I4s', 8 + len(key), b'mdta') + key)
+    data = box(b'data', struct.pack('>II', 1, 0) + creationdate.encode('utf-8'))
+    ilst = box(b'ilst', box(struct.pack('>I', 1), data))
+    hdlr = box(b'hdlr', b'\x00' * 8 + b'mdta' + b'\x00' * 13)
+    return box(b'meta', hdlr + keys + ilst)
+
+
+def udta_day(text: str) -> bytes:
+    """构造QuickTime风格的udta/©day"""
+    payload = struct.pack('>HH', len(text), 0x55C4) + text.encode('utf-8')
+    return box(b'udta', box(b'\xa9day', payload))
+
+
+# 读取测试用例: (说明, moov内容, 期望结果)
+read_cases = [
+    ("只有mvhd", time_box(b'mvhd', 0, expected_time), ['2012-03-17T23:48:09Z']),
+    ("mvhd为0时不返回", time_box(b'mvhd', 0, 0), []),
+    ("QuickTime keys/ilst",
+     time_box(b'mvhd', 1, 0) + quicktime_meta('2012-03-18T07:48:09+0800'),
+     ['2012-03-18T07:48:09+0800']),
+    ("udta/©day",
+     time_box(b'mvhd', 0, expected_time) + udta_day('2012-03-18T07:48:09+0800'),
+     ['2012-03-17T23:48:09Z', '2012-03-18T07:48:09+0800']),
+]
+
+for description, moov_payload, expected in read_cases:
+    with tempfile.NamedTemporaryFile(suffix='.mov', delete=False) as tmp:
+        tmp.write(box(b'ftyp', b'qt  \x00\x00\x00\x00') + box(b'mdat', b'\x00' * 64) + box(b'moov', moov_payload))
+        path = tmp.name
+    try:
+        result = read_creation_texts(path)
+    finally:
+        os.unlink(path)
+
+    if result == expected:
+        status = "✅ PASS"
+        passed += 1
+    else:
+        status = "❌ FAIL"
+        failed += 1
+    print(f"\n{status}")
+    print(f"  场景:     {description}")
+    print(f"  期望:     {expected}")
+    print(f"  实际:     {result}")
+
+print("\n" + "=" * 70)
+print(f"测试结果: {passed} 通过, {failed} 失败")
+print("=" * 70)
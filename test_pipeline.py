@@ -0,0 +1,131 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+测试有界队列流水线（背压、失败隔离、阶段重叠）及MediaProcessor流水线处理
+"""
+
+import time
+import struct
+import logging
+import tempfile
+import threading
+from datetime import datetime
+from pathlib import Path
+
+from main import MediaProcessor
+from mp4_atoms import datetime_to_mp4_time, find_time_boxes, read_box_times
+from pipeline import Pipeline, Stage
+from testing_support import make_jpeg
+
+logging.getLogger().setLevel(logging.CRITICAL)
+
+test_cases = []
+
+# 背压：慢速的最后阶段限制源头最多领先多少项
+lock = threading.Lock()
+progress = {'produced': 0, 'finished': 0, 'lead': 0}
+
+
+def source(count):
+    for i in range(count):
+        with lock:
+            progress['produced'] += 1
+            progress['lead'] = max(progress['lead'], progress['produced'] - progress['finished'])
+        yield i
+
+
+def slow_sink(item):
+    time.sleep(0.001)
+    with lock:
+        progress['finished'] += 1
+    return item
+
+
+pipeline = Pipeline([Stage('fast', lambda x: x, 2, maxsize=4), Stage('slow', slow_sink, 1, maxsize=4)])
+results = pipeline.run(source(200))
+test_cases.append(("所有项通过流水线", sorted(results), list(range(200))))
+test_cases.append(("背压限制在途项数", progress['lead'] <= 4 + 4 + 2 + 1 + 1, True))
+
+
+# 失败隔离：一项失败不影响其他项
+def flaky(item):
+    if item == 3:
+        raise ValueError("bad item")
+    return item
+
+
+pipeline = Pipeline([Stage('flaky', flaky, 2), Stage('drop_odd', lambda x: x if x % 2 == 0 else None)])
+results = pipeline.run(range(10))
+test_cases.append(("失败与提前结束", (sorted(results), pipeline.summary()['flaky']['failed'],
+                                   pipeline.summary()['drop_odd']['dropped']), ([0, 2, 4, 6, 8], 1, 4)))
+
+
+# 阶段重叠：两个各耗时0.05秒的阶段处理10项，应明显少于串行的1秒
+def sleepy(item):
+    time.sleep(0.05)
+    return item
+
+
+started = time.perf_counter()
+Pipeline([Stage('io', sleepy), Stage('cpu', sleepy)]).run(range(10))
+test_cases.append(("阶段并行运行", time.perf_counter() - started < 0.8, True))
+
+
+# MediaProcessor.process_all：视频插值等待图片时间，转码成功后才归档
+def box(atom_type: bytes, payload: bytes) -> bytes:
+    return struct.pack('>I4s', 8 + len(payload), atom_type) + payload
+
+
+def fake_convert(source_path, output_path):
+    mvhd = box(b'mvhd', bytes(4) + struct.pack('>II', 1, 1) + bytes(20))
+    output_path.write_bytes(box(b'ftyp', b'isom') + box(b'moov', mvhd) + box(b'mdat', b''))
+    return source_path.exists()
+
+
+with tempfile.TemporaryDirectory() as tmp:
+    directory = Path(tmp) / 'trip'
+    directory.mkdir()
+    make_jpeg(directory / 'DSC_0001.JPG', '2012:03:14 10:00:00')
+    (directory / 'DSC_0002.AVI').write_bytes(b'not really an avi')
+    make_jpeg(directory / 'DSC_0003.JPG', '2012:03:14 10:02:00')
+    (directory / 'DSC_0004.FLV').write_bytes(b'conversion fails')
+
+    processor = MediaProcessor(str(directory))
+    processor.convert_avi_to_mp4 = fake_convert
+    processor.convert_flv_to_mp4 = lambda source_path, output_path: False
+    summary = processor.process_all(jobs=2)
+
+    with open(directory / 'DSC_0002.mp4', 'rb') as f:
+        mvhd_time = read_box_times(f, find_time_boxes(f)[0])[1]
+    archived = sorted(p.name for p in processor.archive_dir.iterdir())
+
+    test_cases += [
+        ("转码后写入插值时间", mvhd_time, datetime_to_mp4_time(datetime(2012, 3, 14, 10, 1))),
+        ("转码成功后才归档", archived, ['DSC_0002.AVI']),
+        ("转码失败的原文件保留", (directory / 'DSC_0004.FLV').exists(), True),
+        ("转码失败计数", summary['transform']['failed'], 1),
+    ]
+
+print("=" * 70)
+print("流水线测试")
+print("=" * 70)
+
+passed = 0
+failed = 0
+
+for description, result, expected in test_cases:
+    if result == expected:
+        status = "✅ PASS"
+        passed += 1
+    else:
+        status = "❌ FAIL"
+        failed += 1
+
+    print(f"\n{status}")
+    print(f"  场景:     {description}")
+    print(f"  期望:     {expected}")
+    print(f"  实际:     {result}")
+
+print("\n" + "=" * 70)
+print(f"测试结果: {passed} 通过, {failed} 失败")
+print("=" * 70)
@@ -0,0 +1,96 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+测试处理计划（只读计划、计划中的图片时间用于插值、JSON往返）
+"""
+
+import io
+import logging
+import tempfile
+from datetime import datetime
+from pathlib import Path
+
+from main import MediaProcessor
+from plan import ACTION_CONVERT_VIDEO, ACTION_SKIP, ACTION_TAG_IMAGE, dump_plans, load_plans
+from testing_support import make_jpeg
+
+logging.getLogger().setLevel(logging.WARNING)
+
+
+with tempfile.TemporaryDirectory() as tmp:
+    directory = Path(tmp) / '20120314_trip'
+    directory.mkdir()
+    make_jpeg(directory / 'DSC_0001.JPG', '2012:03:14 10:00:00')
+    make_jpeg(directory / 'DSC_0002.AVI')              # 不是真正的AVI，只用于计划
+    make_jpeg(directory / 'DSC_0003.JPG')              # 没有EXIF，时间来自目录名
+    make_jpeg(directory / '临时文件名2012-03-14 10.10.00.jpg')
+    make_jpeg(directory / 'IMG_20120314_120000.jpg', '2012:03:14 11:59:58')  # 已有EXIF的安卓照片
+    make_jpeg(directory / 'IMG_20120314_130000.jpg')  # 没有EXIF的安卓照片
+    (directory / 'DSC_0002.mp4').write_bytes(b'')      # 会被DSC_0002.AVI的转换结果覆盖
+    before = sorted((p.name, p.stat().st_mtime_ns) for p in directory.iterdir())
+
+    processor = MediaProcessor(str(directory))
+    plan = processor.plan(jobs=4)
+    items = {Path(item.path).name: item for item in plan.items}
+    after = sorted((p.name, p.stat().st_mtime_ns) for p in directory.iterdir())
+
+    buffer = io.StringIO()
+    dump_plans([plan], buffer)
+    buffer.seek(0)
+    loaded = load_plans(buffer)[0]
+    loaded_items = {Path(item.path).name: item for item in loaded.items}
+
+    # 测试用例: (说明, 实际结果, 期望结果)
+    test_cases = [
+        ("计划不修改目录", after, before),
+        ("EXIF时间不重复写入", (items['DSC_0001.JPG'].date_source, items['DSC_0001.JPG'].write_date),
+         ('exif', False)),
+        ("目录名猜测的图片时间", (items['DSC_0003.JPG'].date, items['DSC_0003.JPG'].date_source),
+         (datetime(2012, 3, 14, 0, 3), 'directory')),
+        ("文件名时间需要写入EXIF", (items['临时文件名2012-03-14 10.10.00.jpg'].action,
+                          items['临时文件名2012-03-14 10.10.00.jpg'].write_date), (ACTION_TAG_IMAGE, True)),
+        ("已有EXIF时不被文件名格式覆盖",
+         (items['IMG_20120314_120000.jpg'].date, items['IMG_20120314_120000.jpg'].write_date),
+         (datetime(2012, 3, 14, 11, 59, 58), False)),
+        ("没有EXIF时使用配置的文件名格式",
+         (items['IMG_20120314_130000.jpg'].date_source, items['IMG_20120314_130000.jpg'].write_date),
+         ('IMG_YYYYMMDD_HHMMSS', True)),
+        # 插值使用计划中DSC_0003的时间（其EXIF尚未写入磁盘）
+        ("视频使用计划中的图片时间插值", (items['DSC_0002.AVI'].date, items['DSC_0002.AVI'].date_source),
+         (datetime(2012, 3, 14, 5, 1, 30), 'neighbors')),
+        ("视频的输出与归档位置", (Path(items['DSC_0002.AVI'].output).name,
+                          Path(items['DSC_0002.AVI'].archive).parent == processor.archive_dir),
+         ('DSC_0002.mp4', True)),
+        ("被覆盖的MP4跳过", items['DSC_0002.mp4'].action, ACTION_SKIP),
+        ("动作统计", plan.counts(), {ACTION_TAG_IMAGE: 5, ACTION_CONVERT_VIDEO: 1, ACTION_SKIP: 1}),
+        ("JSON往返", {name: item.to_dict() for name, item in loaded_items.items()},
+         {name: item.to_dict() for name, item in items.items()}),
+        ("文件未变化", any(item.changed() for item in plan.items), False),
+    ]
+
+    (directory / 'DSC_0003.JPG').write_bytes(b'changed')
+    test_cases.append(("检测到计划后被修改的文件", items['DSC_0003.JPG'].changed(), True))
+
+print("=" * 70)
+print("处理计划测试")
+print("=" * 70)
+
+passed = 0
+failed = 0
+
+for description, result, expected in test_cases:
+    if result == expected:
+        status = "✅ PASS"
+        passed += 1
+    else:
+        status = "❌ FAIL"
+        failed += 1
+
+    print(f"\n{status}")
+    print(f"  场景:     {description}")
+    print(f"  期望:     {expected}")
+    print(f"  实际:     {result}")
+
+print("\n" + "=" * 70)
+print(f"测试结果: {passed} 通过, {failed} 失败")
+print("=" * 70)
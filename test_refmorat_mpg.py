@@ -0,0 +1,98 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+测试refmorat_mpg的并发探测（探测结果按完成顺序送入转换、探测或转换失败只影响该文件、
+--probe-workers参数检查）
+
+探测和转换函数用桩代替，不需要ffmpeg/ffprobe/exiftool
+"""
+
+import io
+import time
+import threading
+from contextlib import redirect_stderr, redirect_stdout
+from pathlib import Path
+
+from refmorat_mpg import parse_args, probe_and_convert
+
+test_cases = []
+
+# 探测耗时不同：转换按探测完成的顺序开始，而不是按文件顺序
+PROBE_SECONDS = {'a.avi': 0.3, 'b.avi': 0.05, 'c.avi': 0.15}
+converted = []
+lock = threading.Lock()
+
+
+def probe(video_file: Path):
+    time.sleep(PROBE_SECONDS.get(video_file.name, 0.0))
+    if video_file.name == 'broken_probe.avi':
+        raise OSError("无法读取文件头")
+    return f"time-{video_file.stem}", "stub"
+
+
+def convert(video_file: Path, creation):
+    with lock:
+        converted.append((video_file.name, creation[0]))
+    if video_file.name == 'broken_convert.avi':
+        raise RuntimeError("ffmpeg崩溃")
+    if video_file.name == 'exists.avi':
+        return "skipped"
+    if video_file.name == 'bad.avi':
+        return "failed"
+    return "success"
+
+
+files = [Path(name) for name in ('a.avi', 'b.avi', 'c.avi')]
+with redirect_stdout(io.StringIO()):
+    counts = probe_and_convert(files, probe, convert, probe_workers=3, jobs=1)
+test_cases.append(("按探测完成顺序转换", [name for name, _ in converted], ['b.avi', 'c.avi', 'a.avi']))
+test_cases.append(("探测结果传给转换", dict(converted), {'a.avi': 'time-a', 'b.avi': 'time-b', 'c.avi': 'time-c'}))
+test_cases.append(("全部成功", counts, {"success": 3, "skipped": 0, "failed": 0}))
+
+converted.clear()
+files = [Path(name) for name in ('b.avi', 'broken_probe.avi', 'broken_convert.avi', 'exists.avi', 'bad.avi')]
+output = io.StringIO()
+with redirect_stdout(output):
+    counts = probe_and_convert(files, probe, convert, probe_workers=2, jobs=2)
+test_cases.append(("失败只影响该文件", counts, {"success": 1, "skipped": 1, "failed": 3}))
+test_cases.append(("探测失败的文件不转换", 'broken_probe.avi' in [name for name, _ in converted], False))
+test_cases.append(("输出失败原因", ("无法读取文件头" in output.getvalue(), "ffmpeg崩溃" in output.getvalue()),
+                   (True, True)))
+with redirect_stdout(io.StringIO()):
+    test_cases.append(("没有文件", probe_and_convert([], probe, convert, 1, 1),
+                       {"success": 0, "skipped": 0, "failed": 0}))
+
+# --probe-workers必须大于0
+test_cases.append(("默认探测线程数", parse_args(['videos']).probe_workers >= 1, True))
+test_cases.append(("指定探测线程数", parse_args(['videos', '--probe-workers', '3']).probe_workers, 3))
+for value in ('0', '-2'):
+    try:
+        with redirect_stderr(io.StringIO()):
+            parse_args(['videos', '--probe-workers', value])
+        test_cases.append((f"--probe-workers {value}", "未报错", SystemExit))
+    except SystemExit:
+        test_cases.append((f"--probe-workers {value}", SystemExit, SystemExit))
+
+print("=" * 70)
+print("视频转换并发探测测试")
+print("=" * 70)
+
+passed = 0
+failed = 0
+
+for description, result, expected in test_cases:
+    if result == expected:
+        status = "✅ PASS"
+        passed += 1
+    else:
+        status = "❌ FAIL"
+        failed += 1
+
+    print(f"\n{status}")
+    print(f"  场景:     {description}")
+    print(f"  期望:     {expected}")
+    print(f"  实际:     {result}")
+
+print("\n" + "=" * 70)
+print(f"测试结果: {passed} 通过, {failed} 失败")
+print("=" * 70)
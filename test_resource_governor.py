@@ -0,0 +1,138 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+测试资源调控器（内存与负载准入、任务结束后放行、/proc/meminfo解析、转换方式内存估计）
+"""
+
+import time
+import asyncio
+import logging
+import tempfile
+import threading
+from pathlib import Path
+
+from main import MediaProcessor
+from plan import ACTION_CONVERT_VIDEO, ACTION_TAG_IMAGE, KIND_IMAGE, KIND_VIDEO, PROFILE_MP4, PlanItem
+from resource_governor import MB, ResourceGovernor, read_meminfo
+
+logging.getLogger().setLevel(logging.CRITICAL)
+
+test_cases = []
+
+# 模拟的系统状态
+state = {'memory': 4096 * MB, 'load': 0.5}
+
+
+def make_governor(**kwargs):
+    return ResourceGovernor(
+        memory_reader=lambda: state['memory'],
+        load_reader=lambda: state['load'],
+        poll_seconds=0.02,
+        **kwargs,
+    )
+
+
+# 内存：1536MB的任务，4096MB可用、预留512MB，第二个任务放不下（第一个仍在启动中，按估计值计入）
+governor = make_governor(max_load=8, reserve_mb=512)
+first = governor.try_acquire(1536)
+test_cases.append(("第一个任务放行", first is not None, True))
+second = governor.try_acquire(1536)
+test_cases.append(("内存足够时放行第二个", second is not None, True))
+test_cases.append(("内存不足时暂缓", governor.try_acquire(1536), None))
+governor.release(second)
+governor.release(first)
+
+# 没有任务在运行时总是放行（即使资源不足）
+state['memory'] = 100 * MB
+job = governor.try_acquire(1536)
+test_cases.append(("空闲时总是放行", job is not None, True))
+
+# 等待中的任务在运行中的任务结束后被放行
+admitted = threading.Event()
+
+
+def waiter():
+    with governor.admit(1536):
+        admitted.set()
+
+
+thread = threading.Thread(target=waiter)
+thread.start()
+time.sleep(0.1)
+test_cases.append(("资源不足时等待", admitted.is_set(), False))
+governor.release(job)
+thread.join(5)
+test_cases.append(("任务结束后放行", admitted.is_set(), True))
+test_cases.append(("记录等待次数", governor.waits, 1))
+
+# 负载：负载加上启动中的任务数达到上限时暂缓
+state['memory'] = 64 * 1024 * MB
+state['load'] = 2.5
+governor = make_governor(max_load=4, reserve_mb=512)
+jobs = [governor.try_acquire(64) for _ in range(3)]
+test_cases.append(("负载上限", [job is not None for job in jobs], [True, True, False]))
+
+# 异步准入不阻塞事件循环
+governor = make_governor(max_load=8, reserve_mb=512)
+state['load'] = 0.5
+state['memory'] = 1024 * MB
+
+
+async def run_async():
+    order = []
+    blocker = governor.try_acquire(1024)
+
+    async def job():
+        async with governor.aadmit(256):
+            order.append('job')
+
+    async def ticker():
+        order.append('tick')
+        await asyncio.sleep(0.05)
+        governor.release(blocker)
+
+    await asyncio.gather(job(), ticker())
+    return order
+
+
+test_cases.append(("异步等待不阻塞事件循环", asyncio.run(run_async()), ['tick', 'job']))
+
+# /proc/meminfo格式
+with tempfile.TemporaryDirectory() as tmp:
+    meminfo = Path(tmp) / 'meminfo'
+    meminfo.write_text("MemTotal:       16314368 kB\nMemAvailable:    8157184 kB\nHugePages_Total:       0\n")
+    info = read_meminfo(str(meminfo))
+    test_cases.append(("解析meminfo", (info['MemAvailable'], info['HugePages_Total']), (8157184 * 1024, 0)))
+
+    # 按转换方式/源格式估计内存
+    processor = MediaProcessor(tmp)
+    mts = PlanItem(str(Path(tmp) / 'a.MTS'), KIND_VIDEO, ACTION_CONVERT_VIDEO, profile=PROFILE_MP4)
+    avi = PlanItem(str(Path(tmp) / 'a.avi'), KIND_VIDEO, ACTION_CONVERT_VIDEO, profile=PROFILE_MP4)
+    jpg = PlanItem(str(Path(tmp) / 'a.jpg'), KIND_IMAGE, ACTION_TAG_IMAGE)
+    test_cases.append(("内存估计",
+                       [processor._memory_estimate(item) for item in (mts, avi, jpg)],
+                       [1536, 512, 128]))
+
+print("=" * 70)
+print("资源调控器测试")
+print("=" * 70)
+
+passed = 0
+failed = 0
+
+for description, result, expected in test_cases:
+    if result == expected:
+        status = "✅ PASS"
+        passed += 1
+    else:
+        status = "❌ FAIL"
+        failed += 1
+
+    print(f"\n{status}")
+    print(f"  场景:     {description}")
+    print(f"  期望:     {expected}")
+    print(f"  实际:     {result}")
+
+print("\n" + "=" * 70)
+print(f"测试结果: {passed} 通过, {failed} 失败")
+print("=" * 70)
@@ -0,0 +1,71 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+测试AVI（RIFF）IDIT/strd拍摄时间读取功能
+"""
+
+import os
+import struct
+import tempfile
+
+from riff_dates import read_avi_datetime
+
+
+def chunk(chunk_id: bytes, data: bytes) -> bytes:
+    return struct.pack('<4sI', chunk_id, len(data)) + data + (b'\x00' if len(data) & 1 else b'')
+
+
+def lst(list_type: bytes, *chunks: bytes) -> bytes:
+    return chunk(b'LIST', list_type + b''.join(chunks))
+
+
+def build_avi(*hdrl_chunks: bytes) -> bytes:
+    hdrl = lst(b'hdrl', chunk(b'avih', b'\x00' * 56), *hdrl_chunks)
+    body = b'AVI ' + chunk(b'JUNK', b'\x00' * 13) + hdrl + lst(b'movi', chunk(b'00dc', b'\xAA' * 1000))
+    return b'RIFF' + struct.pack('<I', len(body)) + body
+
+
+strl_nikon = lst(b'strl', chunk(b'strh', b'\x00' * 56), chunk(b'strd', b'NIKON\x00\x02' + b'\x00' * 20 + b'2008:06:30 12:34:56\x00'))
+
+# 测试用例: (说明, 文件内容, 期望结果)
+test_cases = [
+    ("IDIT ctime格式", build_avi(chunk(b'IDIT', b'THU OCT  26 16:46:04 2006\n\x00')), "2006-10-26 16:46:04"),
+    ("IDIT EXIF格式", build_avi(chunk(b'IDIT', b'2005:08:17 11:42:43\x00')), "2005-08-17 11:42:43"),
+    ("strd厂商数据", build_avi(strl_nikon), "2008-06-30 12:34:56"),
+    ("IDIT优先于strd", build_avi(strl_nikon, chunk(b'IDIT', b'2005:08:17 11:42:43\x00')), "2005-08-17 11:42:43"),
+    ("没有时间信息", build_avi(), None),
+    ("不是AVI文件", b'not an avi file', None),
+]
+
+print("=" * 70)
+print("AVI IDIT/strd拍摄时间读取测试")
+print("=" * 70)
+
+passed = 0
+failed = 0
+
+for description, content, expected in test_cases:
+    with tempfile.NamedTemporaryFile(suffix='.avi', delete=False) as tmp:
+        tmp.write(content)
+        path = tmp.name
+    try:
+        result = read_avi_datetime(path)
+    finally:
+        os.unlink(path)
+
+    actual = str(result) if result else None
+    if actual == expected:
+        status = "✅ PASS"
+        passed += 1
+    else:
+        status = "❌ FAIL"
+        failed += 1
+
+    print(f"\n{status}")
+    print(f"  场景:     {description}")
+    print(f"  期望:     {expected}")
+    print(f"  实际:     {actual}")
+
+print("\n" + "=" * 70)
+print(f"测试结果: {passed} 通过, {failed} 失败")
+print("=" * 70)
@@ -0,0 +1,63 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+测试确定性分片（--shard I/N）
+"""
+
+import subprocess
+import sys
+
+from main import shard_key
+from sharding import parse_shard, select_shard, shard_of
+
+test_cases = []
+
+# 参数解析
+test_cases.append(("解析 2/4", parse_shard('2/4'), (2, 4)))
+for text in ('0/4', '5/4', '4', 'a/b', '1/0'):
+    try:
+        parse_shard(text)
+        test_cases.append((f"拒绝 {text}", "未报错", "ValueError"))
+    except ValueError:
+        test_cases.append((f"拒绝 {text}", "ValueError", "ValueError"))
+
+# N个分片互不重叠且覆盖全部
+dirs = [f'/photos/2007{m:02d}{d:02d}_trip' for m in range(1, 13) for d in range(1, 29)]
+shards = [select_shard(dirs, (i, 4), shard_key) for i in range(1, 5)]
+test_cases.append(("分片覆盖全部", sorted(sum(shards, [])), sorted(dirs)))
+test_cases.append(("每个分片都有目录", all(shards), True))
+
+# 结果与进程无关（内置hash()每个进程随机加盐，这里必须一致）
+code = "from sharding import shard_of; print(shard_of('20070922_mcm', 7))"
+other = subprocess.run([sys.executable, '-c', code], capture_output=True, text=True).stdout.strip()
+test_cases.append(("跨进程一致", other, str(shard_of('20070922_mcm', 7))))
+
+# 分片键只取目录名，不同挂载点结果一致
+test_cases.append(("不同挂载点同一分片",
+                   shard_of(shard_key('/mnt/nas/20070922_mcm'), 4),
+                   shard_of(shard_key('/volume1/photos/20070922_mcm'), 4)))
+test_cases.append(("单分片包含全部", select_shard(dirs, (1, 1), shard_key), dirs))
+
+print("=" * 70)
+print("确定性分片测试")
+print("=" * 70)
+
+passed = 0
+failed = 0
+
+for description, result, expected in test_cases:
+    if result == expected:
+        status = "✅ PASS"
+        passed += 1
+    else:
+        status = "❌ FAIL"
+        failed += 1
+
+    print(f"\n{status}")
+    print(f"  场景:     {description}")
+    print(f"  期望:     {expected}")
+    print(f"  实际:     {result}")
+
+print("\n" + "=" * 70)
+print(f"测试结果: {passed} 通过, {failed} 失败")
+print("=" * 70)
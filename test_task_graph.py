@@ -0,0 +1,170 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+测试任务图调度（依赖顺序、并发、循环检测）及视频只等待自己的锚点照片
+"""
+
+import time
+import logging
+import tempfile
+import threading
+from pathlib import Path
+
+from PIL import Image
+
+from main import MediaProcessor
+from task_graph import TaskGraph
+
+logging.getLogger().setLevel(logging.CRITICAL)
+
+test_cases = []
+
+# 依赖顺序与结果
+order = []
+lock = threading.Lock()
+
+
+def record(name, value=None):
+    def run():
+        with lock:
+            order.append(name)
+        return value
+    return run
+
+
+graph = TaskGraph()
+graph.add('c', record('c', 3), deps=['a', 'b'])
+graph.add('a', record('a', 1))
+graph.add('b', record('b', 2), deps=['a'])
+results = graph.run(2)
+test_cases.append(("依赖顺序", order, ['a', 'b', 'c']))
+test_cases.append(("任务结果", results, {'a': 1, 'b': 2, 'c': 3}))
+
+# 无依赖的任务并发运行
+graph = TaskGraph()
+for i in range(8):
+    graph.add(f't{i}', lambda: time.sleep(0.1))
+started = time.perf_counter()
+graph.run(8)
+test_cases.append(("无依赖任务并发", time.perf_counter() - started < 0.5, True))
+
+
+# 依赖失败时后续任务仍然运行
+def fail():
+    raise ValueError("no exif")
+
+
+graph = TaskGraph()
+graph.add('read', fail)
+graph.add('infer', lambda: 'fallback', deps=['read'])
+results = graph.run(1)
+test_cases.append(("依赖失败后继续", (results, sorted(graph.errors)), ({'infer': 'fallback'}, ['read'])))
+
+# 任务抛出非Exception异常：不再开始依赖它的任务，run重新抛出而不是一直等待
+def interrupt():
+    raise KeyboardInterrupt
+
+
+raised = []
+
+
+def run_catching(graph):
+    try:
+        graph.run(2)
+    except BaseException as e:
+        raised.append(type(e))
+
+
+graph = TaskGraph()
+graph.add('read', interrupt)
+graph.add('infer', lambda: 'never', deps=['read'])
+runner = threading.Thread(target=run_catching, args=(graph,), daemon=True)
+runner.start()
+runner.join(5)
+test_cases.append(("非Exception异常不会一直等待", runner.is_alive(), False))
+test_cases.append(("run重新抛出异常", raised, [KeyboardInterrupt]))
+test_cases.append(("依赖它的任务不再运行", ('infer' in graph.results, sorted(graph.errors)), (False, ['read'])))
+
+# 循环依赖与缺失依赖
+for description, edges in (("循环依赖", {'x': ['y'], 'y': ['x']}), ("缺失依赖", {'x': ['missing']})):
+    graph = TaskGraph()
+    for name, deps in edges.items():
+        graph.add(name, lambda: None, deps)
+    try:
+        graph.run(1)
+        result = 'accepted'
+    except ValueError:
+        result = 'rejected'
+    test_cases.append((description, result, 'rejected'))
+
+
+# 锚点：插值视频依赖前后照片；最后一个文件依赖前一个文件（前一个是视频时为其锚点照片）
+with tempfile.TemporaryDirectory() as tmp:
+    directory = Path(tmp) / 'trip'
+    directory.mkdir()
+    for name in ('DSC_0001.JPG', 'DSC_0003.JPG', 'DSC_0005.JPG', 'IMG_0001.JPG'):
+        Image.new('RGB', (8, 8)).save(str(directory / name), 'jpeg')
+    for name in ('DSC_0002.AVI', 'DSC_0006.AVI', 'DSC_0007.AMR', 'MVI_0009.AVI'):
+        (directory / name).write_bytes(b'')
+
+    processor = MediaProcessor(str(directory))
+    processor._snapshot()
+
+    def anchors(name):
+        return sorted(p.name for p in processor._inference_anchors(directory / name))
+
+    test_cases += [
+        ("插值视频的锚点", anchors('DSC_0002.AVI'), ['DSC_0001.JPG', 'DSC_0003.JPG']),
+        ("最后一个音频的锚点（前一个是视频）", anchors('DSC_0007.AMR'), ['DSC_0005.JPG']),
+        ("其他相机的视频不依赖DSC照片", anchors('MVI_0009.AVI'), ['IMG_0001.JPG']),
+    ]
+
+    # 流水线：DSC照片读取很慢时，不依赖它的视频先完成转码
+    events = []
+    slow_get = processor.get_exif_datetime
+
+    def get_exif_datetime(image_path):
+        if image_path.name == 'DSC_0001.JPG':
+            time.sleep(0.5)
+            events.append('slow image')
+        return slow_get(image_path)
+
+    def convert(source_path, output_path):
+        events.append(source_path.name)
+        output_path.write_bytes(b'')
+        return True
+
+    processor.get_exif_datetime = get_exif_datetime
+    for method in ('convert_avi_to_mp4', 'convert_amr_to_mp3'):
+        setattr(processor, method, convert)
+    processor.set_mp4_metadata = processor.set_mp3_metadata = lambda path, dt: None
+    processor.process_all(jobs=2, workers={'metadata': 2})
+
+    test_cases += [
+        ("不依赖慢照片的视频先转码", events.index('MVI_0009.AVI') < events.index('slow image'), True),
+        ("依赖慢照片的视频等待", events.index('DSC_0002.AVI') > events.index('slow image'), True),
+    ]
+
+print("=" * 70)
+print("任务图调度测试")
+print("=" * 70)
+
+passed = 0
+failed = 0
+
+for description, result, expected in test_cases:
+    if result == expected:
+        status = "✅ PASS"
+        passed += 1
+    else:
+        status = "❌ FAIL"
+        failed += 1
+
+    print(f"\n{status}")
+    print(f"  场景:     {description}")
+    print(f"  期望:     {expected}")
+    print(f"  实际:     {result}")
+
+print("\n" + "=" * 70)
+print(f"测试结果: {passed} 通过, {failed} 失败")
+print("=" * 70)
@@ -0,0 +1,162 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+测试整目录时间平移（EXIF/MP4原地改写、撤销记录、中途终止后恢复、改写失败时回滚、偏移解析）
+"""
+
+import sys
+import struct
+import tempfile
+import subprocess
+from datetime import timedelta
+from pathlib import Path
+
+from PIL import Image
+import piexif
+
+import exif_patch
+from mp4_atoms import find_time_boxes, read_box_times
+from time_shift import default_undo_path, load_undo, parse_offset, shift_directory, undo_shift
+
+
+def box(atom_type: bytes, payload: bytes) -> bytes:
+    return struct.pack('>I4s', 8 + len(payload), atom_type) + payload
+
+
+def build_mp4(value: int) -> bytes:
+    """最小MP4：mvhd(version 0) + trak/tkhd(version 1)，tkhd修改时间为0（未设置）"""
+    mvhd = box(b'mvhd', bytes(4) + struct.pack('>II', value, value) + bytes(20))
+    tkhd = box(b'tkhd', bytes([1, 0, 0, 0]) + struct.pack('>QQ', value, 0) + bytes(20))
+    return box(b'ftyp', b'isom') + box(b'moov', mvhd + box(b'trak', tkhd)) + box(b'mdat', b'\x00' * 64)
+
+
+# 在子进程中平移，改写第一个字段后立即退出（模拟进程被终止）
+KILLED_AFTER_FIRST_FIELD = """
+import os, sys
+import exif_patch
+from time_shift import parse_offset, shift_directory
+write_at = exif_patch._write_at
+def killed(f, offset, data):
+    write_at(f, offset, data)
+    os._exit(1)
+exif_patch._write_at = killed
+shift_directory(sys.argv[1], parse_offset('+1h'), sys.argv[2])
+"""
+
+
+def exif_dates(path: Path):
+    exif = piexif.load(str(path))
+    return exif["0th"][306].decode(), exif["Exif"][36867].decode()
+
+
+def mp4_times(path: Path):
+    with open(path, 'rb') as f:
+        return sorted(read_box_times(f, atom)[1:] for atom in find_time_boxes(f))
+
+
+with tempfile.TemporaryDirectory() as tmp:
+    directory = Path(tmp) / 'trip'
+    directory.mkdir()
+    jpeg = directory / 'DSC_0001.JPG'
+    exif = {"0th": {306: b'2012:03:14 23:30:00'}, "Exif": {36867: b'2012:03:14 23:30:00'}, "GPS": {}}
+    Image.new('RGB', (8, 8)).save(str(jpeg), 'jpeg', exif=piexif.dump(exif))
+    mp4 = directory / 'MOV_0002.mp4'
+    mp4.write_bytes(build_mp4(3_400_000_000))
+    plain = directory / 'DSC_0003.JPG'
+    Image.new('RGB', (8, 8)).save(str(plain), 'jpeg')
+    sizes = {path.name: path.stat().st_size for path in directory.iterdir()}
+    jpeg_bytes = jpeg.read_bytes()
+    undo_path = Path(tmp) / 'undo.jsonl'
+
+    stats = shift_directory(directory, parse_offset('+1h'), undo_path, jobs=2)
+    shifted_exif = exif_dates(jpeg)
+    shifted_mp4 = mp4_times(mp4)
+    shifted_sizes = {path.name: path.stat().st_size for path in directory.iterdir()}
+    undo_stats = undo_shift(undo_path, jobs=2)
+
+    # 测试用例: (说明, 实际结果, 期望结果)
+    test_cases = [
+        ("平移统计", stats, {'shifted': 2, 'skipped': 1, 'failed': 0}),
+        ("EXIF跨日平移", shifted_exif, ('2012:03:15 00:30:00', '2012:03:15 00:30:00')),
+        ("MP4时间平移（未设置的0保持不变）", shifted_mp4,
+         [(3_400_003_600, 0), (3_400_003_600, 3_400_003_600)]),
+        ("文件大小不变", shifted_sizes, sizes),
+        ("撤销统计", undo_stats, {'restored': 2, 'failed': 0}),
+        ("撤销后图片字节完全一致", jpeg.read_bytes() == jpeg_bytes, True),
+        ("撤销后MP4时间", mp4_times(mp4), [(3_400_000_000, 0), (3_400_000_000, 3_400_000_000)]),
+        ("偏移: 组合单位", parse_offset('-1d2h30m'), -timedelta(days=1, hours=2, minutes=30)),
+        ("偏移: 时钟写法", parse_offset('+01:30:15'), timedelta(hours=1, minutes=30, seconds=15)),
+    ]
+
+    # 改写到一半时进程被终止：撤销记录中已有原值，可以恢复
+    directory = Path(tmp) / 'crash'
+    directory.mkdir()
+    originals = {}
+    for name in ('DSC_0001.JPG', 'DSC_0002.JPG'):
+        Image.new('RGB', (8, 8)).save(str(directory / name), 'jpeg', exif=piexif.dump(exif))
+        originals[name] = (directory / name).read_bytes()
+    undo_path = Path(tmp) / 'crash.jsonl'
+    subprocess.run([sys.executable, '-c', KILLED_AFTER_FIRST_FIELD, str(directory), str(undo_path)],
+                   cwd=Path(__file__).resolve().parent)
+    _, files, complete = load_undo(undo_path)
+    test_cases.append(("中途终止时撤销记录包含已改写的文件", (sorted(files), complete), (['DSC_0001.JPG'], False)))
+    test_cases.append(("一个文件只改写了一部分", exif_dates(directory / 'DSC_0001.JPG'),
+                       ('2012:03:15 00:30:00', '2012:03:14 23:30:00')))
+    undo_shift(undo_path)
+    test_cases.append(("中途终止后恢复", {name: (directory / name).read_bytes() == data
+                                       for name, data in originals.items()},
+                       {'DSC_0001.JPG': True, 'DSC_0002.JPG': True}))
+
+    # 改写失败：回滚文件，撤销记录中不再保留
+    write_at = exif_patch._write_at
+    failures = []
+
+    def fail_after_first_field(f, offset, data):
+        write_at(f, offset, data)
+        if f.name.endswith('DSC_0002.JPG') and not failures:
+            failures.append(offset)
+            raise OSError('磁盘错误')
+
+    exif_patch._write_at = fail_after_first_field
+    undo_path = Path(tmp) / 'failed.jsonl'
+    stats = shift_directory(directory, parse_offset('+1h'), undo_path)
+    exif_patch._write_at = write_at
+    _, files, complete = load_undo(undo_path)
+    test_cases.append(("改写失败的统计", stats, {'shifted': 1, 'skipped': 0, 'failed': 1}))
+    test_cases.append(("改写失败的文件已回滚",
+                       (directory / 'DSC_0002.JPG').read_bytes() == originals['DSC_0002.JPG'], True))
+    test_cases.append(("撤销记录只保留平移成功的文件", (sorted(files), complete), (['DSC_0001.JPG'], True)))
+    default = default_undo_path(directory)
+    test_cases.append(("默认撤销记录位置", (default.parent.name, default.suffix), (directory.name, '.jsonl')))
+
+    for text in ('abc', '+0h', ''):
+        try:
+            parse_offset(text)
+            result = 'accepted'
+        except ValueError:
+            result = 'rejected'
+        test_cases.append((f"非法偏移 {text!r}", result, 'rejected'))
+
+print("=" * 70)
+print("整目录时间平移测试")
+print("=" * 70)
+
+passed = 0
+failed = 0
+
+for description, result, expected in test_cases:
+    if result == expected:
+        status = "✅ PASS"
+        passed += 1
+    else:
+        status = "❌ FAIL"
+        failed += 1
+
+    print(f"\n{status}")
+    print(f"  场景:     {description}")
+    print(f"  期望:     {expected}")
+    print(f"  实际:     {result}")
+
+print("\n" + "=" * 70)
+print(f"测试结果: {passed} 通过, {failed} 失败")
+print("=" * 70)
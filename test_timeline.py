@@ -0,0 +1,84 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+测试按相机前缀划分的目录时间线（相邻文件查找、计数器回绕、稀疏编号不误判为回绕）
+"""
+
+import tempfile
+from pathlib import Path
+
+from timeline import DirectoryTimelines
+
+IMAGES = {'.jpg'}
+
+files = [
+    # 尼康：DSC_前缀，计数器从9999回绕到0001
+    "DSC_9997.JPG", "DSC_9998.AVI", "DSC_9999.JPG", "DSC_0001.JPG", "DSC_0002.AVI",
+    # 佳能：IMG_照片与MVI_视频共用计数器
+    "IMG_0001.JPG", "MVI_0002.AVI", "IMG_0005.JPG", "IMG_0006.JPG",
+    # 编号相差很大但不在计数器边界附近（两张卡或计数器被重置）：不是回绕
+    "DSCN0012.JPG", "DSCN0013.AVI", "DSCN6000.JPG",
+    # MOV前缀没有确认属于哪台相机：不与DSC合并（合并后9998与0100会被当作回绕）
+    "DSC0100.JPG", "MOV9998.AVI",
+    # 没有编号的文件不参与索引
+    "cover.jpg",
+]
+
+
+def name(entry):
+    return entry.path.name if entry else None
+
+
+with tempfile.TemporaryDirectory() as tmp:
+    directory = Path(tmp)
+    for file_name in files:
+        (directory / file_name).write_bytes(b'')
+    timelines = DirectoryTimelines(directory, {'.jpg', '.avi'})
+
+    def neighbours(file_name, extensions=IMAGES):
+        timeline, seq = timelines.locate(directory / file_name)
+        return name(timeline.before(seq, extensions)), name(timeline.after(seq, extensions))
+
+    def is_last(file_name):
+        timeline, seq = timelines.locate(directory / file_name)
+        return seq == timeline.last_seq
+
+    # 测试用例: (说明, 实际结果, 期望结果)
+    test_cases = [
+        ("时间线按相机划分", sorted(timelines.timelines), ["DSC", "DSCN", "DSC_", "IMG_", "MOV"]),
+        ("回绕前的视频", neighbours("DSC_9998.AVI"), ("DSC_9997.JPG", "DSC_9999.JPG")),
+        ("跨越回绕点的相邻照片", neighbours("DSC_0002.AVI"), ("DSC_0001.JPG", None)),
+        ("回绕后的文件是最后一个", is_last("DSC_0002.AVI"), True),
+        ("回绕前的文件不是最后一个", is_last("DSC_9998.AVI"), False),
+        ("稀疏编号不是回绕", neighbours("DSCN0013.AVI"), ("DSCN0012.JPG", "DSCN6000.JPG")),
+        ("稀疏编号按编号排序", is_last("DSCN6000.JPG"), True),
+        ("MVI_视频使用IMG_照片插值", neighbours("MVI_0002.AVI"), ("IMG_0001.JPG", "IMG_0005.JPG")),
+        ("不同相机互不干扰", neighbours("IMG_0006.JPG", None), ("IMG_0005.JPG", None)),
+        ("已移走的文件按文件名定位", neighbours("DSC_9998.mp4"), ("DSC_9997.JPG", "DSC_9999.JPG")),
+        ("MOV视频不与DSC照片合并", neighbours("MOV9998.AVI"), (None, None)),
+        ("没有编号的文件", timelines.locate(directory / "cover.jpg"), None),
+    ]
+
+print("=" * 70)
+print("相机时间线测试")
+print("=" * 70)
+
+passed = 0
+failed = 0
+
+for description, result, expected in test_cases:
+    if result == expected:
+        status = "✅ PASS"
+        passed += 1
+    else:
+        status = "❌ FAIL"
+        failed += 1
+
+    print(f"\n{status}")
+    print(f"  场景:     {description}")
+    print(f"  期望:     {expected}")
+    print(f"  实际:     {result}")
+
+print("\n" + "=" * 70)
+print(f"测试结果: {passed} 通过, {failed} 失败")
+print("=" * 70)
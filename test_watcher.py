@@ -0,0 +1,143 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+测试监视模式（去抖、inotify与轮询、时间线增量加入、新文件写完后处理、自己产生的文件不重复处理）
+
+使用假ffmpeg脚本（testing_support）代替真正的转码
+"""
+
+import os
+import time
+import logging
+import tempfile
+import threading
+from pathlib import Path
+
+from cancellation import CancelToken
+from journal import STATE_ARCHIVED, STATE_CONVERTED, STATE_DATED, STATE_DISCOVERED, STATE_DONE, STATE_TAGGED, Journal
+from main import MediaProcessor
+from testing_support import install_fake_ffmpeg, make_jpeg
+from timeline import DirectoryTimelines
+from watcher import Debouncer, InotifyWatcher, PollingWatcher
+
+logging.getLogger().setLevel(logging.CRITICAL)
+
+
+def wait_until(condition, timeout=15.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if condition():
+            return True
+        time.sleep(0.05)
+    return False
+
+
+test_cases = []
+
+with tempfile.TemporaryDirectory() as tmp:
+    tmp = Path(tmp)
+
+    # 去抖：文件仍在增长时不算写完
+    growing = tmp / 'growing.jpg'
+    growing.write_bytes(b'x')
+    debouncer = Debouncer(settle=5)
+    debouncer.touch(growing, now=0)
+    test_cases.append(("刚有变化", debouncer.ready(now=1), []))
+    with open(growing, 'ab') as fp:
+        fp.write(b'more')
+    test_cases.append(("仍在增长", debouncer.ready(now=5), []))
+    test_cases.append(("增长后未满settle秒", debouncer.ready(now=9), []))
+    test_cases.append(("停止增长settle秒后写完", debouncer.ready(now=10.5), [growing]))
+    test_cases.append(("写完后不再等待", len(debouncer), 0))
+    debouncer.touch(tmp / 'gone.jpg', now=0)
+    test_cases.append(("已删除的文件不再等待", (debouncer.ready(now=10), len(debouncer)), ([], 0)))
+
+    # inotify与轮询
+    inbox = tmp / 'inbox'
+    inbox.mkdir()
+    watcher = InotifyWatcher(inbox)
+    (inbox / 'IMG_0001.jpg').write_bytes(b'x')
+    test_cases.append(("inotify发现新文件", watcher.wait(2), {'IMG_0001.jpg'}))
+    test_cases.append(("没有变化时超时返回", watcher.wait(0.1), set()))
+    os.rename(inbox, tmp / 'moved')
+    try:
+        watcher.wait(2)
+        test_cases.append(("目录被移走", "未报错", "FileNotFoundError"))
+    except FileNotFoundError:
+        test_cases.append(("目录被移走", "FileNotFoundError", "FileNotFoundError"))
+    watcher.close()
+
+    inbox = tmp / 'moved'
+    watcher = PollingWatcher(inbox, poll_seconds=0.1)
+    (inbox / 'IMG_0002.jpg').write_bytes(b'x')
+    (inbox / 'IMG_0001.jpg').write_bytes(b'changed')
+    test_cases.append(("轮询发现新文件和变化的文件", watcher.wait(1), {'IMG_0001.jpg', 'IMG_0002.jpg'}))
+
+    # 时间线增量加入
+    timelines = DirectoryTimelines(inbox, {'.jpg', '.avi'})
+    test_cases.append(("加入新文件", timelines.add(inbox / 'MVI_0003.avi'), True))
+    test_cases.append(("已在索引中的文件", timelines.add(inbox / 'IMG_0001.jpg'), False))
+    timeline, seq = timelines.locate(inbox / 'MVI_0003.avi')
+    test_cases.append(("新文件的相邻照片", timeline.before(seq).path.name, 'IMG_0002.jpg'))
+
+    # 完整的监视模式
+    install_fake_ffmpeg(tmp)
+
+    directory = tmp / '20070922_inbox'
+    directory.mkdir()
+    make_jpeg(directory / 'IMG_0001.jpg')
+    journal = Journal(tmp / 'journal.db')
+    token = CancelToken()
+    processor = MediaProcessor(str(directory), cancel_token=token, journal=journal)
+
+    def done(name):
+        entry = journal.get(directory / name)
+        return entry is not None and entry.state == STATE_DONE
+
+    thread = threading.Thread(target=processor.watch, kwargs={'settle': 0.2}, daemon=True)
+    thread.start()
+    test_cases.append(("先处理已有文件", wait_until(lambda: done('IMG_0001.jpg')), True))
+
+    make_jpeg(directory / 'IMG_0002.jpg')
+    test_cases.append(("新照片写完后处理", wait_until(lambda: done('IMG_0002.jpg')), True))
+    (directory / 'MVI_0003.avi').write_bytes(b'not really an avi')
+    test_cases.append(("新视频写完后转码", wait_until(lambda: done('MVI_0003.mp4')), True))
+    test_cases.append(("新文件加入已建立的时间线",
+                       processor._get_timelines(processor.source_dir).locate(directory / 'MVI_0003.avi') is not None,
+                       True))
+
+    # 处理产生的事件（写入EXIF后的改名、转码输出）再经过几轮去抖也不会重复处理
+    time.sleep(2.5)
+    token.cancel()
+    thread.join(10)
+    test_cases.append(("取消后停止监视", thread.is_alive(), False))
+    test_cases.append(("照片只处理一次", journal.history(directory / 'IMG_0002.jpg'),
+                       [STATE_DISCOVERED, STATE_DATED, STATE_TAGGED, STATE_DONE]))
+    test_cases.append(("视频只处理一次", journal.history(directory / 'MVI_0003.avi'),
+                       [STATE_DISCOVERED, STATE_DATED, STATE_CONVERTED, STATE_TAGGED, STATE_ARCHIVED, STATE_DONE]))
+    test_cases.append(("转码输出不再写入时间", journal.history(directory / 'MVI_0003.mp4'), [STATE_DONE]))
+    journal.close()
+
+print("=" * 70)
+print("监视模式测试")
+print("=" * 70)
+
+passed = 0
+failed = 0
+
+for description, result, expected in test_cases:
+    if result == expected:
+        status = "✅ PASS"
+        passed += 1
+    else:
+        status = "❌ FAIL"
+        failed += 1
+
+    print(f"\n{status}")
+    print(f"  场景:     {description}")
+    print(f"  期望:     {expected}")
+    print(f"  实际:     {result}")
+
+print("\n" + "=" * 70)
+print(f"测试结果: {passed} 通过, {failed} 失败")
+print("=" * 70)
@@ -0,0 +1,176 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+测试共享工作队列（多进程领取不重复、续约、崩溃后租约过期被接手、失败重试上限）
+"""
+
+import os
+import sys
+import time
+import sqlite3
+import subprocess
+import logging
+import tempfile
+import multiprocessing
+from pathlib import Path
+
+from work_queue import STATE_DONE, STATE_FAILED, STATE_LEASED, STATE_PENDING, WorkQueue, run_worker
+
+logging.getLogger().setLevel(logging.CRITICAL)
+
+
+def worker(db_path, log_dir, worker_id):
+    """正常工作进程：每个任务在log_dir中追加一行记录"""
+    queue = WorkQueue(db_path, lease_seconds=5, worker_id=worker_id)
+
+    def handle(path, token):
+        time.sleep(0.02)
+        with open(os.path.join(log_dir, worker_id), 'a', encoding='utf-8') as fp:
+            fp.write(path + '\n')
+
+    run_worker(queue, handle, poll_seconds=0.1)
+
+
+def crashing_worker(db_path):
+    """领取任务后直接退出（不完成、不释放租约）"""
+    queue = WorkQueue(db_path, lease_seconds=0.5, worker_id='crash')
+    queue.claim()
+    os._exit(0)
+
+
+def handled_paths(log_dir):
+    paths = []
+    for name in os.listdir(log_dir):
+        with open(os.path.join(log_dir, name), encoding='utf-8') as fp:
+            paths.extend(line.strip() for line in fp if line.strip())
+    return paths
+
+
+if __name__ == '__main__':
+    test_cases = []
+
+    with tempfile.TemporaryDirectory() as tmp:
+        tmp = Path(tmp)
+
+        # 多个工作进程：每个任务恰好处理一次
+        db_path = str(tmp / 'queue.db')
+        log_dir = tmp / 'log'
+        log_dir.mkdir()
+        queue = WorkQueue(db_path)
+        dirs = [str(tmp / f'dir{i:02d}') for i in range(30)]
+        test_cases.append(("加入任务", queue.add(dirs), 30))
+        test_cases.append(("重复加入忽略", queue.add(dirs[:5]), 0))
+
+        processes = [
+            multiprocessing.Process(target=worker, args=(db_path, str(log_dir), f'w{i}'))
+            for i in range(4)
+        ]
+        for process in processes:
+            process.start()
+        for process in processes:
+            process.join(60)
+        paths = handled_paths(log_dir)
+        test_cases.append(("每个任务处理一次", sorted(paths), sorted(dirs)))
+        test_cases.append(("多个进程参与", len(os.listdir(log_dir)) > 1, True))
+        test_cases.append(("全部完成", queue.counts(), {STATE_DONE: 30}))
+
+        # 崩溃的工作进程：租约过期后任务被接手
+        db_path = str(tmp / 'crash.db')
+        WorkQueue(db_path).add([str(tmp / 'lost')])
+        process = multiprocessing.Process(target=crashing_worker, args=(db_path,))
+        process.start()
+        process.join(30)
+        queue = WorkQueue(db_path, lease_seconds=0.5, worker_id='rescuer')
+        test_cases.append(("租约未过期时不可领取", queue.claim(), None))
+        time.sleep(0.6)
+        task = queue.claim()
+        test_cases.append(("租约过期后被接手", task is not None and task.path, str(tmp / 'lost')))
+        test_cases.append(("领取次数", task.attempts if task else None, 2))
+        test_cases.append(("原持有者无法完成", WorkQueue(db_path, worker_id='crash').complete(task), False))
+        test_cases.append(("续约", queue.heartbeat(task), True))
+        test_cases.append(("完成", queue.complete(task), True))
+
+        # 超过最多领取次数的任务标记为失败
+        db_path = str(tmp / 'retry.db')
+        queue = WorkQueue(db_path, lease_seconds=0.05, max_attempts=2, worker_id='flaky')
+        queue.add([str(tmp / 'flaky')])
+        queue.claim()
+        time.sleep(0.1)
+        queue.claim()
+        time.sleep(0.1)
+        test_cases.append(("超过次数不再领取", queue.claim(), None))
+        test_cases.append(("标记为失败", queue.counts(), {STATE_FAILED: 1}))
+
+        # 处理函数抛出异常时记录失败
+        db_path = str(tmp / 'error.db')
+        queue = WorkQueue(db_path)
+        queue.add([str(tmp / 'bad'), str(tmp / 'good')])
+
+        def handle(path, token):
+            if path.endswith('bad'):
+                raise RuntimeError('坏目录')
+
+        stats = run_worker(queue, handle)
+        test_cases.append(("处理统计", stats, {'done': 1, 'failed': 1, 'lost': 0}))
+        test_cases.append(("再次加入失败的任务", (queue.add([str(tmp / 'bad'), str(tmp / 'good')]), queue.counts()),
+                           (1, {STATE_PENDING: 1, STATE_DONE: 1})))
+        test_cases.append(("重新领取", queue.claim().path, str(tmp / 'bad')))
+
+        # 任务路径相对于数据库所在目录保存：其他主机在不同挂载点下也能领取
+        share = tmp / 'share'
+        (share / 'photos').mkdir(parents=True)
+        WorkQueue(str(share / 'queue.db')).add([str(share / 'photos')])
+        stored = sqlite3.connect(str(share / 'queue.db')).execute("SELECT path FROM tasks").fetchone()[0]
+        test_cases.append(("保存相对路径", stored, 'photos'))
+        mount = tmp / 'mnt'
+        os.symlink(str(share), str(mount))
+        task = WorkQueue(str(mount / 'queue.db')).claim()
+        test_cases.append(("按本机的数据库位置还原", task.path, str(mount / 'photos')))
+
+        # 租约被其他工作进程接手：取消任务、终止子进程，放弃而不记录结果
+        db_path = str(tmp / 'stolen.db')
+        queue = WorkQueue(db_path, lease_seconds=1, worker_id='slow')
+        queue.add([str(tmp / 'stolen')])
+        elapsed = []
+
+        def steal_then_work(path, token):
+            conn = sqlite3.connect(db_path)
+            conn.execute("UPDATE tasks SET owner = 'thief', lease_until = ?", (time.time() + 60,))
+            conn.commit()
+            conn.close()
+            started = time.monotonic()
+            try:
+                token.run([sys.executable, '-c', 'import time; time.sleep(30)'])
+            except subprocess.CalledProcessError:
+                pass
+            elapsed.append(time.monotonic() - started)
+            token.check()
+
+        stats = run_worker(queue, steal_then_work, wait_for_leases=False)
+        test_cases.append(("租约失效后终止子进程", elapsed[0] < 10, True))
+        test_cases.append(("租约失效的任务被放弃", stats, {'done': 0, 'failed': 0, 'lost': 1}))
+        test_cases.append(("接手者的租约不受影响", queue.counts(), {STATE_LEASED: 1}))
+
+    print("=" * 70)
+    print("共享工作队列测试")
+    print("=" * 70)
+
+    passed = 0
+    failed = 0
+
+    for description, result, expected in test_cases:
+        if result == expected:
+            status = "✅ PASS"
+            passed += 1
+        else:
+            status = "❌ FAIL"
+            failed += 1
+
+        print(f"\n{status}")
+        print(f"  场景:     {description}")
+        print(f"  期望:     {expected}")
+        print(f"  实际:     {result}")
+
+    print("\n" + "=" * 70)
+    print(f"测试结果: {passed} 通过, {failed} 失败")
+    print("=" * 70)
@@ -0,0 +1,88 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+测试脚本共用的辅助函数（不是测试脚本本身）
+
+- 假ffmpeg：代替真正的转码，输出只有ftyp/moov/mvhd的最小MP4；
+  写入时间的重新封装（-c copy）直接复制源文件。由环境变量控制：
+  - FAKE_FFMPEG_LOG：每次调用追加一行源文件名
+  - FAKE_FFMPEG_TIMES：每次转码追加一行"开始时刻 结束时刻"
+  - FAKE_FFMPEG_DELAY：每次调用先等待的秒数
+  - FAKE_FFMPEG_HANG：写出一部分输出后一直等待（模拟长时间转码）
+- make_jpeg：生成小JPEG，可选写入DateTimeOriginal
+"""
+
+import os
+import sys
+import stat
+from pathlib import Path
+from typing import Optional, Tuple
+
+from PIL import Image
+import piexif
+
+FAKE_FFMPEG = f"""#!{sys.executable}
+import os, sys, time, shutil, struct
+args = sys.argv[1:]
+if args == ['-version']:
+    sys.exit(0)
+source, output = args[args.index('-i') + 1], args[-1]
+if os.environ.get('FAKE_FFMPEG_LOG'):
+    with open(os.environ['FAKE_FFMPEG_LOG'], 'a') as log:
+        log.write(os.path.basename(source) + '\\n')
+started = time.time()
+time.sleep(float(os.environ.get('FAKE_FFMPEG_DELAY') or 0))
+if os.environ.get('FAKE_FFMPEG_HANG'):
+    open(output, 'wb').write(b'partial')
+    time.sleep(60)
+if 'copy' in args:
+    shutil.copy(source, output)
+else:
+    def box(t, p):
+        return struct.pack('>I4s', 8 + len(p), t) + p
+    mvhd = box(b'mvhd', bytes(4) + struct.pack('>II', 1, 1) + bytes(20))
+    open(output, 'wb').write(box(b'ftyp', b'isom') + box(b'moov', mvhd) + box(b'mdat', b''))
+    if os.environ.get('FAKE_FFMPEG_TIMES'):
+        with open(os.environ['FAKE_FFMPEG_TIMES'], 'a') as log:
+            log.write(f"{{started}} {{time.time()}}\\n")
+"""
+
+
+def install_script(directory: Path, name: str, source: str) -> Path:
+    """
+    把脚本写到directory/bin/name并把该目录加到PATH最前面
+
+    Returns:
+        脚本路径
+    """
+    bin_dir = Path(directory) / 'bin'
+    bin_dir.mkdir(exist_ok=True)
+    script = bin_dir / name
+    script.write_text(source)
+    script.chmod(script.stat().st_mode | stat.S_IEXEC)
+    if os.environ['PATH'].split(os.pathsep)[0] != str(bin_dir):
+        os.environ['PATH'] = f"{bin_dir}{os.pathsep}{os.environ['PATH']}"
+    return script
+
+
+FAKE_FFMPEG_VARIABLES = ('FAKE_FFMPEG_LOG', 'FAKE_FFMPEG_TIMES', 'FAKE_FFMPEG_DELAY', 'FAKE_FFMPEG_HANG')
+
+
+def install_fake_ffmpeg(directory: Path) -> Path:
+    """
+    安装假ffmpeg（见模块说明）
+
+    清除之前的控制变量：pytest在同一进程中导入所有测试脚本，
+    上一个脚本设置的记录文件所在的临时目录已被删除
+    """
+    for name in FAKE_FFMPEG_VARIABLES:
+        os.environ.pop(name, None)
+    return install_script(directory, 'ffmpeg', FAKE_FFMPEG)
+
+
+def make_jpeg(path: Path, taken: Optional[str] = None, size: Tuple[int, int] = (8, 8)):
+    """生成一张小JPEG，可选写入DateTimeOriginal（"YYYY:MM:DD HH:MM:SS"）"""
+    kwargs = {}
+    if taken:
+        kwargs['exif'] = piexif.dump({"0th": {}, "Exif": {36867: taken.encode()}, "GPS": {}})
+    Image.new('RGB', size).save(str(path), 'jpeg', **kwargs)
@@ -0,0 +1,297 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+整目录时间平移（相机时钟设置错误时使用）
+
+对目录中的照片和视频统一加上或减去一个固定偏移：
+- JPEG/TIFF：原地改写EXIF的DateTime、DateTimeOriginal、DateTimeDigitized
+- MP4/MOV/3GP/M4V：原地改写mvhd、tkhd、mdhd的创建/修改时间
+都是定长字段，不重新编码图片、不重新封装视频。
+
+每次平移写一份撤销记录（JSON Lines），只保存被改写字段的偏移和原值，
+每个文件改写之前先追加并fsync，可以用undo_shift原样恢复（包括平移中途被终止的情况）。
+"""
+
+import os
+import re
+import json
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from exif_patch import restore_exif_dates, shift_exif_dates
+from mp4_atoms import restore_mp4_times, shift_mp4_times
+
+logger = logging.getLogger(__name__)
+
+UNDO_VERSION = 2
+
+# 支持原地平移的格式
+EXIF_EXTENSIONS = {'.jpg', '.jpeg', '.tif', '.tiff'}
+ISOBMFF_EXTENSIONS = {'.mp4', '.mov', '.3gp', '.m4v'}
+
+OFFSET_UNITS = {'d': 86400, 'h': 3600, 'm': 60, 's': 1}
+OFFSET_UNIT_PATTERN = re.compile(r'^(?:(\d+)d)?(?:(\d+)h)?(?:(\d+)m)?(?:(\d+)s)?$')
+OFFSET_CLOCK_PATTERN = re.compile(r'^(\d+):(\d{1,2})(?::(\d{1,2}))?$')
+
+
+def parse_offset(text: str) -> timedelta:
+    """
+    解析时间偏移
+
+    支持 "+1h30m"、"-2d"、"+90s"、"-1:30"、"+01:30:15" 等写法，
+    不带符号时视为正偏移
+
+    Raises:
+        ValueError: 格式不正确或偏移为0
+    """
+    value = text.strip()
+    sign = -1 if value.startswith('-') else 1
+    body = value.lstrip('+-')
+
+    match = OFFSET_CLOCK_PATTERN.match(body)
+    if match:
+        hours, minutes, seconds = (int(part or 0) for part in match.groups())
+        total = hours * 3600 + minutes * 60 + seconds
+    else:
+        match = OFFSET_UNIT_PATTERN.match(body.lower())
+        if not body or not match:
+            raise ValueError(f"无法解析时间偏移: {text}")
+        total = sum(
+            int(part) * OFFSET_UNITS[unit]
+            for part, unit in zip(match.groups(), 'dhms') if part
+        )
+
+    if total == 0:
+        raise ValueError(f"时间偏移不能为0: {text}")
+    return timedelta(seconds=sign * total)
+
+
+def shift_file(path: Path, delta: timedelta,
+               before_write: Optional[Callable[[Dict[str, Any]], None]] = None) -> Optional[Dict[str, Any]]:
+    """
+    原地平移单个文件的时间
+
+    Args:
+        path: 文件路径
+        delta: 时间偏移
+        before_write: 改写文件之前用撤销记录调用
+
+    Returns:
+        撤销记录（{"exif": [[偏移, 原值], ...]} 或 {"mp4": [[偏移, version, 创建, 修改], ...]}），
+        文件没有可平移的字段或结构不支持时返回None
+    """
+    suffix = path.suffix.lower()
+    if suffix in EXIF_EXTENSIONS:
+        hook = (lambda values: before_write(_exif_record(values))) if before_write else None
+        values = shift_exif_dates(path, delta, hook)
+        return _exif_record(values) if values else None
+    if suffix in ISOBMFF_EXTENSIONS:
+        hook = (lambda records: before_write(_mp4_record(records))) if before_write else None
+        records = shift_mp4_times(path, int(delta.total_seconds()), hook)
+        return _mp4_record(records) if records else None
+    return None
+
+
+def _exif_record(values) -> Dict[str, Any]:
+    return {'exif': [list(value) for value in values]}
+
+
+def _mp4_record(records) -> Dict[str, Any]:
+    return {'mp4': [list(record) for record in records]}
+
+
+def _restore_file(path: Path, record: Dict[str, Any]):
+    if 'exif' in record:
+        restore_exif_dates(path, [tuple(value) for value in record['exif']])
+    if 'mp4' in record:
+        restore_mp4_times(path, [tuple(value) for value in record['mp4']])
+
+
+class UndoLog:
+    """
+    撤销记录（JSON Lines，只追加）
+
+    第一行是头部（版本、目录、偏移），之后每改写一个文件之前追加一行原值并fsync，
+    进程在任何时刻被终止，已改写（包括只改写了一部分）的文件都能恢复。
+    平移失败且已回滚的文件追加一行discard；全部结束后追加一行complete。
+    """
+
+    def __init__(self, path: Path, directory: Path, delta: timedelta):
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.Lock()
+        self._fp = open(self.path, 'w', encoding='utf-8')
+        self._append({
+            'version': UNDO_VERSION,
+            'directory': str(directory),
+            'offset': int(delta.total_seconds()),
+            'created': datetime.now().replace(microsecond=0).isoformat(),
+        })
+
+    def _append(self, entry: Dict[str, Any]):
+        with self._lock:
+            self._fp.write(json.dumps(entry, ensure_ascii=False, separators=(',', ':')) + '\n')
+            self._fp.flush()
+            os.fsync(self._fp.fileno())
+
+    def record(self, name: str, record: Dict[str, Any]):
+        """文件改写之前记录原值"""
+        self._append(dict(record, file=name))
+
+    def discard(self, name: str):
+        """文件已回滚为原值，恢复时跳过"""
+        self._append({'file': name, 'discard': True})
+
+    def close(self, stats: Dict[str, int]):
+        self._append({'complete': True, 'stats': stats})
+        self._fp.close()
+
+
+def load_undo(undo_path: Path) -> Tuple[Dict[str, Any], Dict[str, Dict[str, Any]], bool]:
+    """
+    读取撤销记录（也支持只在结束时写一次的旧版本JSON）
+
+    Returns:
+        (头部, {文件名: 撤销记录}, 平移是否正常结束)
+
+    Raises:
+        ValueError: 版本不支持
+    """
+    with open(undo_path, encoding='utf-8') as fp:
+        lines = fp.read().splitlines()
+    header = json.loads(lines[0]) if lines else {}
+    if header.get('version') == 1:
+        return header, header['files'], True
+    if header.get('version') != UNDO_VERSION:
+        raise ValueError(f"不支持的撤销记录版本: {header.get('version')}")
+
+    files: Dict[str, Dict[str, Any]] = {}
+    complete = False
+    for number, line in enumerate(lines[1:], start=2):
+        try:
+            entry = json.loads(line)
+        except ValueError:
+            # 写到一半时被终止的最后一行：对应文件尚未改写
+            logger.warning(f"撤销记录第{number}行不完整，忽略")
+            continue
+        if entry.get('complete'):
+            complete = True
+        elif entry.get('discard'):
+            files.pop(entry['file'], None)
+        else:
+            name = entry.pop('file')
+            files[name] = entry
+    return header, files, complete
+
+
+def _shift_one(path: Path, delta: timedelta, undo: UndoLog) -> Tuple[Path, Optional[Dict[str, Any]], Optional[str]]:
+    recorded = []
+
+    def before_write(record):
+        undo.record(path.name, record)
+        recorded.append(record)
+
+    try:
+        return path, shift_file(path, delta, before_write), None
+    except Exception as e:
+        if recorded:
+            # 改写到一半失败：写回原值后撤销记录中不再保留；回滚也失败时保留，由undo恢复
+            try:
+                _restore_file(path, recorded[0])
+                undo.discard(path.name)
+            except Exception as restore_error:
+                logger.error(f"回滚失败 {path.name}: {restore_error}（撤销记录中保留原值）")
+        return path, None, str(e)
+
+
+def shift_directory(directory: Path, delta: timedelta, undo_path: Path,
+                    jobs: int = 1) -> Dict[str, int]:
+    """
+    平移目录中所有照片和视频的时间，同时写入撤销记录
+
+    每个文件改写之前先把原值追加到撤销记录并fsync，中途崩溃或被终止时
+    已改写的文件也能用undo_shift恢复（不要直接再次运行，否则这些文件会被平移两次）
+
+    Args:
+        directory: 目录路径
+        delta: 时间偏移
+        undo_path: 撤销记录路径
+        jobs: 并行线程数
+
+    Returns:
+        统计 {"shifted": 已平移, "skipped": 无可平移字段, "failed": 失败}
+    """
+    directory = Path(directory).resolve()
+    files = sorted(
+        path for path in directory.iterdir()
+        if path.is_file() and path.suffix.lower() in EXIF_EXTENSIONS | ISOBMFF_EXTENSIONS
+    )
+    logger.info(f"平移 {len(files)} 个文件的时间: {delta}")
+
+    undo = UndoLog(undo_path, directory, delta)
+    with ThreadPoolExecutor(max_workers=max(1, jobs)) as executor:
+        results = list(executor.map(lambda path: _shift_one(path, delta, undo), files))
+
+    stats = {'shifted': 0, 'skipped': 0, 'failed': 0}
+    for path, record, error in results:
+        if error:
+            stats['failed'] += 1
+            logger.error(f"平移失败 {path.name}: {error}")
+        elif record is None:
+            stats['skipped'] += 1
+            logger.warning(f"没有可原地平移的时间字段，跳过: {path.name}")
+        else:
+            stats['shifted'] += 1
+
+    undo.close(stats)
+    logger.info(f"撤销记录已写入: {undo_path}")
+    return stats
+
+
+def _restore_one(path: Path, record: Dict[str, Any]) -> Tuple[Path, Optional[str]]:
+    try:
+        _restore_file(path, record)
+        return path, None
+    except Exception as e:
+        return path, str(e)
+
+
+def undo_shift(undo_path: Path, jobs: int = 1) -> Dict[str, int]:
+    """
+    按撤销记录恢复平移前的时间（平移中途被终止时也可以使用）
+
+    Returns:
+        统计 {"restored": 已恢复, "failed": 失败}
+    """
+    undo, files, complete = load_undo(undo_path)
+    if not complete:
+        logger.warning("平移没有正常结束，恢复撤销记录中已开始改写的文件")
+
+    directory = Path(undo['directory'])
+    items: List[Tuple[Path, Dict[str, Any]]] = [
+        (directory / name, record) for name, record in files.items()
+    ]
+    logger.info(f"恢复 {len(items)} 个文件的时间（撤销 {timedelta(seconds=undo['offset'])}）")
+
+    with ThreadPoolExecutor(max_workers=max(1, jobs)) as executor:
+        results = list(executor.map(lambda item: _restore_one(*item), items))
+
+    stats = {'restored': 0, 'failed': 0}
+    for path, error in results:
+        if error:
+            stats['failed'] += 1
+            logger.error(f"恢复失败 {path.name}: {error}")
+        else:
+            stats['restored'] += 1
+    return stats
+
+
+def default_undo_path(directory: Path) -> Path:
+    """默认撤销记录位置：archive2/<目录名>/shift_undo_<时间>.jsonl（与归档原文件放在一起）"""
+    directory = Path(directory).resolve()
+    stamp = datetime.now().strftime('%Y%m%d_%H%M%S')
+    return directory.parent / 'archive2' / directory.name / f'shift_undo_{stamp}.jsonl'
@@ -0,0 +1,201 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+按相机前缀划分的目录时间线索引
+
+同一目录里可能混有多台相机的文件（如 DSC_0001 与 IMG_0001），
+如果把所有文件名里的第一个数字当成同一个序列，就会找错相邻文件。
+本模块一次扫描目录，按文件名前缀（相机）把媒体文件分成多条时间线，
+每条时间线按编号排序，并处理计数器从9999回绕到0001的情况。
+查找相邻文件时只在对应的时间线内二分查找。
+"""
+
+import os
+import bisect
+import logging
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from filename_dates import FILE_NUMBER_PATTERN
+
+logger = logging.getLogger(__name__)
+
+# 同一台相机的照片、视频、录音使用不同前缀但共用一个计数器（只列出已确认的相机；
+# 猜错会把不同相机的计数器合并成一条时间线，误判回绕）
+PREFIX_ALIASES = {
+    'MVI_': 'IMG_',   # 佳能视频
+    'SND_': 'IMG_',   # 佳能录音
+    'MAH': 'DSC',     # 索尼视频
+}
+
+# 回绕时首尾编号离计数器边界的最大距离（占计数范围的比例，4位编号时为1000）
+ROLLOVER_MARGIN = 0.1
+
+
+class TimelineEntry:
+    """时间线中的一个文件"""
+
+    __slots__ = ('path', 'number', 'seq')
+
+    def __init__(self, path: Path, number: int, seq: int):
+        self.path = path
+        self.number = number
+        self.seq = seq
+
+    def __repr__(self) -> str:
+        return f"TimelineEntry({self.path.name!r}, seq={self.seq})"
+
+
+def split_stem(stem: str) -> Optional[Tuple[str, str]]:
+    """
+    把文件名拆成(相机前缀, 编号文本)
+
+    前缀是第一个数字之前的部分（统一为大写并应用别名），
+    编号是第一段连续数字；没有数字时返回None
+    """
+    match = FILE_NUMBER_PATTERN.search(stem)
+    if not match:
+        return None
+    prefix = stem[:match.start()].upper()
+    return PREFIX_ALIASES.get(prefix, prefix), match.group(1)
+
+
+class Timeline:
+    """一台相机（一个前缀）的文件序列"""
+
+    def __init__(self, prefix: str, items: List[Tuple[Path, str]]):
+        """
+        Args:
+            prefix: 相机前缀
+            items: (路径, 编号文本) 列表
+        """
+        self.prefix = prefix
+        numbers = sorted({int(text) for _, text in items})
+        width = max(len(text) for _, text in items)
+        self.modulus = 10 ** width
+        self.wrap_below = self._detect_rollover(numbers)
+
+        self.entries = sorted(
+            (TimelineEntry(path, int(text), self.sequence(int(text))) for path, text in items),
+            key=lambda entry: (entry.seq, entry.path.name),
+        )
+        self._seqs = [entry.seq for entry in self.entries]
+
+    def _detect_rollover(self, numbers: List[int]) -> Optional[int]:
+        """
+        检测计数器回绕（如 DSC_9998, DSC_9999, DSC_0001）
+
+        最大编号接近计数器上限、最小编号接近1，且序列内最大的间隔比首尾相接的回绕间隔还大时，
+        认为计数器在该间隔处回绕，返回回绕后的最大编号上界（小于它的编号要加上modulus）；
+        否则返回None。只有间隔大而首尾不在边界附近（如两张卡的DSC_0012与DSC_6000、
+        计数器被重置）不是回绕，保持编号顺序
+        """
+        if len(numbers) < 2:
+            return None
+        margin = self.modulus * ROLLOVER_MARGIN
+        if numbers[-1] < self.modulus - 1 - margin or numbers[0] > margin:
+            return None
+        wrap_gap = numbers[0] + self.modulus - numbers[-1]
+        largest_gap, split = max(
+            (numbers[i + 1] - numbers[i], numbers[i + 1]) for i in range(len(numbers) - 1)
+        )
+        if largest_gap > wrap_gap:
+            return split
+        return None
+
+    def sequence(self, number: int) -> int:
+        """把文件编号换算成回绕展开后的序号"""
+        if self.wrap_below is not None and number < self.wrap_below:
+            return number + self.modulus
+        return number
+
+    def before(self, seq: int, extensions: Optional[Iterable[str]] = None) -> Optional[TimelineEntry]:
+        """序号严格小于seq的最近一个文件（可按扩展名过滤）"""
+        index = bisect.bisect_left(self._seqs, seq) - 1
+        while index >= 0:
+            entry = self.entries[index]
+            if extensions is None or entry.path.suffix.lower() in extensions:
+                return entry
+            index -= 1
+        return None
+
+    def after(self, seq: int, extensions: Optional[Iterable[str]] = None) -> Optional[TimelineEntry]:
+        """序号严格大于seq的最近一个文件（可按扩展名过滤）"""
+        index = bisect.bisect_right(self._seqs, seq)
+        while index < len(self.entries):
+            entry = self.entries[index]
+            if extensions is None or entry.path.suffix.lower() in extensions:
+                return entry
+            index += 1
+        return None
+
+    @property
+    def last_seq(self) -> int:
+        return self._seqs[-1]
+
+
+class DirectoryTimelines:
+    """一个目录中按相机前缀划分的全部时间线"""
+
+    def __init__(self, directory: Path, extensions: Iterable[str]):
+        """
+        一次扫描目录建立索引
+
+        Args:
+            directory: 目录路径
+            extensions: 参与索引的媒体扩展名（小写，含点）
+        """
+        self.directory = Path(directory)
+        self.extensions = set(extensions)
+        self._groups: Dict[str, List[Tuple[Path, str]]] = {}
+        with os.scandir(self.directory) as it:
+            for dir_entry in it:
+                path = Path(dir_entry.path)
+                if path.suffix.lower() not in self.extensions:
+                    continue
+                parts = split_stem(path.stem)
+                if parts is None:
+                    continue
+                self._groups.setdefault(parts[0], []).append((path, parts[1]))
+        self._paths = {path for items in self._groups.values() for path, _ in items}
+        self.timelines = {prefix: Timeline(prefix, items) for prefix, items in self._groups.items()}
+        logger.debug(
+            f"目录时间线: {self.directory.name} → "
+            + ", ".join(f"{prefix or '(无前缀)'}:{len(t.entries)}" for prefix, t in self.timelines.items())
+        )
+
+    def add(self, path: Path) -> bool:
+        """
+        加入建立索引之后出现的文件（只重建它所属的那条时间线）
+
+        Returns:
+            是否加入（不是媒体文件、文件名没有编号或已在索引中时返回False）
+        """
+        path = Path(path)
+        if path in self._paths or path.suffix.lower() not in self.extensions:
+            return False
+        parts = split_stem(path.stem)
+        if parts is None:
+            return False
+        items = self._groups.setdefault(parts[0], [])
+        items.append((path, parts[1]))
+        self._paths.add(path)
+        self.timelines[parts[0]] = Timeline(parts[0], items)
+        return True
+
+    def locate(self, path: Path) -> Optional[Tuple[Timeline, int]]:
+        """
+        找到文件所属的时间线及其序号
+
+        文件不必仍在目录中（例如已经移动到归档目录），只根据文件名计算
+
+        Returns:
+            (时间线, 序号)，文件名没有编号或没有对应时间线时返回None
+        """
+        parts = split_stem(Path(path).stem)
+        if parts is None:
+            return None
+        timeline = self.timelines.get(parts[0])
+        if timeline is None:
+            return None
+        return timeline, timeline.sequence(int(parts[1]))
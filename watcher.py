@@ -0,0 +1,220 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+监视收件目录，文件写完后交给处理函数（--watch）
+
+- Linux上用inotify（通过ctypes调用libc，不需要额外依赖）得知哪些文件有变化；
+  没有inotify、超出监视数上限或指定了轮询时，定期列出目录比较大小和修改时间
+- 手机、读卡器写入文件可能分多次完成，有变化的文件在大小和修改时间
+  连续settle秒不变后才算写完（去抖），之后一批交给处理函数
+- 处理函数同步执行：处理期间产生的事件（转码输出、写入EXIF后的改名）
+  在处理结束后才检查，这时处理日志中已记录这些文件，不会被重复处理
+
+只监视目录本身，不包括子目录（与逐个目录处理的方式一致）。
+"""
+
+import os
+import time
+import errno
+import ctypes
+import select
+import struct
+import logging
+from pathlib import Path
+from typing import Callable, Dict, List, Optional, Set, Tuple
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_SETTLE_SECONDS = 5.0
+DEFAULT_POLL_SECONDS = 2.0
+
+# <sys/inotify.h>
+IN_MODIFY = 0x00000002
+IN_ATTRIB = 0x00000004
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_DELETE_SELF = 0x00000400
+IN_MOVE_SELF = 0x00000800
+IN_Q_OVERFLOW = 0x00004000
+IN_IGNORED = 0x00008000
+IN_ISDIR = 0x40000000
+WATCH_MASK = IN_MODIFY | IN_ATTRIB | IN_CLOSE_WRITE | IN_MOVED_TO | IN_CREATE | IN_DELETE_SELF | IN_MOVE_SELF
+
+_EVENT_HEADER = struct.Struct('iIII')
+
+
+def _list_files(directory: Path) -> Dict[str, Tuple[int, int]]:
+    """{文件名: (大小, 修改时间)}"""
+    files = {}
+    with os.scandir(directory) as it:
+        for entry in it:
+            try:
+                if entry.is_file():
+                    stat = entry.stat()
+                    files[entry.name] = (stat.st_size, stat.st_mtime_ns)
+            except OSError:
+                continue
+    return files
+
+
+class InotifyWatcher:
+    """用inotify得知目录中有变化的文件"""
+
+    def __init__(self, directory):
+        """
+        Raises:
+            OSError: 当前系统没有inotify，或超出监视数上限（ENOSPC）
+        """
+        self.directory = Path(directory)
+        try:
+            libc = ctypes.CDLL(None, use_errno=True)
+            init, add_watch = libc.inotify_init1, libc.inotify_add_watch
+        except (OSError, AttributeError) as e:
+            raise OSError(errno.ENOSYS, f"没有inotify: {e}")
+        self.fd = init(os.O_NONBLOCK | os.O_CLOEXEC)
+        if self.fd < 0:
+            raise OSError(ctypes.get_errno(), os.strerror(ctypes.get_errno()))
+        if add_watch(self.fd, os.fsencode(str(self.directory)), WATCH_MASK) < 0:
+            error = ctypes.get_errno()
+            os.close(self.fd)
+            raise OSError(error, f"{os.strerror(error)}: {self.directory}")
+
+    def wait(self, timeout: float) -> Set[str]:
+        """
+        等待最多timeout秒
+
+        Returns:
+            有变化的文件名（队列溢出时为目录中的全部文件）
+
+        Raises:
+            FileNotFoundError: 目录已被删除或移走
+        """
+        ready, _, _ = select.select([self.fd], [], [], timeout)
+        if not ready:
+            return set()
+        names = set()
+        while True:
+            try:
+                data = os.read(self.fd, 64 * 1024)
+            except BlockingIOError:
+                break
+            offset = 0
+            while offset < len(data):
+                _, mask, _, length = _EVENT_HEADER.unpack_from(data, offset)
+                offset += _EVENT_HEADER.size
+                name = data[offset:offset + length].rstrip(b'\0')
+                offset += length
+                if mask & IN_Q_OVERFLOW:
+                    logger.warning("inotify事件队列溢出，重新列出目录")
+                    names |= set(_list_files(self.directory))
+                elif mask & (IN_DELETE_SELF | IN_MOVE_SELF | IN_IGNORED):
+                    raise FileNotFoundError(f"监视的目录已被删除或移走: {self.directory}")
+                elif name and not mask & IN_ISDIR:
+                    names.add(os.fsdecode(name))
+        return names
+
+    def close(self):
+        os.close(self.fd)
+
+
+class PollingWatcher:
+    """定期列出目录，比较文件大小和修改时间（用于网络文件系统或没有inotify时）"""
+
+    def __init__(self, directory, poll_seconds: float = DEFAULT_POLL_SECONDS):
+        self.directory = Path(directory)
+        self.poll_seconds = poll_seconds
+        self._files = _list_files(self.directory)
+        self._next = time.monotonic() + poll_seconds
+
+    def wait(self, timeout: float) -> Set[str]:
+        """等待最多timeout秒，到了轮询时间时返回有变化的文件名"""
+        delay = self._next - time.monotonic()
+        if delay > timeout:
+            time.sleep(timeout)
+            return set()
+        if delay > 0:
+            time.sleep(delay)
+        self._next = time.monotonic() + self.poll_seconds
+        files = _list_files(self.directory)
+        changed = {name for name, state in files.items() if self._files.get(name) != state}
+        self._files = files
+        return changed
+
+    def close(self):
+        pass
+
+
+def open_watcher(directory, use_inotify: bool = True, poll_seconds: float = DEFAULT_POLL_SECONDS):
+    """优先使用inotify，不可用时改为轮询"""
+    if use_inotify:
+        try:
+            return InotifyWatcher(directory)
+        except OSError as e:
+            logger.warning(f"无法使用inotify，改为每{poll_seconds:g}秒轮询: {e}")
+    return PollingWatcher(directory, poll_seconds)
+
+
+class Debouncer:
+    """等待文件停止增长：大小和修改时间连续settle秒不变后才算写完"""
+
+    def __init__(self, settle: float = DEFAULT_SETTLE_SECONDS):
+        self.settle = settle
+        # 路径 → (上次看到的(大小, 修改时间), 上次变化的时刻)
+        self._pending: Dict[Path, Tuple[Optional[Tuple[int, int]], float]] = {}
+
+    def __len__(self) -> int:
+        return len(self._pending)
+
+    def touch(self, path: Path, now: Optional[float] = None):
+        """文件有变化（重新开始计时）"""
+        now = time.monotonic() if now is None else now
+        state = self._pending.get(path)
+        self._pending[path] = (state[0] if state else None, now)
+
+    def ready(self, now: Optional[float] = None) -> List[Path]:
+        """
+        取出已写完的文件（已删除的文件不再等待）
+
+        Returns:
+            按路径排序的文件列表
+        """
+        now = time.monotonic() if now is None else now
+        done = []
+        for path, (last, changed_at) in list(self._pending.items()):
+            try:
+                stat = path.stat()
+            except OSError:
+                del self._pending[path]
+                continue
+            current = (stat.st_size, stat.st_mtime_ns)
+            if current != last:
+                self._pending[path] = (current, now)
+            elif now - changed_at >= self.settle:
+                del self._pending[path]
+                done.append(path)
+        return sorted(done)
+
+
+def watch_loop(watcher, handler: Callable[[List[Path]], None], settle: float = DEFAULT_SETTLE_SECONDS,
+               should_stop: Optional[Callable[[], bool]] = None, tick: float = 1.0):
+    """
+    监视直到should_stop()为真，把写完的文件分批交给handler
+
+    Args:
+        watcher: open_watcher的返回值
+        handler: 处理一批文件（同步执行）
+        settle: 文件大小和修改时间不变多少秒后算写完
+        should_stop: 返回True时退出
+        tick: 检查停止条件和去抖状态的间隔（秒）
+    """
+    should_stop = should_stop or (lambda: False)
+    debouncer = Debouncer(settle)
+    while not should_stop():
+        for name in watcher.wait(tick):
+            debouncer.touch(watcher.directory / name)
+        ready = debouncer.ready()
+        if ready:
+            logger.info(f"{len(ready)} 个新文件已写完: {', '.join(path.name for path in ready[:5])}"
+                        + (" ..." if len(ready) > 5 else ""))
+            handler(ready)
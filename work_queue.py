@@ -0,0 +1,348 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+共享文件系统上的租约式工作队列（多台机器同时处理同一个照片库）
+
+队列是放在共享目录中的一个SQLite数据库，每个任务是一个待处理目录
+（目录是时间推断和archive2归档的最小单位，整个目录交给同一个工作进程，
+不同主机之间不会在同一目录里互相移动文件或争用_temp.mp4）。
+
+- 工作进程领取任务时获得一个有期限的租约，处理期间定期续约（心跳）
+- 工作进程崩溃或失联后租约过期，任务被其他工作进程重新领取
+- 多次领取都没有完成的任务标记为失败，不再无限重试；再次加入时重新等待领取
+- 任务路径按相对于数据库所在目录的路径保存，各主机的挂载点不同时也能领取
+  （领取时再按本机上数据库的位置还原为绝对路径）
+- 续约失败（租约已过期并被其他工作进程接手）时立即取消正在处理的任务：
+  终止其子进程、不再开始新文件，任务直接放弃，不与接手者同时处理同一目录
+
+数据库使用默认的回滚日志模式（WAL需要共享内存，不能用于网络文件系统），
+每次领取/续约/完成都是一个短事务。
+"""
+
+import os
+import time
+import socket
+import sqlite3
+import logging
+import threading
+from typing import Callable, Dict, Iterable, Optional
+
+from cancellation import CancelToken
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_LEASE_SECONDS = 300
+DEFAULT_MAX_ATTEMPTS = 3
+BUSY_TIMEOUT_SECONDS = 60
+
+STATE_PENDING = 'pending'
+STATE_LEASED = 'leased'
+STATE_DONE = 'done'
+STATE_FAILED = 'failed'
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS tasks (
+    id          INTEGER PRIMARY KEY,
+    path        TEXT NOT NULL UNIQUE,
+    state       TEXT NOT NULL DEFAULT 'pending',
+    owner       TEXT,
+    lease_until REAL,
+    attempts    INTEGER NOT NULL DEFAULT 0,
+    error       TEXT,
+    updated     REAL
+)
+"""
+
+
+def default_worker_id() -> str:
+    """主机名:进程号"""
+    return f"{socket.gethostname()}:{os.getpid()}"
+
+
+class Task:
+    """领取到的任务"""
+
+    __slots__ = ('id', 'path', 'attempts')
+
+    def __init__(self, task_id: int, path: str, attempts: int):
+        self.id = task_id
+        self.path = path
+        self.attempts = attempts
+
+    def __repr__(self) -> str:
+        return f"Task({self.id}, {self.path!r}, attempts={self.attempts})"
+
+
+class WorkQueue:
+    """基于SQLite的租约式工作队列"""
+
+    def __init__(self, db_path: str, lease_seconds: float = DEFAULT_LEASE_SECONDS,
+                 max_attempts: int = DEFAULT_MAX_ATTEMPTS, worker_id: Optional[str] = None):
+        """
+        Args:
+            db_path: 数据库路径（放在所有主机都能访问的共享目录）
+            lease_seconds: 租约时长，超过这个时间没有续约的任务会被重新领取
+            max_attempts: 最多领取次数
+            worker_id: 工作进程标识，默认 主机名:进程号
+        """
+        self.db_path = str(db_path)
+        self.lease_seconds = lease_seconds
+        self.max_attempts = max_attempts
+        self.worker_id = worker_id or default_worker_id()
+        self.base_dir = os.path.dirname(os.path.abspath(self.db_path))
+        with self._connect() as conn:
+            conn.execute(SCHEMA)
+
+    def _key(self, path: str) -> str:
+        """保存到数据库的任务路径：相对于数据库所在目录（不在同一驱动器时只能用绝对路径）"""
+        path = os.path.abspath(path)
+        try:
+            return os.path.relpath(path, self.base_dir)
+        except ValueError:
+            return path
+
+    def _resolve(self, key: str) -> str:
+        """数据库中的任务路径还原为本机的绝对路径（绝对路径原样返回）"""
+        return os.path.normpath(os.path.join(self.base_dir, key))
+
+    def _connect(self) -> sqlite3.Connection:
+        """每次操作使用新连接（连接不跨线程共享，心跳线程也能安全使用）"""
+        conn = sqlite3.connect(self.db_path, timeout=BUSY_TIMEOUT_SECONDS, isolation_level=None)
+        conn.execute('PRAGMA journal_mode=DELETE')
+        return conn
+
+    def _transaction(self, func):
+        """在BEGIN IMMEDIATE事务中执行func(conn)，保证领取等操作的原子性"""
+        conn = self._connect()
+        try:
+            conn.execute('BEGIN IMMEDIATE')
+            try:
+                result = func(conn)
+            except BaseException:
+                conn.execute('ROLLBACK')
+                raise
+            conn.execute('COMMIT')
+            return result
+        finally:
+            conn.close()
+
+    def add(self, paths: Iterable[str]) -> int:
+        """
+        加入任务（已存在的路径忽略，已失败的任务重新等待领取）
+
+        Returns:
+            新加入和重新加入的任务数
+        """
+        now = time.time()
+        rows = [(self._key(path), now, STATE_PENDING, STATE_FAILED) for path in paths]
+
+        def insert(conn):
+            before = conn.total_changes
+            conn.executemany(
+                "INSERT INTO tasks (path, updated) VALUES (?, ?) "
+                "ON CONFLICT (path) DO UPDATE SET state = ?, attempts = 0, error = NULL, updated = excluded.updated "
+                "WHERE state = ?",
+                rows,
+            )
+            return conn.total_changes - before
+
+        return self._transaction(insert)
+
+    def claim(self) -> Optional[Task]:
+        """
+        领取一个任务：等待中的任务，或租约已过期的任务
+
+        Returns:
+            Task对象；没有可领取的任务时返回None
+        """
+        def take(conn):
+            now = time.time()
+            # 多次领取都没有完成（工作进程反复崩溃）的任务不再重试
+            conn.execute(
+                "UPDATE tasks SET state = ?, error = ?, owner = NULL, updated = ? "
+                "WHERE state = ? AND lease_until < ? AND attempts >= ?",
+                (STATE_FAILED, '租约多次过期', now, STATE_LEASED, now, self.max_attempts),
+            )
+            row = conn.execute(
+                "SELECT id, path, attempts FROM tasks "
+                "WHERE state = ? OR (state = ? AND lease_until < ?) ORDER BY id LIMIT 1",
+                (STATE_PENDING, STATE_LEASED, now),
+            ).fetchone()
+            if row is None:
+                return None
+            task_id, path, attempts = row
+            conn.execute(
+                "UPDATE tasks SET state = ?, owner = ?, lease_until = ?, attempts = ?, updated = ? "
+                "WHERE id = ?",
+                (STATE_LEASED, self.worker_id, now + self.lease_seconds, attempts + 1, now, task_id),
+            )
+            return Task(task_id, self._resolve(path), attempts + 1)
+
+        task = self._transaction(take)
+        if task is not None:
+            logger.info(f"领取任务: {task.path}（第{task.attempts}次）")
+        return task
+
+    def heartbeat(self, task: Task) -> bool:
+        """
+        续约
+
+        Returns:
+            租约是否仍属于本进程（过期后被他人领取时返回False）
+        """
+        def renew(conn):
+            now = time.time()
+            cursor = conn.execute(
+                "UPDATE tasks SET lease_until = ?, updated = ? "
+                "WHERE id = ? AND owner = ? AND state = ?",
+                (now + self.lease_seconds, now, task.id, self.worker_id, STATE_LEASED),
+            )
+            return cursor.rowcount == 1
+
+        return self._transaction(renew)
+
+    def complete(self, task: Task, error: Optional[str] = None) -> bool:
+        """
+        完成任务（error不为None时标记为失败）
+
+        Returns:
+            是否成功记录（租约已被他人接手时返回False）
+        """
+        def finish(conn):
+            cursor = conn.execute(
+                "UPDATE tasks SET state = ?, error = ?, owner = NULL, lease_until = NULL, updated = ? "
+                "WHERE id = ? AND owner = ? AND state = ?",
+                (STATE_FAILED if error else STATE_DONE, error, time.time(),
+                 task.id, self.worker_id, STATE_LEASED),
+            )
+            return cursor.rowcount == 1
+
+        return self._transaction(finish)
+
+    def release(self, task: Task) -> bool:
+        """
+        放弃任务（工作进程被要求停止时），任务立即可以被其他工作进程领取，不计入领取次数
+
+        Returns:
+            是否成功放弃（租约已被他人接手时返回False）
+        """
+        def give_back(conn):
+            cursor = conn.execute(
+                "UPDATE tasks SET state = ?, owner = NULL, lease_until = NULL, attempts = attempts - 1, "
+                "updated = ? WHERE id = ? AND owner = ? AND state = ?",
+                (STATE_PENDING, time.time(), task.id, self.worker_id, STATE_LEASED),
+            )
+            return cursor.rowcount == 1
+
+        return self._transaction(give_back)
+
+    def counts(self) -> Dict[str, int]:
+        """各状态的任务数"""
+        conn = self._connect()
+        try:
+            return dict(conn.execute("SELECT state, COUNT(*) FROM tasks GROUP BY state").fetchall())
+        finally:
+            conn.close()
+
+    def has_open_tasks(self) -> bool:
+        """是否还有等待中或被领取中的任务"""
+        counts = self.counts()
+        return counts.get(STATE_PENDING, 0) + counts.get(STATE_LEASED, 0) > 0
+
+
+class Heartbeat:
+    """处理任务期间在后台线程中定期续约，租约失效时取消任务"""
+
+    def __init__(self, queue: WorkQueue, task: Task, interval: Optional[float] = None,
+                 token: Optional[CancelToken] = None):
+        """
+        Args:
+            queue: 工作队列
+            task: 正在处理的任务
+            interval: 续约间隔，默认为租约时长的1/3
+            token: 任务的取消令牌，租约失效时取消并终止其子进程
+        """
+        self.queue = queue
+        self.task = task
+        self.interval = interval or max(1.0, queue.lease_seconds / 3)
+        self.token = token
+        self.lost = False
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name='lease-heartbeat', daemon=True)
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            try:
+                if not self.queue.heartbeat(self.task):
+                    self.lost = True
+                    logger.warning(f"租约已失效，任务可能已被其他工作进程接手，停止处理: {self.task.path}")
+                    if self.token is not None:
+                        self.token.cancel()
+                        self.token.kill_processes()
+                    return
+            except sqlite3.Error as e:
+                logger.warning(f"续约失败（稍后重试）: {e}")
+
+    def __enter__(self) -> 'Heartbeat':
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self._stop.set()
+        self._thread.join()
+
+
+def run_worker(queue: WorkQueue, handler: Callable[[str, CancelToken], None], wait_for_leases: bool = True,
+               poll_seconds: float = 5.0, should_stop: Optional[Callable[[], bool]] = None,
+               cancel_token: Optional[CancelToken] = None) -> Dict[str, int]:
+    """
+    工作进程主循环：领取 → 处理（期间续约） → 完成，直到队列中没有任务
+
+    Args:
+        queue: 工作队列
+        handler: 处理一个目录的函数handler(路径, 任务的取消令牌)，抛出异常表示失败；
+            令牌在租约失效时被取消，处理函数应尽快停止
+        wait_for_leases: 没有可领取任务但仍有他人持有的租约时，是否等待
+            （租约过期后接手崩溃进程的任务）
+        poll_seconds: 等待时的轮询间隔
+        should_stop: 返回True时不再领取新任务；此时处理函数抛出异常的任务
+            被放弃而不是记为失败（由之后的工作进程重新处理）
+        cancel_token: 全局取消令牌，作为每个任务令牌的parent
+
+    Returns:
+        本进程的统计 {"done": 完成数, "failed": 失败数, "lost": 租约失效后放弃的任务数}
+    """
+    stats = {'done': 0, 'failed': 0, 'lost': 0}
+    while not (should_stop and should_stop()):
+        task = queue.claim()
+        if task is None:
+            if wait_for_leases and queue.has_open_tasks():
+                time.sleep(poll_seconds)
+                continue
+            break
+
+        error = None
+        token = CancelToken(parent=cancel_token)
+        with Heartbeat(queue, task, token=token) as heartbeat:
+            try:
+                handler(task.path, token)
+            except Exception as e:
+                error = str(e) or type(e).__name__
+                if not heartbeat.lost:
+                    logger.error(f"任务失败 {task.path}: {error}")
+
+        if heartbeat.lost:
+            # 目录已属于接手的工作进程，不记录结果
+            stats['lost'] += 1
+            logger.warning(f"租约已失效，放弃任务: {task.path}")
+            continue
+        if error and should_stop and should_stop():
+            queue.release(task)
+            logger.info(f"已停止，放弃任务: {task.path}")
+            break
+        if queue.complete(task, error):
+            stats['failed' if error else 'done'] += 1
+        else:
+            logger.warning(f"任务结果未记录（租约已失效）: {task.path}")
+    logger.info(f"工作进程 {queue.worker_id} 结束: {stats}")
+    return stats